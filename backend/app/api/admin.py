@@ -2,15 +2,17 @@
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from pydantic import BaseModel, EmailStr
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, EmailStr, Field
 from sqlalchemy import func, select
 from sqlalchemy.orm import Session, joinedload
 
 from app.core.database import get_db
-from app.core.auth import get_current_admin, get_current_org_id
+from app.core.auth import Principal, get_current_admin, get_current_org_id
 from app.models.document import User, Department, SystemSettings, ChatHistory, Document, document_department
 from app.models.organization import Organization
-from app.services.auth import get_password_hash, get_user_by_email
+from app.services.auth import get_password_hash_async, get_user_by_email
+from app.services.resync_window import parse_window
 
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
@@ -48,7 +50,7 @@ class UserOut(BaseModel):
 @router.get("/users")
 async def list_users(
     db: Session = Depends(get_db),
-    _: User = Depends(get_current_admin),
+    _: Principal = Depends(get_current_admin),
     org_id: str = Depends(get_current_org_id)
 ):
     """ユーザー一覧（利用統計付き）"""
@@ -90,7 +92,7 @@ async def list_users(
 async def create_user(
     request: UserCreate,
     db: Session = Depends(get_db),
-    _: User = Depends(get_current_admin),
+    _: Principal = Depends(get_current_admin),
     org_id: str = Depends(get_current_org_id)
 ):
     """ユーザー作成"""
@@ -102,7 +104,7 @@ async def create_user(
 
     user = User(
         email=request.email,
-        password_hash=get_password_hash(request.password),
+        password_hash=await get_password_hash_async(request.password),
         name=request.name,
         department_id=request.department_id,
         role=request.role,
@@ -126,7 +128,7 @@ async def update_user(
     user_id: str,
     request: UserUpdate,
     db: Session = Depends(get_db),
-    _: User = Depends(get_current_admin),
+    _: Principal = Depends(get_current_admin),
     org_id: str = Depends(get_current_org_id)
 ):
     """ユーザー更新"""
@@ -148,7 +150,7 @@ async def update_user(
     if request.is_active is not None:
         user.is_active = request.is_active
     if request.password is not None:
-        user.password_hash = get_password_hash(request.password)
+        user.password_hash = await get_password_hash_async(request.password)
 
     db.commit()
     return {"success": True}
@@ -158,7 +160,7 @@ async def update_user(
 async def delete_user(
     user_id: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin),
+    current_user: Principal = Depends(get_current_admin),
     org_id: str = Depends(get_current_org_id)
 ):
     """ユーザー削除"""
@@ -189,7 +191,7 @@ class DepartmentUpdate(BaseModel):
 @router.get("/departments")
 async def list_departments(
     db: Session = Depends(get_db),
-    _: User = Depends(get_current_admin),
+    _: Principal = Depends(get_current_admin),
     org_id: str = Depends(get_current_org_id)
 ):
     """部門一覧"""
@@ -228,7 +230,7 @@ async def list_departments(
 async def create_department(
     request: DepartmentCreate,
     db: Session = Depends(get_db),
-    _: User = Depends(get_current_admin),
+    _: Principal = Depends(get_current_admin),
     org_id: str = Depends(get_current_org_id)
 ):
     """部門作成"""
@@ -249,7 +251,7 @@ async def update_department(
     dept_id: str,
     request: DepartmentUpdate,
     db: Session = Depends(get_db),
-    _: User = Depends(get_current_admin),
+    _: Principal = Depends(get_current_admin),
     org_id: str = Depends(get_current_org_id)
 ):
     """部門更新"""
@@ -273,7 +275,7 @@ async def update_department(
 async def delete_department(
     dept_id: str,
     db: Session = Depends(get_db),
-    _: User = Depends(get_current_admin),
+    _: Principal = Depends(get_current_admin),
     org_id: str = Depends(get_current_org_id)
 ):
     """部門削除"""
@@ -306,6 +308,10 @@ class SettingsUpdate(BaseModel):
     box_private_key_passphrase: Optional[str] = None
     box_watched_folder_id: Optional[str] = None
     box_poll_enabled: Optional[bool] = None
+    box_poll_interval_minutes: Optional[int] = Field(None, ge=0, le=24 * 60)  # 0でサーバー既定に戻す
+    box_auto_resync: Optional[bool] = None
+    box_resync_window: Optional[str] = None  # "HH:MM-HH:MM"、空で終日
+    box_resync_concurrency: Optional[int] = Field(None, ge=0, le=10)  # 0でサーバー既定に戻す
 
 
 def get_or_create_settings(db: Session, org_id: str) -> SystemSettings:
@@ -322,7 +328,7 @@ def get_or_create_settings(db: Session, org_id: str) -> SystemSettings:
 @router.get("/settings")
 async def get_settings(
     db: Session = Depends(get_db),
-    _: User = Depends(get_current_admin),
+    _: Principal = Depends(get_current_admin),
     org_id: str = Depends(get_current_org_id)
 ):
     """システム設定取得"""
@@ -346,6 +352,16 @@ async def get_settings(
         "boxPrivateKeyPassphrase": mask(s.box_private_key_passphrase),
         "boxWatchedFolderId": s.box_watched_folder_id or "",
         "boxPollEnabled": s.box_poll_enabled or False,
+        "boxPollIntervalMinutes": s.box_poll_interval_minutes,
+        "boxAutoResync": s.box_auto_resync or False,
+        "boxResyncWindow": s.box_resync_window or "",
+        "boxResyncConcurrency": s.box_resync_concurrency,
+        "boxLastPoll": {
+            "at": s.box_last_polled_at.isoformat() if s.box_last_polled_at else None,
+            "seconds": s.box_last_poll_seconds,
+            "status": s.box_last_poll_status,
+            "detail": s.box_last_poll_detail,
+        },
     }
 
 
@@ -353,7 +369,7 @@ async def get_settings(
 async def update_settings(
     request: SettingsUpdate,
     db: Session = Depends(get_db),
-    _: User = Depends(get_current_admin),
+    _: Principal = Depends(get_current_admin),
     org_id: str = Depends(get_current_org_id)
 ):
     """システム設定更新"""
@@ -382,6 +398,18 @@ async def update_settings(
     set_if_real("box_watched_folder_id", request.box_watched_folder_id)
     if request.box_poll_enabled is not None:
         s.box_poll_enabled = request.box_poll_enabled
+    if request.box_poll_interval_minutes is not None:
+        s.box_poll_interval_minutes = request.box_poll_interval_minutes or None
+    if request.box_auto_resync is not None:
+        s.box_auto_resync = request.box_auto_resync
+    if request.box_resync_window is not None:
+        try:
+            parse_window(request.box_resync_window)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        s.box_resync_window = request.box_resync_window.strip()
+    if request.box_resync_concurrency is not None:
+        s.box_resync_concurrency = request.box_resync_concurrency or None
 
     db.commit()
     return {"success": True}
@@ -393,33 +421,41 @@ async def update_settings(
 @router.post("/settings/box/test")
 async def sftp_test_connection(
     db: Session = Depends(get_db),
-    _: User = Depends(get_current_admin),
+    _: Principal = Depends(get_current_admin),
     org_id: str = Depends(get_current_org_id),
 ):
     """SFTP接続テスト"""
+    from app.services.sftp_pool import SFTPPoolTimeout
     from app.services.sftp_service import get_sftp_service_for_org
 
     svc = get_sftp_service_for_org(db, org_id)
     if not svc.is_configured:
         raise HTTPException(status_code=400, detail="SFTP接続情報が設定されていません")
     try:
-        result = svc.test_connection()
+        result = await run_in_threadpool(svc.test_connection)
         return {"success": True, "message": f"接続成功（{result['cwd']}: {result['items']}件）"}
+    except SFTPPoolTimeout:
+        raise HTTPException(
+            status_code=503,
+            detail="同期処理でサーバーへの接続が混み合っています。しばらく待ってから再度お試しください。",
+            headers={"Retry-After": "5"},
+        )
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"SFTP接続失敗: {str(e)}")
 
 
 @router.post("/settings/box/poll-now")
 async def sftp_poll_now(
-    db: Session = Depends(get_db),
-    _: User = Depends(get_current_admin),
+    _: Principal = Depends(get_current_admin),
     org_id: str = Depends(get_current_org_id),
 ):
-    """即時ポーリング実行"""
-    from app.services.sftp_poller import poll_org_changes
+    """即時ポーリング実行（ワーカースレッドで実行し、結果をスケジュール実行と同様に記録）"""
+    from app.services.poll_scheduler import poll_scheduler
 
-    result = poll_org_changes(db, org_id)
-    return result
+    try:
+        return await run_in_threadpool(poll_scheduler.run_once, org_id)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"ポーリング失敗: {str(e)}")
 
 
 # ==================== 回答品質管理 ====================
@@ -433,7 +469,7 @@ async def update_answer_memo(
     chat_id: str,
     request: MemoUpdate,
     db: Session = Depends(get_db),
-    _: User = Depends(get_current_admin),
+    _: Principal = Depends(get_current_admin),
     org_id: str = Depends(get_current_org_id)
 ):
     """回答に管理者メモを追加"""
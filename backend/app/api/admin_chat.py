@@ -6,8 +6,7 @@ from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
-from app.core.auth import get_current_admin, get_current_org_id
-from app.models.document import User
+from app.core.auth import Principal, get_current_admin, get_current_org_id
 from app.services.admin_agent import AdminAgent
 
 router = APIRouter(prefix="/api/admin/agent", tags=["admin-agent"])
@@ -27,7 +26,7 @@ class AdminChatRequest(BaseModel):
 async def admin_agent_chat(
     request: AdminChatRequest,
     db: Session = Depends(get_db),
-    _: User = Depends(get_current_admin),
+    _: Principal = Depends(get_current_admin),
     org_id: str = Depends(get_current_org_id),
 ):
     message = request.message.strip()
@@ -47,7 +46,7 @@ async def admin_agent_chat(
 @router.get("/download/{filename}")
 async def download_document(
     filename: str,
-    _: User = Depends(get_current_admin),
+    _: Principal = Depends(get_current_admin),
 ):
     generated_dir = os.path.join(
         os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
@@ -12,13 +12,15 @@ from sqlalchemy.orm import Session
 
 limiter = Limiter(key_func=get_remote_address)
 
+from app.core.config import settings
 from app.core.database import get_db
-from app.core.auth import get_current_user, check_trial_status
+from app.core.auth import Principal, get_current_user, check_trial_status
 from app.models.document import User, SystemSettings
 from app.models.organization import Organization
 from app.services.auth import (
     authenticate_user,
     create_access_token,
+    get_password_hash_async,
     get_user_by_email,
     get_or_create_sso_user,
     ACCESS_TOKEN_EXPIRE_HOURS,
@@ -84,10 +86,10 @@ def _build_user_dict(user: User) -> dict:
 
 
 @router.post("/login", response_model=LoginResponse)
-@limiter.limit("100/minute")
+@limiter.limit(settings.login_rate_limit)
 async def login(request: Request, body: LoginRequest, db: Session = Depends(get_db)):
     """ログイン"""
-    user = authenticate_user(db, body.email, body.password)
+    user = await authenticate_user(db, body.email, body.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -146,7 +148,7 @@ async def signup(request: Request, body: SignupRequest, db: Session = Depends(ge
         db=db,
         company_name=body.company_name.strip(),
         email=body.email,
-        password=body.password,
+        password_hash=await get_password_hash_async(body.password),
     )
 
     # JWT発行
@@ -304,15 +306,15 @@ def _get_frontend_origin() -> str:
 
 
 @router.get("/me", response_model=UserResponse)
-async def get_me(current_user: User = Depends(get_current_user)):
+async def get_me(current_user: Principal = Depends(get_current_user)):
     """現在のユーザー情報を取得"""
     return UserResponse(
         id=current_user.id,
         email=current_user.email,
         name=current_user.name,
         department_id=current_user.department_id,
-        department_name=current_user.department.name if current_user.department else None,
+        department_name=current_user.department_name,
         role=current_user.role,
         organization_id=current_user.organization_id,
-        organization_name=current_user.organization.name if current_user.organization else None,
+        organization_name=current_user.organization_name,
     )
@@ -2,15 +2,21 @@ import json
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy import text
-from sqlalchemy.orm import Session
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
-from app.core.auth import get_current_user_optional
+from app.core.config import settings
+from app.core.database import get_async_db
+from app.core.auth import Principal, get_current_user_optional
 from app.services.agentic_rag import AgenticRAG
-from app.models.document import ChatHistory, User
+from app.services.analytics import record_chat, record_feedback
+from app.services.answer_cache import answer_cache, visibility_scope
+from app.services.chat_references import build_references
+from app.services.rag import rag_service
+from app.models.document import ChatHistory, utc_now
 
 router = APIRouter(prefix="/api", tags=["chat"])
 
@@ -33,8 +39,8 @@ class FeedbackRequest(BaseModel):
 @router.post("/chat")
 async def chat(
     request: ChatRequest,
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user_optional)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[Principal] = Depends(get_current_user_optional)
 ):
     question = request.question.strip()
     if not question:
@@ -47,15 +53,28 @@ async def chat(
     org_id = current_user.organization_id if current_user else None
     history = [{"role": msg.role, "content": msg.content} for msg in request.conversation_history[-10:]]
 
-    agent = AgenticRAG(db, org_id, user_department_id)
+    # 回答キャッシュ: 会話の文脈に依存しない単発質問のみ対象
+    scope = visibility_scope(current_user)
+    use_cache = settings.answer_cache_enabled and bool(org_id) and scope is not None and not history
+    question_embedding = None
+    cached = None
+    if use_cache:
+        question_embedding = await run_in_threadpool(rag_service.get_embedding, question)
+        cached = await db.run_sync(answer_cache.lookup, org_id, scope, question_embedding)
+
+    if cached:
+        events = answer_cache.replay(cached)
+    else:
+        events = AgenticRAG(org_id, user_department_id).run(question, history)
 
     async def generate():
         full_answer = ""
         references = []
         avg_similarity = 0.0
         agentic_trace = []
+        followups = []
 
-        async for event in agent.run(question, history):
+        async for event in events:
             yield event
             # Parse event to collect final data
             if event.startswith("data: "):
@@ -67,6 +86,7 @@ async def chat(
                         references = data.get("references", [])
                         avg_similarity = data.get("avg_similarity", 0.0)
                         agentic_trace = data.get("agentic_trace", [])
+                        followups = data.get("followups", [])
                 except json.JSONDecodeError:
                     pass
 
@@ -88,9 +108,25 @@ async def chat(
             avg_similarity=str(round(avg_similarity, 3)),
             is_no_answer=is_no_answer,
             agentic_trace=json.dumps(agentic_trace, ensure_ascii=False) if agentic_trace else None,
+            created_at=utc_now(),
         )
+        chat_history.references = build_references(chat_history, references)
         db.add(chat_history)
-        db.commit()
+        await db.run_sync(record_chat, chat_history)
+
+        if use_cache and not cached and is_no_answer == "0" and references and full_answer:
+            await db.run_sync(
+                answer_cache.store,
+                organization_id=org_id,
+                scope=scope,
+                question=question,
+                question_embedding=question_embedding,
+                answer=full_answer,
+                references=references,
+                followups=followups,
+                avg_similarity=avg_similarity,
+            )
+        await db.commit()
 
         # done イベントに chat_id を付与して再送
         yield f"data: {json.dumps({'chat_id': chat_history.id}, ensure_ascii=False)}\n\n"
@@ -100,8 +136,8 @@ async def chat(
 
 @router.get("/chat/suggestions")
 async def chat_suggestions(
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user_optional),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[Principal] = Depends(get_current_user_optional),
 ):
     """ドキュメントベースのサジェスト質問を返す"""
     org_id = current_user.organization_id if current_user else None
@@ -114,7 +150,7 @@ async def chat_suggestions(
         GROUP BY filename
         ORDER BY latest DESC LIMIT 20
     """)
-    rows = db.execute(doc_sql, {"org_id": org_id}).fetchall()
+    rows = (await db.execute(doc_sql, {"org_id": org_id})).fetchall()
     filenames = [r.filename for r in rows]
 
     # ファイル名→質問のマッピング
@@ -155,15 +191,17 @@ async def chat_suggestions(
 
 
 @router.post("/feedback")
-async def feedback(request: FeedbackRequest, db: Session = Depends(get_db)):
-    chat = db.query(ChatHistory).filter(ChatHistory.id == request.chat_id).first()
+async def feedback(request: FeedbackRequest, db: AsyncSession = Depends(get_async_db)):
+    chat = await db.scalar(select(ChatHistory).where(ChatHistory.id == request.chat_id))
     if not chat:
         raise HTTPException(status_code=404, detail="チャット履歴が見つかりません")
 
     if request.feedback not in ["good", "bad"]:
         raise HTTPException(status_code=400, detail="フィードバックは 'good' または 'bad' である必要があります")
 
+    previous = chat.feedback
     chat.feedback = request.feedback
-    db.commit()
+    await db.run_sync(record_feedback, chat, previous)
+    await db.commit()
 
     return {"success": True}
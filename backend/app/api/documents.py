@@ -1,21 +1,32 @@
+import asyncio
+import json
 import logging
 import os
 from typing import Optional, List
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from fastapi.responses import FileResponse
+import aiofiles
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy import func
-from sqlalchemy.orm import Session, joinedload
-
-from app.core.database import get_db
-from app.core.auth import get_current_user_optional, get_current_admin, get_current_org_id, get_current_org_id_optional
-from app.services.rag import rag_service
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, get_db, get_async_db
+from app.core.auth import Principal, get_current_user_optional, get_current_admin, get_current_org_id, get_current_org_id_optional
+from app.services.answer_cache import answer_cache
 from app.services.document_processor import document_processor
+from app.services.ingestion import TERMINAL_STATUSES, enqueue_sftp_sync, enqueue_upload, job_to_dict, new_staging_path
+from app.services.sftp_pool import SFTPPoolTimeout
 from app.services.sftp_service import get_sftp_service_for_org, SFTPService
-from app.models.document import Document, DocumentChunk, Department, User
+from app.models.document import Document, DocumentChunk, Department
+from app.models.ingestion import IngestionJob
 
 UPLOADS_BASE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "uploads")
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+SFTP_BUSY_DETAIL = "同期処理でサーバーへの接続が混み合っています。しばらく待ってから再度お試しください。"
 
 logger = logging.getLogger(__name__)
 
@@ -36,48 +47,41 @@ class BoxSyncRequest(BaseModel):
 
 @router.get("")
 async def list_documents(
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user_optional),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[Principal] = Depends(get_current_user_optional),
     org_id: Optional[str] = Depends(get_current_org_id_optional)
 ):
     """ドキュメント一覧（部門別アクセス制御付き）"""
     # チャンク数をサブクエリで取得（N+1回避）
-    chunk_count_sq = (
-        db.query(DocumentChunk.document_id, func.count(DocumentChunk.id).label("chunk_count"))
-        .group_by(DocumentChunk.document_id)
-        .subquery()
-    )
+    chunk_count_q = select(DocumentChunk.document_id, func.count(DocumentChunk.id).label("chunk_count"))
+    if org_id:
+        chunk_count_q = chunk_count_q.where(DocumentChunk.organization_id == org_id)
+    chunk_count_sq = chunk_count_q.group_by(DocumentChunk.document_id).subquery()
 
     query = (
-        db.query(Document, chunk_count_sq.c.chunk_count)
+        select(Document, chunk_count_sq.c.chunk_count)
         .outerjoin(chunk_count_sq, Document.id == chunk_count_sq.c.document_id)
-        .options(joinedload(Document.departments))
+        .options(selectinload(Document.departments))
     )
 
     # org_idフィルタ（マルチテナント対応）
     if org_id:
-        query = query.filter(Document.organization_id == org_id)
+        query = query.where(Document.organization_id == org_id)
 
     # 一般ユーザーの場合は公開ドキュメントと自部門のドキュメントのみ
     if current_user and current_user.role != "admin":
         if current_user.department_id:
-            query = query.filter(
+            query = query.where(
                 (Document.is_public == True) |
                 (Document.departments.any(Department.id == current_user.department_id))
             )
         else:
-            query = query.filter(Document.is_public == True)
-
-    rows = query.order_by(Document.created_at.desc()).all()
-
-    # joinedloadで重複が生じる場合があるため、一意化
-    seen = set()
-    result = []
-    for doc, chunk_count in rows:
-        if doc.id in seen:
-            continue
-        seen.add(doc.id)
-        result.append({
+            query = query.where(Document.is_public == True)
+
+    rows = (await db.execute(query.order_by(Document.created_at.desc()))).all()
+
+    return [
+        {
             "id": doc.id,
             "filename": doc.filename,
             "file_type": doc.file_type,
@@ -91,95 +95,130 @@ async def list_documents(
             "box_file_id": doc.box_file_id,
             "box_sync_status": doc.box_sync_status,
             "box_synced_at": doc.box_synced_at.isoformat() if doc.box_synced_at else None,
-        })
-
-    return result
+        }
+        for doc, chunk_count in rows
+    ]
 
 
-@router.post("/upload")
+@router.post("/upload", status_code=202)
 async def upload_document(
     file: UploadFile = File(...),
     is_public: bool = True,
     category: str = "",
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin)
+    current_user: Principal = Depends(get_current_admin)
 ):
-    """ドキュメントアップロード（管理者のみ）"""
+    """ドキュメントアップロード（管理者のみ）。取り込みはバックグラウンドジョブで行い、ジョブを返す"""
     # ファイルタイプの検証
     try:
         file_type = document_processor.get_file_type(file.filename)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-    # ファイル内容を読み込み
-    content = await file.read()
-
-    # テキスト抽出
+    # ファイル全体をメモリに載せず、ステージング先へ分割して書き込む
+    path = new_staging_path(current_user.organization_id, file.filename, file_type)
+    size = 0
     try:
-        text = document_processor.extract_text(file.filename, content)
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"ファイルの読み込みに失敗しました: {str(e)}")
-
-    if not text.strip():
-        raise HTTPException(status_code=400, detail="ドキュメントからテキストを抽出できませんでした")
-
-    # ドキュメントを作成（organization_id追加）
-    document = Document(
-        filename=file.filename,
-        file_type=file_type,
-        is_public=is_public,
-        category=category,
-        organization_id=current_user.organization_id,
-    )
-    db.add(document)
-    db.flush()
-
-    # 元ファイルをディスクに保存
-    ext = file.filename.rsplit(".", 1)[-1].lower() if "." in file.filename else file_type
-    upload_dir = os.path.join(UPLOADS_BASE_DIR, current_user.organization_id)
-    os.makedirs(upload_dir, exist_ok=True)
-    save_path = os.path.join(upload_dir, f"{document.id}.{ext}")
-    with open(save_path, "wb") as f:
-        f.write(content)
-    document.file_path = save_path
-
-    # チャンク分割
-    chunks = rag_service.chunk_text(text)
-
-    # エンベディング生成
-    embeddings = rag_service.get_embeddings(chunks)
-
-    # チャンクを保存（organization_id追加）
-    for i, (chunk_text, embedding) in enumerate(zip(chunks, embeddings)):
-        chunk = DocumentChunk(
-            document_id=document.id,
-            content=chunk_text,
-            embedding=embedding,
-            chunk_index=i,
+        async with aiofiles.open(path, "wb") as out:
+            while block := await file.read(UPLOAD_BLOCK_SIZE):
+                size += len(block)
+                await out.write(block)
+        if size == 0:
+            raise HTTPException(status_code=400, detail="ファイルが空です")
+
+        job = enqueue_upload(
+            db,
             organization_id=current_user.organization_id,
+            user_id=current_user.id,
+            filename=file.filename,
+            file_type=file_type,
+            source_path=path,
+            is_public=is_public,
+            category=category,
         )
-        db.add(chunk)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return job_to_dict(job)
+
+
+@router.get("/jobs")
+async def list_ingestion_jobs(
+    limit: int = Query(default=50, ge=1, le=200),
+    db: AsyncSession = Depends(get_async_db),
+    _: Principal = Depends(get_current_admin),
+    org_id: str = Depends(get_current_org_id),
+):
+    """取り込みジョブ一覧（新しい順）"""
+    jobs = (await db.scalars(
+        select(IngestionJob)
+        .where(IngestionJob.organization_id == org_id)
+        .order_by(IngestionJob.created_at.desc())
+        .limit(limit)
+    )).all()
+    return [job_to_dict(job) for job in jobs]
+
+
+async def _get_job(db: AsyncSession, job_id: str, org_id: str) -> IngestionJob:
+    job = await db.scalar(select(IngestionJob).where(
+        IngestionJob.id == job_id,
+        IngestionJob.organization_id == org_id,
+    ))
+    if not job:
+        raise HTTPException(status_code=404, detail="ジョブが見つかりません")
+    return job
+
+
+@router.get("/jobs/{job_id}")
+async def get_ingestion_job(
+    job_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    _: Principal = Depends(get_current_admin),
+    org_id: str = Depends(get_current_org_id),
+):
+    """取り込みジョブの状態（ポーリング用）"""
+    return job_to_dict(await _get_job(db, job_id, org_id))
 
-    db.commit()
 
-    return {
-        "id": document.id,
-        "filename": document.filename,
-        "file_type": document.file_type,
-        "is_public": document.is_public,
-        "chunk_count": len(chunks),
-    }
+@router.get("/jobs/{job_id}/events")
+async def stream_ingestion_job(
+    job_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    _: Principal = Depends(get_current_admin),
+    org_id: str = Depends(get_current_org_id),
+):
+    """取り込みジョブの進捗をSSEで配信（変化があった時のみ送信し、完了・失敗で終了）"""
+    await _get_job(db, job_id, org_id)
+
+    async def generate():
+        last = None
+        while True:
+            async with AsyncSessionLocal() as session:
+                job = await session.get(IngestionJob, job_id)
+                data = job_to_dict(job) if job else None
+            if data is None:
+                break
+            if data != last:
+                yield f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+                last = data
+            if data["status"] in TERMINAL_STATUSES:
+                break
+            await asyncio.sleep(settings.ingestion_events_interval_seconds)
+
+    return StreamingResponse(generate(), media_type="text/event-stream")
 
 
 @router.get("/{document_id}")
 async def get_document(
     document_id: str,
     db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user_optional),
+    current_user: Optional[Principal] = Depends(get_current_user_optional),
     org_id: Optional[str] = Depends(get_current_org_id_optional)
 ):
     """ドキュメント詳細（部門別アクセス制御付き）"""
-    query = db.query(Document).filter(Document.id == document_id)
+    # 部門はアクセス権チェックと応答の両方で使うため同じクエリで取得
+    query = db.query(Document).options(joinedload(Document.departments)).filter(Document.id == document_id)
 
     # org_idフィルタ（マルチテナント対応）
     if org_id:
@@ -222,10 +261,11 @@ async def update_document_permissions(
     document_id: str,
     request: DocumentPermissionUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin)
+    current_user: Principal = Depends(get_current_admin)
 ):
     """ドキュメントの権限を更新（管理者のみ）"""
-    query = db.query(Document).filter(Document.id == document_id)
+    # 部門はアクセス権チェックと応答の両方で使うため同じクエリで取得
+    query = db.query(Document).options(joinedload(Document.departments)).filter(Document.id == document_id)
 
     # org_idフィルタ（マルチテナント対応）
     query = query.filter(Document.organization_id == current_user.organization_id)
@@ -244,6 +284,8 @@ async def update_document_permissions(
     else:
         document.departments = []
 
+    # 閲覧スコープが変わるため回答キャッシュを破棄
+    answer_cache.invalidate_documents(db, [document.id])
     db.commit()
 
     return {
@@ -257,10 +299,11 @@ async def update_document_permissions(
 async def delete_document(
     document_id: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin)
+    current_user: Principal = Depends(get_current_admin)
 ):
     """ドキュメント削除（管理者のみ）"""
-    query = db.query(Document).filter(Document.id == document_id)
+    # 部門はアクセス権チェックと応答の両方で使うため同じクエリで取得
+    query = db.query(Document).options(joinedload(Document.departments)).filter(Document.id == document_id)
 
     # org_idフィルタ（マルチテナント対応）
     query = query.filter(Document.organization_id == current_user.organization_id)
@@ -276,6 +319,7 @@ async def delete_document(
         except OSError:
             logger.warning(f"元ファイルの削除に失敗: {document.file_path}")
 
+    answer_cache.invalidate_documents(db, [document.id])
     db.delete(document)
     db.commit()
 
@@ -303,11 +347,11 @@ MEDIA_TYPES = {
 async def download_document(
     document_id: str,
     db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user_optional),
+    current_user: Optional[Principal] = Depends(get_current_user_optional),
     org_id: Optional[str] = Depends(get_current_org_id_optional),
 ):
     """元ファイルのダウンロード（認証済みユーザー）"""
-    query = db.query(Document).filter(Document.id == document_id)
+    query = db.query(Document).options(joinedload(Document.departments)).filter(Document.id == document_id)
     if org_id:
         query = query.filter(Document.organization_id == org_id)
     document = query.first()
@@ -360,14 +404,16 @@ async def sftp_configured(
 async def sftp_list_folders(
     parent_id: str = "/",
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin),
+    current_user: Principal = Depends(get_current_admin),
 ):
     """SFTPフォルダ一覧（管理者のみ）"""
     svc = get_sftp_service_for_org(db, current_user.organization_id)
     if not svc.is_configured:
         raise HTTPException(status_code=400, detail="SFTP接続情報が設定されていません")
     try:
-        return svc.list_folders(parent_id)
+        return await run_in_threadpool(svc.list_folders, parent_id)
+    except SFTPPoolTimeout:
+        raise HTTPException(status_code=503, detail=SFTP_BUSY_DETAIL, headers={"Retry-After": "5"})
     except Exception as e:
         logger.error(f"SFTP list_folders error: {e}")
         raise HTTPException(status_code=502, detail=f"サーバーとの通信に失敗しました: {str(e)}")
@@ -377,14 +423,16 @@ async def sftp_list_folders(
 async def sftp_list_files(
     folder_id: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin),
+    current_user: Principal = Depends(get_current_admin),
 ):
     """SFTPフォルダ内ファイル一覧（管理者のみ）+ 同期状態付き"""
     svc = get_sftp_service_for_org(db, current_user.organization_id)
     if not svc.is_configured:
         raise HTTPException(status_code=400, detail="SFTP接続情報が設定されていません")
     try:
-        files = svc.list_files(f"/{folder_id}")
+        files = await run_in_threadpool(svc.list_files, f"/{folder_id}")
+    except SFTPPoolTimeout:
+        raise HTTPException(status_code=503, detail=SFTP_BUSY_DETAIL, headers={"Retry-After": "5"})
     except Exception as e:
         logger.error(f"SFTP list_files error: {e}")
         raise HTTPException(status_code=502, detail=f"サーバーとの通信に失敗しました: {str(e)}")
@@ -407,27 +455,23 @@ async def sftp_list_files(
 async def sftp_sync_files(
     request: BoxSyncRequest,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin),
+    current_user: Principal = Depends(get_current_admin),
 ):
-    """SFTPファイル同期実行（管理者のみ）"""
+    """SFTPファイル同期ジョブ登録（管理者のみ）。取得・取り込みはバックグラウンドワーカーが行う"""
     svc = get_sftp_service_for_org(db, current_user.organization_id)
     if not svc.is_configured:
         raise HTTPException(status_code=400, detail="SFTP接続情報が設定されていません")
 
-    results = []
-    for file_path in request.file_ids:
-        try:
-            doc = svc.sync_file(
-                db=db,
-                file_path=file_path,
-                is_public=request.is_public,
-                department_ids=request.department_ids or None,
-                organization_id=current_user.organization_id,
-            )
-            results.append({"file_id": file_path, "document_id": doc.id, "status": "synced"})
-        except Exception as e:
-            logger.error(f"SFTP sync error for {file_path}: {e}")
-            results.append({"file_id": file_path, "document_id": None, "status": "error", "detail": str(e)})
-
-    return {"results": results}
+    jobs = enqueue_sftp_sync(
+        db,
+        organization_id=current_user.organization_id,
+        user_id=current_user.id,
+        source_file_ids=request.file_ids,
+        is_public=request.is_public,
+        department_ids=request.department_ids,
+    )
+    return {"results": [
+        {"file_id": file_path, "job_id": job.id, "status": "queued"}
+        for file_path, job in zip(request.file_ids, jobs)
+    ]}
 
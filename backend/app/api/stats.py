@@ -1,164 +1,192 @@
+import base64
 import json
-from collections import Counter
 from datetime import datetime, timedelta, timezone
 
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy import case, extract, func, or_
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func, or_, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 
-from app.core.database import get_db
-from app.core.auth import get_current_admin, get_current_org_id
-from app.models.document import ChatHistory, Department, Document, DocumentChunk, User, document_department
+from app.core.database import get_async_db
+from app.core.auth import Principal, get_current_admin, get_current_org_id
+from app.models.document import ChatHistory, Department, Document, DocumentChunk, document_department
+from app.services import analytics, chat_references
 
 router = APIRouter(prefix="/api/stats", tags=["stats"])
 
 
-def _period_stats(db: Session, org_id: str, since: datetime, until: datetime | None = None) -> dict:
-    """指定期間の基本統計を1クエリで計算"""
-    filters = [
-        ChatHistory.organization_id == org_id,
-        ChatHistory.created_at >= since,
-    ]
-    if until:
-        filters.append(ChatHistory.created_at < until)
-    row = db.query(
-        func.count(ChatHistory.id).label("total"),
-        func.sum(case((ChatHistory.feedback == "good", 1), else_=0)).label("good"),
-        func.sum(case((ChatHistory.feedback == "bad", 1), else_=0)).label("bad"),
-        func.sum(case((ChatHistory.is_no_answer == "1", 1), else_=0)).label("no_answer"),
-    ).filter(*filters).one()
-    total = row.total or 0
-    good = int(row.good or 0)
-    bad = int(row.bad or 0)
-    no_answer = int(row.no_answer or 0)
+ANSWER_PREVIEW_CHARS = 200
+HISTORY_COUNT_CAP = 10_000  # ロールアップで表せない絞り込みは、この件数まで数えて打ち切る
+
+
+def _encode_cursor(created_at: datetime, chat_id: str) -> str:
+    raw = json.dumps([created_at.isoformat(), chat_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        created_at, chat_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(created_at), str(chat_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="cursor が不正です")
+
+
+def _rollup_total(
+    db: Session, org_id: str, since: datetime | None, feedback: str | None, no_answer_only: bool,
+    filter_mode: str | None,
+) -> int | None:
+    """絞り込みが時間別ロールアップの列で表せる場合の件数（期間の境界は時単位のため概数）"""
+    if no_answer_only and feedback:
+        return None
+    if filter_mode == "evaluated" and feedback not in ("good", "bad") and not no_answer_only:
+        return None  # 評価あり OR 回答なし の重複はロールアップから分からない
+    totals = analytics.period_totals(db, org_id, since)
+    if no_answer_only:
+        return totals["no_answer"]
+    if feedback in ("good", "bad"):
+        return totals[feedback]
+    if feedback == "none":
+        return totals["total"] - totals["feedback_count"]
+    return totals["total"]
+
+
+def _history_page(
+    db: Session, org_id: str, limit: int, cursor: str | None, feedback: str | None, no_answer_only: bool,
+    days: int | None, filter_mode: str | None,
+) -> dict:
+    """
+    (created_at, id) のキーセットで1ページ分を返す（OFFSET を使わないため深いページでも一定のコスト）。
+    一覧は回答の抜粋のみ。全文と引用は詳細（/chat-history/{chat_id}）で取得する
+    """
+    since = datetime.now(timezone.utc) - timedelta(days=days) if days else None
+    filters = [ChatHistory.organization_id == org_id]
+    if since:
+        filters.append(ChatHistory.created_at >= since)
+    if filter_mode == "evaluated":
+        filters.append(or_(ChatHistory.feedback.isnot(None), ChatHistory.is_no_answer == "1"))
+    if feedback in ("good", "bad"):
+        filters.append(ChatHistory.feedback == feedback)
+    elif feedback == "none":
+        filters.append(ChatHistory.feedback.is_(None))
+    if no_answer_only:
+        filters.append(ChatHistory.is_no_answer == "1")
+
+    query = db.query(
+        ChatHistory.id,
+        ChatHistory.question,
+        func.substr(ChatHistory.answer, 1, ANSWER_PREVIEW_CHARS + 1).label("answer"),
+        ChatHistory.is_no_answer,
+        ChatHistory.feedback,
+        ChatHistory.created_at,
+    ).filter(*filters)
+    if cursor:
+        query = query.filter(tuple_(ChatHistory.created_at, ChatHistory.id) < tuple_(*_decode_cursor(cursor)))
+    rows = query.order_by(ChatHistory.created_at.desc(), ChatHistory.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    total = _rollup_total(db, org_id, since, feedback, no_answer_only, filter_mode)
+    total_is_estimate = total is not None
+    if total is None:
+        capped = db.query(ChatHistory.id).filter(*filters).limit(HISTORY_COUNT_CAP + 1).subquery()
+        total = db.query(func.count()).select_from(capped).scalar()
+        total_is_estimate = total > HISTORY_COUNT_CAP
+        total = min(total, HISTORY_COUNT_CAP)
+
     return {
         "total": total,
-        "good": good,
-        "bad": bad,
-        "no_answer": no_answer,
-        "feedback_count": good + bad,
+        "total_is_estimate": total_is_estimate,
+        "next_cursor": _encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None,
+        "items": [
+            {
+                "id": row.id,
+                "question": row.question,
+                "answer": row.answer[:ANSWER_PREVIEW_CHARS] + "..." if len(row.answer) > ANSWER_PREVIEW_CHARS else row.answer,
+                "is_no_answer": row.is_no_answer == "1",
+                "feedback": row.feedback,
+                "created_at": row.created_at.isoformat() if row.created_at else None,
+            }
+            for row in rows
+        ],
     }
 
 
 @router.get("/chat-history")
 async def get_chat_history(
     limit: int = Query(default=50, ge=1, le=500),
-    offset: int = Query(default=0, ge=0),
+    cursor: str = Query(default=None),  # 前ページの next_cursor
     feedback: str = Query(default=None),  # "good", "bad", "none"
     no_answer_only: bool = Query(default=False),
     days: int = Query(default=None, ge=1, le=365),
     filter_mode: str = Query(default=None),  # "evaluated"
-    db: Session = Depends(get_db),
-    _: User = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_async_db),
+    _: Principal = Depends(get_current_admin),
     org_id: str = Depends(get_current_org_id)
 ):
-    """チャット履歴一覧を取得"""
-    query = db.query(ChatHistory).filter(
-        ChatHistory.organization_id == org_id
-    ).order_by(ChatHistory.created_at.desc())
-
-    if days:
-        since = datetime.now(timezone.utc) - timedelta(days=days)
-        query = query.filter(ChatHistory.created_at >= since)
-
-    if filter_mode == "evaluated":
-        query = query.filter(or_(ChatHistory.feedback.isnot(None), ChatHistory.is_no_answer == "1"))
-
-    if feedback == "good":
-        query = query.filter(ChatHistory.feedback == "good")
-    elif feedback == "bad":
-        query = query.filter(ChatHistory.feedback == "bad")
-    elif feedback == "none":
-        query = query.filter(ChatHistory.feedback.is_(None))
+    """チャット履歴一覧を取得（新しい順）"""
+    return await db.run_sync(
+        lambda session: _history_page(session, org_id, limit, cursor, feedback, no_answer_only, days, filter_mode)
+    )
 
-    if no_answer_only:
-        query = query.filter(ChatHistory.is_no_answer == "1")
-
-    total = query.count()
-    chats = query.offset(offset).limit(limit).all()
-
-    def _parse_trace(chat):
-        """agentic_traceからreferencesを復元"""
-        references = []
-        if chat.referenced_doc_ids:
-            try:
-                doc_ids = json.loads(chat.referenced_doc_ids)
-                if chat.agentic_trace:
-                    trace = json.loads(chat.agentic_trace)
-                    for step in trace:
-                        if step.get("tool") == "cite_sources":
-                            input_data = step.get("input", {})
-                            if isinstance(input_data, str):
-                                try:
-                                    input_data = json.loads(input_data)
-                                except (json.JSONDecodeError, TypeError):
-                                    input_data = {}
-                            if not isinstance(input_data, dict):
-                                input_data = {}
-                            citations = input_data.get("citations", [])
-                            for c in citations:
-                                if not isinstance(c, dict):
-                                    continue
-                                references.append({
-                                    "id": c.get("document_id", ""),
-                                    "title": c.get("filename", ""),
-                                    "section": c.get("section", ""),
-                                    "excerpt": c.get("excerpt", ""),
-                                })
-                            break
-                if not references:
-                    for doc_id in doc_ids:
-                        references.append({"id": doc_id, "title": "", "section": "", "excerpt": ""})
-            except (ValueError, TypeError):
-                pass
-        return references
 
+@router.get("/chat-history/{chat_id}")
+async def get_chat_history_detail(
+    chat_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    _: Principal = Depends(get_current_admin),
+    org_id: str = Depends(get_current_org_id)
+):
+    """チャット履歴の詳細（回答全文・引用）"""
+    chat = await db.scalar(
+        select(ChatHistory).options(selectinload(ChatHistory.references))
+        .where(ChatHistory.id == chat_id, ChatHistory.organization_id == org_id)
+    )
+    if not chat:
+        raise HTTPException(status_code=404, detail="チャット履歴が見つかりません")
     return {
-        "total": total,
-        "items": [
-            {
-                "id": chat.id,
-                "question": chat.question,
-                "answer": chat.answer[:200] + "..." if len(chat.answer) > 200 else chat.answer,
-                "full_answer": chat.answer,
-                "is_no_answer": chat.is_no_answer == "1",
-                "feedback": chat.feedback,
-                "references": _parse_trace(chat),
-                "created_at": chat.created_at.isoformat() if chat.created_at else None,
-            }
-            for chat in chats
-        ]
+        "id": chat.id,
+        "question": chat.question,
+        "answer": chat.answer,
+        "is_no_answer": chat.is_no_answer == "1",
+        "feedback": chat.feedback,
+        "references": [chat_references.as_dict(ref) for ref in chat.references],
+        "created_at": chat.created_at.isoformat() if chat.created_at else None,
     }
 
 
-@router.get("/admin/dashboard")
-async def get_admin_dashboard(
-    db: Session = Depends(get_db),
-    _: User = Depends(get_current_admin),
+@router.get("/document-usage")
+async def get_document_usage(
+    days: int = Query(default=30, ge=1, le=365),
+    document_id: str = Query(default=None),
+    limit: int = Query(default=50, ge=1, le=500),
+    db: AsyncSession = Depends(get_async_db),
+    _: Principal = Depends(get_current_admin),
     org_id: str = Depends(get_current_org_id)
 ):
-    """統合ダッシュボード"""
+    """ドキュメント別の引用状況（chat_references の集計）"""
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    items = await db.run_sync(
+        lambda session: chat_references.document_usage(session, org_id, since, document_id=document_id, limit=limit)
+    )
+    return {"days": days, "items": items}
+
+
+def _build_dashboard(db: Session, org_id: str) -> dict:
     now = datetime.now(timezone.utc)
 
+    # チャットの集計はロールアップ（app/services/analytics.py）から取得。境界は時/日単位
     # ── 週次比較（今週 vs 先週）──
     this_week_start = now - timedelta(days=7)
     last_week_start = now - timedelta(days=14)
 
-    this_week = _period_stats(db, org_id, this_week_start)
-
-    # アクティブユーザー数（今週 vs 先週）
-    tw_active_users = db.query(func.count(func.distinct(ChatHistory.user_id))).filter(
-        ChatHistory.organization_id == org_id,
-        ChatHistory.created_at >= this_week_start,
-    ).scalar() or 0
+    this_week = analytics.period_totals(db, org_id, this_week_start)
+    last_week = analytics.period_totals(db, org_id, last_week_start, this_week_start)
 
-    lw_active_users = db.query(func.count(func.distinct(ChatHistory.user_id))).filter(
-        ChatHistory.organization_id == org_id,
-        ChatHistory.created_at >= last_week_start,
-        ChatHistory.created_at < this_week_start,
-    ).scalar() or 0
-
-    last_week = _period_stats(db, org_id, last_week_start, this_week_start)
+    # アクティブユーザー数（今日を含む直近7日 vs その前の7日）
+    today = now.date()
+    tw_active_users = analytics.active_users(db, org_id, today - timedelta(days=6), today)
+    lw_active_users = analytics.active_users(db, org_id, today - timedelta(days=13), today - timedelta(days=7))
 
     def _rate(numerator: int, denominator: int) -> float:
         return round(numerator / denominator * 100, 1) if denominator > 0 else 0
@@ -180,73 +208,21 @@ async def get_admin_dashboard(
         },
     }
 
-    # ── KPI: 14日分の日別データ（スパークライン用）──
-    sparkline_since = now - timedelta(days=14)
-    date_col = func.date(ChatHistory.created_at)
-    daily_rows = db.query(
-        date_col.label("date"),
-        func.count(ChatHistory.id).label("total"),
-        func.sum(case((ChatHistory.feedback == "good", 1), else_=0)).label("good"),
-        func.sum(case((ChatHistory.feedback == "bad", 1), else_=0)).label("bad"),
-        func.sum(case((ChatHistory.is_no_answer == "1", 1), else_=0)).label("no_answer"),
-    ).filter(
-        ChatHistory.created_at >= sparkline_since,
-        ChatHistory.organization_id == org_id
-    ).group_by(date_col).order_by(date_col).all()
-
-    sparkline_data = [
-        {
-            "date": str(row.date),
-            "total": row.total,
-            "good": int(row.good or 0),
-            "bad": int(row.bad or 0),
-            "noAnswer": int(row.no_answer or 0),
-        }
-        for row in daily_rows
-    ]
-
-    # ── ヒートマップ（曜日×時間帯、直近30日）──
+    # ── KPI: 14日分の日別データ（スパークライン用）/ ヒートマップ（曜日×時間帯、直近30日）──
     heatmap_since = now - timedelta(days=30)
-    heatmap_rows = db.query(
-        extract("dow", ChatHistory.created_at).label("dow"),
-        extract("hour", ChatHistory.created_at).label("hour"),
-        func.count(ChatHistory.id).label("cnt"),
-    ).filter(
-        ChatHistory.created_at >= heatmap_since,
-        ChatHistory.organization_id == org_id
-    ).group_by("dow", "hour").all()
-
-    heatmap = [[0] * 24 for _ in range(7)]
-    for row in heatmap_rows:
-        dow = int(row.dow)  # 0=Sun, 1=Mon, ...
-        hour = int(row.hour)
-        heatmap[dow][hour] = row.cnt
+    hourly = analytics.hourly_rows(db, org_id, heatmap_since)
+    sparkline_data = analytics.daily_series(hourly, since=now - timedelta(days=14))
+    heatmap = analytics.weekday_hour_heatmap(hourly)
 
     # ── TOP5引用ドキュメント（直近30日）──
-    ref_rows = db.query(ChatHistory.referenced_doc_ids).filter(
-        ChatHistory.created_at >= heatmap_since,
-        ChatHistory.organization_id == org_id,
-        ChatHistory.referenced_doc_ids.isnot(None),
-    ).all()
-
-    doc_counter: Counter = Counter()
-    for row in ref_rows:
-        try:
-            ids = json.loads(row.referenced_doc_ids)
-            for doc_id in ids:
-                if doc_id:
-                    doc_counter[doc_id] += 1
-        except (json.JSONDecodeError, TypeError):
-            pass
-
-    top_doc_ids = [doc_id for doc_id, _ in doc_counter.most_common(5)]
+    top_counts = analytics.top_documents(db, org_id, heatmap_since.date(), limit=5)
     top_docs = []
-    if top_doc_ids:
+    if top_counts:
         docs = db.query(Document.id, Document.filename).filter(
-            Document.id.in_(top_doc_ids)
+            Document.id.in_([doc_id for doc_id, _ in top_counts])
         ).all()
         doc_name_map = {d.id: d.filename for d in docs}
-        for doc_id, count in doc_counter.most_common(5):
+        for doc_id, count in top_counts:
             top_docs.append({
                 "id": doc_id,
                 "filename": doc_name_map.get(doc_id, "不明"),
@@ -296,23 +272,20 @@ async def get_admin_dashboard(
     if public_count > 0:
         coverage_list.insert(0, {"departmentName": "全社公開", "documentCount": public_count})
 
-    # 最近のドキュメント（5件）- チャンク数はサブクエリで取得（N+1回避）
-    recent_chunk_sq = (
-        db.query(
-            DocumentChunk.document_id,
-            func.count(DocumentChunk.id).label("chunk_count"),
-        )
-        .group_by(DocumentChunk.document_id)
-        .subquery()
-    )
-    recent_rows = (
-        db.query(Document, recent_chunk_sq.c.chunk_count)
-        .outerjoin(recent_chunk_sq, Document.id == recent_chunk_sq.c.document_id)
+    # 最近のドキュメント（5件）- チャンク数は対象5件だけまとめて集計（N+1回避）
+    recent_docs = (
+        db.query(Document)
         .filter(Document.organization_id == org_id)
         .order_by(Document.created_at.desc())
         .limit(5)
         .all()
     )
+    recent_chunk_counts = dict(
+        db.query(DocumentChunk.document_id, func.count(DocumentChunk.id))
+        .filter(DocumentChunk.document_id.in_([doc.id for doc in recent_docs]))
+        .group_by(DocumentChunk.document_id)
+        .all()
+    ) if recent_docs else {}
 
     return {
         "weeklyComparison": weekly_comparison,
@@ -335,8 +308,19 @@ async def get_admin_dashboard(
                 "filename": doc.filename,
                 "source": "box" if doc.box_file_id else "manual",
                 "createdAt": doc.created_at.isoformat() if doc.created_at else None,
-                "chunkCount": chunk_count or 0,
+                "chunkCount": recent_chunk_counts.get(doc.id, 0),
             }
-            for doc, chunk_count in recent_rows
+            for doc in recent_docs
         ],
     }
+
+
+@router.get("/admin/dashboard")
+async def get_admin_dashboard(
+    db: AsyncSession = Depends(get_async_db),
+    _: Principal = Depends(get_current_admin),
+    org_id: str = Depends(get_current_org_id)
+):
+    """統合ダッシュボード"""
+    # 集計クエリ群は同期Query APIのまま、asyncpg接続上で実行（イベントループはブロックしない）
+    return await db.run_sync(_build_dashboard, org_id)
@@ -7,9 +7,9 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
-from app.models.document import User
 from app.models.organization import Organization
-from app.services.auth import decode_token, get_user_by_id
+from app.services.auth import decode_token
+from app.services.principal_cache import Principal, principal_cache
 
 
 security = HTTPBearer(auto_error=False)
@@ -18,7 +18,7 @@ security = HTTPBearer(auto_error=False)
 async def get_current_user_optional(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
     db: Session = Depends(get_db)
-) -> Optional[User]:
+) -> Optional[Principal]:
     """現在のユーザーを取得（オプション）"""
     if not credentials:
         return None
@@ -31,7 +31,7 @@ async def get_current_user_optional(
     if not user_id:
         return None
 
-    user = get_user_by_id(db, user_id)
+    user = principal_cache.resolve(db, user_id)
     if not user or not user.is_active:
         return None
 
@@ -41,8 +41,8 @@ async def get_current_user_optional(
 async def get_current_user(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
     db: Session = Depends(get_db)
-) -> User:
-    """現在のユーザーを取得（必須）"""
+) -> Principal:
+    """現在のユーザーを取得（必須。ユーザー属性は principal_cache から取得）"""
     if not credentials:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -66,7 +66,7 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    user = get_user_by_id(db, user_id)
+    user = principal_cache.resolve(db, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -84,8 +84,8 @@ async def get_current_user(
 
 
 async def get_current_admin(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: Principal = Depends(get_current_user)
+) -> Principal:
     """管理者権限を確認"""
     if current_user.role != "admin":
         raise HTTPException(
@@ -95,13 +95,13 @@ async def get_current_admin(
     return current_user
 
 
-def get_current_org_id(current_user: User = Depends(get_current_user)) -> str:
+def get_current_org_id(current_user: Principal = Depends(get_current_user)) -> str:
     """現在のユーザーのorganization_idを取得"""
     return current_user.organization_id
 
 
 def get_current_org_id_optional(
-    current_user: Optional[User] = Depends(get_current_user_optional),
+    current_user: Optional[Principal] = Depends(get_current_user_optional),
 ) -> Optional[str]:
     """現在のユーザーのorganization_idを取得（オプション）"""
     if current_user:
@@ -109,7 +109,7 @@ def get_current_org_id_optional(
     return None
 
 
-def check_trial_status(org: Organization) -> None:
+def check_trial_status(org: Organization | Principal) -> None:
     """トライアルの期限チェック。期限切れの場合は403を返す"""
     if org.plan == "trial" and org.trial_ends_at:
         if datetime.now(timezone.utc) > org.trial_ends_at:
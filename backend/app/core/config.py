@@ -22,9 +22,82 @@ class Settings(BaseSettings):
     chunk_size: int = 512
     chunk_overlap: int = 77
     retrieval_top_k: int = 5
+    retrieval_mode: str = "vector"  # vector / hybrid（ベクトル + 全文一致のRRF融合。計測後に切り替える）
+    retrieval_candidate_pool: int = 40  # hybrid: 各ランキングから取る候補数
+    retrieval_rrf_k: int = 60
+    retrieval_overfetch_factor: int = 4  # ANN候補をtop_kの何倍取得して再ランクするか
+    hnsw_ef_search: int = 40
+    hnsw_iterative_scan: str = "relaxed_order"  # off / relaxed_order / strict_order（pgvector>=0.8）
+    vector_index_per_tenant: bool = True  # 組織ごとの部分HNSWインデックス（scripts/migrate_tenant_vector_indexes.py）
+    agentic_tool_workers: int = 16  # AgenticRAGのツール並列実行スレッド数（プロセス全体）
+
+    # Embedding Cache（クエリ埋め込みのキャッシュ）
+    embedding_cache_enabled: bool = True
+    embedding_cache_max_entries: int = 2048
+    embedding_cache_ttl_seconds: int = 24 * 3600
+    embedding_cache_persistent: bool = False  # Postgres永続キャッシュ（embedding_cacheテーブル）
+    embedding_cache_persistent_ttl_days: int = 30
+
+    # Embedding Pipeline（取り込み時のチャンク一括埋め込み）
+    embedding_batch_max_tokens: int = 100_000  # 1リクエストの合計トークン（APIの上限は300k）
+    embedding_batch_max_items: int = 512  # 1リクエストのテキスト数（APIの上限は2048）
+    embedding_concurrency: int = 4  # 1文書あたりの同時リクエスト数
+    embedding_max_retries: int = 4
+
+    # Answer Cache（/api/chat の意味的回答キャッシュ）
+    answer_cache_enabled: bool = True
+    answer_cache_similarity_threshold: float = 0.95
+    answer_cache_ttl_hours: int = 24
+
+    # Page Extraction Cache（PDFページのVision抽出結果。page_extraction_cacheテーブル）
+    page_extraction_cache_enabled: bool = True
+    pdf_render_workers: int = 4  # PDFページ分類・画像化のプロセス数（0でリクエストスレッド内で逐次処理）
+
+    # Ingestion（アップロードの取り込みジョブキュー）
+    ingestion_workers: int = 2  # プロセスあたりのワーカースレッド数（0でこのプロセスでは処理しない）
+    ingestion_poll_interval_seconds: float = 2.0
+    ingestion_heartbeat_timeout_seconds: int = 300  # これを超えて更新のない running ジョブは再キュー
+    ingestion_max_attempts: int = 3  # 一時的なエラー（API障害・タイムアウト等）と中断を合わせた試行回数
+    ingestion_retry_backoff_seconds: float = 60.0  # 再試行までの待ち（試行ごとに倍、最大30分）
+    ingestion_events_interval_seconds: float = 1.0  # SSE進捗の確認間隔
+
+    # SFTP connection pool（接続先ごとにSSH接続を再利用）
+    sftp_pool_max_per_host: int = 4
+    sftp_pool_idle_seconds: int = 300
+    sftp_pool_max_lifetime_seconds: int = 3600
+    sftp_pool_checkout_timeout_seconds: float = 10.0  # 空き接続を待つ上限（超えたら503。0で無制限）
+
+    # SFTP poll scheduler（変更検知。組織ごとの間隔は system_settings.box_poll_interval_minutes で上書き）
+    sftp_poll_workers: int = 4  # 同時にポーリングする組織数（0でこのプロセスでは実行しない）
+    sftp_poll_interval_seconds: int = 30 * 60
+    sftp_poll_jitter: float = 0.1  # 間隔に加える揺らぎの割合（±）
+
+    # SFTP auto-resync（outdated の自動再取り込み。組織ごとの有効化・時間帯・同時実行数は system_settings）
+    sftp_sync_concurrency_per_org: int = 1  # 組織ごとに同時に実行する同期ジョブ数
+    sftp_resync_batch_size: int = 100  # 1回のポーリングで登録する再同期ジョブの上限
+    sftp_resync_timezone: str = "Asia/Tokyo"  # box_resync_window の時刻の基準
+
+    # Analytics rollup（ダッシュボード集計。チャット登録時に加算し、定期的に直近の日を再計算）
+    analytics_compact_interval_seconds: int = 60 * 60  # 0でこのプロセスでは実行しない
+    analytics_compact_lookback_days: int = 2
+
+    # LLM Governor（プロセス内の全Anthropic呼び出しのバジェットと再試行）
+    llm_requests_per_minute: int = 0  # 0で無制限（契約ティアの上限を設定する）
+    llm_tokens_per_minute: int = 0  # 0で無制限。入力+想定出力で見積もり、実績で補正
+    llm_model_limits: dict[str, dict[str, int]] = {}  # モデル別上書き 例: {"claude-sonnet-4-20250514": {"rpm": 1000, "tpm": 400000}}
+    llm_max_concurrency: int = 8
+    llm_interactive_reserved_slots: int = 2  # チャット専用に残す同時実行枠（取り込み・管理は残りまで）
+    llm_max_retries: int = 4
+    llm_backoff_base_seconds: float = 1.0
+    llm_backoff_max_seconds: float = 30.0
 
     # Auth
     admin_password: str
+    principal_cache_ttl_seconds: float = 30.0  # 認証ユーザーのキャッシュ（0で無効。他プロセスの変更はこの時間で反映）
+    principal_cache_max_entries: int = 10_000
+    password_hash_workers: int = 4  # bcrypt専用スレッド数（1回約250msのCPU。イベントループから切り離す）
+    password_hash_max_queue: int = 64  # 実行待ちの上限（超えたログイン等は503。64件 ≒ 4スレッドで約4秒待ち）
+    login_rate_limit: str = "100/minute"  # /api/auth/login のIPあたり上限（負荷試験では引き上げる）
     jwt_secret_key: str = secrets.token_hex(32)
 
     # BOX API
@@ -40,6 +113,8 @@ class Settings(BaseSettings):
     db_max_overflow: int = 30
     db_pool_recycle: int = 300
     db_pool_timeout: int = 30
+    db_async_pool_size: int = 10  # asyncpgエンジン（チャット・一覧・統計）
+    db_async_max_overflow: int = 20
 
     # Frontend
     frontend_origin: str = "http://localhost:3300"
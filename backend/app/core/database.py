@@ -1,4 +1,7 @@
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from pgvector.sqlalchemy import Vector
 
@@ -25,3 +28,48 @@ def get_db():
         raise
     finally:
         db.close()
+
+
+def _async_database_url(url: str) -> tuple[str, dict]:
+    """psycopg2用URLをasyncpg用に変換（sslmodeはasyncpgのssl引数へ移す）"""
+    parts = urlsplit(url)
+    scheme = parts.scheme.split("+")[0]
+    if scheme == "postgres":
+        scheme = "postgresql"
+    query = dict(parse_qsl(parts.query))
+    connect_args = {}
+    sslmode = query.pop("sslmode", None)
+    if sslmode and sslmode != "disable":
+        connect_args["ssl"] = sslmode
+    return urlunsplit((f"{scheme}+asyncpg", parts.netloc, parts.path, urlencode(query), parts.fragment)), connect_args
+
+
+# 非同期エンジン（asyncpg）: イベントループをブロックしないホットパス用
+# vector型はテキスト形式でやり取りされるため、既存SQLと同じく '[...]' 文字列で渡す。
+# asyncpgはプリペアドステートメントを使うため、汎用プランで部分インデックス
+# （テナント別HNSW）の述語照合が外れないよう custom plan を強制する。
+_async_url, _async_connect_args = _async_database_url(settings.database_url)
+async_engine = create_async_engine(
+    _async_url,
+    pool_size=settings.db_async_pool_size,
+    max_overflow=settings.db_async_max_overflow,
+    pool_recycle=settings.db_pool_recycle,
+    pool_timeout=settings.db_pool_timeout,
+    pool_pre_ping=True,
+    connect_args={
+        **_async_connect_args,
+        "server_settings": {"plan_cache_mode": "force_custom_plan"},
+    },
+)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except Exception:
+            await db.rollback()
+            raise
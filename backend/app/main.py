@@ -1,4 +1,3 @@
-import asyncio
 import logging
 import time
 from contextlib import asynccontextmanager
@@ -18,38 +17,98 @@ limiter = Limiter(key_func=get_remote_address)
 
 # Request metrics (in-memory counters)
 _request_metrics = {"total": 0, "errors_5xx": 0, "errors_4xx": 0, "latency_sum": 0.0}
-from app.core.database import engine, Base
+from app.core.database import engine, async_engine, Base
 from app.api import chat, documents, stats, auth, admin, admin_chat
-from app.services.sftp_poller import polling_loop
+from app.services.analytics import analytics_compactor
+from app.services.ingestion import ingestion_workers
+from app.services.password_hasher import PasswordHasherBusy, password_hasher
+from app.services.pdf_render import shutdown_render_pool
+from app.services.poll_scheduler import poll_scheduler
+from app.services.sftp_pool import sftp_pool
+from app.services.vector_index import GLOBAL_INDEX_NAME, HNSW_WITH
 import app.models.organization  # noqa: F401
 import app.models.document  # noqa: F401
 import app.models.graph  # noqa: F401
+import app.models.cache  # noqa: F401
+import app.models.ingestion  # noqa: F401
+import app.models.analytics  # noqa: F401
 
 logger = logging.getLogger(__name__)
 
 # Create tables
 Base.metadata.create_all(bind=engine)
 
+# Add columns introduced after initial deploy (create_all does not alter existing tables)
+_ADDED_COLUMNS = [
+    ("documents", "content_hash", "VARCHAR(64)"),
+    ("document_chunks", "content_hash", "VARCHAR(64)"),
+    ("documents", "source_mtime", "TIMESTAMPTZ"),
+    ("documents", "source_size", "BIGINT"),
+    ("system_settings", "box_poll_interval_minutes", "INTEGER"),
+    ("system_settings", "box_last_polled_at", "TIMESTAMPTZ"),
+    ("system_settings", "box_last_poll_seconds", "DOUBLE PRECISION"),
+    ("system_settings", "box_last_poll_status", "VARCHAR(20)"),
+    ("system_settings", "box_last_poll_detail", "TEXT"),
+    ("system_settings", "box_auto_resync", "BOOLEAN DEFAULT FALSE"),
+    ("system_settings", "box_resync_window", "VARCHAR(11) DEFAULT ''"),
+    ("system_settings", "box_resync_concurrency", "INTEGER"),
+    ("ingestion_jobs", "priority", "INTEGER NOT NULL DEFAULT 0"),
+    ("ingestion_jobs", "run_after", "TIMESTAMPTZ"),
+]
+# chat_history のインデックスは書き込みを止めないよう scripts/migrate_chat_history_indexes.py で
+# CREATE INDEX CONCURRENTLY により作成する（新規DBは create_all で作成される）
+try:
+    from sqlalchemy import text as sa_text
+    with engine.connect() as conn:
+        for table, column, column_type in _ADDED_COLUMNS:
+            conn.execute(sa_text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {column_type}"))
+        conn.commit()
+except Exception as e:
+    logger.warning("Could not add columns: %s", e)
+
 # Create HNSW index on embedding column for fast vector search
+# 組織ごとの部分インデックスは起動時には作らない（scripts/migrate_tenant_vector_indexes.py と
+# サインアップ時の CONCURRENTLY 作成のみ）。共有インデックスは組織条件のない検索と未作成組織のために残す
 try:
     from sqlalchemy import text as sa_text
     with engine.connect() as conn:
         conn.execute(sa_text(
-            "CREATE INDEX IF NOT EXISTS ix_chunks_embedding_hnsw "
-            "ON document_chunks USING hnsw (embedding vector_cosine_ops) "
-            "WITH (m = 16, ef_construction = 64)"
+            f"CREATE INDEX IF NOT EXISTS {GLOBAL_INDEX_NAME} "
+            f"ON document_chunks USING hnsw (embedding vector_cosine_ops) {HNSW_WITH}"
         ))
         conn.commit()
     logger.info("pgvector HNSW index ensured on document_chunks.embedding")
 except Exception as e:
     logger.warning("Could not create HNSW index: %s", e)
 
+# Trigram GIN index on chunk content for hybrid (lexical) retrieval.
+# 日本語のトライグラム抽出にはDBのLC_CTYPEがUTF-8ロケールである必要がある（Cロケール不可）
+try:
+    with engine.connect() as conn:
+        conn.execute(sa_text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        conn.execute(sa_text(
+            "CREATE INDEX IF NOT EXISTS ix_chunks_content_trgm "
+            "ON document_chunks USING gin (content gin_trgm_ops)"
+        ))
+        conn.commit()
+    logger.info("pg_trgm GIN index ensured on document_chunks.content")
+except Exception as e:
+    logger.warning("Could not create trigram index: %s", e)
+
 
 @asynccontextmanager
 async def lifespan(application: FastAPI):
-    task = asyncio.create_task(polling_loop())
+    poll_scheduler.start()
+    ingestion_workers.start(settings.ingestion_workers)
+    analytics_compactor.start(settings.analytics_compact_interval_seconds)
     yield
-    task.cancel()
+    analytics_compactor.stop()
+    poll_scheduler.stop()
+    ingestion_workers.stop()
+    shutdown_render_pool()
+    password_hasher.shutdown()
+    sftp_pool.close_all()
+    await async_engine.dispose()
 
 
 app = FastAPI(
@@ -67,6 +126,17 @@ async def rate_limit_handler(request: Request, exc: RateLimitExceeded):
     return JSONResponse(status_code=429, content={"detail": "リクエスト回数の制限を超えました。しばらく待ってから再度お試しください。"})
 
 
+# パスワードハッシュの待ち行列が満杯（ログイン集中時）
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    logger.warning("Password hashing queue full: %s %s", request.method, request.url.path)
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "ログインが混み合っています。しばらく待ってから再度お試しください。"},
+        headers={"Retry-After": "1"},
+    )
+
+
 # Global exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -138,6 +208,12 @@ async def metrics():
     from sqlalchemy import func as sa_func
     from app.core.database import SessionLocal
     from app.models.document import Document, DocumentChunk, ChatHistory, User
+    from app.services.answer_cache import answer_cache
+    from app.services.principal_cache import principal_cache
+    from app.services.embedding_cache import embedding_cache
+    from app.services.extraction_cache import page_extraction_cache
+    from app.services.llm_governor import llm_governor
+    from app.services.pdf_render import render_stats
 
     db = SessionLocal()
     try:
@@ -153,6 +229,15 @@ async def metrics():
         ).scalar() or 0
 
         pool = engine.pool
+        emb_cache = embedding_cache.stats()
+        ans_cache = answer_cache.stats()
+        principals = principal_cache.stats()
+        page_cache = page_extraction_cache.stats()
+        render = render_stats()
+        llm = llm_governor.stats()
+        hasher = password_hasher.stats()
+        sftp = sftp_pool.stats()
+        polls = poll_scheduler.stats()
         avg_latency = _request_metrics["latency_sum"] / _request_metrics["total"] if _request_metrics["total"] > 0 else 0
         lines = [
             "# HELP faq_documents_total Total number of documents",
@@ -187,7 +272,106 @@ async def metrics():
             "# HELP faq_http_latency_avg_seconds Average request latency",
             "# TYPE faq_http_latency_avg_seconds gauge",
             f"faq_http_latency_avg_seconds {avg_latency:.4f}",
+            "# HELP faq_embedding_cache_requests_total Query embedding cache lookups by result",
+            "# TYPE faq_embedding_cache_requests_total counter",
+            f'faq_embedding_cache_requests_total{{result="memory_hit"}} {emb_cache["memory_hits"]}',
+            f'faq_embedding_cache_requests_total{{result="persistent_hit"}} {emb_cache["persistent_hits"]}',
+            f'faq_embedding_cache_requests_total{{result="miss"}} {emb_cache["misses"]}',
+            "# HELP faq_embedding_cache_errors_total Persistent embedding cache errors",
+            "# TYPE faq_embedding_cache_errors_total counter",
+            f"faq_embedding_cache_errors_total {emb_cache['errors']}",
+            "# HELP faq_embedding_cache_entries In-process embedding cache entries",
+            "# TYPE faq_embedding_cache_entries gauge",
+            f"faq_embedding_cache_entries {emb_cache['memory_entries']}",
+            "# HELP faq_answer_cache_requests_total Chat answer cache lookups by result",
+            "# TYPE faq_answer_cache_requests_total counter",
+            f'faq_answer_cache_requests_total{{result="hit"}} {ans_cache["hits"]}',
+            f'faq_answer_cache_requests_total{{result="miss"}} {ans_cache["misses"]}',
+            "# HELP faq_answer_cache_invalidated_total Answer cache entries invalidated by document changes",
+            "# TYPE faq_answer_cache_invalidated_total counter",
+            f"faq_answer_cache_invalidated_total {ans_cache['invalidated']}",
+            "# HELP faq_principal_cache_requests_total Authenticated user lookups by cache result",
+            "# TYPE faq_principal_cache_requests_total counter",
+            f'faq_principal_cache_requests_total{{result="hit"}} {principals["hits"]}',
+            f'faq_principal_cache_requests_total{{result="miss"}} {principals["misses"]}',
+            "# HELP faq_principal_cache_entries Cached authenticated users in this process",
+            "# TYPE faq_principal_cache_entries gauge",
+            f"faq_principal_cache_entries {principals['size']}",
+            "# HELP faq_page_extraction_cache_requests_total PDF page Vision extraction cache lookups by result",
+            "# TYPE faq_page_extraction_cache_requests_total counter",
+            f'faq_page_extraction_cache_requests_total{{result="hit"}} {page_cache["hits"]}',
+            f'faq_page_extraction_cache_requests_total{{result="miss"}} {page_cache["misses"]}',
+            "# HELP faq_page_extraction_cache_errors_total Page extraction cache errors",
+            "# TYPE faq_page_extraction_cache_errors_total counter",
+            f"faq_page_extraction_cache_errors_total {page_cache['errors']}",
+            "# HELP faq_pdf_render_pages_total PDF pages classified/rendered for ingestion",
+            "# TYPE faq_pdf_render_pages_total counter",
+            f'faq_pdf_render_pages_total{{kind="text"}} {render["text_pages"]}',
+            f'faq_pdf_render_pages_total{{kind="vision"}} {render["vision_pages"]}',
+            "# HELP faq_pdf_render_encodes_total Page image encodes (including size probes)",
+            "# TYPE faq_pdf_render_encodes_total counter",
+            f"faq_pdf_render_encodes_total {render['encodes']}",
+            "# HELP faq_pdf_render_cpu_seconds_total CPU time spent classifying and rendering PDF pages",
+            "# TYPE faq_pdf_render_cpu_seconds_total counter",
+            f"faq_pdf_render_cpu_seconds_total {render['seconds']:.3f}",
+            "# HELP faq_llm_in_flight Anthropic calls currently holding a governor slot",
+            "# TYPE faq_llm_in_flight gauge",
+            f"faq_llm_in_flight {llm['in_flight']}",
+            "# HELP faq_llm_queued Anthropic calls waiting for a governor slot",
+            "# TYPE faq_llm_queued gauge",
+            f"faq_llm_queued {llm['queued']}",
+            "# HELP faq_password_hash_in_flight Password hash/verify operations running in the bcrypt pool",
+            "# TYPE faq_password_hash_in_flight gauge",
+            f"faq_password_hash_in_flight {hasher['in_flight']}",
+            "# HELP faq_password_hash_queued Password hash/verify operations waiting for a bcrypt thread",
+            "# TYPE faq_password_hash_queued gauge",
+            f"faq_password_hash_queued {hasher['queued']}",
+            "# HELP faq_password_hash_total Password hash/verify operations by result",
+            "# TYPE faq_password_hash_total counter",
+            f'faq_password_hash_total{{result="completed"}} {hasher["completed"]}',
+            f'faq_password_hash_total{{result="rejected"}} {hasher["rejected"]}',
+            "# HELP faq_password_hash_seconds_total Time spent hashing/verifying passwords",
+            "# TYPE faq_password_hash_seconds_total counter",
+            f"faq_password_hash_seconds_total {hasher['seconds']:.3f}",
+            "# HELP faq_password_hash_wait_seconds_total Time password operations spent queued",
+            "# TYPE faq_password_hash_wait_seconds_total counter",
+            f"faq_password_hash_wait_seconds_total {hasher['wait_seconds']:.3f}",
+            "# HELP faq_password_hash_max_wait_seconds Longest queue wait since startup",
+            "# TYPE faq_password_hash_max_wait_seconds gauge",
+            f"faq_password_hash_max_wait_seconds {hasher['max_wait_seconds']:.3f}",
+            "# HELP faq_sftp_connections_opened_total SSH connections opened by the SFTP pool",
+            "# TYPE faq_sftp_connections_opened_total counter",
+            f"faq_sftp_connections_opened_total {sftp['opened']}",
+            "# HELP faq_sftp_sessions_reused_total SFTP operations served by a pooled connection",
+            "# TYPE faq_sftp_sessions_reused_total counter",
+            f"faq_sftp_sessions_reused_total {sftp['reused']}",
+            "# HELP faq_sftp_pool_connections Pooled SFTP connections by state",
+            "# TYPE faq_sftp_pool_connections gauge",
+            f'faq_sftp_pool_connections{{state="idle"}} {sftp["idle"]}',
+            f'faq_sftp_pool_connections{{state="in_use"}} {sftp["in_use"]}',
+            "# HELP faq_sftp_polls_total Scheduled and manual SFTP change polls by outcome",
+            "# TYPE faq_sftp_polls_total counter",
+            f'faq_sftp_polls_total{{outcome="ok"}} {polls["runs"] - polls["failures"] - polls["partial"]}',
+            f'faq_sftp_polls_total{{outcome="partial"}} {polls["partial"]}',
+            f'faq_sftp_polls_total{{outcome="error"}} {polls["failures"]}',
+            f'faq_sftp_polls_total{{outcome="skipped"}} {polls["skipped"]}',
+            "# HELP faq_sftp_poll_orgs Organizations in the poll schedule by state",
+            "# TYPE faq_sftp_poll_orgs gauge",
+            f'faq_sftp_poll_orgs{{state="scheduled"}} {polls["scheduled"]}',
+            f'faq_sftp_poll_orgs{{state="running"}} {polls["running"]}',
+            f'faq_sftp_poll_orgs{{state="overdue"}} {polls["overdue"]}',
+        ]
+        llm_class_metrics = [
+            ("faq_llm_queue_wait_seconds_sum", "Time spent waiting for a governor slot by priority class",
+             "counter", "wait_seconds"),
+            ("faq_llm_queue_wait_seconds_count", "Governor slots granted by priority class", "counter", "requests"),
+            ("faq_llm_queue_wait_seconds_max", "Longest governor wait by priority class", "gauge", "max_wait_seconds"),
+            ("faq_llm_retries_total", "Anthropic call retries by priority class", "counter", "retries"),
+            ("faq_llm_rate_limited_total", "Anthropic 429 responses by priority class", "counter", "rate_limited"),
         ]
+        for name, help_text, metric_type, key in llm_class_metrics:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+            lines += [f'{name}{{class="{cls}"}} {values[key]}' for cls, values in llm["classes"].items()]
         return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4; charset=utf-8")
     finally:
         db.close()
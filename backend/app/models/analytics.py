@@ -0,0 +1,35 @@
+from sqlalchemy import Column, String, Date, DateTime, Integer, ForeignKey
+
+from app.core.database import Base
+
+
+class ChatStatsHourly(Base):
+    """チャット集計（組織×UTCの1時間単位）。チャット登録・評価時に加算し、定期コンパクションで再計算"""
+    __tablename__ = "chat_stats_hourly"
+
+    organization_id = Column(String(36), ForeignKey("organizations.id", ondelete="CASCADE"), primary_key=True)
+    bucket = Column(DateTime(timezone=True), primary_key=True)  # 時単位に切り捨てた時刻（UTC）
+    questions = Column(Integer, nullable=False, default=0)
+    good = Column(Integer, nullable=False, default=0)
+    bad = Column(Integer, nullable=False, default=0)
+    no_answer = Column(Integer, nullable=False, default=0)
+    referenced = Column(Integer, nullable=False, default=0)  # 参照ドキュメント数の合計
+
+
+class ChatUserDaily(Base):
+    """日別の質問ユーザー（アクティブユーザー数の集計用。ユーザー数×日数で履歴件数に依存しない）"""
+    __tablename__ = "chat_user_daily"
+
+    organization_id = Column(String(36), ForeignKey("organizations.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)  # UTC
+    user_id = Column(String(36), primary_key=True)
+
+
+class ChatDocumentDaily(Base):
+    """日別の参照ドキュメント回数（document_id は削除済みドキュメントも残すためFKは張らない）"""
+    __tablename__ = "chat_document_daily"
+
+    organization_id = Column(String(36), ForeignKey("organizations.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)  # UTC
+    document_id = Column(String(36), primary_key=True)
+    reference_count = Column(Integer, nullable=False, default=0)
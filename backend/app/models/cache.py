@@ -0,0 +1,61 @@
+import uuid
+
+from sqlalchemy import Column, String, Text, DateTime, Float, Integer, ForeignKey, Table, Index
+from pgvector.sqlalchemy import Vector
+
+from app.core.database import Base
+from app.models.document import utc_now
+
+
+class EmbeddingCacheEntry(Base):
+    """クエリ埋め込みの永続キャッシュ（モデル名 + 正規化テキストのハッシュがキー）"""
+    __tablename__ = "embedding_cache"
+
+    cache_key = Column(String(64), primary_key=True)  # sha256 hex
+    model = Column(String(100), nullable=False)
+    embedding = Column(Vector(1536), nullable=False)
+    created_at = Column(DateTime(timezone=True), default=utc_now, index=True)
+
+
+# 中間テーブル: 回答キャッシュと参照ドキュメント（ドキュメント更新時の無効化用）
+# document_id はLLMの出典登録に由来するためFKは張らない
+answer_cache_documents = Table(
+    "answer_cache_documents",
+    Base.metadata,
+    Column("cache_id", String(36), ForeignKey("answer_cache.id", ondelete="CASCADE"), primary_key=True),
+    Column("document_id", String(36), primary_key=True, index=True),
+)
+
+
+class AnswerCacheEntry(Base):
+    """/api/chat の最終回答キャッシュ（質問埋め込み + テナント + 閲覧スコープ単位）"""
+    __tablename__ = "answer_cache"
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    organization_id = Column(String(36), ForeignKey("organizations.id"), nullable=False)
+    scope = Column(String(60), nullable=False)  # admin / dept:<department_id> / all（部門なしの一般ユーザー）
+    question = Column(Text, nullable=False)
+    question_embedding = Column(Vector(1536), nullable=False)
+    answer = Column(Text, nullable=False)
+    reference_items = Column(Text)  # JSON: doneイベントのreferences
+    followups = Column(Text)  # JSON: doneイベントのfollowups
+    avg_similarity = Column(Float, default=0.0)
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime(timezone=True), default=utc_now)
+    last_hit_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_answer_cache_org_scope", "organization_id", "scope", "created_at"),
+    )
+
+
+class PageExtractionCacheEntry(Base):
+    """PDFページのVision抽出結果（送信画像のハッシュ + プロンプト版がキー）"""
+    __tablename__ = "page_extraction_cache"
+
+    cache_key = Column(String(64), primary_key=True)  # sha256 hex
+    prompt_version = Column(String(32), nullable=False)
+    markdown = Column(Text, nullable=False)
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime(timezone=True), default=utc_now)
+    last_hit_at = Column(DateTime(timezone=True), nullable=True)
@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime, timezone
 
-from sqlalchemy import Column, String, Text, DateTime, Integer, ForeignKey, Boolean, Table, Index
+from sqlalchemy import BigInteger, Column, String, Text, DateTime, Float, Integer, ForeignKey, Boolean, Table, Index, text
 from sqlalchemy.orm import relationship
 from pgvector.sqlalchemy import Vector
 
@@ -89,6 +89,14 @@ class SystemSettings(Base):
     box_private_key_passphrase = Column(String(200), default="")
     box_watched_folder_id = Column(String(50), default="")
     box_poll_enabled = Column(Boolean, default=False)
+    box_poll_interval_minutes = Column(Integer, nullable=True)  # 未設定ならサーバー既定
+    box_last_polled_at = Column(DateTime(timezone=True), nullable=True)  # 直近のポーリング開始日時
+    box_last_poll_seconds = Column(Float, nullable=True)
+    box_last_poll_status = Column(String(20), nullable=True)  # ok / partial / error
+    box_last_poll_detail = Column(Text, nullable=True)  # 結果件数（JSON）またはエラー内容
+    box_auto_resync = Column(Boolean, default=False)  # outdated を自動で再取り込み
+    box_resync_window = Column(String(11), default="")  # 自動再同期の時間帯 "HH:MM-HH:MM"（空なら終日）
+    box_resync_concurrency = Column(Integer, nullable=True)  # 同時に実行する同期ジョブ数（未設定ならサーバー既定）
 
     updated_at = Column(DateTime(timezone=True), default=utc_now, onupdate=utc_now)
 
@@ -107,8 +115,11 @@ class Document(Base):
     graph_build_status = Column(String(20), default="pending")  # pending, building, completed, failed
     file_path = Column(String(500), nullable=True)  # 元ファイルの保存パス
     box_file_id = Column(String(50), nullable=True, index=True)
-    box_sync_status = Column(String(20), nullable=True)  # synced / outdated / error
+    box_sync_status = Column(String(20), nullable=True)  # synced / outdated / deleted / error
     box_synced_at = Column(DateTime(timezone=True), nullable=True)
+    source_mtime = Column(DateTime(timezone=True), nullable=True)  # 同期時点の外部ファイル更新日時
+    source_size = Column(BigInteger, nullable=True)  # 同期時点の外部ファイルサイズ
+    content_hash = Column(String(64), nullable=True)  # 元ファイルのSHA-256（索引済みの内容）
     created_at = Column(DateTime(timezone=True), default=utc_now)
     updated_at = Column(DateTime(timezone=True), default=utc_now, onupdate=utc_now)
 
@@ -130,6 +141,7 @@ class DocumentChunk(Base):
     content = Column(Text, nullable=False)
     embedding = Column(Vector(1536))  # text-embedding-3-small
     chunk_index = Column(Integer, nullable=False)
+    content_hash = Column(String(64), nullable=True)  # チャンク本文のSHA-256（埋め込み再利用の判定）
 
     __table_args__ = (
         Index("ix_chunks_org_doc", "organization_id", "document_id"),
@@ -146,7 +158,7 @@ class ChatHistory(Base):
     user_id = Column(String(36), ForeignKey("users.id"), nullable=True)
     question = Column(Text, nullable=False)
     answer = Column(Text, nullable=False)
-    referenced_doc_ids = Column(Text)  # JSON array of document IDs
+    referenced_doc_ids = Column(Text)  # JSON array of document IDs（集計・表示は chat_references を使用）
     avg_similarity = Column(String(10))  # Average similarity score (0.0-1.0)
     is_no_answer = Column(String(1), default="0")  # "1" if AI couldn't answer
     feedback = Column(String(10))  # good, bad, null
@@ -156,7 +168,41 @@ class ChatHistory(Base):
 
     __table_args__ = (
         Index("ix_chat_org_user", "organization_id", "user_id"),
+        Index("ix_chat_created", "created_at"),  # 集計のコンパクション（全組織の期間指定）
+        # 履歴一覧のキーセット（created_at, id の降順）。絞り込み別に部分インデックス
+        Index("ix_chat_org_created_id", "organization_id", "created_at", "id"),
+        Index("ix_chat_org_feedback_created_id", "organization_id", "feedback", "created_at", "id",
+              postgresql_where=text("feedback IS NOT NULL")),
+        Index("ix_chat_org_noanswer_created_id", "organization_id", "created_at", "id",
+              postgresql_where=text("is_no_answer = '1'")),
+        Index("ix_chat_org_evaluated_created_id", "organization_id", "created_at", "id",
+              postgresql_where=text("feedback IS NOT NULL OR is_no_answer = '1'")),
     )
 
     organization = relationship("Organization", back_populates="chat_histories")
     user = relationship("User", back_populates="chat_histories")
+    references = relationship(
+        "ChatReference", back_populates="chat", cascade="all, delete-orphan",
+        order_by="ChatReference.rank", passive_deletes=True,
+    )
+
+
+class ChatReference(Base):
+    """回答が引用したドキュメント（チャット完了時に登録。document_id は削除済みドキュメントも残すためFKは張らない）"""
+    __tablename__ = "chat_references"
+
+    chat_id = Column(String(36), ForeignKey("chat_history.id", ondelete="CASCADE"), primary_key=True)
+    rank = Column(Integer, primary_key=True)  # 回答内の引用順（1始まり）
+    organization_id = Column(String(36), nullable=False)
+    document_id = Column(String(36), nullable=False)
+    title = Column(String(255), default="")  # 引用時点のファイル名
+    section = Column(Text, default="")
+    excerpt = Column(Text, default="")
+    created_at = Column(DateTime(timezone=True), nullable=False)  # チャットの日時（期間集計用に複製）
+
+    __table_args__ = (
+        Index("ix_chat_refs_org_created_doc", "organization_id", "created_at", "document_id"),
+        Index("ix_chat_refs_doc_created", "document_id", "created_at"),
+    )
+
+    chat = relationship("ChatHistory", back_populates="references")
@@ -0,0 +1,41 @@
+import uuid
+
+from sqlalchemy import Column, String, Text, DateTime, Integer, ForeignKey, Index
+
+from app.core.database import Base
+from app.models.document import utc_now
+
+
+class IngestionJob(Base):
+    """ドキュメント取り込みジョブ（バックグラウンドワーカーが処理するDBキュー）"""
+    __tablename__ = "ingestion_jobs"
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    organization_id = Column(String(36), ForeignKey("organizations.id"), nullable=False, index=True)
+    created_by = Column(String(36), ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    kind = Column(String(20), nullable=False, default="upload")  # upload / sftp_sync
+    priority = Column(Integer, nullable=False, default=0)  # 小さいほど先に処理（自動再同期は1）
+    status = Column(String(20), nullable=False, default="queued")  # queued / running / succeeded / failed
+    filename = Column(String(255), nullable=False)
+    file_type = Column(String(10), nullable=False)
+    source_path = Column(String(500), nullable=True)  # ステージング済みの元ファイル
+    params = Column(Text, default="{}")  # JSON: is_public, category, department_ids, source_file_id
+    document_id = Column(String(36), ForeignKey("documents.id", ondelete="SET NULL"), nullable=True)
+    stage = Column(String(20), nullable=True)  # downloading / extracting / chunking / embedding / saving
+    progress_current = Column(Integer, default=0)
+    progress_total = Column(Integer, default=0)  # ページ数・シート数など（不明なら0）
+    chunk_count = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, default=0)
+    worker_id = Column(String(100), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    run_after = Column(DateTime(timezone=True), nullable=True)  # 再試行のバックオフ（これより前は取得しない）
+    created_at = Column(DateTime(timezone=True), default=utc_now)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), default=utc_now, onupdate=utc_now)
+
+    __table_args__ = (
+        Index("ix_ingestion_jobs_status_created", "status", "created_at"),
+        Index("ix_ingestion_jobs_org_created", "organization_id", "created_at"),
+    )
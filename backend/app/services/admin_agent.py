@@ -12,6 +12,9 @@ from sqlalchemy.orm import Session
 
 from app.core.config import settings
 from app.models.document import ChatHistory, Document
+from app.services.llm_governor import Priority, estimate_tokens, llm_governor
+
+CLAUDE_MODEL = "claude-sonnet-4-20250514"
 
 
 TOOLS = [
@@ -186,7 +189,8 @@ class AdminAgent:
     def __init__(self, db: Session, organization_id: str):
         self.db = db
         self.organization_id = organization_id
-        self.client = anthropic.Anthropic(api_key=settings.anthropic_api_key)
+        # イベントループをブロックしないよう非同期クライアントを使う（再試行は llm_governor）
+        self.client = anthropic.AsyncAnthropic(api_key=settings.anthropic_api_key, max_retries=0)
 
     def _execute_tool(self, name: str, input_data: dict) -> str:
         if name == "get_quality_issues":
@@ -304,13 +308,18 @@ class AdminAgent:
 
         max_iterations = 15
         for i in range(max_iterations):
-            response = self.client.messages.create(
-                model="claude-sonnet-4-20250514",
-                max_tokens=4096,
-                temperature=0.3,
-                system=system_with_cache,
-                tools=tools_with_cache,
-                messages=messages,
+            response = await llm_governor.acall(
+                lambda: self.client.messages.create(
+                    model=CLAUDE_MODEL,
+                    max_tokens=4096,
+                    temperature=0.3,
+                    system=system_with_cache,
+                    tools=tools_with_cache,
+                    messages=messages,
+                ),
+                model=CLAUDE_MODEL,
+                priority=Priority.ADMIN,
+                estimate=estimate_tokens(messages, system=SYSTEM_PROMPT, max_tokens=4096),
             )
 
             if response.stop_reason != "tool_use":
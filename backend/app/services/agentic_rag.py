@@ -1,5 +1,7 @@
+import asyncio
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import AsyncGenerator
 
 import anthropic
@@ -7,10 +9,22 @@ from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services.llm_governor import Priority, estimate_tokens, llm_governor
 from app.services.rag import rag_service
 
 logger = logging.getLogger(__name__)
 
+CLAUDE_MODEL = "claude-sonnet-4-20250514"
+
+# 埋め込みAPI・DBアクセスを伴うツールの実行用（イベントループをブロックしない）
+_tool_executor = ThreadPoolExecutor(
+    max_workers=settings.agentic_tool_workers, thread_name_prefix="agentic-tool"
+)
+
+# サーバー側の状態更新のみで即時に終わるツール（UI上ではステップ表示しない）
+INLINE_TOOLS = {"cite_sources", "suggest_followups"}
+
 
 TOOLS = [
     {
@@ -28,6 +42,11 @@ TOOLS = [
                     "description": "取得する件数（デフォルト: 5）",
                     "default": 5,
                 },
+                "mode": {
+                    "type": "string",
+                    "enum": ["hybrid", "vector"],
+                    "description": "検索方式。vector は意味検索のみ。hybrid は意味検索に加えて条番号（第20条）・様式名・製品コード等の文字列一致も考慮する。省略時はサーバー設定に従う。",
+                },
             },
             "required": ["query"],
         },
@@ -161,36 +180,50 @@ def _content_to_dict(content_blocks) -> list[dict]:
 
 
 class AgenticRAG:
-    def __init__(self, db: Session, organization_id: str | None, user_department_id: str | None):
-        self.db = db
+    def __init__(self, organization_id: str | None, user_department_id: str | None):
         self.organization_id = organization_id
         self.user_department_id = user_department_id
-        self.client = anthropic.AsyncAnthropic(api_key=settings.anthropic_api_key)
+        # 再試行は llm_governor が行う
+        self.client = anthropic.AsyncAnthropic(api_key=settings.anthropic_api_key, max_retries=0)
         self._citations: list[dict] = []
         self._all_similarities: list[float] = []
         self._trace: list[dict] = []
         self._followups: list[str] = []
 
-    def _execute_tool(self, name: str, input_data: dict) -> str:
+    def _execute_tool(self, name: str, input_data: dict, db: Session | None = None) -> str:
         if name == "search_knowledge":
             return self._tool_search_knowledge(
-                input_data["query"], input_data.get("top_k", 5)
+                db, input_data["query"], input_data.get("top_k", 5), input_data.get("mode")
             )
         elif name == "get_document_detail":
-            return self._tool_get_document_detail(input_data["document_id"])
+            return self._tool_get_document_detail(db, input_data["document_id"])
         elif name == "list_documents":
-            return self._tool_list_documents()
+            return self._tool_list_documents(db)
         elif name == "cite_sources":
             return self._tool_cite_sources(input_data["citations"])
         elif name == "suggest_followups":
             return self._tool_suggest_followups(input_data["questions"])
         return json.dumps({"error": f"Unknown tool: {name}"})
 
-    def _tool_search_knowledge(self, query: str, top_k: int = 5) -> str:
+    def _execute_tool_in_thread(self, name: str, input_data: dict) -> str:
+        """ワーカースレッドで実行。Sessionはスレッド間で共有できないため呼び出しごとに開く"""
+        db = SessionLocal()
+        try:
+            return self._execute_tool(name, input_data, db)
+        except Exception as e:
+            logger.exception("Tool %s failed: %s", name, e)
+            return json.dumps({"error": "ツールの実行中にエラーが発生しました。"}, ensure_ascii=False)
+        finally:
+            db.close()
+
+    def _tool_search_knowledge(self, db: Session, query: str, top_k: int = 5, mode: str | None = None) -> str:
+        if mode not in ("hybrid", "vector"):
+            mode = None
         chunks = rag_service.search_similar_chunks(
-            self.db, query, top_k=top_k,
+            db, query, top_k=top_k,
             user_department_id=self.user_department_id,
             organization_id=self.organization_id,
+            mode=mode,
         )
         for chunk in chunks:
             sim = chunk.get("similarity")
@@ -209,7 +242,7 @@ class AgenticRAG:
         ]
         return json.dumps({"results": results}, ensure_ascii=False)
 
-    def _tool_get_document_detail(self, document_id: str) -> str:
+    def _tool_get_document_detail(self, db: Session, document_id: str) -> str:
         sql = text("""
             SELECT dc.content, dc.chunk_index, d.filename
             FROM document_chunks dc
@@ -218,7 +251,7 @@ class AgenticRAG:
               AND dc.organization_id = :organization_id
             ORDER BY dc.chunk_index
         """)
-        rows = self.db.execute(sql, {
+        rows = db.execute(sql, {
             "document_id": document_id,
             "organization_id": self.organization_id,
         }).fetchall()
@@ -232,7 +265,7 @@ class AgenticRAG:
             "chunk_count": len(rows),
         }, ensure_ascii=False)
 
-    def _tool_list_documents(self) -> str:
+    def _tool_list_documents(self, db: Session) -> str:
         sql = text("""
             SELECT d.id, d.filename, d.category, d.updated_at
             FROM documents d
@@ -240,7 +273,7 @@ class AgenticRAG:
             ORDER BY d.updated_at DESC
             LIMIT 50
         """)
-        rows = self.db.execute(sql, {
+        rows = db.execute(sql, {
             "organization_id": self.organization_id,
         }).fetchall()
         docs = [
@@ -307,13 +340,18 @@ class AgenticRAG:
 
         try:
             for i in range(max_iterations):
-                async with self.client.messages.stream(
-                    model="claude-sonnet-4-20250514",
-                    max_tokens=4096,
-                    temperature=0.3,
-                    system=system_with_cache,
-                    tools=tools_with_cache,
-                    messages=messages,
+                async with llm_governor.astream(
+                    lambda: self.client.messages.stream(
+                        model=CLAUDE_MODEL,
+                        max_tokens=4096,
+                        temperature=0.3,
+                        system=system_with_cache,
+                        tools=tools_with_cache,
+                        messages=messages,
+                    ),
+                    model=CLAUDE_MODEL,
+                    priority=Priority.INTERACTIVE,
+                    estimate=estimate_tokens(messages, system=SYSTEM_PROMPT, max_tokens=4096),
                 ) as stream:
                     async for event in stream:
                         if event.type == "text":
@@ -325,47 +363,54 @@ class AgenticRAG:
                     break
 
                 assistant_content = response.content
-                tool_results = []
+                tool_blocks = [block for block in assistant_content if block.type == "tool_use"]
+                results: dict[str, str] = {}
+                trace_entries: dict[str, dict] = {}
+                pending = []
 
-                for block in assistant_content:
-                    if block.type != "tool_use":
+                for block in tool_blocks:
+                    trace_entries[block.id] = {
+                        "iteration": i,
+                        "tool": block.name,
+                        "input": block.input,
+                    }
+                    self._trace.append(trace_entries[block.id])
+
+                    if block.name in INLINE_TOOLS:
+                        results[block.id] = self._execute_tool(block.name, block.input)
+                        trace_entries[block.id]["summary"] = self._summarize_result(block.name, results[block.id])
                         continue
 
-                    tool_name = block.name
-                    tool_input = block.input
-
-                    self._trace.append({
-                        "iteration": i,
-                        "tool": tool_name,
-                        "input": tool_input,
-                    })
-
-                    # cite_sources/suggest_followups はUI上ではステップ表示しない
-                    hidden_tools = {"cite_sources", "suggest_followups"}
-                    if tool_name not in hidden_tools:
-                        yield _sse({"step": {
-                            "tool": tool_name,
-                            "status": "running",
-                            "input": tool_input,
-                        }})
-
-                    result = self._execute_tool(tool_name, tool_input)
-
-                    summary = self._summarize_result(tool_name, result)
-                    self._trace[-1]["summary"] = summary
-
-                    if tool_name not in hidden_tools:
-                        yield _sse({"step": {
-                            "tool": tool_name,
-                            "status": "done",
-                            "summary": summary,
-                        }})
-
-                    tool_results.append({
+                    yield _sse({"step": {
+                        "id": block.id,
+                        "tool": block.name,
+                        "status": "running",
+                        "input": block.input,
+                    }})
+                    pending.append(self._run_tool_async(block))
+
+                # 同一ターン内の独立したツール呼び出しは並列実行し、完了順にステップを通知
+                for completed in asyncio.as_completed(pending):
+                    block, result = await completed
+                    results[block.id] = result
+                    summary = self._summarize_result(block.name, result)
+                    trace_entries[block.id]["summary"] = summary
+                    yield _sse({"step": {
+                        "id": block.id,
+                        "tool": block.name,
+                        "status": "done",
+                        "summary": summary,
+                    }})
+
+                # tool_result はアシスタントのtool_use順に並べる
+                tool_results = [
+                    {
                         "type": "tool_result",
                         "tool_use_id": block.id,
-                        "content": result,
-                    })
+                        "content": results[block.id],
+                    }
+                    for block in tool_blocks
+                ]
 
                 messages.append({"role": "assistant", "content": _content_to_dict(assistant_content)})
                 messages.append({"role": "user", "content": tool_results})
@@ -385,6 +430,13 @@ class AgenticRAG:
             yield _sse({"token": "AIサービスとの通信中にエラーが発生しました。しばらくしてから再度お試しください。"})
             yield _sse({"done": True, "references": [], "avg_similarity": 0, "followups": [], "agentic_trace": self._trace})
 
+    async def _run_tool_async(self, block) -> tuple:
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            _tool_executor, self._execute_tool_in_thread, block.name, block.input
+        )
+        return block, result
+
     @staticmethod
     def _summarize_result(tool_name: str, result_json: str) -> str:
         try:
@@ -0,0 +1,380 @@
+"""チャット分析のロールアップ
+
+管理ダッシュボードの集計を chat_history の走査ではなく、組織×時間（UTC）/ 日単位の集計テーブルから返す。
+読み出しは期間内のバケット数（最大で日数×24行）に比例し、履歴の総件数には依存しない。
+- チャット登録・フィードバック時に同じトランザクションで加算（record_chat / record_feedback）
+- 定期コンパクションで直近の確定済みの日を chat_history から再計算し、加算漏れや直接更新を補正する
+- プロセス起動後の初回コンパクションで、集計開始より前の履歴がある組織は全期間を再構築する（導入時のバックフィル）。
+  引用数は chat_references から数えるため、その前に未作成のチャットの引用行を作成する
+"""
+import logging
+import threading
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import delete, func, insert, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.analytics import ChatDocumentDaily, ChatStatsHourly, ChatUserDaily
+from app.models.document import ChatHistory, ChatReference
+from app.services.chat_references import backfill as backfill_references
+
+logger = logging.getLogger(__name__)
+
+COMPACTION_LOCK_KEY = 7_420_116
+REFERENCES_BACKFILL_LOCK_KEY = 7_420_117
+INSERT_BATCH_ROWS = 1000
+FEEDBACK_COLUMNS = ("good", "bad")
+
+
+def _utc(dt: datetime) -> datetime:
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+
+def hour_bucket(dt: datetime) -> datetime:
+    return _utc(dt).replace(minute=0, second=0, microsecond=0)
+
+
+def _day_start(d: date) -> datetime:
+    return datetime(d.year, d.month, d.day, tzinfo=timezone.utc)
+
+
+def _upsert(db: Session, model, keys: dict, counts: dict) -> None:
+    """キーの行が無ければ作成し、counts を加算する（counts が空なら存在確認のみ）"""
+    insert_fn = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    stmt = insert_fn(model).values(**keys, **counts)
+    if counts:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={name: model.__table__.c[name] + stmt.excluded[name] for name in counts},
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=list(keys))
+    db.execute(stmt)
+
+
+# ================================================================
+# 加算（チャット登録・フィードバック）
+# ================================================================
+
+def record_chat(db: Session, chat: ChatHistory) -> None:
+    """登録するチャット（references 設定済み）を集計に加算（失敗してもチャットの保存は妨げない。コンパクションで補正される）"""
+    if not chat.organization_id:
+        return
+    if chat.created_at is None:
+        chat.created_at = datetime.now(timezone.utc)
+    created = _utc(chat.created_at)
+    doc_ids = [ref.document_id for ref in chat.references]
+    try:
+        with db.begin_nested():
+            _upsert(db, ChatStatsHourly, {"organization_id": chat.organization_id, "bucket": hour_bucket(created)}, {
+                "questions": 1,
+                "good": int(chat.feedback == "good"),
+                "bad": int(chat.feedback == "bad"),
+                "no_answer": int(chat.is_no_answer == "1"),
+                "referenced": len(doc_ids),
+            })
+            if chat.user_id:
+                _upsert(db, ChatUserDaily, {
+                    "organization_id": chat.organization_id, "day": created.date(), "user_id": chat.user_id,
+                }, {})
+            for doc_id, count in Counter(doc_ids).items():
+                _upsert(db, ChatDocumentDaily, {
+                    "organization_id": chat.organization_id, "day": created.date(), "document_id": doc_id,
+                }, {"reference_count": count})
+    except Exception as e:
+        logger.warning("Analytics rollup update failed for chat %s: %s", chat.id, e)
+
+
+def record_feedback(db: Session, chat: ChatHistory, previous: Optional[str]) -> None:
+    """フィードバックの変更を集計に反映（行が無い古いチャットはコンパクションに任せる）"""
+    if previous == chat.feedback or chat.created_at is None:
+        return
+    values = {}
+    if previous in FEEDBACK_COLUMNS:
+        values[previous] = ChatStatsHourly.__table__.c[previous] - 1
+    if chat.feedback in FEEDBACK_COLUMNS:
+        values[chat.feedback] = ChatStatsHourly.__table__.c[chat.feedback] + 1
+    if not values:
+        return
+    try:
+        with db.begin_nested():
+            db.execute(update(ChatStatsHourly).where(
+                ChatStatsHourly.organization_id == chat.organization_id,
+                ChatStatsHourly.bucket == hour_bucket(chat.created_at),
+            ).values(**values))
+    except Exception as e:
+        logger.warning("Analytics rollup update failed for chat %s: %s", chat.id, e)
+
+
+# ================================================================
+# 再計算（コンパクション・バックフィル）
+# ================================================================
+
+def rebuild(db: Session, until: date, since: Optional[date] = None, organization_id: Optional[str] = None) -> int:
+    """
+    [since, until) の日（UTC）の集計を chat_history / chat_references から作り直す（コミットしない）。
+    since が None なら全期間。再計算したチャット件数を返す
+    """
+    until_dt = _day_start(until)
+    since_dt = _day_start(since) if since else None
+
+    def _range(query, created_at, org_column):
+        query = query.filter(created_at < until_dt)
+        if since_dt:
+            query = query.filter(created_at >= since_dt)
+        if organization_id:
+            query = query.filter(org_column == organization_id)
+        return query
+
+    hourly: dict[tuple, Counter] = defaultdict(Counter)
+    users: set[tuple] = set()
+    docs: Counter = Counter()
+    chats = _range(db.query(
+        ChatHistory.organization_id, ChatHistory.created_at, ChatHistory.user_id,
+        ChatHistory.feedback, ChatHistory.is_no_answer,
+    ), ChatHistory.created_at, ChatHistory.organization_id)
+
+    count = 0
+    for row in chats.yield_per(2000):
+        count += 1
+        created = _utc(row.created_at)
+        hourly[(row.organization_id, hour_bucket(created))].update({
+            "questions": 1,
+            "good": int(row.feedback == "good"),
+            "bad": int(row.feedback == "bad"),
+            "no_answer": int(row.is_no_answer == "1"),
+        })
+        if row.user_id:
+            users.add((row.organization_id, created.date(), row.user_id))
+
+    # 引用はチャットと同じ日時で chat_references に複製されている
+    references = _range(db.query(
+        ChatReference.organization_id, ChatReference.created_at, ChatReference.document_id,
+    ), ChatReference.created_at, ChatReference.organization_id)
+    for row in references.yield_per(5000):
+        created = _utc(row.created_at)
+        hourly[(row.organization_id, hour_bucket(created))]["referenced"] += 1
+        docs[(row.organization_id, created.date(), row.document_id)] += 1
+
+    for model, column, lower, upper in (
+        (ChatStatsHourly, ChatStatsHourly.bucket, since_dt, until_dt),
+        (ChatUserDaily, ChatUserDaily.day, since, until),
+        (ChatDocumentDaily, ChatDocumentDaily.day, since, until),
+    ):
+        stmt = delete(model).where(column < upper)
+        if lower is not None:
+            stmt = stmt.where(column >= lower)
+        if organization_id:
+            stmt = stmt.where(model.organization_id == organization_id)
+        db.execute(stmt)
+
+    _insert_rows(db, ChatStatsHourly, [
+        {"organization_id": org_id, "bucket": bucket, "questions": c["questions"], "good": c["good"],
+         "bad": c["bad"], "no_answer": c["no_answer"], "referenced": c["referenced"]}
+        for (org_id, bucket), c in hourly.items()
+    ])
+    _insert_rows(db, ChatUserDaily, [
+        {"organization_id": org_id, "day": day, "user_id": user_id} for org_id, day, user_id in users
+    ])
+    _insert_rows(db, ChatDocumentDaily, [
+        {"organization_id": org_id, "day": day, "document_id": doc_id, "reference_count": n}
+        for (org_id, day, doc_id), n in docs.items()
+    ])
+    return count
+
+
+def _insert_rows(db: Session, model, rows: list[dict]) -> None:
+    for start in range(0, len(rows), INSERT_BATCH_ROWS):
+        db.execute(insert(model), rows[start:start + INSERT_BATCH_ROWS])
+
+
+def orgs_needing_backfill(db: Session) -> list[str]:
+    """集計の最初のバケットより前にチャット履歴がある組織"""
+    first_chat = dict(db.query(ChatHistory.organization_id, func.min(ChatHistory.created_at)).group_by(
+        ChatHistory.organization_id
+    ).all())
+    first_bucket = dict(db.query(ChatStatsHourly.organization_id, func.min(ChatStatsHourly.bucket)).group_by(
+        ChatStatsHourly.organization_id
+    ).all())
+    return [
+        org_id for org_id, first in first_chat.items()
+        if org_id not in first_bucket or hour_bucket(first) < _utc(first_bucket[org_id])
+    ]
+
+
+def _backfill_references(db: Session) -> Optional[int]:
+    """
+    chat_references の無い既存チャットに引用行を作成する（バッチごとにコミットするためセッション単位のロック）。
+    他プロセスが実行中なら None
+    """
+    postgres = db.get_bind().dialect.name == "postgresql"
+    if postgres:
+        locked = db.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": REFERENCES_BACKFILL_LOCK_KEY}).scalar()
+        if not locked:
+            db.rollback()
+            return None
+    try:
+        return backfill_references(db)
+    finally:
+        if postgres:
+            db.rollback()
+            db.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": REFERENCES_BACKFILL_LOCK_KEY})
+            db.commit()
+
+
+def compact(db: Session, lookback_days: int, backfill: bool = False) -> dict:
+    """
+    直近 lookback_days 日（当日を除く確定済みの日）を再計算してコミットする。
+    backfill: 先に chat_references の無いチャットの引用行を作成し、集計開始より前の履歴がある組織は
+    全期間を再構築する（引用行の作成前に再計算すると引用数が0になるため、作成中は見送る）。
+    PostgreSQL では複数プロセスが同時に実行しないようアドバイザリロックを取る
+    """
+    references = None
+    if backfill:
+        references = _backfill_references(db)
+        if references is None:
+            return {"skipped": True}
+    if db.get_bind().dialect.name == "postgresql":
+        locked = db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": COMPACTION_LOCK_KEY}).scalar()
+        if not locked:
+            db.rollback()
+            return {"skipped": True}
+    today = datetime.now(timezone.utc).date()
+    result = {"chats": rebuild(db, until=today, since=today - timedelta(days=lookback_days)), "backfilled": 0}
+    if references is not None:
+        result["references_backfilled"] = references
+    if backfill:
+        for org_id in orgs_needing_backfill(db):
+            result["chats"] += rebuild(db, until=today, organization_id=org_id)
+            result["backfilled"] += 1
+    db.commit()
+    return result
+
+
+class AnalyticsCompactor:
+    """定期コンパクションのバックグラウンドスレッド"""
+
+    def __init__(self):
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self, interval_seconds: int) -> None:
+        if self._thread is not None or interval_seconds <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(interval_seconds,), name="analytics-compactor", daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread = None
+
+    def _run(self, interval_seconds: int) -> None:
+        backfill = True
+        while True:
+            db = SessionLocal()
+            try:
+                result = compact(db, settings.analytics_compact_lookback_days, backfill=backfill)
+                backfill = False
+                logger.info("Analytics compaction: %s", result)
+            except Exception as e:
+                db.rollback()
+                logger.error("Analytics compaction failed: %s", e)
+            finally:
+                db.close()
+            if self._stop.wait(interval_seconds):
+                return
+
+
+analytics_compactor = AnalyticsCompactor()
+
+
+# ================================================================
+# 読み出し（ダッシュボード）
+# ================================================================
+
+def period_totals(
+    db: Session, organization_id: str, since: Optional[datetime], until: Optional[datetime] = None,
+) -> dict:
+    """[since, until) の時間バケットの合計（境界は時単位に切り捨て。since が None なら全期間）"""
+    filters = [ChatStatsHourly.organization_id == organization_id]
+    if since:
+        filters.append(ChatStatsHourly.bucket >= hour_bucket(since))
+    if until:
+        filters.append(ChatStatsHourly.bucket < hour_bucket(until))
+    row = db.query(
+        func.sum(ChatStatsHourly.questions).label("total"),
+        func.sum(ChatStatsHourly.good).label("good"),
+        func.sum(ChatStatsHourly.bad).label("bad"),
+        func.sum(ChatStatsHourly.no_answer).label("no_answer"),
+    ).filter(*filters).one()
+    good = int(row.good or 0)
+    bad = int(row.bad or 0)
+    return {
+        "total": int(row.total or 0),
+        "good": good,
+        "bad": bad,
+        "no_answer": int(row.no_answer or 0),
+        "feedback_count": good + bad,
+    }
+
+
+def active_users(db: Session, organization_id: str, first_day: date, last_day: date) -> int:
+    """first_day〜last_day（両端含む）に質問したユーザー数"""
+    return db.query(func.count(func.distinct(ChatUserDaily.user_id))).filter(
+        ChatUserDaily.organization_id == organization_id,
+        ChatUserDaily.day >= first_day,
+        ChatUserDaily.day <= last_day,
+    ).scalar() or 0
+
+
+def hourly_rows(db: Session, organization_id: str, since: datetime) -> list[ChatStatsHourly]:
+    return db.query(ChatStatsHourly).filter(
+        ChatStatsHourly.organization_id == organization_id,
+        ChatStatsHourly.bucket >= hour_bucket(since),
+    ).order_by(ChatStatsHourly.bucket).all()
+
+
+def daily_series(rows: list[ChatStatsHourly], since: datetime) -> list[dict]:
+    """since 以降の時間バケットを日（UTC）ごとに合算"""
+    since = hour_bucket(since)
+    days: dict[date, Counter] = {}
+    for row in rows:
+        bucket = _utc(row.bucket)
+        if bucket < since:
+            continue
+        days.setdefault(bucket.date(), Counter()).update({
+            "total": row.questions, "good": row.good, "bad": row.bad, "noAnswer": row.no_answer,
+        })
+    return [
+        {"date": day.isoformat(), "total": c["total"], "good": c["good"], "bad": c["bad"], "noAnswer": c["noAnswer"]}
+        for day, c in sorted(days.items())
+    ]
+
+
+def weekday_hour_heatmap(rows: list[ChatStatsHourly]) -> list[list[int]]:
+    """曜日（0=日曜）×時（UTC）の質問数"""
+    heatmap = [[0] * 24 for _ in range(7)]
+    for row in rows:
+        bucket = _utc(row.bucket)
+        heatmap[(bucket.weekday() + 1) % 7][bucket.hour] += row.questions
+    return heatmap
+
+
+def top_documents(db: Session, organization_id: str, since_day: date, limit: int) -> list[tuple[str, int]]:
+    total = func.sum(ChatDocumentDaily.reference_count)
+    return [
+        (row.document_id, int(row.total))
+        for row in db.query(ChatDocumentDaily.document_id, total.label("total")).filter(
+            ChatDocumentDaily.organization_id == organization_id,
+            ChatDocumentDaily.day >= since_day,
+        ).group_by(ChatDocumentDaily.document_id).order_by(total.desc(), ChatDocumentDaily.document_id).limit(limit)
+    ]
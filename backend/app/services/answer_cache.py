@@ -0,0 +1,178 @@
+"""/api/chat の意味的回答キャッシュ
+
+質問埋め込みの類似度が閾値以上の過去回答を、同じテナント・同じ閲覧スコープ
+（admin / 部門 / 部門なし）に限って再利用する。
+参照ドキュメントが再アップロード・再同期・削除・権限変更されたら該当エントリを破棄する。
+"""
+import json
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import AsyncGenerator, Optional
+
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.cache import AnswerCacheEntry, answer_cache_documents
+from app.models.document import Document
+from app.services.principal_cache import Principal
+
+logger = logging.getLogger(__name__)
+
+REPLAY_CHUNK_SIZE = 16
+
+
+def _sse(data: dict) -> str:
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def visibility_scope(user: Optional[Principal]) -> Optional[str]:
+    """
+    ユーザーが閲覧できるドキュメント集合を表すスコープ。キャッシュ対象外ならNone。
+    部門に所属しない一般ユーザーは検索で部門ACLがかからず、非公開を含む組織の全ドキュメントを
+    閲覧できるため "all"（部門ユーザーの公開ドキュメントのみの集合とは異なる）
+    """
+    if user is None:
+        return None
+    if user.role == "admin":
+        return "admin"
+    if user.department_id:
+        return f"dept:{user.department_id}"
+    return "all"
+
+
+class AnswerCache:
+    def __init__(self):
+        self._counters = {"hits": 0, "misses": 0, "stores": 0, "invalidated": 0}
+        self._lock = threading.Lock()
+
+    def _incr(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._counters)
+
+    def lookup(
+        self, db: Session, organization_id: str, scope: str, question_embedding: list[float]
+    ) -> Optional[dict]:
+        """閾値以上で最も近いキャッシュ済み回答を返す"""
+        since = datetime.now(timezone.utc) - timedelta(hours=settings.answer_cache_ttl_hours)
+        embedding_str = "[" + ",".join(map(str, question_embedding)) + "]"
+        row = db.execute(text("""
+            SELECT id, question, answer, reference_items, followups, avg_similarity,
+                   1 - (question_embedding <=> cast(:query_embedding as vector)) AS similarity
+            FROM answer_cache
+            WHERE organization_id = :organization_id
+              AND scope = :scope
+              AND created_at >= :since
+            ORDER BY question_embedding <=> cast(:query_embedding as vector)
+            LIMIT 1
+        """), {
+            "query_embedding": embedding_str,
+            "organization_id": organization_id,
+            "scope": scope,
+            "since": since,
+        }).first()
+
+        if row is None or row.similarity < settings.answer_cache_similarity_threshold:
+            self._incr("misses")
+            return None
+
+        db.execute(text("""
+            UPDATE answer_cache
+            SET hit_count = hit_count + 1, last_hit_at = NOW()
+            WHERE id = :id
+        """), {"id": row.id})
+        self._incr("hits")
+        return {
+            "id": row.id,
+            "question": row.question,
+            "answer": row.answer,
+            "references": json.loads(row.reference_items) if row.reference_items else [],
+            "followups": json.loads(row.followups) if row.followups else [],
+            "avg_similarity": row.avg_similarity or 0.0,
+            "similarity": float(row.similarity),
+        }
+
+    def store(
+        self,
+        db: Session,
+        organization_id: str,
+        scope: str,
+        question: str,
+        question_embedding: list[float],
+        answer: str,
+        references: list[dict],
+        followups: list[str],
+        avg_similarity: float,
+    ) -> None:
+        """完了した回答を登録（呼び出し側でcommitする）"""
+        entry = AnswerCacheEntry(
+            organization_id=organization_id,
+            scope=scope,
+            question=question,
+            question_embedding=question_embedding,
+            answer=answer,
+            reference_items=json.dumps(references, ensure_ascii=False),
+            followups=json.dumps(followups, ensure_ascii=False),
+            avg_similarity=avg_similarity,
+        )
+        db.add(entry)
+        db.flush()
+        doc_ids = {r.get("id") for r in references if r.get("id")}
+        if doc_ids:
+            db.execute(answer_cache_documents.insert(), [
+                {"cache_id": entry.id, "document_id": doc_id} for doc_id in doc_ids
+            ])
+        self._incr("stores")
+
+    def invalidate_documents(self, db: Session, document_ids: list[str]) -> int:
+        """指定ドキュメントを参照しているキャッシュを破棄（呼び出し側でcommitする）"""
+        if not document_ids:
+            return 0
+        cache_ids = select(answer_cache_documents.c.cache_id).where(
+            answer_cache_documents.c.document_id.in_(document_ids)
+        )
+        deleted = db.query(AnswerCacheEntry).filter(
+            AnswerCacheEntry.id.in_(cache_ids)
+        ).delete(synchronize_session=False)
+        if deleted:
+            logger.info("Answer cache: invalidated %d entries for documents %s", deleted, document_ids)
+            self._incr("invalidated", deleted)
+        return deleted
+
+    def invalidate_filename(self, db: Session, organization_id: str, filename: str) -> int:
+        """同名ファイルの再アップロード時、旧版を参照しているキャッシュを破棄"""
+        doc_ids = [
+            row.id for row in db.query(Document.id).filter(
+                Document.organization_id == organization_id,
+                Document.filename == filename,
+            ).all()
+        ]
+        return self.invalidate_documents(db, doc_ids)
+
+    @staticmethod
+    async def replay(entry: dict) -> AsyncGenerator[str, None]:
+        """キャッシュ済み回答を AgenticRAG.run と同じSSE形式で再生"""
+        answer = entry["answer"]
+        for pos in range(0, len(answer), REPLAY_CHUNK_SIZE):
+            yield _sse({"token": answer[pos:pos + REPLAY_CHUNK_SIZE]})
+        yield _sse({
+            "done": True,
+            "cached": True,
+            "references": entry["references"],
+            "avg_similarity": round(entry["avg_similarity"], 3),
+            "followups": entry["followups"],
+            "agentic_trace": [{
+                "iteration": 0,
+                "tool": "answer_cache",
+                "input": {"cache_id": entry["id"], "similarity": round(entry["similarity"], 4)},
+                "summary": "キャッシュ済みの回答を再利用",
+            }],
+        })
+
+
+answer_cache = AnswerCache()
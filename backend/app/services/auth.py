@@ -8,6 +8,7 @@ from sqlalchemy.orm import Session
 
 from app.core.config import settings
 from app.models.document import User
+from app.services.password_hasher import password_hasher
 
 
 # JWT設定
@@ -30,6 +31,16 @@ def get_password_hash(password: str) -> str:
     return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
 
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """パスワードを検証（ルートハンドラ用。bcryptは専用スレッドプールで実行）"""
+    return await password_hasher.run(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """パスワードをハッシュ化（ルートハンドラ用。bcryptは専用スレッドプールで実行）"""
+    return await password_hasher.run(get_password_hash, password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """アクセストークンを生成"""
     to_encode = data.copy()
@@ -51,14 +62,14 @@ def decode_token(token: str) -> Optional[dict]:
         return None
 
 
-def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
+async def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
     """ユーザーを認証（パスワードログイン）"""
     user = db.query(User).filter(User.email == email).first()
     if not user:
         return None
     if not user.password_hash:
         return None  # SSO専用ユーザーはパスワードログイン不可
-    if not verify_password(password, user.password_hash):
+    if not await verify_password_async(password, user.password_hash):
         return None
     if not user.is_active:
         return None
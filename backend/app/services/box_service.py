@@ -1,7 +1,5 @@
 import logging
-import os
 from dataclasses import dataclass
-from datetime import datetime, timezone
 
 from box_sdk_gen import BoxClient, BoxJWTAuth, JWTConfig
 from box_sdk_gen.schemas.file_full import FileFull
@@ -9,9 +7,8 @@ from box_sdk_gen.schemas.folder_mini import FolderMini
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
-from app.models.document import Document, DocumentChunk
-from app.services.document_processor import document_processor
-from app.services.rag import rag_service
+from app.models.document import Document
+from app.services.ingestion import sync_document
 
 logger = logging.getLogger(__name__)
 
@@ -120,69 +117,16 @@ class BoxService:
         organization_id: str | None = None,
     ) -> Document:
         content, filename = self.download_file(file_id)
-
-        file_type = document_processor.get_file_type(filename)
-        text = document_processor.extract_text(filename, content)
-        if not text.strip():
-            raise ValueError(f"テキストを抽出できませんでした: {filename}")
-
-        # 既存ドキュメントの検索（box_file_idで重複排除）
-        existing = db.query(Document).filter(Document.box_file_id == file_id).first()
-        if existing:
-            # 旧チャンク削除
-            db.query(DocumentChunk).filter(DocumentChunk.document_id == existing.id).delete()
-            document = existing
-            document.filename = filename
-            document.file_type = file_type
-            document.is_public = is_public
-        else:
-            document = Document(
-                filename=filename,
-                file_type=file_type,
-                is_public=is_public,
-                box_file_id=file_id,
-                organization_id=organization_id,
-            )
-            db.add(document)
-            db.flush()
-
-        # 部門割当
-        if department_ids:
-            from app.models.document import Department
-            departments = db.query(Department).filter(Department.id.in_(department_ids)).all()
-            document.departments = departments
-        else:
-            document.departments = []
-
-        # 元ファイルをディスクに保存
-        if organization_id:
-            uploads_base = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "uploads")
-            upload_dir = os.path.join(uploads_base, organization_id)
-            os.makedirs(upload_dir, exist_ok=True)
-            ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else file_type
-            save_path = os.path.join(upload_dir, f"{document.id}.{ext}")
-            with open(save_path, "wb") as f:
-                f.write(content)
-            document.file_path = save_path
-
-        # チャンク分割 + エンベディング
-        chunks = rag_service.chunk_text(text)
-        embeddings = rag_service.get_embeddings(chunks)
-
-        for i, (chunk_text, embedding) in enumerate(zip(chunks, embeddings)):
-            db.add(DocumentChunk(
-                document_id=document.id,
-                content=chunk_text,
-                embedding=embedding,
-                chunk_index=i,
-                organization_id=organization_id,
-            ))
-
-        document.box_sync_status = "synced"
-        document.box_synced_at = datetime.now(timezone.utc)
-        db.commit()
-
-        return document
+        # ハッシュ比較で未変更ならスキップ、変更時は差分チャンクのみ再埋め込み
+        return sync_document(
+            db,
+            source_file_id=file_id,
+            filename=filename,
+            content=content,
+            is_public=is_public,
+            department_ids=department_ids,
+            organization_id=organization_id,
+        )
 
     def get_file_info(self, file_id: str) -> dict:
         """BOXファイルのメタ情報を取得"""
@@ -0,0 +1,125 @@
+"""チャットの引用ドキュメント（chat_references）
+
+回答の引用はチャット完了時に正規化して保存し、履歴表示・ドキュメント別の利用状況は
+JSON（referenced_doc_ids / agentic_trace）の再パースではなく、このテーブルへのSQLで取得する。
+"""
+import json
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import exists, func
+from sqlalchemy.orm import Session
+
+from app.models.document import ChatHistory, ChatReference, Document
+
+
+def build_references(chat: ChatHistory, references: list[dict]) -> list[ChatReference]:
+    """回答の references（id / title / section / excerpt）を引用順の行に変換"""
+    return [
+        ChatReference(
+            rank=rank,
+            organization_id=chat.organization_id,
+            document_id=ref["id"],
+            title=(ref.get("title") or "")[:255],
+            section=ref.get("section") or "",
+            excerpt=ref.get("excerpt") or "",
+            created_at=chat.created_at,
+        )
+        for rank, ref in enumerate((r for r in references if r.get("id")), start=1)
+    ]
+
+
+def as_dict(ref: ChatReference) -> dict:
+    return {"id": ref.document_id, "title": ref.title or "", "section": ref.section or "", "excerpt": ref.excerpt or ""}
+
+
+def references_from_trace(chat: ChatHistory) -> list[dict]:
+    """保存済みの agentic_trace（cite_sources）と referenced_doc_ids から references を復元（バックフィル用）"""
+    try:
+        doc_ids = json.loads(chat.referenced_doc_ids or "[]")
+        trace = json.loads(chat.agentic_trace) if chat.agentic_trace else []
+    except (ValueError, TypeError):
+        return []
+    references = []
+    for step in trace if isinstance(trace, list) else []:
+        if not isinstance(step, dict) or step.get("tool") != "cite_sources":
+            continue
+        input_data = step.get("input", {})
+        if isinstance(input_data, str):
+            try:
+                input_data = json.loads(input_data)
+            except (json.JSONDecodeError, TypeError):
+                input_data = {}
+        if not isinstance(input_data, dict):
+            input_data = {}
+        for c in input_data.get("citations", []):
+            if not isinstance(c, dict):
+                continue
+            references.append({
+                "id": c.get("document_id", ""),
+                "title": c.get("filename", ""),
+                "section": c.get("section", ""),
+                "excerpt": c.get("excerpt", ""),
+            })
+        break
+    if not references:
+        references = [{"id": doc_id, "title": "", "section": "", "excerpt": ""} for doc_id in doc_ids if doc_id]
+    return references
+
+
+def backfill(db: Session, batch_size: int = 500, progress=None) -> int:
+    """chat_references の無い既存チャットに引用行を作成（バッチごとにコミット）。作成したチャット数を返す"""
+    done = 0
+    last_id = ""
+    while True:
+        chats = db.query(ChatHistory).filter(
+            ChatHistory.id > last_id,
+            ChatHistory.referenced_doc_ids.isnot(None),
+            ChatHistory.referenced_doc_ids != "[]",
+            ~exists().where(ChatReference.chat_id == ChatHistory.id),
+        ).order_by(ChatHistory.id).limit(batch_size).all()
+        if not chats:
+            return done
+        for chat in chats:
+            rows = build_references(chat, references_from_trace(chat))
+            for row in rows:
+                row.chat_id = chat.id
+            if rows:
+                db.add_all(rows)
+                done += 1
+        db.commit()
+        last_id = chats[-1].id
+        if progress:
+            progress(done)
+
+
+def document_usage(
+    db: Session, organization_id: str, since: datetime, document_id: Optional[str] = None, limit: int = 50,
+) -> list[dict]:
+    """期間内の引用回数・引用したチャット数・最終引用日時（ドキュメント別、引用回数の多い順）"""
+    references = func.count().label("references")
+    chats = func.count(func.distinct(ChatReference.chat_id)).label("chats")
+    last_referenced = func.max(ChatReference.created_at).label("last_referenced")
+    query = db.query(
+        ChatReference.document_id, Document.filename, references, chats, last_referenced,
+    ).outerjoin(
+        Document, Document.id == ChatReference.document_id,
+    ).filter(
+        ChatReference.organization_id == organization_id,
+        ChatReference.created_at >= since,
+    )
+    if document_id:
+        query = query.filter(ChatReference.document_id == document_id)
+    rows = query.group_by(ChatReference.document_id, Document.filename).order_by(
+        references.desc(), ChatReference.document_id,
+    ).limit(limit).all()
+    return [
+        {
+            "id": row.document_id,
+            "filename": row.filename or "不明",
+            "referenceCount": row.references,
+            "chatCount": row.chats,
+            "lastReferencedAt": row.last_referenced.isoformat() if row.last_referenced else None,
+        }
+        for row in rows
+    ]
@@ -0,0 +1,88 @@
+"""document_chunks の一括書き込み
+
+PostgreSQL（psycopg2）ではバイナリ形式の COPY で送り、ベクトルを文字列化せずに pgvector の
+バイナリ表現（次元数・予約領域・float4配列）で渡す。セッションの接続を使うため同じトランザクション内で
+書き込まれ、ロールバックも通常どおり効く。その他のDB（テストのSQLite等）は executemany で挿入する。
+"""
+import io
+import struct
+import sys
+import uuid
+from array import array
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.models.document import DocumentChunk
+
+COPY_COLUMNS = ("id", "document_id", "organization_id", "content", "content_hash", "chunk_index", "embedding")
+
+_COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+_COPY_TRAILER = struct.pack("!h", -1)
+_NULL = struct.pack("!i", -1)
+_FIELD_COUNT = struct.pack("!h", len(COPY_COLUMNS))
+
+
+def _text_field(value: str | None) -> bytes:
+    if value is None:
+        return _NULL
+    data = value.encode("utf-8")
+    return struct.pack("!i", len(data)) + data
+
+
+def _vector_field(values) -> bytes:
+    if values is None:
+        return _NULL
+    floats = array("f", values)
+    if sys.byteorder == "little":
+        floats.byteswap()
+    return struct.pack("!ihh", 4 + 4 * len(floats), len(floats), 0) + floats.tobytes()
+
+
+def encode_copy_binary(rows: list[dict]) -> bytes:
+    """COPY ... FROM STDIN WITH (FORMAT binary) 用のペイロード"""
+    buf = io.BytesIO()
+    buf.write(_COPY_HEADER)
+    for row in rows:
+        buf.write(_FIELD_COUNT)
+        buf.write(_text_field(row["id"]))
+        buf.write(_text_field(row["document_id"]))
+        buf.write(_text_field(row["organization_id"]))
+        buf.write(_text_field(row["content"]))
+        buf.write(_text_field(row.get("content_hash")))
+        buf.write(struct.pack("!ii", 4, row["chunk_index"]))
+        buf.write(_vector_field(row.get("embedding")))
+    buf.write(_COPY_TRAILER)
+    return buf.getvalue()
+
+
+def _copy_rows(db: Session, rows: list[dict]) -> None:
+    payload = io.BytesIO(encode_copy_binary(rows))
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY document_chunks ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT binary)", payload
+        )
+    finally:
+        cursor.close()
+
+
+def write_chunks(db: Session, rows: list[dict], method: str | None = None) -> int:
+    """
+    チャンク行（COPY_COLUMNSのキーを持つdict。idは省略可）を一括挿入する。
+    method: "copy" / "executemany"。Noneならドライバに応じて選ぶ
+    """
+    if not rows:
+        return 0
+    for row in rows:
+        row.setdefault("id", str(uuid.uuid4()))
+    # 親ドキュメント等の保留中の変更を先に送る（外部キー）
+    db.flush()
+    if method is None:
+        dialect = db.get_bind().dialect
+        method = "copy" if (dialect.name, dialect.driver) == ("postgresql", "psycopg2") else "executemany"
+    if method == "copy":
+        _copy_rows(db, rows)
+    else:
+        db.execute(insert(DocumentChunk), rows)
+    return len(rows)
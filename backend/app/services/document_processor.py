@@ -1,8 +1,11 @@
 import base64
+import hashlib
 import logging
+import os
 import tempfile
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from typing import Callable, Optional
 
 import csv
 import io
@@ -14,9 +17,17 @@ import fitz
 import openpyxl
 
 from app.core.config import settings
+from app.services.extraction_cache import page_cache_key, page_extraction_cache
+from app.services.llm_governor import Priority, estimate_tokens, llm_governor
+from app.services.pdf_render import iter_rendered_pages
 
 logger = logging.getLogger(__name__)
 
+# 進捗通知 (処理済み単位数, 全体数)。PDFはページ、Excelはシート分割単位
+ProgressCallback = Callable[[int, int], None]
+
+CLAUDE_MODEL = "claude-sonnet-4-20250514"
+
 # --- PDF prompts ---
 
 PAGE_EXTRACTION_PROMPT = (
@@ -29,6 +40,10 @@ PAGE_EXTRACTION_PROMPT = (
     "- テキストは原文のまま忠実に抽出する\n"
     "- 余計な説明や前置きは不要。抽出結果のみを返す"
 )
+# モデルかプロンプトを変えるとページ抽出キャッシュのキーが変わり、再抽出される
+PAGE_EXTRACTION_PROMPT_VERSION = hashlib.sha256(
+    f"{CLAUDE_MODEL}\n{PAGE_EXTRACTION_PROMPT}".encode("utf-8")
+).hexdigest()[:16]
 
 DOCUMENT_EXTRACTION_PROMPT = (
     "このドキュメントの内容を構造化Markdownとして抽出してください。\n"
@@ -78,9 +93,7 @@ _FILE_TYPE_MAP = {
 # LibreOffice PDF変換で処理する拡張子
 _LIBREOFFICE_EXTENSIONS = {".pptx", ".ppt", ".key"}
 
-# PDF thresholds
-TEXT_RICH_CHAR_THRESHOLD = 500
-TEXT_RICH_IMAGE_LIMIT = 2
+# PDF thresholds（ページ分類の閾値は pdf_render を参照）
 MAX_WORKERS = 5
 
 # Excel thresholds
@@ -95,153 +108,91 @@ class DocumentProcessor:
     @property
     def client(self) -> anthropic.Anthropic:
         if self._client is None:
-            self._client = anthropic.Anthropic(api_key=settings.anthropic_api_key)
+            # 再試行は llm_governor が行う
+            self._client = anthropic.Anthropic(api_key=settings.anthropic_api_key, max_retries=0)
         return self._client
 
     # ================================================================
     # Common: Claude text formatting
     # ================================================================
 
-    def _call_claude_text(self, text: str, prompt: str) -> str:
-        message = self.client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=4096,
-            messages=[{
-                "role": "user",
-                "content": f"{prompt}\n\n{text}",
-            }],
+    def _create_message(self, messages: list[dict], max_tokens: int) -> str:
+        """取り込み優先度でガバナー経由で呼び出す（チャットに実行枠を譲る）"""
+        message = llm_governor.call(
+            lambda: self.client.messages.create(model=CLAUDE_MODEL, max_tokens=max_tokens, messages=messages),
+            model=CLAUDE_MODEL,
+            priority=Priority.INGESTION,
+            estimate=estimate_tokens(messages, max_tokens=max_tokens),
         )
         return message.content[0].text
 
+    def _call_claude_text(self, text: str, prompt: str) -> str:
+        return self._create_message([{
+            "role": "user",
+            "content": f"{prompt}\n\n{text}",
+        }], max_tokens=4096)
+
     # ================================================================
     # PDF extraction
     # ================================================================
 
     def _call_claude_document(self, file_content: bytes, media_type: str) -> str:
         encoded = base64.standard_b64encode(file_content).decode("utf-8")
-        message = self.client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=8192,
-            messages=[{
-                "role": "user",
-                "content": [
-                    {
-                        "type": "document",
-                        "source": {
-                            "type": "base64",
-                            "media_type": media_type,
-                            "data": encoded,
-                        },
-                    },
-                    {
-                        "type": "text",
-                        "text": DOCUMENT_EXTRACTION_PROMPT,
+        return self._create_message([{
+            "role": "user",
+            "content": [
+                {
+                    "type": "document",
+                    "source": {
+                        "type": "base64",
+                        "media_type": media_type,
+                        "data": encoded,
                     },
-                ],
-            }],
-        )
-        return message.content[0].text
+                },
+                {
+                    "type": "text",
+                    "text": DOCUMENT_EXTRACTION_PROMPT,
+                },
+            ],
+        }], max_tokens=8192)
 
     def _call_claude_vision(
         self, image_data: bytes, page_num: int, media_type: str = "image/png"
     ) -> str:
         encoded = base64.standard_b64encode(image_data).decode("utf-8")
-        message = self.client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=4096,
-            messages=[{
-                "role": "user",
-                "content": [
-                    {
-                        "type": "image",
-                        "source": {
-                            "type": "base64",
-                            "media_type": media_type,
-                            "data": encoded,
-                        },
-                    },
-                    {
-                        "type": "text",
-                        "text": PAGE_EXTRACTION_PROMPT,
+        return self._create_message([{
+            "role": "user",
+            "content": [
+                {
+                    "type": "image",
+                    "source": {
+                        "type": "base64",
+                        "media_type": media_type,
+                        "data": encoded,
                     },
-                ],
-            }],
-        )
-        return message.content[0].text
+                },
+                {
+                    "type": "text",
+                    "text": PAGE_EXTRACTION_PROMPT,
+                },
+            ],
+        }], max_tokens=4096)
+
+    def extract_text_from_pdf(self, file_content: bytes, progress: Optional[ProgressCallback] = None) -> str:
+        # ワーカープロセスが開けるよう一時ファイルに書き出す
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+            tmp.write(file_content)
+            pdf_path = tmp.name
+        try:
+            return self.extract_text_from_pdf_path(pdf_path, progress)
+        finally:
+            Path(pdf_path).unlink(missing_ok=True)
 
-    def _classify_page(self, page: fitz.Page) -> str:
-        text = page.get_text("text").strip()
-        image_count = len(page.get_images(full=True))
-        if len(text) >= TEXT_RICH_CHAR_THRESHOLD and image_count <= TEXT_RICH_IMAGE_LIMIT:
-            return "text"
-        return "vision"
-
-    def _render_page_to_image(self, page: fitz.Page) -> tuple[bytes, str]:
-        max_bytes = 3_700_000  # ~5MB after base64 encoding (×4/3)
-        for dpi in (300, 200, 150):
-            mat = fitz.Matrix(dpi / 72, dpi / 72)
-            pix = page.get_pixmap(matrix=mat)
-            data = pix.tobytes("png")
-            if len(data) <= max_bytes:
-                return data, "image/png"
-            logger.debug("Page PNG at %d DPI = %d KB, reducing", dpi, len(data) // 1024)
-        import io
-        from PIL import Image
-        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        buf = io.BytesIO()
-        img.save(buf, format="JPEG", quality=85)
-        data = buf.getvalue()
-        if len(data) <= max_bytes:
-            return data, "image/jpeg"
-        buf = io.BytesIO()
-        img.save(buf, format="JPEG", quality=60)
-        return buf.getvalue(), "image/jpeg"
-
-    def extract_text_from_pdf(self, file_content: bytes) -> str:
-        doc = fitz.open(stream=file_content, filetype="pdf")
-        page_count = len(doc)
+    def extract_text_from_pdf_path(self, pdf_path: str, progress: Optional[ProgressCallback] = None) -> str:
+        with fitz.open(pdf_path) as doc:
+            page_count = len(doc)
         logger.info("PDF extraction: %d pages, page-by-page hybrid mode", page_count)
-
-        text_pages = []
-        vision_pages = []
-        for i in range(page_count):
-            if self._classify_page(doc[i]) == "text":
-                text_pages.append(i)
-            else:
-                vision_pages.append(i)
-
-        logger.info(
-            "Classification: %d text-rich (PyMuPDF), %d visual (Claude Vision)",
-            len(text_pages), len(vision_pages),
-        )
-
-        results: dict[int, str] = {}
-
-        for i in text_pages:
-            results[i] = doc[i].get_text("text").strip()
-
-        if vision_pages:
-            page_images: list[tuple[int, bytes, str]] = []
-            for i in vision_pages:
-                img_data, media_type = self._render_page_to_image(doc[i])
-                page_images.append((i, img_data, media_type))
-
-            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-                futures = {
-                    executor.submit(self._call_claude_vision, img_data, idx + 1, mt): idx
-                    for idx, img_data, mt in page_images
-                }
-                for future in as_completed(futures):
-                    idx = futures[future]
-                    try:
-                        text = future.result()
-                        results[idx] = text
-                        logger.info("Page %d: Vision extraction complete", idx + 1)
-                    except Exception:
-                        logger.exception("Page %d: Vision extraction failed", idx + 1)
-                        results[idx] = doc[idx].get_text("text").strip()
-
-        doc.close()
+        results = self._extract_pdf_pages(pdf_path, page_count, progress)
 
         parts = []
         for i in range(page_count):
@@ -251,6 +202,72 @@ class DocumentProcessor:
 
         return "\n\n".join(parts)
 
+    def _extract_pdf_pages(
+        self, pdf_path: str, page_count: int, progress: Optional[ProgressCallback],
+    ) -> dict[int, str]:
+        """分類・画像化をプロセスプールで行い、画像化できたページから順にVisionへ送る"""
+        results: dict[int, str] = {}
+        fallback: dict[int, str] = {}
+        keys: dict[int, str] = {}
+        cache_hits = 0
+        render_seconds = 0.0
+
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            futures = {}
+            for batch in iter_rendered_pages(pdf_path, page_count, settings.pdf_render_workers):
+                vision = [page for page in batch if page.kind == "vision"]
+                for page in batch:
+                    render_seconds += page.seconds
+                    if page.kind == "text":
+                        results[page.index] = page.text
+                    else:
+                        logger.debug(
+                            "Page %d: rendered %s at %d DPI, %d KB, %d encodes, %.2fs",
+                            page.index + 1, page.media_type, page.dpi,
+                            len(page.image) // 1024, page.encodes, page.seconds,
+                        )
+                # 同一画像のページは過去の抽出結果を再利用し、変更ページのみVisionに送る
+                for page in vision:
+                    keys[page.index] = page_cache_key(page.image, PAGE_EXTRACTION_PROMPT_VERSION)
+                    fallback[page.index] = page.text
+                cached = page_extraction_cache.get_many([keys[page.index] for page in vision])
+                for page in vision:
+                    if keys[page.index] in cached:
+                        results[page.index] = cached[keys[page.index]]
+                        cache_hits += 1
+                    else:
+                        future = executor.submit(
+                            self._call_claude_vision, page.image, page.index + 1, page.media_type,
+                        )
+                        futures[future] = page.index
+                if progress:
+                    progress(len(results), page_count)
+
+            logger.info(
+                "Classification: %d text-rich (PyMuPDF), %d visual (Claude Vision), render CPU %.1fs",
+                page_count - len(keys), len(keys), render_seconds,
+            )
+            logger.info(
+                "Page extraction cache: %d hit, %d miss (%d vision pages)",
+                cache_hits, len(futures), len(keys),
+            )
+
+            for future in as_completed(futures):
+                idx = futures[future]
+                try:
+                    text = future.result()
+                    results[idx] = text
+                    # フォールバック（PyMuPDFテキスト）はキャッシュしない
+                    page_extraction_cache.put(keys[idx], PAGE_EXTRACTION_PROMPT_VERSION, text)
+                    logger.info("Page %d: Vision extraction complete", idx + 1)
+                except Exception:
+                    logger.exception("Page %d: Vision extraction failed", idx + 1)
+                    results[idx] = fallback[idx]
+                if progress:
+                    progress(len(results), page_count)
+
+        return results
+
     # ================================================================
     # Excel extraction: openpyxl → Claude formatting
     # ================================================================
@@ -281,109 +298,102 @@ class DocumentProcessor:
             header += f" ({chunk_info})"
         return self._call_claude_text(f"{header}\n{tsv_text}", EXCEL_FORMAT_PROMPT)
 
-    def extract_text_from_excel(self, file_content: bytes, filename: str) -> str:
-        ext = Path(filename).suffix.lower()
-
-        # Save to temp file for openpyxl
-        with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as tmp:
-            tmp.write(file_content)
-            tmp_path = tmp.name
+    def extract_text_from_excel(
+        self, path: str, filename: str, progress: Optional[ProgressCallback] = None
+    ) -> str:
+        is_large = os.path.getsize(path) > EXCEL_LARGE_FILE_MB * 1024 * 1024
 
-        try:
-            is_large = len(file_content) > EXCEL_LARGE_FILE_MB * 1024 * 1024
+        if is_large:
+            wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        else:
+            wb = openpyxl.load_workbook(path, data_only=True)
+            # Unmerge cells (only possible in non-read_only mode)
+            for ws in wb.worksheets:
+                for cell_range in list(ws.merged_cells.ranges):
+                    ws.unmerge_cells(str(cell_range))
+
+        sheet_names = wb.sheetnames
+        logger.info("Excel extraction: %s (%d sheets, %s)",
+                    filename, len(sheet_names),
+                    "read_only" if is_large else "standard")
+
+        # Build table of contents
+        toc_lines = ["このExcelファイルには以下のシートが含まれています:"]
+
+        # Extract each sheet
+        sheet_results: dict[int, str] = {}
+        sheet_tasks: list[tuple[int, str, str, str]] = []  # (idx, name, tsv, chunk_info)
+
+        for idx, name in enumerate(sheet_names):
+            ws = wb[name]
+            tsv_text, row_count = self._sheet_to_tsv(ws)
+            toc_lines.append(f"- {name} ({row_count}行)")
+
+            if not tsv_text.strip():
+                continue
 
-            if is_large:
-                wb = openpyxl.load_workbook(tmp_path, read_only=True, data_only=True)
+            if row_count <= EXCEL_CHUNK_ROWS:
+                # Small sheet: single Claude call
+                sheet_tasks.append((idx, name, tsv_text, ""))
             else:
-                wb = openpyxl.load_workbook(tmp_path, data_only=True)
-                # Unmerge cells (only possible in non-read_only mode)
-                for ws in wb.worksheets:
-                    for cell_range in list(ws.merged_cells.ranges):
-                        ws.unmerge_cells(str(cell_range))
-
-            sheet_names = wb.sheetnames
-            logger.info("Excel extraction: %s (%d sheets, %s)",
-                        filename, len(sheet_names),
-                        "read_only" if is_large else "standard")
-
-            # Build table of contents
-            toc_lines = ["このExcelファイルには以下のシートが含まれています:"]
-
-            # Extract each sheet
-            sheet_results: dict[int, str] = {}
-            sheet_tasks: list[tuple[int, str, str, str]] = []  # (idx, name, tsv, chunk_info)
-
-            for idx, name in enumerate(sheet_names):
-                ws = wb[name]
-                tsv_text, row_count = self._sheet_to_tsv(ws)
-                toc_lines.append(f"- {name} ({row_count}行)")
-
-                if not tsv_text.strip():
-                    continue
-
-                if row_count <= EXCEL_CHUNK_ROWS:
-                    # Small sheet: single Claude call
-                    sheet_tasks.append((idx, name, tsv_text, ""))
-                else:
-                    # Large sheet: split into chunks with header row
-                    rows = tsv_text.split("\n")
-                    header_row = rows[0]
-                    data_rows = rows[1:]
-                    chunk_num = 0
-                    for start in range(0, len(data_rows), EXCEL_CHUNK_ROWS):
-                        chunk_rows = data_rows[start:start + EXCEL_CHUNK_ROWS]
-                        chunk_tsv = header_row + "\n" + "\n".join(chunk_rows)
-                        chunk_num += 1
-                        info = f"Part {chunk_num}, 行{start + 2}-{start + 1 + len(chunk_rows)}"
-                        sheet_tasks.append((idx, name, chunk_tsv, info))
-
-            wb.close()
-
-            logger.info("Excel: %d sheets → %d Claude calls", len(sheet_names), len(sheet_tasks))
-
-            # Process all sheet tasks in parallel
-            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-                futures = {
-                    executor.submit(
-                        self._format_excel_chunk, tsv, name, info
-                    ): (idx, name, info)
-                    for idx, name, tsv, info in sheet_tasks
-                }
-                for future in as_completed(futures):
-                    idx, name, info = futures[future]
-                    key = (idx, info)
-                    try:
-                        result = future.result()
-                        sheet_results[key] = result
-                        logger.info("Sheet '%s' %s: formatted", name, info)
-                    except Exception:
-                        logger.exception("Sheet '%s' %s: formatting failed", name, info)
-                        # Fallback: use raw TSV
-                        for task_idx, task_name, task_tsv, task_info in sheet_tasks:
-                            if task_idx == idx and task_info == info:
-                                sheet_results[key] = task_tsv
-                                break
-
-            # Assemble in order
-            parts = ["\n".join(toc_lines)]
-            for idx, name, tsv, info in sheet_tasks:
+                # Large sheet: split into chunks with header row
+                rows = tsv_text.split("\n")
+                header_row = rows[0]
+                data_rows = rows[1:]
+                chunk_num = 0
+                for start in range(0, len(data_rows), EXCEL_CHUNK_ROWS):
+                    chunk_rows = data_rows[start:start + EXCEL_CHUNK_ROWS]
+                    chunk_tsv = header_row + "\n" + "\n".join(chunk_rows)
+                    chunk_num += 1
+                    info = f"Part {chunk_num}, 行{start + 2}-{start + 1 + len(chunk_rows)}"
+                    sheet_tasks.append((idx, name, chunk_tsv, info))
+
+        wb.close()
+
+        logger.info("Excel: %d sheets → %d Claude calls", len(sheet_names), len(sheet_tasks))
+
+        # Process all sheet tasks in parallel
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            futures = {
+                executor.submit(
+                    self._format_excel_chunk, tsv, name, info
+                ): (idx, name, info)
+                for idx, name, tsv, info in sheet_tasks
+            }
+            for future in as_completed(futures):
+                idx, name, info = futures[future]
                 key = (idx, info)
-                text = sheet_results.get(key, "")
-                if text:
-                    parts.append(f"<!-- sheet: {name} -->\n{text}")
-
-            return "\n\n".join(parts)
+                try:
+                    result = future.result()
+                    sheet_results[key] = result
+                    logger.info("Sheet '%s' %s: formatted", name, info)
+                except Exception:
+                    logger.exception("Sheet '%s' %s: formatting failed", name, info)
+                    # Fallback: use raw TSV
+                    for task_idx, task_name, task_tsv, task_info in sheet_tasks:
+                        if task_idx == idx and task_info == info:
+                            sheet_results[key] = task_tsv
+                            break
+                if progress:
+                    progress(len(sheet_results), len(sheet_tasks))
+
+        # Assemble in order
+        parts = ["\n".join(toc_lines)]
+        for idx, name, tsv, info in sheet_tasks:
+            key = (idx, info)
+            text = sheet_results.get(key, "")
+            if text:
+                parts.append(f"<!-- sheet: {name} -->\n{text}")
 
-        finally:
-            Path(tmp_path).unlink(missing_ok=True)
+        return "\n\n".join(parts)
 
     # ================================================================
     # Other formats
     # ================================================================
 
     @staticmethod
-    def extract_text_from_docx(file_content: bytes) -> str:
-        doc = docx.Document(io.BytesIO(file_content))
+    def extract_text_from_docx(path: str) -> str:
+        doc = docx.Document(path)
         parts: list[str] = []
         for para in doc.paragraphs:
             text = para.text.strip()
@@ -409,27 +419,27 @@ class DocumentProcessor:
                 parts.append(f"\n{header}\n{separator}\n{body}")
         return "\n\n".join(parts)
 
-    def _convert_to_pdf_via_libreoffice(self, file_content: bytes, suffix: str) -> bytes:
+    def _convert_to_pdf_via_libreoffice(self, path: str, out_dir: str) -> Path:
         """LibreOfficeでPDFに変換し、既存PDFパイプラインで処理"""
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            src = Path(tmp_dir) / f"input{suffix}"
-            src.write_bytes(file_content)
-            result = subprocess.run(
-                ["soffice", "--headless", "--convert-to", "pdf", "--outdir", tmp_dir, str(src)],
-                capture_output=True, timeout=120,
-            )
-            if result.returncode != 0:
-                raise RuntimeError(f"LibreOffice conversion failed: {result.stderr.decode()}")
-            pdf_path = src.with_suffix(".pdf")
-            if not pdf_path.exists():
-                raise RuntimeError("LibreOffice did not produce a PDF")
-            return pdf_path.read_bytes()
-
-    def extract_text_via_pdf_conversion(self, file_content: bytes, suffix: str) -> str:
+        result = subprocess.run(
+            ["soffice", "--headless", "--convert-to", "pdf", "--outdir", out_dir, path],
+            capture_output=True, timeout=120,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"LibreOffice conversion failed: {result.stderr.decode()}")
+        pdf_path = Path(out_dir) / f"{Path(path).stem}.pdf"
+        if not pdf_path.exists():
+            raise RuntimeError("LibreOffice did not produce a PDF")
+        return pdf_path
+
+    def extract_text_via_pdf_conversion(
+        self, path: str, progress: Optional[ProgressCallback] = None
+    ) -> str:
         """LibreOfficeでPDF変換 → 既存PDFパイプライン（PyMuPDF + Claude Vision）で抽出"""
-        logger.info("Converting %s to PDF via LibreOffice for visual extraction", suffix)
-        pdf_bytes = self._convert_to_pdf_via_libreoffice(file_content, suffix)
-        return self.extract_text_from_pdf(pdf_bytes)
+        logger.info("Converting %s to PDF via LibreOffice for visual extraction", Path(path).suffix)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pdf_path = self._convert_to_pdf_via_libreoffice(path, tmp_dir)
+            return self.extract_text_from_pdf_path(str(pdf_path), progress)
 
     @staticmethod
     def extract_text_from_csv(file_content: bytes) -> str:
@@ -459,23 +469,41 @@ class DocumentProcessor:
         # BOM付きUTF-8にも対応
         return file_content.decode("utf-8-sig")
 
-    def extract_text(self, filename: str, file_content: bytes) -> str:
+    def extract_text(
+        self, filename: str, file_content: bytes, progress: Optional[ProgressCallback] = None
+    ) -> str:
+        """メモリ上の内容から抽出（一時ファイル経由で extract_text_from_file に委譲）"""
+        with tempfile.NamedTemporaryFile(suffix=Path(filename).suffix.lower(), delete=False) as tmp:
+            tmp.write(file_content)
+            tmp_path = tmp.name
+        try:
+            return self.extract_text_from_file(filename, tmp_path, progress)
+        finally:
+            Path(tmp_path).unlink(missing_ok=True)
+
+    def extract_text_from_file(
+        self, filename: str, path: str, progress: Optional[ProgressCallback] = None
+    ) -> str:
+        """
+        保存済みファイルをパスで開いて抽出する。PDF・Excel・LibreOffice変換はファイルを直接読むため、
+        ファイル全体をメモリに載せない（テキスト系の形式のみ読み込む）
+        """
         ext = Path(filename).suffix.lower()
         # PPTX/KEY等 → LibreOfficeでPDF変換 → Claude Visionパイプライン
         if ext in _LIBREOFFICE_EXTENSIONS:
-            return self.extract_text_via_pdf_conversion(file_content, ext)
+            return self.extract_text_via_pdf_conversion(path, progress)
         elif ext == ".pdf":
-            return self.extract_text_from_pdf(file_content)
+            return self.extract_text_from_pdf_path(path, progress)
         elif ext in (".docx", ".doc"):
-            return self.extract_text_from_docx(file_content)
+            return self.extract_text_from_docx(path)
         elif ext in (".xlsx", ".xls"):
-            return self.extract_text_from_excel(file_content, filename)
+            return self.extract_text_from_excel(path, filename, progress)
         elif ext == ".csv":
-            return self.extract_text_from_csv(file_content)
+            return self.extract_text_from_csv(Path(path).read_bytes())
         elif ext in (".html", ".htm"):
-            return self.extract_text_from_html(file_content)
+            return self.extract_text_from_html(Path(path).read_bytes())
         elif ext in (".txt", ".md", ".json"):
-            return self.extract_text_from_txt(file_content)
+            return self.extract_text_from_txt(Path(path).read_bytes())
         else:
             raise ValueError(f"Unsupported file type: {ext}")
 
@@ -0,0 +1,186 @@
+"""クエリEmbeddingキャッシュ
+
+同じ質問（表記ゆれ含む）に対する OpenAI embed_query の往復を省略する。
+- L1: プロセス内LRU（TTL付き）
+- L2: Postgres永続キャッシュ（任意。embedding_cacheテーブル）
+キーは「モデル名 + 正規化テキスト」のSHA-256。
+"""
+import hashlib
+import logging
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Protocol
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.cache import EmbeddingCacheEntry
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text: str) -> str:
+    """全角/半角・空白・英字の大小を揃える"""
+    normalized = unicodedata.normalize("NFKC", text)
+    return " ".join(normalized.split()).lower()
+
+
+def make_cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\n{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore(Protocol):
+    def get(self, key: str) -> list[float] | None: ...
+
+    def set(self, key: str, model: str, embedding: list[float]) -> None: ...
+
+
+class MemoryEmbeddingStore:
+    """スレッドセーフなLRU + TTL"""
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[float, list[float]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> list[float] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, embedding = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return embedding
+
+    def set(self, key: str, model: str, embedding: list[float]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class PostgresEmbeddingStore:
+    """embedding_cacheテーブルを使う永続キャッシュ（プロセス・再起動をまたいで共有）"""
+
+    def __init__(self, ttl_days: int):
+        self.ttl_days = ttl_days
+
+    def get(self, key: str) -> list[float] | None:
+        since = datetime.now(timezone.utc) - timedelta(days=self.ttl_days)
+        db = SessionLocal()
+        try:
+            row = db.query(EmbeddingCacheEntry.embedding).filter(
+                EmbeddingCacheEntry.cache_key == key,
+                EmbeddingCacheEntry.created_at >= since,
+            ).first()
+            if row is None:
+                return None
+            return [float(v) for v in row.embedding]
+        finally:
+            db.close()
+
+    def set(self, key: str, model: str, embedding: list[float]) -> None:
+        db = SessionLocal()
+        try:
+            stmt = pg_insert(EmbeddingCacheEntry).values(
+                cache_key=key,
+                model=model,
+                embedding=embedding,
+            ).on_conflict_do_update(
+                index_elements=[EmbeddingCacheEntry.cache_key],
+                set_={"embedding": embedding, "created_at": datetime.now(timezone.utc)},
+            )
+            db.execute(stmt)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+class EmbeddingCache:
+    def __init__(self, memory: EmbeddingStore | None, persistent: EmbeddingStore | None = None):
+        self.memory = memory
+        self.persistent = persistent
+        self._counters = {"memory_hits": 0, "persistent_hits": 0, "misses": 0, "errors": 0}
+        self._lock = threading.Lock()
+
+    def _incr(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def lookup(self, model: str, text: str) -> tuple[str, list[float] | None]:
+        """(キー, キャッシュ済みベクトル or None) を返す。ヒット/ミスを計上する"""
+        key = make_cache_key(model, text)
+        if self.memory is not None:
+            embedding = self.memory.get(key)
+            if embedding is not None:
+                self._incr("memory_hits")
+                return key, embedding
+        if self.persistent is not None:
+            try:
+                embedding = self.persistent.get(key)
+            except Exception as e:
+                logger.warning("Embedding cache (persistent) lookup failed: %s", e)
+                self._incr("errors")
+                embedding = None
+            if embedding is not None:
+                self._incr("persistent_hits")
+                if self.memory is not None:
+                    self.memory.set(key, model, embedding)
+                return key, embedding
+        self._incr("misses")
+        return key, None
+
+    def store(self, key: str, model: str, embedding: list[float]) -> None:
+        if self.memory is not None:
+            self.memory.set(key, model, embedding)
+        if self.persistent is not None:
+            try:
+                self.persistent.set(key, model, embedding)
+            except Exception as e:
+                logger.warning("Embedding cache (persistent) store failed: %s", e)
+                self._incr("errors")
+
+    def get_or_compute(self, model: str, text: str, compute: Callable[[str], list[float]]) -> list[float]:
+        key, embedding = self.lookup(model, text)
+        if embedding is not None:
+            return embedding
+        embedding = compute(text)
+        self.store(key, model, embedding)
+        return embedding
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+        stats["memory_entries"] = len(self.memory) if isinstance(self.memory, MemoryEmbeddingStore) else 0
+        return stats
+
+
+def build_embedding_cache() -> EmbeddingCache:
+    if not settings.embedding_cache_enabled:
+        return EmbeddingCache(memory=None, persistent=None)
+    memory = MemoryEmbeddingStore(
+        max_entries=settings.embedding_cache_max_entries,
+        ttl_seconds=settings.embedding_cache_ttl_seconds,
+    )
+    persistent = None
+    if settings.embedding_cache_persistent:
+        persistent = PostgresEmbeddingStore(ttl_days=settings.embedding_cache_persistent_ttl_days)
+    return EmbeddingCache(memory=memory, persistent=persistent)
+
+
+embedding_cache = build_embedding_cache()
@@ -0,0 +1,156 @@
+"""取り込み時のチャンク一括埋め込み
+
+トークン数で区切ったバッチを上限付きで並列に埋め込み、完了したバッチから順に返す。
+失敗したバッチだけを再試行し（400はバッチを半分に分けて再送）、
+実行中のバッチ数を並列数に抑えることで文書の大きさによらずメモリを一定に保つ。
+"""
+import logging
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterator, Optional
+
+import openai
+
+logger = logging.getLogger(__name__)
+
+EmbedFn = Callable[[list[str]], list[list[float]]]
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+class EmbeddingError(Exception):
+    """再試行しても埋め込めなかったバッチ"""
+
+
+def count_tokens(text: str) -> int:
+    """cl100k_base のトークン数。tiktoken の辞書が取得できない環境では文字数で上限見積もり"""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception as e:
+                    logger.warning("tiktoken unavailable, estimating tokens from length: %s", e)
+                _encoding_loaded = True
+    if _encoding is None:
+        return len(text)
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def token_batches(texts: list[str], max_tokens: int, max_items: int) -> list[list[int]]:
+    """テキストのインデックスを、合計トークン数・件数の上限を超えないバッチに分ける"""
+    batches: list[list[int]] = []
+    current: list[int] = []
+    current_tokens = 0
+    for i, text in enumerate(texts):
+        tokens = count_tokens(text)
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_items):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, openai.APIConnectionError):
+        return True
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code in (408, 409, 429) or exc.status_code >= 500
+    return False
+
+
+def _retry_after_seconds(exc: Exception) -> Optional[float]:
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    try:
+        if headers and headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+class EmbeddingPipeline:
+    def __init__(
+        self,
+        embed_fn: EmbedFn,
+        max_tokens: int,
+        max_items: int,
+        concurrency: int,
+        max_retries: int,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+    ):
+        self.embed_fn = embed_fn
+        self.max_tokens = max_tokens
+        self.max_items = max_items
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def _embed_with_retry(self, texts: list[str]) -> list[list[float]]:
+        attempt = 0
+        while True:
+            try:
+                vectors = self.embed_fn(texts)
+                if len(vectors) != len(texts):
+                    raise EmbeddingError(f"expected {len(texts)} embeddings, got {len(vectors)}")
+                return vectors
+            except openai.BadRequestError:
+                # 入力起因（トークン超過など）はバッチを分けて問題のテキストを切り分ける
+                if len(texts) == 1:
+                    raise
+                mid = len(texts) // 2
+                return self._embed_with_retry(texts[:mid]) + self._embed_with_retry(texts[mid:])
+            except Exception as e:
+                if not _is_retryable(e) or attempt >= self.max_retries:
+                    raise EmbeddingError(f"embedding batch of {len(texts)} failed: {e}") from e
+                backoff = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+                delay = _retry_after_seconds(e) or backoff / 2 + random.uniform(0, backoff / 2)
+                logger.warning(
+                    "Embedding batch of %d failed (%s, attempt %d/%d), retrying in %.1fs",
+                    len(texts), type(e).__name__, attempt + 1, self.max_retries, delay,
+                )
+                time.sleep(delay)
+                attempt += 1
+
+    def iter_batches(self, texts: list[str]) -> Iterator[tuple[list[int], list[list[float]]]]:
+        """(texts 内のインデックス, ベクトル) を完了したバッチから順に返す（順序は保証しない）"""
+        batches = iter(token_batches(texts, self.max_tokens, self.max_items))
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed") as executor:
+            pending = {}
+
+            def submit_next() -> None:
+                batch = next(batches, None)
+                if batch is not None:
+                    pending[executor.submit(self._embed_with_retry, [texts[i] for i in batch])] = batch
+
+            for _ in range(self.concurrency):
+                submit_next()
+            try:
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        batch = pending.pop(future)
+                        vectors = future.result()
+                        submit_next()
+                        yield batch, vectors
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def embed_all(self, texts: list[str]) -> list[list[float]]:
+        vectors: list[Optional[list[float]]] = [None] * len(texts)
+        for batch, batch_vectors in self.iter_batches(texts):
+            for i, vector in zip(batch, batch_vectors):
+                vectors[i] = vector
+        return vectors
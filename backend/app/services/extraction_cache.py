@@ -0,0 +1,93 @@
+"""PDFページ抽出結果（Claude Vision）のキャッシュ
+
+改訂版マニュアルは80ページ中1〜2ページしか変わらないことが多いため、
+Visionに送る画像のSHA-256 + プロンプト版をキーに抽出Markdownを永続化し、
+再アップロード・再同期では変更ページのみVision APIを呼ぶ。
+"""
+import hashlib
+import logging
+import threading
+from datetime import datetime, timezone
+
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.cache import PageExtractionCacheEntry
+
+logger = logging.getLogger(__name__)
+
+
+def page_cache_key(image_data: bytes, prompt_version: str) -> str:
+    digest = hashlib.sha256(image_data).hexdigest()
+    return hashlib.sha256(f"{prompt_version}\n{digest}".encode("utf-8")).hexdigest()
+
+
+class PageExtractionCache:
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self._counters = {"hits": 0, "misses": 0, "errors": 0}
+        self._lock = threading.Lock()
+
+    def _incr(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._counters)
+
+    def get_many(self, keys: list[str]) -> dict[str, str]:
+        """キャッシュ済みのキー → Markdown を返す（1クエリ）。失敗時は全件ミス扱い"""
+        if not self.enabled or not keys:
+            return {}
+        db = SessionLocal()
+        try:
+            rows = db.query(
+                PageExtractionCacheEntry.cache_key, PageExtractionCacheEntry.markdown
+            ).filter(PageExtractionCacheEntry.cache_key.in_(set(keys))).all()
+            found = {row.cache_key: row.markdown for row in rows}
+            if found:
+                db.execute(
+                    update(PageExtractionCacheEntry)
+                    .where(PageExtractionCacheEntry.cache_key.in_(list(found)))
+                    .values(
+                        hit_count=PageExtractionCacheEntry.hit_count + 1,
+                        last_hit_at=datetime.now(timezone.utc),
+                    )
+                )
+                db.commit()
+        except Exception as e:
+            logger.warning("Page extraction cache lookup failed: %s", e)
+            db.rollback()
+            self._incr("errors")
+            found = {}
+        finally:
+            db.close()
+        hits = sum(1 for k in keys if k in found)
+        self._incr("hits", hits)
+        self._incr("misses", len(keys) - hits)
+        return found
+
+    def put(self, key: str, prompt_version: str, markdown: str) -> None:
+        if not self.enabled or not markdown:
+            return
+        db = SessionLocal()
+        try:
+            db.execute(pg_insert(PageExtractionCacheEntry).values(
+                cache_key=key,
+                prompt_version=prompt_version,
+                markdown=markdown,
+                hit_count=0,
+            ).on_conflict_do_nothing(index_elements=[PageExtractionCacheEntry.cache_key]))
+            db.commit()
+        except Exception as e:
+            logger.warning("Page extraction cache store failed: %s", e)
+            db.rollback()
+            self._incr("errors")
+        finally:
+            db.close()
+
+
+page_extraction_cache = PageExtractionCache(enabled=settings.page_extraction_cache_enabled)
@@ -0,0 +1,777 @@
+"""ドキュメント取り込みジョブキュー
+
+アップロードはファイルをステージングしてジョブ（ingestion_jobs）を登録するだけで即時に返し、
+テキスト抽出（Claude Vision / LibreOffice）・チャンク分割・埋め込み・保存は
+バックグラウンドワーカーが行う。キューはDBにあるため再起動をまたいで処理が継続し、
+複数プロセスのワーカーは FOR UPDATE SKIP LOCKED で同じジョブを取り合わない。
+ハートビートが途絶えた実行中ジョブ（プロセス停止など）と、一時的なエラー（API障害・タイムアウト等）で
+失敗したジョブは、試行回数の上限までバックオフを空けて再キューされる。
+
+ドキュメント・チャンクにはSHA-256のcontent_hashを持たせ、再同期時は
+ファイルが同一なら処理全体をスキップし、変更時もテキストが同じチャンクの埋め込みは再利用する。
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import and_, func, or_, select, text, update
+from sqlalchemy.orm import Session, aliased
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.document import Department, Document, DocumentChunk, SystemSettings
+from app.models.ingestion import IngestionJob
+from app.services.answer_cache import answer_cache
+from app.services.chunk_writer import write_chunks
+from app.services.document_processor import document_processor
+from app.services.rag import rag_service
+from app.services.resync_window import paused_orgs
+
+logger = logging.getLogger(__name__)
+
+UPLOADS_BASE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "uploads")
+STAGING_DIRNAME = "_staging"
+TERMINAL_STATUSES = ("succeeded", "failed")
+HEARTBEAT_INTERVAL_SECONDS = 30
+RESYNC_RETRY_AFTER_SECONDS = 24 * 60 * 60
+RETRY_BACKOFF_MAX_SECONDS = 30 * 60
+CLAIM_LOCK_KEY = 7_420_115  # claim_next_job を直列化するアドバイザリロック
+
+
+class IngestionError(Exception):
+    """再試行しても結果が変わらない取り込みエラー（ユーザーに表示する）。それ以外の例外は試行上限まで再キューする"""
+
+
+def content_hash(data: bytes | str) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def _file_ext(filename: str, file_type: str) -> str:
+    return filename.rsplit(".", 1)[-1].lower() if "." in filename else file_type
+
+
+def job_to_dict(job: IngestionJob) -> dict:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "filename": job.filename,
+        "file_type": job.file_type,
+        "document_id": job.document_id,
+        "stage": job.stage,
+        "progress_current": job.progress_current or 0,
+        "progress_total": job.progress_total or 0,
+        "chunk_count": job.chunk_count or 0,
+        "error": job.error,
+        "attempts": job.attempts or 0,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+# ================================================================
+# Enqueue
+# ================================================================
+
+def file_content_hash(path: str, block_size: int = 1024 * 1024) -> str:
+    """ファイルを読み込み単位ごとにハッシュする（content_hash(bytes) と同じ値）"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def new_staging_path(organization_id: str, filename: str, file_type: str) -> str:
+    """アップロードの書き込み先（ジョブ登録前に本文をストリームで書き込む）"""
+    staging_dir = os.path.join(UPLOADS_BASE_DIR, organization_id, STAGING_DIRNAME)
+    os.makedirs(staging_dir, exist_ok=True)
+    return os.path.join(staging_dir, f"{uuid.uuid4()}.{_file_ext(filename, file_type)}")
+
+
+def _link_or_copy(src: str, dst: str) -> None:
+    """同一ファイルシステムならハードリンク（データをコピーしない）"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def _remove_file(path: Optional[str]) -> None:
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def enqueue_upload(
+    db: Session,
+    organization_id: str,
+    user_id: Optional[str],
+    filename: str,
+    file_type: str,
+    source_path: str,
+    is_public: bool = True,
+    category: str = "",
+) -> IngestionJob:
+    """ステージング済みのアップロードファイル（new_staging_path）のジョブを登録"""
+    job = IngestionJob(
+        organization_id=organization_id,
+        created_by=user_id,
+        kind="upload",
+        filename=filename,
+        file_type=file_type,
+        source_path=source_path,
+        params=json.dumps({"is_public": is_public, "category": category}, ensure_ascii=False),
+    )
+    db.add(job)
+    db.commit()
+
+    ingestion_workers.notify()
+    return job
+
+
+def enqueue_sftp_sync(
+    db: Session,
+    organization_id: str,
+    user_id: Optional[str],
+    source_file_ids: list[str],
+    is_public: Optional[bool] = True,
+    department_ids: Optional[list[str]] = None,
+    background: bool = False,
+) -> list[IngestionJob]:
+    """
+    SFTP上のファイルの同期ジョブを登録（取得・取り込みはワーカーが行う）。
+    is_public / department_ids が None の場合は既存ドキュメントの権限を維持する。
+    background: 自動再同期（アップロード・手動同期より後に処理し、実行時間帯の制限を受ける）
+    """
+    jobs = []
+    for source_file_id in source_file_ids:
+        filename = os.path.basename(source_file_id)
+        job = IngestionJob(
+            organization_id=organization_id,
+            created_by=user_id,
+            kind="sftp_sync",
+            priority=1 if background else 0,
+            filename=filename,
+            file_type=document_processor.get_file_type(filename),
+            params=json.dumps({
+                "source_file_id": source_file_id,
+                "is_public": is_public,
+                "department_ids": department_ids,
+            }, ensure_ascii=False),
+        )
+        db.add(job)
+        jobs.append(job)
+    db.commit()
+
+    ingestion_workers.notify()
+    return jobs
+
+
+def enqueue_outdated_syncs(db: Session, organization_id: str, limit: int) -> int:
+    """自動再同期: outdated のSFTP連携ドキュメントを再取り込みジョブとして登録（登録済み・実行中・直近の失敗は除く）"""
+    retry_cutoff = datetime.now(timezone.utc) - timedelta(seconds=RESYNC_RETRY_AFTER_SECONDS)
+    pending = {
+        json.loads(params or "{}").get("source_file_id")
+        for (params,) in db.query(IngestionJob.params).filter(
+            IngestionJob.organization_id == organization_id,
+            IngestionJob.kind == "sftp_sync",
+            or_(
+                IngestionJob.status.in_(["queued", "running"]),
+                # 失敗したファイルはポーリングのたびに再登録せず、一定時間空ける
+                and_(IngestionJob.status == "failed", IngestionJob.finished_at > retry_cutoff),
+            ),
+        )
+    }
+    paths = [
+        path for (path,) in db.query(Document.box_file_id).filter(
+            Document.organization_id == organization_id,
+            Document.box_sync_status == "outdated",
+        ).order_by(Document.updated_at)
+        if path not in pending
+    ][:limit]
+    if paths:
+        enqueue_sftp_sync(db, organization_id, None, paths, is_public=None, department_ids=None, background=True)
+    return len(paths)
+
+
+# ================================================================
+# Progress / heartbeat
+# ================================================================
+
+class JobProgress:
+    """
+    ジョブの進捗・ハートビートを別セッションで書き込む。
+    本処理のトランザクションはコミットまで見えないため、進捗だけ即時に反映する。
+    """
+
+    def __init__(self, job_id: str, min_interval: float = 1.0):
+        self.job_id = job_id
+        self.min_interval = min_interval
+        self._last_write = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._ticker: Optional[threading.Thread] = None
+        # 本処理で作成したファイル（ロールバック時に削除する）
+        self.created_files: list[str] = []
+
+    def _write(self, values: dict) -> None:
+        now = datetime.now(timezone.utc)
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(IngestionJob)
+                .where(IngestionJob.id == self.job_id, IngestionJob.status == "running")
+                .values(**values, heartbeat_at=now, updated_at=now)
+            )
+            db.commit()
+        except Exception as e:
+            logger.warning("Ingestion job %s: progress update failed: %s", self.job_id, e)
+            db.rollback()
+        finally:
+            db.close()
+
+    def stage(self, stage: str, total: int = 0) -> None:
+        with self._lock:
+            self._last_write = time.monotonic()
+        self._write({"stage": stage, "progress_current": 0, "progress_total": total})
+
+    def update(self, current: int, total: int) -> None:
+        """DocumentProcessor の ProgressCallback として渡す（書き込みは間引く）"""
+        with self._lock:
+            now = time.monotonic()
+            if current < total and now - self._last_write < self.min_interval:
+                return
+            self._last_write = now
+        self._write({"progress_current": current, "progress_total": total})
+
+    def _tick(self) -> None:
+        while not self._stop.wait(HEARTBEAT_INTERVAL_SECONDS):
+            self._write({})
+
+    def __enter__(self) -> "JobProgress":
+        self._ticker = threading.Thread(target=self._tick, name=f"ingest-heartbeat-{self.job_id[:8]}", daemon=True)
+        self._ticker.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+
+
+# ================================================================
+# Indexing（チャンク分割・差分埋め込み）
+# ================================================================
+
+@dataclass
+class IndexResult:
+    chunk_count: int = 0
+    embedded: int = 0
+    reused: int = 0
+    deleted: int = 0
+
+
+def index_chunks(
+    db: Session, document: Document, extracted: str, progress: Optional[JobProgress] = None
+) -> IndexResult:
+    """
+    テキストをチャンク化して document のチャンクを置き換える。
+    既存チャンクとテキストハッシュが一致するものは行（埋め込み）をそのまま再利用し、
+    変更・追加分のみ埋め込みAPIを呼ぶ。不要になった行は削除する。
+    """
+    if progress:
+        progress.stage("chunking")
+    chunks = rag_service.chunk_text(extracted)
+    hashes = [content_hash(c) for c in chunks]
+
+    # 既存チャンク（ベクトル本体は読まない）。ハッシュ未設定の旧データは本文から計算
+    pool: dict[str, list] = defaultdict(list)
+    for row in db.query(
+        DocumentChunk.id, DocumentChunk.content, DocumentChunk.content_hash, DocumentChunk.chunk_index
+    ).filter(DocumentChunk.document_id == document.id).order_by(DocumentChunk.chunk_index.desc()):
+        pool[row.content_hash or content_hash(row.content)].append(row)
+
+    reused: dict[int, object] = {}
+    new_indexes: list[int] = []
+    for i, h in enumerate(hashes):
+        if pool.get(h):
+            reused[i] = pool[h].pop()
+        else:
+            new_indexes.append(i)
+
+    # 同一テキストのチャンクは1回だけ埋め込む
+    unique_texts = list(dict.fromkeys(chunks[i] for i in new_indexes))
+    positions: dict[str, list[int]] = defaultdict(list)
+    for i in new_indexes:
+        positions[chunks[i]].append(i)
+
+    if progress:
+        progress.stage("saving", total=len(chunks))
+    stale_ids = [row.id for rows in pool.values() for row in rows]
+    if stale_ids:
+        db.query(DocumentChunk).filter(DocumentChunk.id.in_(stale_ids)).delete(synchronize_session=False)
+
+    moved = [
+        {"id": row.id, "chunk_index": i, "content_hash": hashes[i]}
+        for i, row in reused.items()
+        if row.chunk_index != i or row.content_hash != hashes[i]
+    ]
+    if moved:
+        db.execute(update(DocumentChunk), moved)
+
+    # 新規チャンクは埋め込みバッチが完了するたびにCOPYで書き込み、ベクトルを文書全体分は保持しない
+    if progress:
+        progress.stage("embedding", total=len(unique_texts))
+    embedded = 0
+    for batch, vectors in rag_service.iter_embeddings(unique_texts):
+        write_chunks(db, [
+            {
+                "document_id": document.id,
+                "organization_id": document.organization_id,
+                "content": chunks[i],
+                "content_hash": hashes[i],
+                "chunk_index": i,
+                "embedding": vector,
+            }
+            for j, vector in zip(batch, vectors)
+            for i in positions[unique_texts[j]]
+        ])
+        embedded += len(batch)
+        if progress:
+            progress.update(embedded, len(unique_texts))
+
+    return IndexResult(
+        chunk_count=len(chunks),
+        embedded=len(unique_texts),
+        reused=len(reused),
+        deleted=len(stale_ids),
+    )
+
+
+def sync_document_file(
+    db: Session,
+    source_file_id: str,
+    filename: str,
+    path: str,
+    is_public: Optional[bool] = True,
+    department_ids: Optional[list[str]] = None,
+    organization_id: Optional[str] = None,
+    source_mtime: Optional[datetime] = None,
+    source_size: Optional[int] = None,
+    progress: Optional[JobProgress] = None,
+) -> Document:
+    """
+    外部ストレージ（SFTP / BOX）から取得済みのファイルを取り込み、ドキュメントを作成・更新する（コミットしない）。
+    box_file_id に外部ファイルIDを格納して同一ファイルを判定する。
+    is_public / department_ids が None の場合、既存ドキュメントの権限を維持する（自動再同期）。
+    source_mtime / source_size はポーリング時の変更判定用に保存する（取得時点の値）
+    """
+    file_type = document_processor.get_file_type(filename)
+    file_hash = file_content_hash(path)
+
+    query = db.query(Document).filter(Document.box_file_id == source_file_id)
+    if organization_id:
+        query = query.filter(Document.organization_id == organization_id)
+    document = query.first()
+
+    if is_public is None:
+        is_public = document.is_public if document else True
+    if department_ids is None and document:
+        departments = list(document.departments)
+    elif department_ids:
+        departments = db.query(Department).filter(Department.id.in_(department_ids)).all()
+    else:
+        departments = []
+
+    if document and document.content_hash == file_hash:
+        # ファイル内容が同一: 抽出・埋め込みをスキップし、メタデータと権限のみ反映
+        permissions_changed = (
+            document.is_public != is_public
+            or {d.id for d in document.departments} != {d.id for d in departments}
+        )
+        if permissions_changed:
+            answer_cache.invalidate_documents(db, [document.id])
+        document.filename = filename
+        document.is_public = is_public
+        document.departments = departments
+        document.box_sync_status = "synced"
+        document.box_synced_at = datetime.now(timezone.utc)
+        document.source_mtime = source_mtime
+        document.source_size = source_size
+        logger.info("Sync %s: content unchanged, skipped re-indexing", source_file_id)
+        return document
+
+    if progress:
+        progress.stage("extracting")
+    extracted = document_processor.extract_text_from_file(
+        filename, path, progress.update if progress else None
+    )
+    if not extracted.strip():
+        raise IngestionError(f"テキストを抽出できませんでした: {filename}")
+
+    if document:
+        answer_cache.invalidate_documents(db, [document.id])
+        document.filename = filename
+        document.file_type = file_type
+        document.is_public = is_public
+    else:
+        document = Document(
+            filename=filename,
+            file_type=file_type,
+            is_public=is_public,
+            box_file_id=source_file_id,
+            organization_id=organization_id,
+        )
+        db.add(document)
+        db.flush()
+    document.departments = departments
+
+    # 元ファイルをディスクに保存
+    if organization_id:
+        upload_dir = os.path.join(UPLOADS_BASE_DIR, organization_id)
+        os.makedirs(upload_dir, exist_ok=True)
+        save_path = os.path.join(upload_dir, f"{document.id}.{_file_ext(filename, file_type)}")
+        if os.path.exists(save_path):
+            os.remove(save_path)
+        _link_or_copy(path, save_path)
+        document.file_path = save_path
+
+    result = index_chunks(db, document, extracted, progress)
+    document.content_hash = file_hash
+    document.box_sync_status = "synced"
+    document.box_synced_at = datetime.now(timezone.utc)
+    document.source_mtime = source_mtime
+    document.source_size = source_size
+
+    logger.info(
+        "Sync %s: %d chunks (embedded=%d, reused=%d, deleted=%d)",
+        source_file_id, result.chunk_count, result.embedded, result.reused, result.deleted,
+    )
+    return document
+
+
+def sync_document(
+    db: Session,
+    source_file_id: str,
+    filename: str,
+    content: bytes,
+    is_public: bool = True,
+    department_ids: list[str] | None = None,
+    organization_id: str | None = None,
+    source_mtime: datetime | None = None,
+    source_size: int | None = None,
+) -> Document:
+    """取得済みの内容（bytes）を sync_document_file で取り込んでコミットする"""
+    staging_path = new_staging_path(organization_id or "_shared", filename, document_processor.get_file_type(filename))
+    try:
+        with open(staging_path, "wb") as f:
+            f.write(content)
+        document = sync_document_file(
+            db,
+            source_file_id=source_file_id,
+            filename=filename,
+            path=staging_path,
+            is_public=is_public,
+            department_ids=department_ids or [],
+            organization_id=organization_id,
+            source_mtime=source_mtime,
+            source_size=source_size,
+        )
+        db.commit()
+        return document
+    finally:
+        os.remove(staging_path)
+
+
+# ================================================================
+# Processing
+# ================================================================
+
+def claim_next_job(db: Session, worker_id: str) -> Optional[str]:
+    """
+    キュー先頭のジョブを取得して running にする（他ワーカーがロック中の行は飛ばす）。
+    - priority の小さいジョブから（自動再同期はアップロード・手動同期の後）
+    - 再試行待ち（run_after が未来）のジョブは取らない
+    - 同期ジョブは組織ごとの同時実行数まで（数え漏れが無いよう取得処理はアドバイザリロックで直列化）
+    - 実行時間帯の外にある組織の自動再同期ジョブは取らない
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": CLAIM_LOCK_KEY})
+    now = datetime.now(timezone.utc)
+    running = aliased(IngestionJob)
+    running_syncs = select(func.count()).where(
+        running.organization_id == IngestionJob.organization_id,
+        running.kind == "sftp_sync",
+        running.status == "running",
+    ).scalar_subquery()
+    sync_concurrency = func.coalesce(
+        select(SystemSettings.box_resync_concurrency).where(
+            SystemSettings.organization_id == IngestionJob.organization_id
+        ).scalar_subquery(),
+        settings.sftp_sync_concurrency_per_org,
+    )
+    conditions = [
+        IngestionJob.status == "queued",
+        or_(IngestionJob.run_after.is_(None), IngestionJob.run_after <= now),
+        or_(IngestionJob.kind != "sftp_sync", running_syncs < sync_concurrency),
+    ]
+    paused = paused_orgs(db)
+    if paused:
+        conditions.append(or_(IngestionJob.priority <= 0, IngestionJob.organization_id.notin_(paused)))
+
+    job_id = db.execute(
+        select(IngestionJob.id).where(*conditions)
+        .order_by(IngestionJob.priority, IngestionJob.created_at)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    ).scalar()
+    if job_id:
+        db.execute(update(IngestionJob).where(IngestionJob.id == job_id).values(
+            status="running", worker_id=worker_id, attempts=func.coalesce(IngestionJob.attempts, 0) + 1,
+            started_at=now, heartbeat_at=now, updated_at=now, error=None, run_after=None,
+        ))
+    db.commit()
+    return job_id
+
+
+def recover_stale_jobs(db: Session) -> int:
+    """ハートビートが途絶えた running ジョブを再キュー（試行上限を超えたら failed）"""
+    now = datetime.now(timezone.utc)
+    cutoff = now - timedelta(seconds=settings.ingestion_heartbeat_timeout_seconds)
+    jobs = db.query(IngestionJob).filter(
+        IngestionJob.status == "running",
+        IngestionJob.heartbeat_at < cutoff,
+    ).with_for_update(skip_locked=True).all()
+    for job in jobs:
+        if (job.attempts or 0) >= settings.ingestion_max_attempts:
+            job.status = "failed"
+            job.error = "処理が中断されました（再試行回数の上限）"
+            job.finished_at = now
+        else:
+            job.status = "queued"
+            job.finished_at = None
+        job.worker_id = None
+        job.updated_at = now
+    db.commit()
+    for job in jobs:
+        logger.warning("Ingestion job %s: stale heartbeat, now %s", job.id, job.status)
+        if job.status == "failed":
+            _remove_file(job.source_path)
+    return len(jobs)
+
+
+def retry_delay(attempts: int) -> float:
+    """attempts 回目の失敗後、再取得までの待ち秒数"""
+    return min(RETRY_BACKOFF_MAX_SECONDS, settings.ingestion_retry_backoff_seconds * (2 ** max(attempts - 1, 0)))
+
+
+def _process_upload(db: Session, job: IngestionJob, progress: JobProgress) -> None:
+    params = json.loads(job.params or "{}")
+
+    progress.stage("extracting")
+    try:
+        extracted = document_processor.extract_text_from_file(job.filename, job.source_path, progress.update)
+    except Exception as e:
+        raise IngestionError(f"ファイルの読み込みに失敗しました: {e}") from e
+    if not extracted.strip():
+        raise IngestionError("ドキュメントからテキストを抽出できませんでした")
+
+    # 同名ファイルの再アップロード: 旧版を参照する回答キャッシュを破棄
+    answer_cache.invalidate_filename(db, job.organization_id, job.filename)
+
+    document = Document(
+        filename=job.filename,
+        file_type=job.file_type,
+        is_public=params.get("is_public", True),
+        category=params.get("category", ""),
+        organization_id=job.organization_id,
+    )
+    department_ids = params.get("department_ids") or []
+    if department_ids:
+        document.departments = db.query(Department).filter(
+            Department.id.in_(department_ids),
+            Department.organization_id == job.organization_id,
+        ).all()
+    db.add(document)
+    db.flush()
+
+    # 元ファイルを保存（ステージングはコミット後に削除。中断時は再試行で使う）
+    upload_dir = os.path.join(UPLOADS_BASE_DIR, job.organization_id)
+    save_path = os.path.join(upload_dir, f"{document.id}.{_file_ext(job.filename, job.file_type)}")
+    _link_or_copy(job.source_path, save_path)
+    progress.created_files.append(save_path)
+    document.file_path = save_path
+
+    result = index_chunks(db, document, extracted, progress)
+    document.content_hash = file_content_hash(job.source_path)
+
+    job.document_id = document.id
+    job.chunk_count = result.chunk_count
+
+
+def _process_sftp_sync(db: Session, job: IngestionJob, progress: JobProgress) -> None:
+    # sftp_service は本モジュール（sync_document）を import するため実行時に読み込む
+    from app.services.sftp_service import get_sftp_service_for_org
+
+    params = json.loads(job.params or "{}")
+    source_file_id = params["source_file_id"]
+    svc = get_sftp_service_for_org(db, job.organization_id)
+    if not svc.is_configured:
+        raise IngestionError("SFTP接続情報が設定されていません")
+
+    progress.stage("downloading")
+    staging_path = new_staging_path(job.organization_id, job.filename, job.file_type)
+    try:
+        try:
+            remote = svc.download_to(source_file_id, staging_path)
+        except FileNotFoundError as e:
+            raise IngestionError(f"サーバー上にファイルがありません: {source_file_id}") from e
+        document = sync_document_file(
+            db,
+            source_file_id=source_file_id,
+            filename=job.filename,
+            path=staging_path,
+            is_public=params.get("is_public"),
+            department_ids=params.get("department_ids"),
+            organization_id=job.organization_id,
+            source_mtime=remote.modified_at,
+            source_size=remote.size,
+            progress=progress,
+        )
+    finally:
+        if os.path.exists(staging_path):
+            os.remove(staging_path)
+
+    db.flush()
+    job.document_id = document.id
+    job.chunk_count = db.query(DocumentChunk).filter(DocumentChunk.document_id == document.id).count()
+
+
+JOB_HANDLERS = {
+    "upload": _process_upload,
+    "sftp_sync": _process_sftp_sync,
+}
+
+
+def run_job(job_id: str) -> None:
+    """claim済みジョブを実行。本処理とジョブ完了は同一トランザクションでコミット"""
+    db = SessionLocal()
+    try:
+        job = db.get(IngestionJob, job_id)
+        handler = JOB_HANDLERS.get(job.kind)
+        started = time.monotonic()
+        with JobProgress(job_id) as progress:
+            try:
+                if handler is None:
+                    raise IngestionError(f"Unknown job kind: {job.kind}")
+                handler(db, job, progress)
+                job.status = "succeeded"
+                job.stage = None
+                job.finished_at = datetime.now(timezone.utc)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                for path in progress.created_files:
+                    _remove_file(path)
+                job = db.get(IngestionJob, job_id)
+                now = datetime.now(timezone.utc)
+                attempts = job.attempts or 0
+                job.error = str(e)
+                job.worker_id = None
+                if not isinstance(e, IngestionError) and attempts < settings.ingestion_max_attempts:
+                    # 一時的なエラーの可能性があるため、バックオフを空けて再キュー
+                    delay = retry_delay(attempts)
+                    logger.warning(
+                        "Ingestion job %s failed (attempt %d/%d), retrying in %.0fs: %s",
+                        job_id, attempts, settings.ingestion_max_attempts, delay, e,
+                    )
+                    job.status = "queued"
+                    job.stage = None
+                    job.run_after = now + timedelta(seconds=delay)
+                else:
+                    if not isinstance(e, IngestionError):
+                        logger.exception("Ingestion job %s failed", job_id)
+                    job.status = "failed"
+                    job.finished_at = now
+                db.commit()
+                if job.status == "failed":
+                    _remove_file(job.source_path)
+                return
+        logger.info(
+            "Ingestion job %s: %s done (%d chunks, %.1fs)",
+            job_id, job.filename, job.chunk_count or 0, time.monotonic() - started,
+        )
+        _remove_file(job.source_path)
+    finally:
+        db.close()
+
+
+# ================================================================
+# Worker pool
+# ================================================================
+
+class IngestionWorkerPool:
+    """プロセス内のワーカースレッド群（API処理とは別スレッドで同期処理を実行）"""
+
+    def __init__(self):
+        self._threads: list[threading.Thread] = []
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+
+    def start(self, count: int) -> None:
+        if self._threads or count <= 0:
+            return
+        self._stop.clear()
+        host = socket.gethostname()
+        for n in range(count):
+            worker_id = f"{host}:{os.getpid()}:{n}"
+            t = threading.Thread(target=self._run, args=(worker_id,), name=f"ingest-worker-{n}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        logger.info("Ingestion workers started (count=%d)", count)
+
+    def stop(self) -> None:
+        """新規ジョブの取得を止める（実行中のジョブは中断され、ハートビート切れで再キューされる）"""
+        self._stop.set()
+        self._wakeup.set()
+        self._threads = []
+
+    def notify(self) -> None:
+        """同一プロセスでの登録時に待機中のワーカーを起こす"""
+        self._wakeup.set()
+
+    def _run(self, worker_id: str) -> None:
+        while not self._stop.is_set():
+            job_id = None
+            db = SessionLocal()
+            try:
+                recover_stale_jobs(db)
+                job_id = claim_next_job(db, worker_id)
+            except Exception as e:
+                logger.error("Ingestion worker %s: queue error: %s", worker_id, e)
+            finally:
+                db.close()
+
+            if job_id:
+                try:
+                    run_job(job_id)
+                except Exception:
+                    logger.exception("Ingestion worker %s: job %s crashed", worker_id, job_id)
+                continue
+
+            self._wakeup.wait(settings.ingestion_poll_interval_seconds)
+            self._wakeup.clear()
+
+
+ingestion_workers = IngestionWorkerPool()
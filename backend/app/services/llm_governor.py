@@ -0,0 +1,439 @@
+"""Anthropic API呼び出しのプロセス全体ガバナー
+
+チャット・取り込み・管理エージェントの呼び出しを1か所で制御する。
+- モデル別のリクエスト数/トークン数バジェット（トークンバケット）
+- 優先度クラス（チャット > 取り込み > 管理バッチ）順に実行枠を割り当て。
+  取り込み・管理は同時実行枠の一部（interactive_reserved 分を除く）までしか使えず、チャット用の枠を常に残す
+- 429/5xx/接続エラーは retry-after を尊重したジッター付きバックオフで再試行
+  （429は同一モデルの全呼び出しを retry-after まで止める）
+- クラス別の待ち時間・再試行回数を /api/metrics に公開
+
+各クライアントは max_retries=0 で生成し、再試行はここに一本化する。
+"""
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+import anthropic
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# トークン見積もり（実績値で呼び出し後に補正する）
+CHARS_PER_TOKEN = 2  # 日本語主体のため英語（約4文字）より小さめ
+IMAGE_BLOCK_TOKENS = 1600  # リサイズ後の最大画像（約1.15MP）
+DOCUMENT_BLOCK_TOKENS = 20_000  # PDFはページ数不明のため概算
+EXPECTED_OUTPUT_TOKENS = 1024  # 出力の予約量（max_tokens全体は予約せず、超過分は実績で補正）
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # チャット
+    INGESTION = 1  # ドキュメント取り込み
+    ADMIN = 2  # 管理エージェント
+
+
+class TokenBucket:
+    """1分あたりの上限を秒単位で補充するトークンバケット（ガバナーのロック下で使う）
+
+    per_minute が0以下なら無制限（429による block のみ効く）。
+    """
+
+    def __init__(self, per_minute: float):
+        self.unlimited = per_minute <= 0
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        if self.unlimited:
+            return
+        self.level -= min(amount, self.capacity)
+
+    def adjust(self, amount: float) -> None:
+        """見積もりと実績の差分を戻す（負なら追加で消費）"""
+        if self.unlimited:
+            return
+        self.level = min(self.capacity, self.level + amount)
+
+    def block(self, until: float) -> None:
+        self.blocked_until = max(self.blocked_until, until)
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    model: str = field(compare=False)
+    tokens: int = field(compare=False)
+    enqueued_at: float = field(compare=False)
+    wake: Callable[[], None] = field(compare=False)
+    granted: bool = field(default=False, compare=False)
+
+
+def estimate_tokens(messages: list[dict], system: Any = None, max_tokens: int = 0) -> int:
+    """入力文字数・画像数から入力トークンを概算し、想定出力（max_tokens以下）を加える"""
+    chars = 0
+    blocks = 0
+
+    def walk(content: Any) -> None:
+        nonlocal chars, blocks
+        if isinstance(content, str):
+            chars += len(content)
+        elif isinstance(content, list):
+            for item in content:
+                walk(item)
+        elif isinstance(content, dict):
+            block_type = content.get("type")
+            if block_type == "image":
+                blocks += IMAGE_BLOCK_TOKENS
+            elif block_type == "document":
+                blocks += DOCUMENT_BLOCK_TOKENS
+            elif block_type == "text":
+                chars += len(content.get("text", ""))
+            elif "content" in content:
+                walk(content["content"])
+            else:
+                chars += len(json.dumps(content, ensure_ascii=False, default=str))
+
+    walk(system)
+    for message in messages:
+        walk(message.get("content"))
+    return chars // CHARS_PER_TOKEN + blocks + min(max_tokens, EXPECTED_OUTPUT_TOKENS)
+
+
+def _usage_tokens(message: Any) -> Optional[int]:
+    usage = getattr(message, "usage", None)
+    if usage is None:
+        return None
+    return (getattr(usage, "input_tokens", 0) or 0) + (getattr(usage, "output_tokens", 0) or 0)
+
+
+def _retry_after_seconds(exc: Exception) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass  # HTTP日付形式は使われないため無視してバックオフに任せる
+    return None
+
+
+def _is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, anthropic.APIConnectionError):
+        return True
+    if isinstance(exc, anthropic.APIStatusError):
+        return exc.status_code in (408, 409, 429) or exc.status_code >= 500
+    return False
+
+
+class LLMGovernor:
+    def __init__(
+        self,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        max_concurrency: int,
+        max_retries: int,
+        backoff_base: float,
+        backoff_max: float,
+        model_limits: Optional[dict[str, dict[str, int]]] = None,
+        interactive_reserved: int = 0,
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_concurrency = max_concurrency
+        # チャット以外が同時に使える枠（最低1）
+        self.background_concurrency = max(1, max_concurrency - interactive_reserved)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.model_limits = model_limits or {}
+
+        self._lock = threading.Lock()
+        self._buckets: dict[str, tuple[TokenBucket, TokenBucket]] = {}
+        self._waiters: list[_Waiter] = []
+        self._seq = 0
+        self._in_flight = 0
+        self._background_in_flight = 0
+        self._timer: Optional[threading.Timer] = None
+        self._timer_deadline = 0.0
+        self._stats = {
+            p: {"requests": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0, "retries": 0, "rate_limited": 0}
+            for p in Priority
+        }
+
+    # ---- バジェットと割り当て ----
+
+    def _buckets_for(self, model: str) -> tuple[TokenBucket, TokenBucket]:
+        if model not in self._buckets:
+            limits = self.model_limits.get(model, {})
+            self._buckets[model] = (
+                TokenBucket(limits.get("rpm", self.requests_per_minute)),
+                TokenBucket(limits.get("tpm", self.tokens_per_minute)),
+            )
+        return self._buckets[model]
+
+    def _dispatch(self) -> None:
+        with self._lock:
+            self._dispatch_locked()
+
+    def _dispatch_locked(self) -> None:
+        """
+        優先度順に実行枠を割り当てる。バジェット待ちのモデルは下位クラスにも追い越させない。
+        チャット以外は background_concurrency まで（残りはチャット専用）
+        """
+        now = time.monotonic()
+        blocked: set[str] = set()
+        next_wait: Optional[float] = None
+        for waiter in sorted(self._waiters):
+            if self._in_flight >= self.max_concurrency:
+                break
+            background = waiter.priority != Priority.INTERACTIVE
+            if background and self._background_in_flight >= self.background_concurrency:
+                continue
+            if waiter.model in blocked:
+                continue
+            requests, tokens = self._buckets_for(waiter.model)
+            wait = max(requests.wait_time(1, now), tokens.wait_time(waiter.tokens, now))
+            if wait > 0:
+                blocked.add(waiter.model)
+                next_wait = wait if next_wait is None else min(next_wait, wait)
+                continue
+            requests.take(1)
+            tokens.take(waiter.tokens)
+            self._in_flight += 1
+            if background:
+                self._background_in_flight += 1
+            self._waiters.remove(waiter)
+            waiter.granted = True
+            waited = now - waiter.enqueued_at
+            stats = self._stats[waiter.priority]
+            stats["requests"] += 1
+            stats["wait_seconds"] += waited
+            stats["max_wait_seconds"] = max(stats["max_wait_seconds"], waited)
+            waiter.wake()
+        if next_wait is not None:
+            self._schedule_locked(now + next_wait)
+
+    def _schedule_locked(self, deadline: float) -> None:
+        if self._timer is not None and self._timer_deadline <= deadline:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer_deadline = deadline
+        self._timer = threading.Timer(max(0.0, deadline - time.monotonic()), self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_timer(self) -> None:
+        with self._lock:
+            self._timer = None
+            self._dispatch_locked()
+
+    def _enqueue(self, model: str, priority: Priority, tokens: int, wake: Callable[[], None]) -> _Waiter:
+        with self._lock:
+            self._seq += 1
+            waiter = _Waiter(int(priority), self._seq, model, tokens, time.monotonic(), wake)
+            self._waiters.append(waiter)
+            self._dispatch_locked()
+        return waiter
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        """待機中にキャンセルされた呼び出しの後始末"""
+        with self._lock:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                return
+        if waiter.granted:
+            self._release(waiter.model, Priority(waiter.priority), waiter.tokens, 0)
+
+    def _release(self, model: str, priority: Priority, estimate: int, actual: Optional[int]) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            if priority != Priority.INTERACTIVE:
+                self._background_in_flight -= 1
+            if actual is not None:
+                self._buckets_for(model)[1].adjust(estimate - actual)
+            self._dispatch_locked()
+
+    def _acquire(self, model: str, priority: Priority, tokens: int) -> None:
+        event = threading.Event()
+        self._enqueue(model, priority, tokens, event.set)
+        event.wait()
+
+    async def _aacquire(self, model: str, priority: Priority, tokens: int) -> _Waiter:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake() -> None:
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        waiter = self._enqueue(model, priority, tokens, wake)
+        try:
+            await future
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        return waiter
+
+    # ---- 再試行 ----
+
+    def _retry_delay(self, model: str, priority: Priority, exc: Exception, attempt: int) -> Optional[float]:
+        if not _is_retryable(exc) or attempt >= self.max_retries:
+            return None
+        backoff = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        delay = backoff / 2 + random.uniform(0, backoff / 2)
+        retry_after = _retry_after_seconds(exc)
+        if retry_after is not None:
+            delay = retry_after + random.uniform(0, self.backoff_base)
+        with self._lock:
+            stats = self._stats[priority]
+            stats["retries"] += 1
+            if getattr(exc, "status_code", None) == 429:
+                stats["rate_limited"] += 1
+                # 同じモデルへの後続呼び出しも一緒に待たせる
+                until = time.monotonic() + delay
+                for bucket in self._buckets_for(model):
+                    bucket.block(until)
+        logger.warning(
+            "Anthropic call failed (%s, attempt %d/%d), retrying in %.1fs",
+            type(exc).__name__, attempt + 1, self.max_retries, delay,
+        )
+        return delay
+
+    def call(self, fn: Callable[[], T], *, model: str, priority: Priority, estimate: int) -> T:
+        """同期呼び出し（ワーカースレッド用）"""
+        attempt = 0
+        while True:
+            self._acquire(model, priority, estimate)
+            actual = None
+            try:
+                result = fn()
+                actual = _usage_tokens(result)
+                return result
+            except Exception as e:
+                delay = self._retry_delay(model, priority, e, attempt)
+                if delay is None:
+                    raise
+            finally:
+                self._release(model, priority, estimate, actual)
+            attempt += 1
+            time.sleep(delay)
+
+    async def acall(
+        self, fn: Callable[[], Awaitable[T]], *, model: str, priority: Priority, estimate: int,
+    ) -> T:
+        attempt = 0
+        while True:
+            await self._aacquire(model, priority, estimate)
+            actual = None
+            try:
+                result = await fn()
+                actual = _usage_tokens(result)
+                return result
+            except Exception as e:
+                delay = self._retry_delay(model, priority, e, attempt)
+                if delay is None:
+                    raise
+            finally:
+                self._release(model, priority, estimate, actual)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    @asynccontextmanager
+    async def astream(
+        self, open_stream: Callable[[], Any], *, model: str, priority: Priority, estimate: int,
+    ) -> AsyncIterator[Any]:
+        """messages.stream() を枠内で開く。再試行するのは最初のイベント受信前（接続・ステータス）まで"""
+        attempt = 0
+        while True:
+            await self._aacquire(model, priority, estimate)
+            try:
+                manager = open_stream()
+                stream = await manager.__aenter__()
+                break
+            except Exception as e:
+                self._release(model, priority, estimate, None)
+                delay = self._retry_delay(model, priority, e, attempt)
+                if delay is None:
+                    raise
+            except BaseException:
+                # 接続中のキャンセル（クライアント切断・停止）でも枠を返す
+                self._release(model, priority, estimate, None)
+                raise
+            attempt += 1
+            await asyncio.sleep(delay)
+
+        actual = None
+        try:
+            try:
+                yield stream
+            except BaseException as e:
+                if not await manager.__aexit__(type(e), e, e.__traceback__):
+                    raise
+            else:
+                await manager.__aexit__(None, None, None)
+            actual = _usage_tokens(getattr(stream, "current_message_snapshot", None))
+        finally:
+            self._release(model, priority, estimate, actual)
+
+    @asynccontextmanager
+    async def aslot(self, *, model: str, priority: Priority, estimate: int) -> AsyncIterator[None]:
+        """再試行を呼び出し側のSDKに任せる場合の実行枠のみの取得"""
+        await self._aacquire(model, priority, estimate)
+        try:
+            yield
+        finally:
+            self._release(model, priority, estimate, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": self._in_flight,
+                "in_flight_background": self._background_in_flight,
+                "queued": len(self._waiters),
+                "classes": {p.name.lower(): dict(s) for p, s in self._stats.items()},
+            }
+
+
+llm_governor = LLMGovernor(
+    requests_per_minute=settings.llm_requests_per_minute,
+    tokens_per_minute=settings.llm_tokens_per_minute,
+    max_concurrency=settings.llm_max_concurrency,
+    max_retries=settings.llm_max_retries,
+    backoff_base=settings.llm_backoff_base_seconds,
+    backoff_max=settings.llm_backoff_max_seconds,
+    model_limits=settings.llm_model_limits,
+    interactive_reserved=settings.llm_interactive_reserved_slots,
+)
@@ -5,9 +5,10 @@ from datetime import datetime, timedelta, timezone
 
 from sqlalchemy.orm import Session
 
+from app.core.config import settings as app_settings
 from app.models.organization import Organization
 from app.models.document import User, SystemSettings
-from app.services.auth import get_password_hash
+from app.services.vector_index import create_tenant_index_in_background
 
 
 def _generate_slug(name: str) -> str:
@@ -35,9 +36,9 @@ def create_organization_with_admin(
     db: Session,
     company_name: str,
     email: str,
-    password: str,
+    password_hash: str,
 ) -> tuple[Organization, User]:
-    """Organization + 管理者User + デフォルトSystemSettingsを一括作成"""
+    """Organization + 管理者User + デフォルトSystemSettingsを一括作成（password_hash はハッシュ済みの値）"""
     base_slug = _generate_slug(company_name)
     slug = _ensure_unique_slug(db, base_slug)
 
@@ -56,7 +57,7 @@ def create_organization_with_admin(
     user = User(
         organization_id=org.id,
         email=email,
-        password_hash=get_password_hash(password),
+        password_hash=password_hash,
         name=email.split("@")[0],  # メールアドレスの@前をデフォルト名に
         role="admin",
     )
@@ -74,4 +75,8 @@ def create_organization_with_admin(
     db.refresh(org)
     db.refresh(user)
 
+    # テナント専用の部分HNSWインデックス（空のうちに作成しておく）
+    if app_settings.vector_index_per_tenant:
+        create_tenant_index_in_background(org.id)
+
     return org, user
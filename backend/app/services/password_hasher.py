@@ -0,0 +1,95 @@
+"""パスワードハッシュ（bcrypt）の専用スレッドプール
+
+bcrypt の checkpw / hashpw は1回あたり数百msのCPUを使うため、async のルートハンドラで直接呼ぶと
+その間イベントループが止まり、ストリーミング中のチャットが詰まる。
+- ハッシュ計算は専用の小さなスレッドプールで実行する（bcrypt は計算中にGILを解放する）
+- 待ち行列は password_hash_max_queue で上限を設け、溢れた分は PasswordHasherBusy（→ 503）で即座に返す
+  （ログイン集中時に待ち時間が際限なく伸びてタイムアウトするより、再試行させる方が早く捌ける）
+- 実行中・待機中の件数と処理時間を /api/metrics に公開
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+
+class PasswordHasherBusy(Exception):
+    """待ち行列が上限に達した"""
+
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._submitted = 0  # 実行中 + 待機中
+        self._in_flight = 0
+        self._stats = {"completed": 0, "rejected": 0, "seconds": 0.0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+            return self._executor
+
+    def _execute(self, enqueued_at: float, fn: Callable[..., T], args: tuple) -> T:
+        started = time.monotonic()
+        with self._lock:
+            self._in_flight += 1
+            wait = started - enqueued_at
+            self._stats["wait_seconds"] += wait
+            self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], wait)
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._submitted -= 1
+                self._stats["completed"] += 1
+                self._stats["seconds"] += time.monotonic() - started
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        """fn(*args) を専用プールで実行して結果を待つ（待ち行列が満杯なら PasswordHasherBusy）"""
+        executor = self._get_executor()
+        with self._lock:
+            if self._submitted >= self.workers + self.max_queue:
+                self._stats["rejected"] += 1
+                raise PasswordHasherBusy()
+            self._submitted += 1
+        try:
+            future = executor.submit(self._execute, time.monotonic(), fn, args)
+        except BaseException:
+            with self._lock:
+                self._submitted -= 1
+            raise
+        future.add_done_callback(self._discard_cancelled)
+        # 件数は実行済みならワーカー側、未開始のまま破棄されたらコールバックで戻す
+        return await asyncio.wrap_future(future)
+
+    def _discard_cancelled(self, future) -> None:
+        if future.cancelled():  # 呼び出し側のキャンセル・shutdown で未開始のまま破棄された
+            with self._lock:
+                self._submitted -= 1
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "in_flight": self._in_flight,
+                "queued": self._submitted - self._in_flight,
+            }
+
+
+password_hasher = PasswordHasher(settings.password_hash_workers, settings.password_hash_max_queue)
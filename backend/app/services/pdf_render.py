@@ -0,0 +1,202 @@
+"""PDFページの分類・画像化（プロセスプールで並列実行）
+
+spawnされたワーカーでもimportできるよう、このモジュールはDBや設定に依存しない。
+ワーカーはステージングした一時PDFファイルを開き、担当ページ範囲だけを処理して返す。
+"""
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+import fitz
+
+logger = logging.getLogger(__name__)
+
+# PDF thresholds
+TEXT_RICH_CHAR_THRESHOLD = 500
+TEXT_RICH_IMAGE_LIMIT = 2
+MAX_IMAGE_BYTES = 3_700_000  # ~5MB after base64 encoding (×4/3)
+RENDER_DPIS = (300, 200, 150)
+PROBE_DPI = 50  # サイズ見積もり用の試し描画
+JPEG_DPI = 150  # PNGがどのDPIでも収まらないページ
+JPEG_QUALITIES = (85, 60)
+# 1タスクで処理するページ数（小さいほど最初のVision呼び出しが早く始まる）
+RENDER_BATCH_PAGES = 4
+
+
+@dataclass
+class PageImage:
+    data: bytes
+    media_type: str
+    dpi: int
+    encodes: int  # 試し描画を含むエンコード回数
+
+
+@dataclass
+class RenderedPage:
+    index: int
+    kind: str  # text / vision
+    text: str  # PyMuPDFのテキスト（Vision失敗時のフォールバックにも使う）
+    image: Optional[bytes] = None
+    media_type: Optional[str] = None
+    dpi: int = 0
+    encodes: int = 0
+    seconds: float = 0.0  # 分類・描画・エンコードにかかったCPU時間
+
+
+def classify_page(page: fitz.Page, text: Optional[str] = None) -> str:
+    if text is None:
+        text = page.get_text("text").strip()
+    image_count = len(page.get_images(full=True))
+    if len(text) >= TEXT_RICH_CHAR_THRESHOLD and image_count <= TEXT_RICH_IMAGE_LIMIT:
+        return "text"
+    return "vision"
+
+
+def _predict_png_dpi(page: fitz.Page) -> Optional[int]:
+    """低解像度の試し描画からPNGサイズを見積もり、上限に収まる最大DPIを返す
+
+    PNGは高解像度ほど画素あたりの圧縮率が上がるため、画素数比での外挿は大きめに出る（安全側）。
+    """
+    probe = page.get_pixmap(matrix=fitz.Matrix(PROBE_DPI / 72, PROBE_DPI / 72), alpha=False)
+    probe_bytes = len(probe.tobytes("png"))
+    for dpi in RENDER_DPIS:
+        if probe_bytes * (dpi / PROBE_DPI) ** 2 <= MAX_IMAGE_BYTES:
+            return dpi
+    return None
+
+
+def render_page_to_image(page: fitz.Page) -> PageImage:
+    """予測したDPIで1回だけ描画し、超過時は同じピクセルマップをJPEG化・縮小する"""
+    dpi = _predict_png_dpi(page)
+    encodes = 1
+    if dpi is not None:
+        pix = page.get_pixmap(matrix=fitz.Matrix(dpi / 72, dpi / 72), alpha=False)
+        data = pix.tobytes("png")
+        encodes += 1
+        if len(data) <= MAX_IMAGE_BYTES:
+            return PageImage(data, "image/png", dpi, encodes)
+        logger.debug("Page PNG at %d DPI = %d KB, falling back to JPEG", dpi, len(data) // 1024)
+    else:
+        dpi = JPEG_DPI
+        pix = page.get_pixmap(matrix=fitz.Matrix(dpi / 72, dpi / 72), alpha=False)
+
+    for quality in JPEG_QUALITIES:
+        data = pix.tobytes("jpeg", jpg_quality=quality)
+        encodes += 1
+        if len(data) <= MAX_IMAGE_BYTES:
+            return PageImage(data, "image/jpeg", dpi, encodes)
+    # 最後の手段: ピクセルマップをその場で1/2に縮小（再描画しない）
+    pix.shrink(1)
+    data = pix.tobytes("jpeg", jpg_quality=JPEG_QUALITIES[-1])
+    return PageImage(data, "image/jpeg", dpi // 2, encodes + 1)
+
+
+def process_pages(path: str, indices: list[int]) -> list[RenderedPage]:
+    """ページを分類し、Vision対象のみ画像化する（ワーカープロセスで実行）"""
+    doc = fitz.open(path)
+    try:
+        pages = []
+        for i in indices:
+            started = time.process_time()
+            page = doc[i]
+            text = page.get_text("text").strip()
+            if classify_page(page, text) == "text":
+                rendered = RenderedPage(i, "text", text)
+            else:
+                image = render_page_to_image(page)
+                rendered = RenderedPage(
+                    i, "vision", text, image.data, image.media_type, image.dpi, image.encodes,
+                )
+            rendered.seconds = time.process_time() - started
+            pages.append(rendered)
+        return pages
+    finally:
+        doc.close()
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+# 親プロセス側で集計する描画コスト（/api/metrics で公開）
+_stats = {"text_pages": 0, "vision_pages": 0, "encodes": 0, "seconds": 0.0}
+_stats_lock = threading.Lock()
+
+
+def _record(pages: list[RenderedPage]) -> None:
+    with _stats_lock:
+        for page in pages:
+            _stats["text_pages" if page.kind == "text" else "vision_pages"] += 1
+            _stats["encodes"] += page.encodes
+            _stats["seconds"] += page.seconds
+
+
+def render_stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
+
+
+def get_render_pool(workers: int) -> Optional[ProcessPoolExecutor]:
+    """プロセス全体で共有するレンダリングプール（workers<=0なら呼び出しスレッドで処理）"""
+    global _pool
+    if workers <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _discard_pool(pool: Executor) -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_render_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def iter_rendered_pages(
+    path: str, page_count: int, workers: int, batch_size: int = RENDER_BATCH_PAGES,
+) -> Iterator[list[RenderedPage]]:
+    """レンダリング済みのページを完了したバッチから順に返す（ページ順は保証しない）"""
+    batches = [
+        list(range(start, min(start + batch_size, page_count)))
+        for start in range(0, page_count, batch_size)
+    ]
+    pool = get_render_pool(workers)
+    if pool is None:
+        for batch in batches:
+            pages = process_pages(path, batch)
+            _record(pages)
+            yield pages
+        return
+
+    futures = {pool.submit(process_pages, path, batch): batch for batch in batches}
+    try:
+        for future in as_completed(futures):
+            try:
+                pages = future.result()
+            except BrokenProcessPool:
+                # ワーカーが落ちた（OOM等）場合はプールを作り直し、残りはこのスレッドで処理
+                logger.warning("PDF render pool broken, rendering pages %s in-process", futures[future])
+                _discard_pool(pool)
+                pages = process_pages(path, futures[future])
+            _record(pages)
+            yield pages
+    finally:
+        for future in futures:
+            future.cancel()
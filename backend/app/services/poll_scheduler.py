@@ -0,0 +1,263 @@
+"""SFTP変更検知のポーリングスケジューラ
+
+組織ごとのポーリングをイベントループ外のワーカースレッド（上限付き）で実行する。
+- 初回は間隔内のランダムな時刻に分散し、以降も間隔に揺らぎ（jitter）を加えて同時刻に集中させない
+- 間隔は組織ごとに設定可能（system_settings.box_poll_interval_minutes、未設定ならサーバー既定）
+- 前回の実行がまだ終わっていない組織は次の実行を積まない（遅いSFTPホストが他組織を詰まらせない）
+- 実行ごとに開始日時・所要時間・結果を system_settings に記録する
+- 複数プロセスで動かしても、間隔内に他プロセスが開始した組織は実行しない
+- 自動再同期が有効な組織は、時間帯内であれば outdated のドキュメントを取り込みジョブに登録する
+"""
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.document import SystemSettings
+from app.services.ingestion import enqueue_outdated_syncs
+from app.services.resync_window import in_window
+from app.services.sftp_poller import poll_org_changes
+
+logger = logging.getLogger(__name__)
+
+TICK_SECONDS = 5
+REFRESH_SECONDS = 60  # 対象組織・間隔の再読み込み
+CLAIM_FRACTION = 0.5  # 間隔のこの割合以内に他プロセスが開始していれば実行しない
+
+
+def load_poll_targets(db: Session) -> dict[str, float]:
+    """ポーリング対象の組織と間隔（秒）"""
+    rows = db.query(SystemSettings.organization_id, SystemSettings.box_poll_interval_minutes).filter(
+        SystemSettings.box_poll_enabled == True,
+        SystemSettings.box_client_id != "",
+        SystemSettings.box_enterprise_id != "",
+    ).all()
+    return {
+        org_id: minutes * 60 if minutes else settings.sftp_poll_interval_seconds
+        for org_id, minutes in rows
+    }
+
+
+def claim_poll(db: Session, org_id: str, interval_seconds: Optional[float]) -> bool:
+    """
+    開始日時を記録して実行権を得る。
+    interval_seconds 指定時は、間隔内に他プロセスが開始済みなら False（None は常に実行）
+    """
+    now = datetime.now(timezone.utc)
+    stmt = update(SystemSettings).where(SystemSettings.organization_id == org_id)
+    if interval_seconds is not None:
+        cutoff = now - timedelta(seconds=interval_seconds * CLAIM_FRACTION)
+        stmt = stmt.where(or_(
+            SystemSettings.box_last_polled_at.is_(None), SystemSettings.box_last_polled_at < cutoff,
+        ))
+    claimed = db.execute(stmt.values(box_last_polled_at=now)).rowcount
+    db.commit()
+    return interval_seconds is None or claimed > 0
+
+
+def record_poll_run(db: Session, org_id: str, seconds: float, status: str, detail: str) -> None:
+    db.execute(
+        update(SystemSettings)
+        .where(SystemSettings.organization_id == org_id)
+        .values(box_last_poll_seconds=seconds, box_last_poll_status=status, box_last_poll_detail=detail)
+    )
+    db.commit()
+
+
+def poll_status(result: dict) -> str:
+    """
+    ポーリング結果の記録用ステータス。一覧取得・接続の失敗は例外ではなく errors で報告されるため、
+    1件も確認できなければ error、一部のフォルダのみ失敗なら partial
+    """
+    if not result.get("errors"):
+        return "ok"
+    return "partial" if result.get("checked") or result.get("new") else "error"
+
+
+class PollScheduler:
+    def __init__(
+        self,
+        max_workers: int,
+        jitter: float,
+        poll: Callable[[Session, str], dict] = poll_org_changes,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ):
+        self.max_workers = max_workers
+        self.jitter = jitter
+        self._poll = poll
+        self._session_factory = session_factory
+        self._lock = threading.Lock()
+        self._intervals: dict[str, float] = {}
+        self._next_run: dict[str, float] = {}
+        self._running: set[str] = set()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._stats = {"runs": 0, "failures": 0, "partial": 0, "skipped": 0}
+
+    # ---------- スケジュール ----------
+
+    def set_targets(self, targets: dict[str, float], now: float) -> None:
+        """対象組織を反映する。新規・間隔変更の組織は間隔内のランダムな時刻に初回を置く"""
+        with self._lock:
+            for org_id in set(self._intervals) - set(targets):
+                del self._intervals[org_id]
+                self._next_run.pop(org_id, None)
+            for org_id, interval in targets.items():
+                if self._intervals.get(org_id) != interval:
+                    self._intervals[org_id] = interval
+                    self._next_run[org_id] = now + random.uniform(0, interval)
+
+    def _next_delay(self, interval: float) -> float:
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def take_due(self, now: float) -> list[tuple[str, float]]:
+        """
+        期限の来た組織を空きワーカー数まで取り出し、次回時刻を進める。
+        実行中の組織と空きの無い分は取り出さない（期限切れのまま次のtickで再判定）
+        """
+        with self._lock:
+            free = self.max_workers - len(self._running)
+            due = sorted(
+                (at, org_id) for org_id, at in self._next_run.items()
+                if at <= now and org_id not in self._running
+            )
+            taken = []
+            for _, org_id in due[:max(free, 0)]:
+                interval = self._intervals[org_id]
+                self._next_run[org_id] = now + self._next_delay(interval)
+                self._running.add(org_id)
+                taken.append((org_id, interval))
+            return taken
+
+    # ---------- 実行 ----------
+
+    def _record(self, db: Session, org_id: str, seconds: float, status: str, detail: str) -> None:
+        with self._lock:
+            self._stats["runs"] += 1
+            if status == "error":
+                self._stats["failures"] += 1
+            elif status == "partial":
+                self._stats["partial"] += 1
+        try:
+            record_poll_run(db, org_id, round(seconds, 3), status, detail)
+        except Exception as e:
+            db.rollback()
+            logger.warning("Could not record poll run for org=%s: %s", org_id, e)
+
+    def _queue_resyncs(self, db: Session, org_id: str) -> int:
+        """自動再同期が有効で実行時間帯内なら outdated を取り込みジョブに登録"""
+        row = db.query(SystemSettings.box_auto_resync, SystemSettings.box_resync_window).filter(
+            SystemSettings.organization_id == org_id
+        ).first()
+        if not row or not row.box_auto_resync:
+            return 0
+        try:
+            if not in_window(row.box_resync_window):
+                return 0
+        except ValueError:
+            pass  # 不正な時間帯は終日扱い（paused_orgs と同じ）
+        try:
+            return enqueue_outdated_syncs(db, org_id, settings.sftp_resync_batch_size)
+        except Exception as e:
+            db.rollback()
+            logger.warning("Could not queue resyncs for org=%s: %s", org_id, e)
+            return 0
+
+    def run_once(self, org_id: str, interval_seconds: Optional[float] = None) -> Optional[dict]:
+        """
+        1組織をポーリングして結果を記録する。
+        interval_seconds を指定した場合、間隔内に他プロセスが開始済みなら実行せず None を返す
+        """
+        db = self._session_factory()
+        try:
+            if not claim_poll(db, org_id, interval_seconds):
+                with self._lock:
+                    self._stats["skipped"] += 1
+                return None
+            started = time.monotonic()
+            try:
+                result = self._poll(db, org_id)
+            except Exception as e:
+                db.rollback()
+                logger.error("Poll failed for org=%s: %s", org_id, e)
+                self._record(db, org_id, time.monotonic() - started, "error", str(e)[:1000])
+                raise
+            result["queued"] = self._queue_resyncs(db, org_id) if result.get("outdated") else 0
+            seconds = time.monotonic() - started
+            self._record(db, org_id, seconds, poll_status(result), json.dumps(result))
+            if result.get("outdated") or result.get("deleted") or result.get("new"):
+                logger.info("Poll org=%s (%.1fs): %s", org_id, seconds, result)
+            return result
+        finally:
+            db.close()
+
+    def _run_scheduled(self, org_id: str, interval: float) -> None:
+        try:
+            self.run_once(org_id, interval)
+        except Exception:
+            pass  # run_once で記録・ログ済み
+        finally:
+            with self._lock:
+                self._running.discard(org_id)
+
+    def _loop(self, executor: ThreadPoolExecutor) -> None:
+        refreshed: Optional[float] = None
+        while not self._stop.wait(TICK_SECONDS):
+            now = time.monotonic()
+            if refreshed is None or now - refreshed >= REFRESH_SECONDS:
+                db = self._session_factory()
+                try:
+                    self.set_targets(load_poll_targets(db), now)
+                    refreshed = now
+                except Exception as e:
+                    logger.error("Poll scheduler: could not load targets: %s", e)
+                finally:
+                    db.close()
+            for org_id, interval in self.take_due(now):
+                try:
+                    executor.submit(self._run_scheduled, org_id, interval)
+                except RuntimeError:  # stop() 後
+                    with self._lock:
+                        self._running.discard(org_id)
+
+    def start(self) -> None:
+        if self._thread is not None or self.max_workers <= 0:
+            return
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="sftp-poll")
+        self._thread = threading.Thread(
+            target=self._loop, args=(self._executor,), name="sftp-poll-scheduler", daemon=True,
+        )
+        self._thread.start()
+        logger.info("SFTP poll scheduler started (workers=%d)", self.max_workers)
+
+    def stop(self) -> None:
+        """新規の実行を止める（実行中のポーリングは待たない）"""
+        self._stop.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._thread = None
+        self._executor = None
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                **self._stats,
+                "scheduled": len(self._intervals),
+                "running": len(self._running),
+                "overdue": sum(1 for at in self._next_run.values() if at <= now - TICK_SECONDS),
+            }
+
+
+poll_scheduler = PollScheduler(max_workers=settings.sftp_poll_workers, jitter=settings.sftp_poll_jitter)
@@ -0,0 +1,171 @@
+"""認証済みユーザー（プリンシパル）の短期キャッシュ
+
+get_current_user / get_current_user_optional がリクエストごとに users を引かないよう、
+ユーザーID → 権限判定に使う属性（ロール・組織・部門・有効フラグ・組織のプラン/トライアル期限）を
+プロセス内に TTL 付きで保持する。
+- User / Department / Organization の更新・削除はコミット時にこのプロセスのエントリを破棄する
+- 他プロセスでの変更は TTL（principal_cache_ttl_seconds）で反映される
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.document import Department, User
+from app.models.organization import Organization
+
+
+@dataclass(frozen=True)
+class Principal:
+    """認証済みユーザーの読み取り専用スナップショット（ORMの User と同名の属性を持つ）"""
+    id: str
+    email: str
+    name: str
+    role: str
+    organization_id: str
+    department_id: Optional[str]
+    is_active: bool
+    department_name: Optional[str] = None
+    organization_name: Optional[str] = None
+    plan: Optional[str] = None  # 組織のプラン
+    trial_ends_at: Optional[datetime] = None  # 組織のトライアル期限
+
+
+def load_principal(db: Session, user_id: str) -> Optional[Principal]:
+    """ユーザー・部門・組織を1クエリで取得"""
+    row = db.query(
+        User.id, User.email, User.name, User.role, User.organization_id, User.department_id, User.is_active,
+        Department.name.label("department_name"),
+        Organization.name.label("organization_name"),
+        Organization.plan,
+        Organization.trial_ends_at,
+    ).outerjoin(
+        Department, Department.id == User.department_id,
+    ).outerjoin(
+        Organization, Organization.id == User.organization_id,
+    ).filter(User.id == user_id).first()
+    if row is None:
+        return None
+    return Principal(
+        id=row.id,
+        email=row.email,
+        name=row.name,
+        role=row.role,
+        organization_id=row.organization_id,
+        department_id=row.department_id,
+        is_active=bool(row.is_active),
+        department_name=row.department_name,
+        organization_name=row.organization_name,
+        plan=row.plan,
+        trial_ends_at=row.trial_ends_at,
+    )
+
+
+class PrincipalCache:
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, Principal]] = OrderedDict()
+        self._counters = {"hits": 0, "misses": 0, "invalidated": 0}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str) -> Optional[Principal]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[user_id]
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self._counters["hits"] += 1
+            return entry[1]
+
+    def put(self, principal: Principal) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[principal.id] = (time.monotonic() + self.ttl_seconds, principal)
+            self._entries.move_to_end(principal.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def resolve(self, db: Session, user_id: str) -> Optional[Principal]:
+        """キャッシュになければ DB から読み込んで保持（存在しないユーザーは保持しない）"""
+        principal = self.get(user_id)
+        if principal is None:
+            principal = load_principal(db, user_id)
+            if principal is not None:
+                self.put(principal)
+        return principal
+
+    def _drop(self, match) -> None:
+        with self._lock:
+            stale = [user_id for user_id, (_, p) in self._entries.items() if match(user_id, p)]
+            for user_id in stale:
+                del self._entries[user_id]
+            self._counters["invalidated"] += len(stale)
+
+    def invalidate_user(self, user_id: str) -> None:
+        self._drop(lambda uid, p: uid == user_id)
+
+    def invalidate_department(self, department_id: str) -> None:
+        self._drop(lambda uid, p: p.department_id == department_id)
+
+    def invalidate_organization(self, organization_id: str) -> None:
+        self._drop(lambda uid, p: p.organization_id == organization_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._counters, "size": len(self._entries)}
+
+
+principal_cache = PrincipalCache(settings.principal_cache_ttl_seconds, settings.principal_cache_max_entries)
+
+
+# ================================================================
+# 破棄フック: フラッシュ時に変更対象を記録し、コミット後に破棄する
+# （コミット前に破棄すると、他リクエストが旧値を読み直して TTL の間残るため）
+# ================================================================
+
+_PENDING_KEY = "principal_cache_pending"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session: Session, flush_context) -> None:
+    pending = session.info.setdefault(_PENDING_KEY, set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            pending.add(("user", obj.id))
+        elif isinstance(obj, Department):
+            pending.add(("department", obj.id))
+        elif isinstance(obj, Organization):
+            pending.add(("organization", obj.id))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session) -> None:
+    for kind, key in session.info.pop(_PENDING_KEY, ()):
+        if kind == "user":
+            principal_cache.invalidate_user(key)
+        elif kind == "department":
+            principal_cache.invalidate_department(key)
+        else:
+            principal_cache.invalidate_organization(key)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending(session: Session, previous_transaction) -> None:
+    if not previous_transaction.nested:  # SAVEPOINT の巻き戻しでは外側の変更は残る
+        session.info.pop(_PENDING_KEY, None)
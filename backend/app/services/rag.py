@@ -1,6 +1,9 @@
 import logging
+import re
+import unicodedata
 from typing import AsyncGenerator
 
+import openai
 from langchain_anthropic import ChatAnthropic
 from langchain_openai import OpenAIEmbeddings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
@@ -9,10 +12,90 @@ from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
+from app.services.embedding_cache import embedding_cache
+from app.services.embedding_pipeline import EmbeddingPipeline
+from app.services.llm_governor import Priority, estimate_tokens, llm_governor
 
 logger = logging.getLogger(__name__)
 from app.models.document import Document, DocumentChunk
 
+# 新しさボーナス: 180日半減期で最大0.03加算（同等の類似度なら新しい文書を優先）
+RECENCY_BONUS_SQL = (
+    "0.03 * EXP(-EXTRACT(EPOCH FROM (NOW() - COALESCE(d.updated_at, d.created_at))) / (86400.0 * 180))"
+)
+
+# 全文一致用の語抽出
+_TERM_SPLIT_RE = re.compile(r"[\s、。，,．・!！?？「」『』（）()\[\]【】:：;；/／]+")
+_HIRAGANA_RE = re.compile(r"[\u3041-\u309f]+")
+_ARTICLE_RE = re.compile(r"第\s*[0-9一二三四五六七八九十百]+\s*[条章項節号]")
+MAX_LEXICAL_TERMS = 8
+# pg_trgm のGINインデックスは3文字未満のパターンに使えず、OR条件に1つでも混ざると全体が逐次走査になる。
+# 2文字の語は一致条件に入れず、3文字以上の語で取得した候補のスコア付けにだけ使う
+MIN_MATCH_TERM_CHARS = 3
+
+
+def extract_lexical_terms(query: str) -> list[str]:
+    """
+    検索クエリから全文一致用の語を抽出する。
+    形態素解析は使わず、条番号（第20条）・英数字コードと、ひらがなで区切った
+    漢字/カタカナ/英数字の連続（2文字以上）を語とみなす。
+    """
+    normalized = unicodedata.normalize("NFKC", query)
+    terms: list[str] = []
+    for m in _ARTICLE_RE.finditer(normalized):
+        terms.append(re.sub(r"\s+", "", m.group()))
+    for token in _TERM_SPLIT_RE.split(normalized):
+        for piece in _HIRAGANA_RE.split(token):
+            if len(piece) >= 2:
+                terms.append(piece)
+    unique: list[str] = []
+    for t in terms:
+        if t not in unique:
+            unique.append(t)
+    return unique[:MAX_LEXICAL_TERMS]
+
+
+_iterative_scan_supported: bool | None = None
+
+
+def _supports_iterative_scan(db: Session) -> bool:
+    """pgvector 0.8.0以降か（hnsw.iterative_scan対応）。初回のみ問い合わせる"""
+    global _iterative_scan_supported
+    if _iterative_scan_supported is None:
+        version = db.execute(text(
+            "SELECT extversion FROM pg_extension WHERE extname = 'vector'"
+        )).scalar()
+        try:
+            major, minor = (int(p) for p in (version or "0.0").split(".")[:2])
+        except ValueError:
+            major, minor = 0, 0
+        _iterative_scan_supported = (major, minor) >= (0, 8)
+    return _iterative_scan_supported
+
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def build_lexical_sql(terms: list[str]) -> tuple[str, str, dict[str, str]] | None:
+    """
+    全文一致の (一致条件SQL, スコアSQL, パラメータ) を組み立てる。
+    一致条件は MIN_MATCH_TERM_CHARS 以上の語のみ（トライグラムインデックスで絞り込める）。
+    スコアは短い語も含めて、一致した語の文字数の合計とする。該当する語がなければ None。
+    """
+    params = {f"term_{i}": f"%{_escape_like(t)}%" for i, t in enumerate(terms)}
+    names = list(params)
+    match_sql = " OR ".join(
+        f"dc.content ILIKE :{name}" for name, t in zip(names, terms) if len(t) >= MIN_MATCH_TERM_CHARS
+    )
+    if not match_sql:
+        return None
+    score_sql = " + ".join(
+        f"(CASE WHEN dc.content ILIKE :{name} THEN {len(t)} ELSE 0 END)"
+        for name, t in zip(names, terms)
+    )
+    return match_sql, score_sql, params
+
 
 class RAGService:
     def __init__(self):
@@ -27,6 +110,14 @@ class RAGService:
             streaming=True,
             max_tokens=4096,
         )
+        self._openai_client: openai.OpenAI | None = None
+        self.embedding_pipeline = EmbeddingPipeline(
+            embed_fn=lambda texts: self.embed_batch(texts),
+            max_tokens=settings.embedding_batch_max_tokens,
+            max_items=settings.embedding_batch_max_items,
+            concurrency=settings.embedding_concurrency,
+            max_retries=settings.embedding_max_retries,
+        )
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=settings.chunk_size,
             chunk_overlap=settings.chunk_overlap,
@@ -37,112 +128,57 @@ class RAGService:
         return self.text_splitter.split_text(text)
 
     def get_embedding(self, text: str) -> list[float]:
-        return self.embeddings.embed_query(text)
+        # 同一クエリはキャッシュから返す（OpenAIへの往復を省略）
+        return embedding_cache.get_or_compute(
+            settings.openai_embedding_model, text, self.embeddings.embed_query
+        )
+
+    @property
+    def openai_client(self) -> openai.OpenAI:
+        if self._openai_client is None:
+            # 再試行は EmbeddingPipeline がバッチ単位で行う
+            self._openai_client = openai.OpenAI(api_key=settings.openai_api_key, max_retries=0)
+        return self._openai_client
+
+    def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        """1リクエスト分の埋め込み（バッチ分割・再試行は呼び出し側）"""
+        response = self.openai_client.embeddings.create(model=settings.openai_embedding_model, input=texts)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    def iter_embeddings(self, texts: list[str]):
+        """(texts 内のインデックス, ベクトル) をバッチ完了順に返す"""
+        return self.embedding_pipeline.iter_batches(texts)
 
     def get_embeddings(self, texts: list[str]) -> list[list[float]]:
-        return self.embeddings.embed_documents(texts)
+        return self.embedding_pipeline.embed_all(texts)
 
     def search_similar_chunks(
         self, db: Session, query: str, top_k: int = None, user_department_id: str = None,
-        organization_id: str = None
-    ) -> list[tuple[DocumentChunk, float]]:
+        organization_id: str = None, mode: str = None
+    ) -> list[dict]:
         """
         類似チャンクを検索
         user_department_id: ユーザーの部門ID（Noneの場合は全ドキュメント対象、管理者用）
         organization_id: テナントID（マルチテナント分離用）
+        mode: "vector"（コサイン類似度のみ）/ "hybrid"（ベクトル + 全文一致をRRFで融合）
+              Noneの場合は settings.retrieval_mode
         """
         if top_k is None:
             top_k = settings.retrieval_top_k
+        if mode is None:
+            mode = settings.retrieval_mode
 
         query_embedding = self.get_embedding(query)
         embedding_str = "[" + ",".join(map(str, query_embedding)) + "]"
 
-        # 新しさボーナス: 180日半減期で最大0.03加算（同等の類似度なら新しい文書を優先）
-        recency_expr = """
-                           0.03 * EXP(-EXTRACT(EPOCH FROM (NOW() - COALESCE(d.updated_at, d.created_at))) / (86400.0 * 180))"""
-
-        # 部門別アクセス制御を含むクエリ
-        if user_department_id:
-            if organization_id:
-                sql = text(f"""
-                    SELECT dc.id, dc.document_id, dc.content, dc.chunk_index,
-                           d.filename, d.file_type,
-                           (1 - (dc.embedding <=> cast(:query_embedding as vector)))
-                           +{recency_expr}
-                           as similarity
-                    FROM document_chunks dc
-                    JOIN documents d ON dc.document_id = d.id
-                    LEFT JOIN document_department dd ON d.id = dd.document_id
-                    WHERE (d.is_public = true OR dd.department_id = :department_id)
-                       AND dc.organization_id = :organization_id
-                    GROUP BY dc.id, dc.document_id, dc.content, dc.chunk_index,
-                             d.filename, d.file_type, dc.embedding, d.updated_at, d.created_at
-                    ORDER BY similarity DESC
-                    LIMIT :top_k
-                """)
-                result = db.execute(sql, {
-                    "query_embedding": embedding_str,
-                    "top_k": top_k,
-                    "department_id": user_department_id,
-                    "organization_id": organization_id,
-                })
-            else:
-                sql = text(f"""
-                    SELECT dc.id, dc.document_id, dc.content, dc.chunk_index,
-                           d.filename, d.file_type,
-                           (1 - (dc.embedding <=> cast(:query_embedding as vector)))
-                           +{recency_expr}
-                           as similarity
-                    FROM document_chunks dc
-                    JOIN documents d ON dc.document_id = d.id
-                    LEFT JOIN document_department dd ON d.id = dd.document_id
-                    WHERE d.is_public = true
-                       OR dd.department_id = :department_id
-                    GROUP BY dc.id, dc.document_id, dc.content, dc.chunk_index,
-                             d.filename, d.file_type, dc.embedding, d.updated_at, d.created_at
-                    ORDER BY similarity DESC
-                    LIMIT :top_k
-                """)
-                result = db.execute(sql, {
-                    "query_embedding": embedding_str,
-                    "top_k": top_k,
-                    "department_id": user_department_id,
-                })
+        if mode == "hybrid":
+            result = self._search_hybrid(
+                db, query, embedding_str, top_k, user_department_id, organization_id
+            )
         else:
-            if organization_id:
-                sql = text(f"""
-                    SELECT dc.id, dc.document_id, dc.content, dc.chunk_index,
-                           d.filename, d.file_type,
-                           (1 - (dc.embedding <=> cast(:query_embedding as vector)))
-                           +{recency_expr}
-                           as similarity
-                    FROM document_chunks dc
-                    JOIN documents d ON dc.document_id = d.id
-                    WHERE dc.organization_id = :organization_id
-                    ORDER BY similarity DESC
-                    LIMIT :top_k
-                """)
-                result = db.execute(sql, {
-                    "query_embedding": embedding_str,
-                    "top_k": top_k,
-                    "organization_id": organization_id,
-                })
-            else:
-                sql = text(f"""
-                    SELECT dc.id, dc.document_id, dc.content, dc.chunk_index,
-                           d.filename, d.file_type,
-                           (1 - (dc.embedding <=> cast(:query_embedding as vector)))
-                           +{recency_expr}
-                           as similarity
-                    FROM document_chunks dc
-                    JOIN documents d ON dc.document_id = d.id
-                    ORDER BY similarity DESC
-                    LIMIT :top_k
-                """)
-                result = db.execute(sql, {
-                    "query_embedding": embedding_str,
-                    "top_k": top_k,
-                })
+            result = self._search_vector(
+                db, embedding_str, top_k, user_department_id, organization_id
+            )
 
         return [
             {
@@ -157,6 +193,181 @@ class RAGService:
             for row in result
         ]
 
+    def _search_vector(
+        self, db: Session, embedding_str: str, top_k: int, user_department_id: str | None,
+        organization_id: str | None
+    ):
+        """
+        HNSWインデックス順（生のコサイン距離）でANN候補を多めに取得し、
+        候補集合に対して新しさボーナスを加えて再ランクする。
+        ACLは候補取得時のフィルタ（閲覧可能ドキュメント集合）として適用するため、
+        GROUP BY やJOINでインデックス順序が崩れない。
+        """
+        candidate_k = max(top_k * settings.retrieval_overfetch_factor, settings.retrieval_candidate_pool)
+        acl_sql, params = self._acl_filter(db, user_department_id, organization_id)
+        self._configure_ann_scan(db, candidate_k)
+
+        sql = text(f"""
+            WITH candidates AS MATERIALIZED (
+                SELECT dc.id, dc.document_id, dc.content, dc.chunk_index,
+                       dc.embedding <=> cast(:query_embedding as vector) AS distance
+                FROM document_chunks dc
+                WHERE {acl_sql}
+                ORDER BY dc.embedding <=> cast(:query_embedding as vector)
+                LIMIT :candidate_k
+            )
+            SELECT c.id, c.document_id, c.content, c.chunk_index,
+                   d.filename, d.file_type,
+                   (1 - c.distance)
+                   + {RECENCY_BONUS_SQL}
+                   as similarity
+            FROM candidates c
+            JOIN documents d ON c.document_id = d.id
+            ORDER BY similarity DESC
+            LIMIT :top_k
+        """)
+        return db.execute(sql, {
+            **params,
+            "query_embedding": embedding_str,
+            "candidate_k": candidate_k,
+            "top_k": top_k,
+        })
+
+    def _acl_filter(
+        self, db: Session, user_department_id: str | None, organization_id: str | None
+    ) -> tuple[str, dict]:
+        """
+        document_chunks(dc) に対するテナント・部門ACL条件（JOIN不要の形）。
+        organization_id の等価条件はテナント別の部分HNSWインデックス（vector_index.py）の述語に一致させる。
+        """
+        conditions = []
+        params: dict = {}
+        if organization_id:
+            conditions.append("dc.organization_id = :organization_id")
+            params["organization_id"] = organization_id
+        if user_department_id:
+            visible, hidden = self._document_visibility(db, user_department_id, organization_id)
+            if hidden:
+                # 件数の少ない方の集合で条件を組み立てる
+                if len(hidden) <= len(visible):
+                    conditions.append("NOT (dc.document_id = ANY(:hidden_document_ids))")
+                    params["hidden_document_ids"] = hidden
+                else:
+                    conditions.append("dc.document_id = ANY(:visible_document_ids)")
+                    params["visible_document_ids"] = visible
+        return (" AND ".join(conditions) if conditions else "true"), params
+
+    @staticmethod
+    def _document_visibility(
+        db: Session, user_department_id: str, organization_id: str | None
+    ) -> tuple[list[str], list[str]]:
+        """部門ユーザーが閲覧可能/不可のドキュメントIDを返す（documentsのみの軽量クエリ）"""
+        sql = """
+            SELECT d.id,
+                   (d.is_public = true OR EXISTS (
+                       SELECT 1 FROM document_department dd
+                       WHERE dd.document_id = d.id AND dd.department_id = :department_id
+                   )) AS visible
+            FROM documents d
+        """
+        params = {"department_id": user_department_id}
+        if organization_id:
+            sql += " WHERE d.organization_id = :organization_id"
+            params["organization_id"] = organization_id
+        visible: list[str] = []
+        hidden: list[str] = []
+        for row in db.execute(text(sql), params):
+            (visible if row.visible else hidden).append(row.id)
+        return visible, hidden
+
+    @staticmethod
+    def _configure_ann_scan(db: Session, candidate_k: int) -> None:
+        """
+        トランザクション内限定でHNSWの探索幅を候補数に合わせる。
+        pgvector 0.8以降はフィルタで候補が不足した場合に探索を継続する iterative scan を有効化。
+        """
+        ef_search = min(max(candidate_k, settings.hnsw_ef_search), 1000)
+        if settings.hnsw_iterative_scan != "off" and _supports_iterative_scan(db):
+            db.execute(text(
+                "SELECT set_config('hnsw.ef_search', :ef_search, true), "
+                "set_config('hnsw.iterative_scan', :iterative_scan, true)"
+            ), {"ef_search": str(ef_search), "iterative_scan": settings.hnsw_iterative_scan})
+        else:
+            db.execute(text("SELECT set_config('hnsw.ef_search', :ef_search, true)"),
+                       {"ef_search": str(ef_search)})
+
+    def _search_hybrid(
+        self, db: Session, query: str, embedding_str: str, top_k: int,
+        user_department_id: str | None, organization_id: str | None
+    ):
+        """ベクトル順位と全文一致（pg_trgm GINインデックス）順位をRRFで融合（検索は1クエリ）"""
+        candidate_k = max(top_k, settings.retrieval_candidate_pool)
+        acl_sql, params = self._acl_filter(db, user_department_id, organization_id)
+        params.update({
+            "query_embedding": embedding_str,
+            "top_k": top_k,
+            "candidate_k": candidate_k,
+            "rrf_k": settings.retrieval_rrf_k,
+        })
+        self._configure_ann_scan(db, candidate_k)
+
+        lexical = build_lexical_sql(extract_lexical_terms(query))
+        if lexical:
+            match_sql, score_sql, term_params = lexical
+            params.update(term_params)
+            lexical_cte = f"""
+                lexical_candidates AS (
+                    SELECT dc.id,
+                           ({score_sql}) AS lexical_score,
+                           dc.embedding <=> cast(:query_embedding as vector) AS distance
+                    FROM document_chunks dc
+                    WHERE {acl_sql} AND ({match_sql})
+                    ORDER BY lexical_score DESC, distance
+                    LIMIT :candidate_k
+                ),
+                lexical_ranked AS (
+                    SELECT id, ROW_NUMBER() OVER (ORDER BY lexical_score DESC, distance) AS rank
+                    FROM lexical_candidates
+                )"""
+        else:
+            lexical_cte = """
+                lexical_ranked AS (
+                    SELECT CAST(NULL AS VARCHAR) AS id, CAST(NULL AS BIGINT) AS rank WHERE false
+                )"""
+
+        sql = text(f"""
+            WITH vector_candidates AS MATERIALIZED (
+                SELECT dc.id, dc.embedding <=> cast(:query_embedding as vector) AS distance
+                FROM document_chunks dc
+                WHERE {acl_sql}
+                ORDER BY dc.embedding <=> cast(:query_embedding as vector)
+                LIMIT :candidate_k
+            ),
+            vector_ranked AS (
+                SELECT id, ROW_NUMBER() OVER (ORDER BY distance) AS rank
+                FROM vector_candidates
+            ),{lexical_cte},
+            fused AS (
+                SELECT COALESCE(v.id, l.id) AS id,
+                       COALESCE(1.0 / (:rrf_k + v.rank), 0)
+                       + COALESCE(1.0 / (:rrf_k + l.rank), 0) AS rrf_score
+                FROM vector_ranked v
+                FULL OUTER JOIN lexical_ranked l ON v.id = l.id
+            )
+            SELECT dc.id, dc.document_id, dc.content, dc.chunk_index,
+                   d.filename, d.file_type,
+                   (1 - (dc.embedding <=> cast(:query_embedding as vector)))
+                   + {RECENCY_BONUS_SQL}
+                   as similarity,
+                   f.rrf_score
+            FROM fused f
+            JOIN document_chunks dc ON dc.id = f.id
+            JOIN documents d ON dc.document_id = d.id
+            ORDER BY f.rrf_score DESC, similarity DESC
+            LIMIT :top_k
+        """)
+        return db.execute(sql, params)
+
     async def generate_answer(
         self, question: str, context_chunks: list[dict], conversation_history: list[dict] = None
     ) -> AsyncGenerator[str, None]:
@@ -207,11 +418,17 @@ class RAGService:
 
         chain = prompt | self.llm
 
-        async for chunk in chain.astream({
-            "question": question,
-        }):
-            if chunk.content:
-                yield chunk.content
+        # langchain経由のため再試行はSDKに任せ、実行枠とバジェットのみガバナーで確保する
+        async with llm_governor.aslot(
+            model=self.llm.model,
+            priority=Priority.INTERACTIVE,
+            estimate=estimate_tokens([{"content": question}], system=system_prompt, max_tokens=4096),
+        ):
+            async for chunk in chain.astream({
+                "question": question,
+            }):
+                if chunk.content:
+                    yield chunk.content
 
 
 rag_service = RAGService()
@@ -0,0 +1,55 @@
+"""自動再同期の実行時間帯（オフピーク枠）
+
+system_settings.box_resync_window に "HH:MM-HH:MM"（sftp_resync_timezone の現地時刻）で指定する。
+日付をまたぐ枠（例 "22:00-06:00"）も可。空なら終日。
+"""
+from datetime import datetime, time, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.document import SystemSettings
+
+
+def parse_window(value: str) -> Optional[tuple[time, time]]:
+    """"HH:MM-HH:MM" を (開始, 終了) に変換。空なら None、形式不正は ValueError"""
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        start, end = (time.fromisoformat(part.strip()) for part in value.split("-"))
+    except ValueError:
+        raise ValueError(f"時間帯は HH:MM-HH:MM の形式で指定してください: {value}")
+    if start == end:
+        raise ValueError(f"開始と終了が同じ時刻です: {value}")
+    return start, end
+
+
+def in_window(value: str, now: Optional[datetime] = None) -> bool:
+    window = parse_window(value)
+    if window is None:
+        return True
+    now = (now or datetime.now(timezone.utc)).astimezone(ZoneInfo(settings.sftp_resync_timezone))
+    start, end = window
+    current = now.time().replace(second=0, microsecond=0)
+    if start < end:
+        return start <= current < end
+    return current >= start or current < end
+
+
+def paused_orgs(db: Session, now: Optional[datetime] = None) -> list[str]:
+    """実行時間帯の外にある組織（自動再同期ジョブを取得しない）"""
+    rows = db.query(SystemSettings.organization_id, SystemSettings.box_resync_window).filter(
+        SystemSettings.box_resync_window.isnot(None),
+        SystemSettings.box_resync_window != "",
+    ).all()
+    paused = []
+    for org_id, window in rows:
+        try:
+            if not in_window(window, now):
+                paused.append(org_id)
+        except ValueError:
+            pass  # 保存時に検証済み。不正値は終日扱い
+    return paused
@@ -1,88 +1,128 @@
 """SFTPファイル変更検知ポーリング"""
-import asyncio
 import logging
+import posixpath
+import re
+from collections import defaultdict
 from datetime import datetime, timezone
 
 from sqlalchemy.orm import Session
 
 from app.models.document import Document, SystemSettings
-from app.services.sftp_service import get_sftp_service_for_org
+from app.services.sftp_service import RemoteFile, get_sftp_service_for_org
 
 logger = logging.getLogger(__name__)
 
-POLL_INTERVAL_SECONDS = 30 * 60  # 30分
+POLLED_STATUSES = ("synced", "outdated", "deleted")
+
+
+def _norm_dir(directory: str) -> str:
+    return re.sub(r"/+", "/", directory).rstrip("/") or "/"
+
+
+def _dir_of(path: str) -> str:
+    return _norm_dir(posixpath.dirname(re.sub(r"/+", "/", path)))
+
+
+def _result(**counts: int) -> dict:
+    return {"checked": 0, "outdated": 0, "deleted": 0, "new": 0, "directories": 0, "errors": 0, **counts}
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _is_changed(doc: Document, remote: RemoteFile) -> bool:
+    """保存済みの mtime / サイズと比較（未保存の旧データは同期日時との比較にフォールバック）"""
+    if doc.source_mtime is not None or doc.source_size is not None:
+        stored_mtime = _as_utc(doc.source_mtime) if doc.source_mtime else None
+        return stored_mtime != remote.modified_at or doc.source_size != remote.size
+    if not remote.modified_at or not doc.box_synced_at:
+        return False
+    return remote.modified_at > _as_utc(doc.box_synced_at)
 
 
 def poll_org_changes(db: Session, org_id: str) -> dict:
-    """指定orgのSFTP連携ドキュメントの変更を検知し outdated マーク"""
+    """
+    指定orgのSFTP連携ドキュメントの変更を検知する。
+    追跡中のファイルを親ディレクトリごとにまとめ、ディレクトリ1つにつき listdir_attr 1回で
+    mtime / サイズを比較する（ファイル数ではなくディレクトリ数の往復で済む）。
+    - 変更あり: outdated
+    - 一覧に無い: deleted（再び現れたら outdated）
+    - 監視ディレクトリ内の未取り込みファイル: new として件数を返す
+    """
     svc = get_sftp_service_for_org(db, org_id)
     if not svc.is_configured:
-        return {"checked": 0, "outdated": 0, "errors": 0}
+        return _result()
 
     docs = db.query(Document).filter(
         Document.organization_id == org_id,
         Document.box_file_id.isnot(None),
-        Document.box_sync_status.in_(["synced", "outdated"]),
     ).all()
+    watched = db.query(SystemSettings.box_watched_folder_id).filter(
+        SystemSettings.organization_id == org_id
+    ).scalar()
+    watched_dir = _norm_dir(f"/{watched}") if watched else None
+
+    docs_by_dir: dict[str, list[Document]] = defaultdict(list)
+    for doc in docs:
+        if doc.box_sync_status in POLLED_STATUSES:
+            docs_by_dir[_dir_of(doc.box_file_id)].append(doc)
+    directories = set(docs_by_dir)
+    if watched_dir:
+        directories.add(watched_dir)
+
+    if not directories:
+        return _result()
+    try:
+        listings = svc.list_directories(sorted(directories))
+    except Exception as e:
+        logger.warning(f"Poll error for org {org_id}: {e}")
+        tracked_count = sum(len(d) for d in docs_by_dir.values())
+        return _result(directories=len(directories), errors=max(tracked_count, 1))
 
     checked = 0
     outdated = 0
+    deleted = 0
     errors = 0
-
-    for doc in docs:
-        try:
-            info = svc.get_file_info(doc.box_file_id)
+    changed = False
+
+    for directory, dir_docs in docs_by_dir.items():
+        listing = listings[directory]
+        if isinstance(listing, Exception) and not isinstance(listing, FileNotFoundError):
+            logger.warning(f"Poll error for dir {directory} ({len(dir_docs)} docs): {listing}")
+            errors += len(dir_docs)
+            continue
+        files = {} if isinstance(listing, FileNotFoundError) else listing
+        for doc in dir_docs:
             checked += 1
-
-            sftp_modified = info.get("modified_at")
-            if not sftp_modified or not doc.box_synced_at:
-                continue
-
-            if isinstance(sftp_modified, str):
-                sftp_dt = datetime.fromisoformat(sftp_modified.replace("Z", "+00:00"))
-            else:
-                sftp_dt = sftp_modified
-
-            synced_at = doc.box_synced_at
-            if synced_at.tzinfo is None:
-                synced_at = synced_at.replace(tzinfo=timezone.utc)
-
-            if sftp_dt > synced_at:
-                doc.box_sync_status = "outdated"
+            remote = files.get(posixpath.basename(doc.box_file_id))
+            if remote is None:
+                if doc.box_sync_status != "deleted":
+                    doc.box_sync_status = "deleted"
+                    changed = True
+                deleted += 1
+            elif doc.box_sync_status == "deleted" or _is_changed(doc, remote):
+                if doc.box_sync_status != "outdated":
+                    doc.box_sync_status = "outdated"
+                    changed = True
                 outdated += 1
-        except Exception as e:
-            logger.warning(f"Poll error for doc {doc.id} (path={doc.box_file_id}): {e}")
+
+    new = 0
+    if watched_dir:
+        listing = listings[watched_dir]
+        if isinstance(listing, Exception):
+            logger.warning(f"Poll error for watched dir {watched_dir}: {listing}")
             errors += 1
+        else:
+            tracked = {
+                posixpath.basename(d.box_file_id) for d in docs if _dir_of(d.box_file_id) == watched_dir
+            }
+            new = len(set(listing) - tracked)
 
-    if outdated > 0:
+    if changed:
         db.commit()
 
-    return {"checked": checked, "outdated": outdated, "errors": errors}
-
-
-async def polling_loop() -> None:
-    """全orgを巡回してSFTP変更検知を行うバックグラウンドループ"""
-    from app.core.database import SessionLocal
-
-    logger.info("SFTP poll loop started (interval=%ds)", POLL_INTERVAL_SECONDS)
-    while True:
-        await asyncio.sleep(POLL_INTERVAL_SECONDS)
-        db = SessionLocal()
-        try:
-            rows = db.query(SystemSettings.organization_id).filter(
-                SystemSettings.box_poll_enabled == True,
-                SystemSettings.box_client_id != "",
-                SystemSettings.box_enterprise_id != "",
-            ).all()
-
-            for (org_id,) in rows:
-                try:
-                    result = poll_org_changes(db, org_id)
-                    if result["outdated"] > 0:
-                        logger.info("Poll org=%s: %s", org_id, result)
-                except Exception as e:
-                    logger.error("Poll failed for org=%s: %s", org_id, e)
-        except Exception as e:
-            logger.error("Poll loop error: %s", e)
-        finally:
-            db.close()
+    return _result(
+        checked=checked, outdated=outdated, deleted=deleted, new=new,
+        directories=len(directories), errors=errors,
+    )
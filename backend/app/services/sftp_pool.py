@@ -0,0 +1,249 @@
+"""SFTP接続プール
+
+接続先（ホスト・ポート・ユーザー・認証情報）ごとにSSHトランスポートを保持して再利用し、
+ポーリングや同期のたびにTCP接続・SSHハンドシェイク・鍵のパースを行わないようにする。
+- 貸し出し前に生存確認（一定時間使われていない接続は往復1回で確認）
+- 接続先ごとの同時接続数の上限（超えた分は返却待ち。待ち時間の上限を超えたら SFTPPoolTimeout）
+- アイドル・寿命超過の接続はバックグラウンドで切断
+"""
+import hashlib
+import io
+import logging
+import socket
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Iterator
+
+import paramiko
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CONNECT_TIMEOUT_SECONDS = 5
+KEEPALIVE_SECONDS = 30
+HEALTH_CHECK_IDLE_SECONDS = 30  # これ以上使われていない接続は貸し出し前に往復確認
+REAPER_INTERVAL_SECONDS = 60
+
+# 接続自体が使えなくなった例外（ファイルが無い等のSFTPエラーは接続を再利用する）
+_BROKEN_ERRORS = (EOFError, ConnectionError, socket.timeout, paramiko.SSHException)
+
+
+class SFTPPoolTimeout(TimeoutError):
+    """接続先の同時接続数が上限のまま、貸し出し待ちが時間切れになった"""
+
+
+def _pool_key(creds) -> tuple:
+    secret = hashlib.sha256(
+        f"{creds.password}\0{creds.private_key}\0{creds.private_key_passphrase}".encode("utf-8")
+    ).hexdigest()
+    return (creds.hostname, creds.port, creds.username, secret)
+
+
+def _load_private_key(creds) -> paramiko.PKey:
+    key_str = creds.private_key.replace("\\n", "\n")
+    passphrase = creds.private_key_passphrase or None
+    try:
+        return paramiko.RSAKey.from_private_key(io.StringIO(key_str), password=passphrase)
+    except paramiko.SSHException:
+        return paramiko.Ed25519Key.from_private_key(io.StringIO(key_str), password=passphrase)
+
+
+def open_sftp(creds) -> paramiko.SFTPClient:
+    sock = socket.create_connection((creds.hostname, creds.port), timeout=CONNECT_TIMEOUT_SECONDS)
+    transport = paramiko.Transport(sock)
+    try:
+        if creds.private_key:
+            transport.connect(username=creds.username, pkey=_load_private_key(creds))
+        else:
+            transport.connect(username=creds.username, password=creds.password)
+        transport.set_keepalive(KEEPALIVE_SECONDS)
+        return paramiko.SFTPClient.from_transport(transport)
+    except BaseException:
+        transport.close()
+        raise
+
+
+@dataclass
+class _Connection:
+    key: tuple
+    sftp: paramiko.SFTPClient
+    created_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+    broken: bool = False
+
+    def is_active(self) -> bool:
+        channel = self.sftp.get_channel()
+        transport = channel.get_transport() if channel is not None else None
+        return bool(transport and transport.is_active() and not channel.closed)
+
+    def close(self) -> None:
+        try:
+            self.sftp.close()
+            channel = self.sftp.get_channel()
+            if channel is not None and channel.get_transport() is not None:
+                channel.get_transport().close()
+        except Exception:
+            pass
+
+
+class SFTPConnectionPool:
+    def __init__(
+        self,
+        max_per_key: int,
+        idle_seconds: float,
+        max_lifetime_seconds: float,
+        checkout_timeout: float | None = None,
+        connect: Callable[..., paramiko.SFTPClient] = open_sftp,
+    ):
+        self.max_per_key = max_per_key
+        self.checkout_timeout = checkout_timeout
+        self.idle_seconds = idle_seconds
+        self.max_lifetime_seconds = max_lifetime_seconds
+        self._connect = connect
+        self._cond = threading.Condition()
+        self._idle: dict[tuple, deque[_Connection]] = defaultdict(deque)
+        self._in_use: dict[tuple, int] = defaultdict(int)
+        self._reaper: threading.Thread | None = None
+        self._closed = threading.Event()
+        self._stats = {"opened": 0, "reused": 0, "discarded": 0}
+
+    def _expired(self, conn: _Connection, now: float) -> bool:
+        return (now - conn.last_used > self.idle_seconds
+                or now - conn.created_at > self.max_lifetime_seconds)
+
+    def _healthy(self, conn: _Connection) -> bool:
+        if not conn.is_active():
+            return False
+        if time.monotonic() - conn.last_used < HEALTH_CHECK_IDLE_SECONDS:
+            return True
+        try:
+            conn.sftp.normalize(".")
+            return True
+        except Exception:
+            return False
+
+    def _checkout(self, creds) -> _Connection:
+        key = _pool_key(creds)
+        deadline = None if self.checkout_timeout is None else time.monotonic() + self.checkout_timeout
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    idle = self._idle[key]
+                    if idle:
+                        conn = idle.pop()  # 直近に使った接続から（古いものはアイドルで切断されやすくする）
+                        self._in_use[key] += 1
+                        break
+                    if self._in_use[key] < self.max_per_key:
+                        self._in_use[key] += 1
+                        conn = None
+                        break
+                    remaining = None if deadline is None else deadline - now
+                    if remaining is not None and remaining <= 0:
+                        raise SFTPPoolTimeout(
+                            f"{creds.hostname}: all {self.max_per_key} connections are busy"
+                        )
+                    self._cond.wait(remaining)
+            if conn is None:
+                break
+            if not self._expired(conn, now) and self._healthy(conn):
+                with self._cond:
+                    self._stats["reused"] += 1
+                return conn
+            self._discard(conn)
+
+        try:
+            sftp = self._connect(creds)
+        except BaseException:
+            with self._cond:
+                self._in_use[key] -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats["opened"] += 1
+        self._ensure_reaper()
+        return _Connection(key, sftp)
+
+    def _discard(self, conn: _Connection) -> None:
+        """貸し出し枠を返し、接続を閉じる"""
+        conn.close()
+        with self._cond:
+            self._in_use[conn.key] -= 1
+            self._stats["discarded"] += 1
+            self._cond.notify()
+
+    def _checkin(self, conn: _Connection) -> None:
+        if conn.broken or not conn.is_active() or self._closed.is_set():
+            self._discard(conn)
+            return
+        conn.last_used = time.monotonic()
+        with self._cond:
+            self._in_use[conn.key] -= 1
+            self._idle[conn.key].append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def session(self, creds) -> Iterator[paramiko.SFTPClient]:
+        """接続を借りて返す。接続断の例外で抜けた場合は接続を破棄する"""
+        conn = self._checkout(creds)
+        try:
+            yield conn.sftp
+        except _BROKEN_ERRORS:
+            conn.broken = True
+            raise
+        finally:
+            self._checkin(conn)
+
+    def evict_idle(self) -> int:
+        now = time.monotonic()
+        expired: list[_Connection] = []
+        with self._cond:
+            for key, idle in self._idle.items():
+                keep = deque(c for c in idle if not self._expired(c, now))
+                expired.extend(c for c in idle if self._expired(c, now))
+                self._idle[key] = keep
+            self._stats["discarded"] += len(expired)
+        for conn in expired:
+            conn.close()
+        return len(expired)
+
+    def _ensure_reaper(self) -> None:
+        with self._cond:
+            if self._reaper is not None:
+                return
+            self._reaper = threading.Thread(target=self._reap, name="sftp-pool-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap(self) -> None:
+        while not self._closed.wait(REAPER_INTERVAL_SECONDS):
+            evicted = self.evict_idle()
+            if evicted:
+                logger.debug("SFTP pool: closed %d idle connections", evicted)
+
+    def close_all(self) -> None:
+        self._closed.set()
+        with self._cond:
+            conns = [c for idle in self._idle.values() for c in idle]
+            self._idle.clear()
+        for conn in conns:
+            conn.close()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                **self._stats,
+                "idle": sum(len(idle) for idle in self._idle.values()),
+                "in_use": sum(self._in_use.values()),
+            }
+
+
+sftp_pool = SFTPConnectionPool(
+    max_per_key=settings.sftp_pool_max_per_host,
+    idle_seconds=settings.sftp_pool_idle_seconds,
+    max_lifetime_seconds=settings.sftp_pool_max_lifetime_seconds,
+    checkout_timeout=settings.sftp_pool_checkout_timeout_seconds or None,
+)
@@ -20,14 +20,15 @@ import socket
 import stat
 from dataclasses import dataclass
 from datetime import datetime, timezone
+from typing import Iterable, Iterator
 
 import paramiko
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
-from app.models.document import Document, DocumentChunk
-from app.services.document_processor import document_processor
-from app.services.rag import rag_service
+from app.models.document import Document
+from app.services.ingestion import new_staging_path, sync_document_file
+from app.services.sftp_pool import sftp_pool
 
 logger = logging.getLogger(__name__)
 
@@ -47,6 +48,19 @@ class SFTPCredentials:
     private_key_passphrase: str = ""
 
 
+@dataclass
+class RemoteFile:
+    path: str
+    size: int
+    modified_at: datetime | None
+
+
+def _mtime(attrs: paramiko.SFTPAttributes) -> datetime | None:
+    if not attrs.st_mtime:
+        return None
+    return datetime.fromtimestamp(attrs.st_mtime, tz=timezone.utc)
+
+
 class SFTPService:
     def __init__(self, credentials: SFTPCredentials | None = None):
         self._credentials = credentials
@@ -74,38 +88,18 @@ class SFTPService:
             return False
         return True
 
-    def _connect(self) -> paramiko.SFTPClient:
-        c = self._creds
-        sock = socket.create_connection((c.hostname, c.port), timeout=5)
-        transport = paramiko.Transport(sock)
-
-        if c.private_key:
-            key_str = c.private_key.replace("\\n", "\n")
-            key_file = io.StringIO(key_str)
-            passphrase = c.private_key_passphrase or None
-            try:
-                pkey = paramiko.RSAKey.from_private_key(key_file, password=passphrase)
-            except paramiko.SSHException:
-                key_file.seek(0)
-                pkey = paramiko.Ed25519Key.from_private_key(key_file, password=passphrase)
-            transport.connect(username=c.username, pkey=pkey)
-        else:
-            transport.connect(username=c.username, password=c.password)
-
-        return paramiko.SFTPClient.from_transport(transport)
+    def _session(self):
+        """プールから接続を借りる（接続先ごとに再利用）"""
+        return sftp_pool.session(self._creds)
 
     def test_connection(self) -> dict:
-        sftp = self._connect()
-        try:
+        with self._session() as sftp:
             cwd = sftp.normalize(".")
             items = sftp.listdir(cwd)
             return {"success": True, "cwd": cwd, "items": len(items)}
-        finally:
-            sftp.close()
 
     def list_folders(self, parent_path: str = "/") -> list[dict]:
-        sftp = self._connect()
-        try:
+        with self._session() as sftp:
             folders = []
             for entry in sftp.listdir_attr(parent_path):
                 if stat.S_ISDIR(entry.st_mode or 0):
@@ -116,21 +110,24 @@ class SFTPService:
                         "type": "folder",
                     })
             return folders
-        finally:
-            sftp.close()
+
+    @staticmethod
+    def _file_entries(sftp, folder_path: str) -> Iterator[tuple[str, paramiko.SFTPAttributes]]:
+        """対応拡張子の通常ファイルを (フルパス, 属性) で列挙（listdir_attr 1回）"""
+        for entry in sftp.listdir_attr(folder_path):
+            if not stat.S_ISREG(entry.st_mode or 0):
+                continue
+            name = entry.filename
+            ext = name.rsplit(".", 1)[-1].lower() if "." in name else ""
+            if ext not in SUPPORTED_EXTENSIONS:
+                continue
+            yield f"{folder_path.rstrip('/')}/{name}", entry
 
     def list_files(self, folder_path: str) -> list[dict]:
-        sftp = self._connect()
-        try:
+        with self._session() as sftp:
             files = []
-            for entry in sftp.listdir_attr(folder_path):
-                if not stat.S_ISREG(entry.st_mode or 0):
-                    continue
+            for full_path, entry in self._file_entries(sftp, folder_path):
                 name = entry.filename
-                ext = name.rsplit(".", 1)[-1].lower() if "." in name else ""
-                if ext not in SUPPORTED_EXTENSIONS:
-                    continue
-                full_path = f"{folder_path.rstrip('/')}/{name}"
                 modified_at = ""
                 if entry.st_mtime:
                     modified_at = datetime.fromtimestamp(
@@ -141,26 +138,43 @@ class SFTPService:
                     "name": name,
                     "size": entry.st_size or 0,
                     "modified_at": modified_at,
-                    "file_type": ext,
+                    "file_type": name.rsplit(".", 1)[-1].lower(),
                 })
             return files
-        finally:
-            sftp.close()
+
+    def list_directories(self, folder_paths: Iterable[str]) -> dict[str, dict[str, RemoteFile] | Exception]:
+        """
+        複数ディレクトリを1接続で一覧し、ディレクトリごとに {ファイル名: RemoteFile} を返す。
+        一覧できなかったディレクトリは例外オブジェクトを返す（存在しない場合は FileNotFoundError）
+        """
+        listings: dict[str, dict[str, RemoteFile] | Exception] = {}
+        with self._session() as sftp:
+            for folder_path in folder_paths:
+                try:
+                    listings[folder_path] = {
+                        entry.filename: RemoteFile(
+                            path=full_path,
+                            size=entry.st_size or 0,
+                            modified_at=_mtime(entry),
+                        )
+                        for full_path, entry in self._file_entries(sftp, folder_path)
+                    }
+                except (ConnectionError, socket.timeout):
+                    raise  # 接続断はプールに接続を破棄させる
+                except OSError as e:
+                    listings[folder_path] = e
+        return listings
 
     def download_file(self, file_path: str) -> tuple[bytes, str]:
-        sftp = self._connect()
-        try:
+        with self._session() as sftp:
             buf = io.BytesIO()
             sftp.getfo(file_path, buf)
             buf.seek(0)
             filename = os.path.basename(file_path)
             return buf.read(), filename
-        finally:
-            sftp.close()
 
     def get_file_info(self, file_path: str) -> dict:
-        sftp = self._connect()
-        try:
+        with self._session() as sftp:
             st = sftp.stat(file_path)
             modified_at = None
             if st.st_mtime:
@@ -173,8 +187,14 @@ class SFTPService:
                 "modified_at": modified_at,
                 "size": st.st_size or 0,
             }
-        finally:
-            sftp.close()
+
+    def download_to(self, file_path: str, dest_path: str) -> RemoteFile:
+        """ローカルパスへ取得し、取得時点の属性を返す"""
+        # 取得と同じ接続で stat する。取得中に更新された場合は古い mtime が残り、次回ポーリングで再検知される
+        with self._session() as sftp:
+            st = sftp.stat(file_path)
+            sftp.get(file_path, dest_path)
+        return RemoteFile(path=file_path, size=st.st_size or 0, modified_at=_mtime(st))
 
     def sync_file(
         self,
@@ -184,78 +204,27 @@ class SFTPService:
         department_ids: list[str] | None = None,
         organization_id: str | None = None,
     ) -> Document:
-        content, filename = self.download_file(file_path)
-
-        file_type = document_processor.get_file_type(filename)
-        text = document_processor.extract_text(filename, content)
-        if not text.strip():
-            raise ValueError(f"テキストを抽出できませんでした: {filename}")
-
-        # 既存ドキュメントの検索（box_file_idにファイルパスを格納）
-        existing = db.query(Document).filter(
-            Document.box_file_id == file_path
-        ).first()
-        if existing:
-            db.query(DocumentChunk).filter(
-                DocumentChunk.document_id == existing.id
-            ).delete()
-            document = existing
-            document.filename = filename
-            document.file_type = file_type
-            document.is_public = is_public
-        else:
-            document = Document(
+        filename = os.path.basename(file_path)
+        staging_path = new_staging_path(organization_id or "_shared", filename, "")
+        try:
+            remote = self.download_to(file_path, staging_path)
+            # ハッシュ比較で未変更ならスキップ、変更時は差分チャンクのみ再埋め込み
+            document = sync_document_file(
+                db,
+                source_file_id=file_path,
                 filename=filename,
-                file_type=file_type,
+                path=staging_path,
                 is_public=is_public,
-                box_file_id=file_path,
+                department_ids=department_ids or [],
                 organization_id=organization_id,
+                source_mtime=remote.modified_at,
+                source_size=remote.size,
             )
-            db.add(document)
-            db.flush()
-
-        # 部門割当
-        if department_ids:
-            from app.models.document import Department
-            departments = db.query(Department).filter(
-                Department.id.in_(department_ids)
-            ).all()
-            document.departments = departments
-        else:
-            document.departments = []
-
-        # 元ファイルをディスクに保存
-        if organization_id:
-            uploads_base = os.path.join(
-                os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-                "uploads",
-            )
-            upload_dir = os.path.join(uploads_base, organization_id)
-            os.makedirs(upload_dir, exist_ok=True)
-            ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else file_type
-            save_path = os.path.join(upload_dir, f"{document.id}.{ext}")
-            with open(save_path, "wb") as f:
-                f.write(content)
-            document.file_path = save_path
-
-        # チャンク分割 + エンベディング
-        chunks = rag_service.chunk_text(text)
-        embeddings = rag_service.get_embeddings(chunks)
-
-        for i, (chunk_text, embedding) in enumerate(zip(chunks, embeddings)):
-            db.add(DocumentChunk(
-                document_id=document.id,
-                content=chunk_text,
-                embedding=embedding,
-                chunk_index=i,
-                organization_id=organization_id,
-            ))
-
-        document.box_sync_status = "synced"
-        document.box_synced_at = datetime.now(timezone.utc)
-        db.commit()
-
-        return document
+            db.commit()
+            return document
+        finally:
+            if os.path.exists(staging_path):
+                os.remove(staging_path)
 
 
 def get_sftp_service_for_org(db: Session, org_id: str) -> SFTPService:
@@ -0,0 +1,70 @@
+"""テナント単位のベクトルインデックス管理
+
+document_chunks は全テナント共有のテーブルのまま、組織ごとに
+`WHERE organization_id = '<org_id>'` の部分HNSWインデックスを持たせる。
+検索SQLの `dc.organization_id = :organization_id` が述語に一致するため、
+プランナーは該当テナントのベクトルだけで構築されたグラフを探索する。
+
+psycopg2はパラメータをクライアント側で埋め込むため、部分インデックスの述語照合が効く。
+"""
+import logging
+import threading
+import uuid
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.core.database import engine
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_INDEX_NAME = "ix_chunks_embedding_hnsw"
+HNSW_WITH = "WITH (m = 16, ef_construction = 64)"
+
+
+def tenant_index_name(organization_id: str) -> str:
+    """組織IDからインデックス名を生成（UUIDのhex表記で63文字制限に収める）"""
+    return f"ix_chunks_hnsw_{uuid.UUID(organization_id).hex}"
+
+
+def tenant_index_ddl(organization_id: str, concurrently: bool = False) -> str:
+    """部分HNSWインデックスのDDL（DDLはバインド不可のため、UUID検証済みの値を埋め込む）"""
+    org_id = str(uuid.UUID(organization_id))
+    return (
+        f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS "
+        f"{tenant_index_name(org_id)} "
+        f"ON document_chunks USING hnsw (embedding vector_cosine_ops) {HNSW_WITH} "
+        f"WHERE organization_id = '{org_id}'"
+    )
+
+
+def drop_invalid_tenant_index(conn: Connection, organization_id: str) -> bool:
+    """CONCURRENTLY作成の失敗で残った無効インデックスを削除（IF NOT EXISTSで再作成されないため）"""
+    invalid = conn.execute(text("""
+        SELECT 1 FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = :name AND NOT i.indisvalid
+    """), {"name": tenant_index_name(organization_id)}).first()
+    if invalid:
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {tenant_index_name(organization_id)}"))
+        return True
+    return False
+
+
+def create_tenant_index(organization_id: str) -> None:
+    """書き込みをブロックしないよう CONCURRENTLY で作成（トランザクション外で実行）"""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        drop_invalid_tenant_index(conn, organization_id)
+        conn.execute(text(tenant_index_ddl(organization_id, concurrently=True)))
+    logger.info("Tenant vector index ensured: %s", tenant_index_name(organization_id))
+
+
+def create_tenant_index_in_background(organization_id: str) -> None:
+    """サインアップ応答を待たせないよう別スレッドで作成。失敗しても検索は共有インデックス等で継続可能"""
+    def _run():
+        try:
+            create_tenant_index(organization_id)
+        except Exception as e:
+            logger.warning("Could not create tenant vector index for %s: %s", organization_id, e)
+
+    threading.Thread(target=_run, name=f"vector-index-{organization_id[:8]}", daemon=True).start()
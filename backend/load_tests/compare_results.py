@@ -0,0 +1,40 @@
+"""2回分の Locust --csv 結果（*_stats.csv）をエンドポイント別に比較
+
+実行方法:
+  python backend/load_tests/compare_results.py results/sync_db_stats.csv results/async_db_stats.csv
+"""
+import csv
+import sys
+
+
+def _load(path: str) -> dict[str, dict]:
+    with open(path, newline="", encoding="utf-8") as f:
+        return {row["Name"]: row for row in csv.DictReader(f)}
+
+
+def _num(row: dict | None, key: str) -> float:
+    if not row or not row.get(key) or row[key] == "N/A":
+        return 0.0
+    return float(row[key])
+
+
+def main() -> None:
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(1)
+    before, after = _load(sys.argv[1]), _load(sys.argv[2])
+
+    print(f"{'endpoint':<32} {'req/s':>15} {'p50 ms':>15} {'p95 ms':>15} {'fail %':>13}")
+    for name in sorted(set(before) | set(after), key=lambda n: (n == "Aggregated", n)):
+        b, a = before.get(name), after.get(name)
+        cols = []
+        for key in ("Requests/s", "50%", "95%"):
+            cols.append(f"{_num(b, key):>6.1f}→{_num(a, key):<7.1f}")
+        fail_b = _num(b, "Failure Count") / _num(b, "Request Count") * 100 if _num(b, "Request Count") else 0
+        fail_a = _num(a, "Failure Count") / _num(a, "Request Count") * 100 if _num(a, "Request Count") else 0
+        cols.append(f"{fail_b:>5.1f}→{fail_a:<6.1f}")
+        print(f"{name:<32} " + " ".join(f"{c:>15}" for c in cols))
+
+
+if __name__ == "__main__":
+    main()
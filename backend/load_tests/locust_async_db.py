@@ -0,0 +1,90 @@
+"""
+同期DB → 非同期DB（asyncpg）移行の比較用 負荷テスト (Locust)
+
+チャットのストリーミングと重い管理画面クエリ（ダッシュボード・履歴・一覧）を
+同時に流し、遅いクエリがイベントループを止めてチャットが詰まるかを測る。
+
+比較手順（同じデータ・同じワーカー数で2回実行）:
+  # 1. 移行前のコミットでサーバー起動 → 計測
+  locust -f backend/load_tests/locust_async_db.py --host http://localhost:8300 \
+    --headless -u 200 -r 20 --run-time 180s --csv results/sync_db
+
+  # 2. 移行後のコミットでサーバー起動 → 計測
+  locust -f backend/load_tests/locust_async_db.py --host http://localhost:8300 \
+    --headless -u 200 -r 20 --run-time 180s --csv results/async_db
+
+  # 3. 比較表を出力
+  python backend/load_tests/compare_results.py results/sync_db_stats.csv results/async_db_stats.csv
+
+注意:
+  - uvicorn は --workers 1 で計測するとイベントループのブロックの影響が最も明確に出る
+  - /api/chat は外部LLM応答時間を含むため、回答キャッシュを無効化（ANSWER_CACHE_ENABLED=false）
+    するか、同一質問のヒットを前提にするかを両方の計測で揃えること
+"""
+
+import os
+
+from locust import HttpUser, between, task
+
+ADMIN_EMAIL = os.environ.get("LOCUST_ADMIN_EMAIL", "admin@example.com")
+ADMIN_PASSWORD = os.environ.get("LOCUST_ADMIN_PASSWORD", "admin123")
+
+
+class _AuthenticatedUser(HttpUser):
+    abstract = True
+
+    def on_start(self):
+        resp = self.client.post(
+            "/api/auth/login",
+            json={"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD},
+        )
+        if resp.status_code == 200:
+            token = resp.json().get("access_token", "")
+            self.client.headers.update({"Authorization": f"Bearer {token}"})
+
+
+class ChatUser(_AuthenticatedUser):
+    """社員: チャット質問（SSEを最後まで読み切る）"""
+
+    weight = 4
+    wait_time = between(1, 3)
+
+    @task(5)
+    def chat_question(self):
+        with self.client.post(
+            "/api/chat",
+            json={"question": "有給休暇の申請方法を教えてください"},
+            stream=True,
+            timeout=60,
+            name="/api/chat",
+            catch_response=True,
+        ) as resp:
+            received_chat_id = False
+            for line in resp.iter_lines():
+                if line and b'"chat_id"' in line:
+                    received_chat_id = True
+            if not received_chat_id:
+                resp.failure("chat_id event not received")
+
+    @task(1)
+    def suggestions(self):
+        self.client.get("/api/chat/suggestions", name="/api/chat/suggestions")
+
+    @task(2)
+    def list_documents(self):
+        self.client.get("/api/documents", name="/api/documents")
+
+
+class AdminUser(_AuthenticatedUser):
+    """管理者: ダッシュボード・履歴（集計クエリ）"""
+
+    weight = 1
+    wait_time = between(2, 5)
+
+    @task(2)
+    def dashboard(self):
+        self.client.get("/api/stats/admin/dashboard", name="/api/stats/admin/dashboard")
+
+    @task(1)
+    def chat_history(self):
+        self.client.get("/api/stats/chat-history?limit=50", name="/api/stats/chat-history")
@@ -0,0 +1,107 @@
+"""
+ログイン集中時のスループットとチャット遅延の 負荷テスト (Locust)
+
+少数のチャットユーザーがSSEを流している間に大量のユーザーが一斉にログインし、
+bcrypt の計算がイベントループを止めてチャットが詰まるか（専用スレッドプール化の効果）を測る。
+- /api/auth/login のスループット（503 = ハッシュ待ち行列が満杯、429 = レート制限）
+- /api/chat の最初のイベントまでの時間（"/api/chat first event"）と完了までの時間
+
+比較手順（同じデータ・同じワーカー数で2回実行。-u のうち CHAT_USERS 人がチャット、残りがログイン）:
+  # 0. レート制限で頭打ちにならないよう、両方の計測で上限を引き上げてサーバー起動
+  LOGIN_RATE_LIMIT=100000/minute uvicorn app.main:app --port 8300 --workers 1
+
+  # 1. 変更前のコミットで計測
+  locust -f backend/load_tests/locust_login_burst.py --host http://localhost:8300 \
+    --headless -u 1100 -r 200 --run-time 120s --csv results/login_inline
+
+  # 2. 変更後のコミットで計測
+  locust -f backend/load_tests/locust_login_burst.py --host http://localhost:8300 \
+    --headless -u 1100 -r 200 --run-time 120s --csv results/login_pool
+
+  # 3. 比較表を出力
+  python backend/load_tests/compare_results.py results/login_inline_stats.csv results/login_pool_stats.csv
+
+注意:
+  - 計測中は /api/metrics の faq_password_hash_queued / faq_password_hash_in_flight で待ち行列の深さを確認できる
+  - /api/chat は外部LLM応答時間を含むため、回答キャッシュの設定（ANSWER_CACHE_ENABLED）を両方の計測で揃えること
+"""
+
+import os
+import time
+
+from locust import HttpUser, between, constant_pacing, task
+
+LOGIN_EMAIL = os.environ.get("LOCUST_ADMIN_EMAIL", "admin@example.com")
+LOGIN_PASSWORD = os.environ.get("LOCUST_ADMIN_PASSWORD", "admin123")
+CHAT_USERS = int(os.environ.get("LOCUST_CHAT_USERS", "50"))
+
+
+class ChatUser(HttpUser):
+    """社員: ログイン集中の間もチャットを続ける（SSEを最後まで読み切る）"""
+
+    fixed_count = CHAT_USERS
+    wait_time = between(1, 3)
+
+    def on_start(self):
+        resp = self.client.post(
+            "/api/auth/login",
+            json={"email": LOGIN_EMAIL, "password": LOGIN_PASSWORD},
+            name="/api/auth/login (chat user)",
+        )
+        if resp.status_code == 200:
+            token = resp.json().get("access_token", "")
+            self.client.headers.update({"Authorization": f"Bearer {token}"})
+
+    @task
+    def chat_question(self):
+        start = time.perf_counter()
+        first_event_ms = None
+        with self.client.post(
+            "/api/chat",
+            json={"question": "有給休暇の申請方法を教えてください"},
+            stream=True,
+            timeout=60,
+            name="/api/chat",
+            catch_response=True,
+        ) as resp:
+            received_chat_id = False
+            for line in resp.iter_lines():
+                if line and first_event_ms is None:
+                    first_event_ms = (time.perf_counter() - start) * 1000
+                if line and b'"chat_id"' in line:
+                    received_chat_id = True
+            if not received_chat_id:
+                resp.failure("chat_id event not received")
+        if first_event_ms is not None:
+            self.environment.events.request.fire(
+                request_type="SSE",
+                name="/api/chat first event",
+                response_time=first_event_ms,
+                response_length=0,
+                exception=None,
+                context={},
+            )
+
+
+class LoginBurstUser(HttpUser):
+    """ログインを繰り返す（起動直後の一斉ログインと、その後の継続的なログイン負荷）"""
+
+    wait_time = constant_pacing(5)
+
+    def on_start(self):
+        self.login()
+
+    @task
+    def login(self):
+        with self.client.post(
+            "/api/auth/login",
+            json={"email": LOGIN_EMAIL, "password": LOGIN_PASSWORD},
+            name="/api/auth/login",
+            catch_response=True,
+        ) as resp:
+            if resp.status_code == 503:
+                resp.failure("password hash queue full (503)")
+            elif resp.status_code == 429:
+                resp.failure("rate limited (429)")
+            elif resp.status_code != 200:
+                resp.failure(f"status {resp.status_code}")
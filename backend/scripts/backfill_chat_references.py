@@ -0,0 +1,35 @@
+"""既存のチャット履歴から chat_references（引用ドキュメント）を作成するスクリプト
+
+実行方法:
+  cd backend && python -m scripts.backfill_chat_references
+  cd backend && python -m scripts.backfill_chat_references --batch 1000
+
+agentic_trace の cite_sources から引用（ファイル名・セクション・抜粋）を復元し、
+無ければ referenced_doc_ids の順に作成する。作成済みのチャットは対象外のため再実行できる。
+アプリ起動後の初回の集計コンパクションでも同じ処理を自動で行う（集計の再計算より先に実行）。
+手動で実行した場合は、その後に
+  python -m scripts.rebuild_analytics
+で集計を作り直すこと。
+"""
+import argparse
+import time
+
+from app.core.database import SessionLocal
+from app.services.chat_references import backfill
+
+
+def main(batch: int) -> None:
+    db = SessionLocal()
+    try:
+        start = time.monotonic()
+        count = backfill(db, batch_size=batch, progress=lambda done: print(f"  {done} chats..."))
+        print(f"Backfilled references for {count} chats in {time.monotonic() - start:.1f}s")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="chat_references を既存履歴から作成")
+    parser.add_argument("--batch", type=int, default=500, help="1回のコミットで処理するチャット数")
+    args = parser.parse_args()
+    main(args.batch)
@@ -0,0 +1,84 @@
+"""チャンク書き込み方式（ORM add / executemany / COPY binary）のスループット比較
+
+実行方法:
+  cd backend && python -m scripts.benchmark_chunk_insert --org-id <ORG_ID> --chunks 5000
+
+各方式ごとに一時ドキュメントを作成してチャンクを書き込み、計測後にロールバックする（DBには残らない）。
+埋め込みバッチ単位の書き込みを再現するため --batch 件ごとに flush / COPY する。
+HNSW・GINインデックスの更新コストも含むため、本番相当の件数が入ったDBで実行すること。
+"""
+import argparse
+import random
+import statistics
+import time
+import uuid
+
+from app.core.database import SessionLocal
+from app.models.document import Document, DocumentChunk
+from app.services.chunk_writer import write_chunks
+
+METHODS = ("orm", "executemany", "copy")
+DIMENSIONS = 1536
+
+
+def _rows(count: int, document_id: str, org_id: str) -> list[dict]:
+    text = "第1条（目的）この規程は、従業員の就業に関する事項を定める。" * 8
+    return [
+        {
+            "document_id": document_id,
+            "organization_id": org_id,
+            "content": f"{i}: {text}",
+            "content_hash": uuid.uuid4().hex + uuid.uuid4().hex,
+            "chunk_index": i,
+            "embedding": [random.uniform(-1, 1) for _ in range(DIMENSIONS)],
+        }
+        for i in range(count)
+    ]
+
+
+def _insert(db, method: str, rows: list[dict], batch: int) -> None:
+    for start in range(0, len(rows), batch):
+        part = [dict(r) for r in rows[start:start + batch]]
+        if method == "orm":
+            # 変更前の実装: 1チャンク1オブジェクトで add し、flushで1行ずつINSERT
+            for row in part:
+                db.add(DocumentChunk(**row))
+            db.flush()
+        else:
+            write_chunks(db, part, method=method)
+
+
+def run(org_id: str, chunks: int, batch: int, repeat: int) -> None:
+    print(f"chunks={chunks} batch={batch} repeat={repeat} dims={DIMENSIONS}")
+    print(f"{'method':<12} {'rows/s':>10} {'median s':>10} {'min s':>8}")
+    for method in METHODS:
+        durations = []
+        for _ in range(repeat):
+            db = SessionLocal()
+            try:
+                document = Document(filename="benchmark.txt", file_type="txt", organization_id=org_id)
+                db.add(document)
+                db.flush()
+                rows = _rows(chunks, document.id, org_id)
+                start = time.perf_counter()
+                _insert(db, method, rows, batch)
+                durations.append(time.perf_counter() - start)
+            finally:
+                db.rollback()
+                db.close()
+        median = statistics.median(durations)
+        print(f"{method:<12} {chunks / median:>10.0f} {median:>10.2f} {min(durations):>8.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--org-id", required=True)
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=512)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.org_id, args.chunks, args.batch, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
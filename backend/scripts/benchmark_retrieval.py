@@ -0,0 +1,92 @@
+"""検索方式（vector / hybrid）の再現率・レイテンシ比較
+
+実行方法:
+  cd backend && python -m scripts.benchmark_retrieval --org-id <ORG_ID> --queries queries.json
+
+queries.json の形式（正解ドキュメントIDは複数可）:
+  [
+    {"query": "第20条 年次有給休暇", "expected_document_ids": ["<doc-id>"]},
+    {"query": "出張旅費の日当", "expected_document_ids": ["<doc-id>"]}
+  ]
+
+クエリ埋め込みは事前に1回計算してキャッシュするため、計測値はDB検索のみの時間。
+"""
+import argparse
+import json
+import statistics
+import time
+
+from app.core.database import SessionLocal
+from app.services.rag import rag_service
+
+MODES = ("vector", "hybrid")
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def run(org_id: str, queries: list[dict], top_k: int, repeat: int, department_id: str | None) -> None:
+    db = SessionLocal()
+    try:
+        # 埋め込みを温める（OpenAI往復を計測から除外）
+        for q in queries:
+            rag_service.get_embedding(q["query"])
+
+        print(f"queries={len(queries)} top_k={top_k} repeat={repeat}")
+        print(f"{'mode':<8} {'recall@k':>9} {'MRR':>7} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8}")
+        for mode in MODES:
+            latencies: list[float] = []
+            hits = 0
+            reciprocal_ranks: list[float] = []
+            for q in queries:
+                expected = set(q.get("expected_document_ids") or [q.get("document_id")])
+                results = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    results = rag_service.search_similar_chunks(
+                        db, q["query"], top_k=top_k,
+                        user_department_id=department_id,
+                        organization_id=org_id,
+                        mode=mode,
+                    )
+                    latencies.append((time.perf_counter() - start) * 1000)
+                db.rollback()
+
+                rank = next(
+                    (i + 1 for i, r in enumerate(results) if r["document_id"] in expected),
+                    None,
+                )
+                if rank is not None:
+                    hits += 1
+                    reciprocal_ranks.append(1 / rank)
+                else:
+                    reciprocal_ranks.append(0.0)
+
+            print(
+                f"{mode:<8} {hits / len(queries):>9.3f} {statistics.mean(reciprocal_ranks):>7.3f} "
+                f"{_percentile(latencies, 50):>8.1f} {_percentile(latencies, 95):>8.1f} "
+                f"{statistics.mean(latencies):>8.1f}"
+            )
+    finally:
+        db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="vector / hybrid 検索のベンチマーク")
+    parser.add_argument("--org-id", required=True)
+    parser.add_argument("--queries", required=True, help="クエリと正解ドキュメントIDのJSONファイル")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3, help="レイテンシ計測の繰り返し回数")
+    parser.add_argument("--department-id", default=None, help="一般ユーザー（部門ACLあり）として計測")
+    args = parser.parse_args()
+
+    with open(args.queries, encoding="utf-8") as f:
+        queries = json.load(f)
+    run(args.org_id, queries, args.top_k, args.repeat, args.department_id)
+
+
+if __name__ == "__main__":
+    main()
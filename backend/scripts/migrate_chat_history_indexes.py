@@ -0,0 +1,69 @@
+"""既存の chat_history に集計・履歴一覧用のインデックスを作成するスクリプト
+
+create_all は既存テーブルにインデックスを追加しないため、デプロイ後に実行する。
+チャット登録を止めないよう CREATE INDEX CONCURRENTLY で1本ずつ作成する
+（起動時のカラム追加とは別に、トランザクション外で実行）。
+
+実行方法:
+  cd backend && python -m scripts.migrate_chat_history_indexes
+"""
+import os
+import sys
+import time
+
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+# .envを読み込み（backend/.envまたはプロジェクトルート/.env）
+load_dotenv(os.path.join(os.path.dirname(__file__), "..", ".env"))
+load_dotenv(os.path.join(os.path.dirname(__file__), "..", "..", ".env"))
+
+DATABASE_URL = os.environ.get("DATABASE_URL")
+if not DATABASE_URL:
+    print("ERROR: DATABASE_URL not set")
+    sys.exit(1)
+
+engine = create_engine(DATABASE_URL)
+
+# models/document.py の ChatHistory.__table_args__ と同じ定義
+CHAT_HISTORY_INDEXES = [
+    ("ix_chat_created", "chat_history (created_at)"),
+    ("ix_chat_org_created_id", "chat_history (organization_id, created_at, id)"),
+    ("ix_chat_org_feedback_created_id",
+     "chat_history (organization_id, feedback, created_at, id) WHERE feedback IS NOT NULL"),
+    ("ix_chat_org_noanswer_created_id", "chat_history (organization_id, created_at, id) WHERE is_no_answer = '1'"),
+    ("ix_chat_org_evaluated_created_id",
+     "chat_history (organization_id, created_at, id) WHERE feedback IS NOT NULL OR is_no_answer = '1'"),
+]
+
+
+def migrate() -> None:
+    # CREATE/DROP INDEX CONCURRENTLY はトランザクション外で実行する必要がある
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        failed = []
+        for name, definition in CHAT_HISTORY_INDEXES:
+            start = time.monotonic()
+            try:
+                # 失敗した CONCURRENTLY 作成の残骸は IF NOT EXISTS で再作成されないため削除する
+                invalid = conn.execute(text("""
+                    SELECT 1 FROM pg_index i
+                    JOIN pg_class c ON c.oid = i.indexrelid
+                    WHERE c.relname = :name AND NOT i.indisvalid
+                """), {"name": name}).first()
+                if invalid:
+                    conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+                    print(f"Dropped invalid index {name}")
+                conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}"))
+            except Exception as e:
+                failed.append(name)
+                print(f"FAILED {name}: {e}")
+                continue
+            print(f"Ensured {name} in {time.monotonic() - start:.1f}s")
+
+    print("\nMigration completed" + (" with errors" if failed else " successfully!"))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,75 @@
+"""既存組織に部分HNSWインデックス（テナント単位）を作成するスクリプト
+
+document_chunks の行はそのまま、組織ごとに
+  ix_chunks_hnsw_<org_id hex> ON document_chunks USING hnsw (embedding)
+  WHERE organization_id = '<org_id>'
+を CREATE INDEX CONCURRENTLY で作成する（書き込みは止めない）。
+アプリ起動時には作成しないため、デプロイ後にこのスクリプトを実行する。
+共有インデックス（ix_chunks_embedding_hnsw）は組織条件のない検索のために残す。
+
+実行方法:
+  cd backend && python -m scripts.migrate_tenant_vector_indexes
+"""
+import os
+import sys
+import time
+
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+# .envを読み込み（backend/.envまたはプロジェクトルート/.env）
+load_dotenv(os.path.join(os.path.dirname(__file__), "..", ".env"))
+load_dotenv(os.path.join(os.path.dirname(__file__), "..", "..", ".env"))
+
+DATABASE_URL = os.environ.get("DATABASE_URL")
+if not DATABASE_URL:
+    print("ERROR: DATABASE_URL not set")
+    sys.exit(1)
+
+from app.services.vector_index import (  # noqa: E402
+    drop_invalid_tenant_index,
+    tenant_index_ddl,
+    tenant_index_name,
+)
+
+engine = create_engine(DATABASE_URL)
+
+
+def migrate() -> None:
+    # CREATE/DROP INDEX CONCURRENTLY はトランザクション外で実行する必要がある
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        orgs = conn.execute(text("""
+            SELECT o.id, o.name, COUNT(dc.id) AS chunk_count
+            FROM organizations o
+            LEFT JOIN document_chunks dc ON dc.organization_id = o.id
+            GROUP BY o.id, o.name
+            ORDER BY chunk_count DESC
+        """)).fetchall()
+
+        failed = []
+        for org in orgs:
+            # UUIDでない組織IDはその組織だけスキップして続行する
+            try:
+                name = tenant_index_name(org.id)
+            except ValueError:
+                failed.append(org.id)
+                print(f"SKIPPED {org.id} ({org.name}): organization id is not a UUID")
+                continue
+            start = time.monotonic()
+            try:
+                if drop_invalid_tenant_index(conn, org.id):
+                    print(f"Dropped invalid index {name}")
+                conn.execute(text(tenant_index_ddl(org.id, concurrently=True)))
+            except Exception as e:
+                failed.append(org.id)
+                print(f"FAILED {name} ({org.name}): {e}")
+                continue
+            print(f"Ensured {name} ({org.name}, {org.chunk_count} chunks) in {time.monotonic() - start:.1f}s")
+
+    print("\nMigration completed" + (" with errors" if failed else " successfully!"))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,36 @@
+"""ダッシュボード集計（chat_stats_hourly / chat_user_daily / chat_document_daily）を chat_history から再構築するスクリプト
+
+実行方法:
+  cd backend && python -m scripts.rebuild_analytics                 # 全組織・全期間
+  cd backend && python -m scripts.rebuild_analytics --org-id <ORG_ID> --days 30
+
+前日までの確定した日を作り直す（当日分はチャット登録時の加算のまま）。
+通常は起動後の初回コンパクションで自動的にバックフィルされるため、集計の不整合を直すときに使う。
+"""
+import argparse
+import time
+from datetime import datetime, timedelta, timezone
+
+from app.core.database import SessionLocal
+from app.services.analytics import rebuild
+
+
+def main(org_id: str | None, days: int | None) -> None:
+    today = datetime.now(timezone.utc).date()
+    since = today - timedelta(days=days) if days else None
+    db = SessionLocal()
+    try:
+        start = time.monotonic()
+        count = rebuild(db, until=today, since=since, organization_id=org_id)
+        db.commit()
+        print(f"Rebuilt rollups from {count} chats in {time.monotonic() - start:.1f}s")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ダッシュボード集計を再構築")
+    parser.add_argument("--org-id", help="対象の組織（省略時は全組織）")
+    parser.add_argument("--days", type=int, help="直近N日のみ（省略時は全期間）")
+    args = parser.parse_args()
+    main(args.org_id, args.days)
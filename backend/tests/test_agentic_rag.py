@@ -0,0 +1,114 @@
+"""Unit tests for AgenticRAG tool execution"""
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+from app.services.agentic_rag import AgenticRAG
+
+
+class FakeStream:
+    def __init__(self, response):
+        self._response = response
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        raise StopAsyncIteration
+
+    async def get_final_message(self):
+        return self._response
+
+
+class FakeMessages:
+    """Returns one tool_use turn, then a final answer; records requests"""
+
+    def __init__(self, tool_blocks):
+        self.calls = []
+        self._responses = [
+            SimpleNamespace(stop_reason="tool_use", content=tool_blocks),
+            SimpleNamespace(stop_reason="end_turn", content=[]),
+        ]
+
+    def stream(self, **kwargs):
+        self.calls.append(kwargs)
+        return FakeStream(self._responses[len(self.calls) - 1])
+
+
+def _tool_use(block_id: str, name: str, **input_data):
+    return SimpleNamespace(type="tool_use", id=block_id, name=name, input=input_data)
+
+
+def _events(chunks: list[str]) -> list[dict]:
+    return [json.loads(c[len("data: "):]) for c in chunks]
+
+
+class TestParallelTools:
+    """Concurrent execution of tool calls within one assistant turn"""
+
+    def _run(self, blocks, execute):
+        agent = AgenticRAG(organization_id="org", user_department_id=None)
+        agent.client = SimpleNamespace(messages=FakeMessages(blocks))
+
+        def fake_execute(name, input_data):
+            execute(input_data["query"])
+            return json.dumps({"results": [], "query": input_data["query"]})
+
+        agent._execute_tool_in_thread = fake_execute
+
+        async def collect():
+            return [chunk async for chunk in agent.run("質問", [])]
+
+        return agent, _events(asyncio.run(collect()))
+
+    def test_tools_run_concurrently(self):
+        """Test independent searches overlap instead of running back to back"""
+        # 3件が同時に実行中でなければバリアを通過できない（逐次実行ならタイムアウトで壊れる）
+        barrier = threading.Barrier(3, timeout=5)
+        passed: list[str] = []
+
+        def execute(query):
+            try:
+                barrier.wait()
+                passed.append(query)
+            except threading.BrokenBarrierError:
+                pass
+
+        blocks = [_tool_use(f"t{i}", "search_knowledge", query=f"q{i}") for i in range(3)]
+        self._run(blocks, execute)
+        assert sorted(passed) == ["q0", "q1", "q2"]
+
+    def test_steps_stream_in_completion_order_results_keep_order(self):
+        """Test done steps arrive as tools finish while tool_results follow tool_use order"""
+        blocks = [
+            _tool_use("slow", "search_knowledge", query="slow"),
+            _tool_use("fast", "search_knowledge", query="fast"),
+            _tool_use("cite", "cite_sources", citations=[]),
+        ]
+        fast_done = threading.Event()
+
+        def execute(query):
+            if query == "slow":
+                fast_done.wait(timeout=5)
+                time.sleep(0.05)  # fast の結果がイベントループに届くまでの猶予
+            else:
+                fast_done.set()
+
+        agent, events = self._run(blocks, execute)
+
+        done_ids = [e["step"]["id"] for e in events if e.get("step", {}).get("status") == "done"]
+        assert done_ids == ["fast", "slow"]
+        assert all(e["step"]["tool"] != "cite_sources" for e in events if "step" in e)
+
+        tool_results = agent.client.messages.calls[1]["messages"][-1]["content"]
+        assert [r["tool_use_id"] for r in tool_results] == ["slow", "fast", "cite"]
+        assert json.loads(tool_results[0]["content"])["query"] == "slow"
+        assert events[-1]["done"] is True
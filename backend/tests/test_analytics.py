@@ -0,0 +1,175 @@
+"""Unit tests for the chat analytics rollups"""
+import json
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base
+from app.models.analytics import ChatDocumentDaily, ChatStatsHourly, ChatUserDaily
+from app.models.document import ChatHistory, ChatReference
+from app.models.organization import Organization
+from app.services import analytics
+from app.services.chat_references import build_references
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[
+        Organization.__table__, ChatHistory.__table__, ChatReference.__table__, ChatStatsHourly.__table__,
+        ChatUserDaily.__table__, ChatDocumentDaily.__table__,
+    ])
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def _chat(created_at, user_id="u1", docs=(), feedback=None, no_answer=False, org_id="org"):
+    chat = ChatHistory(
+        organization_id=org_id, user_id=user_id, question="有給は？", answer="…",
+        referenced_doc_ids=json.dumps(list(docs)), is_no_answer="1" if no_answer else "0",
+        feedback=feedback, created_at=created_at,
+    )
+    chat.references = build_references(chat, [{"id": doc_id} for doc_id in docs])
+    return chat
+
+
+def _snapshot(db):
+    return (
+        sorted((r.organization_id, analytics.hour_bucket(r.bucket), r.questions, r.good, r.bad, r.no_answer,
+                r.referenced) for r in db.query(ChatStatsHourly)),
+        sorted((r.organization_id, r.day, r.user_id) for r in db.query(ChatUserDaily)),
+        sorted((r.organization_id, r.day, r.document_id, r.reference_count) for r in db.query(ChatDocumentDaily)),
+    )
+
+
+T0 = datetime(2026, 4, 1, 9, 15, tzinfo=timezone.utc)
+
+
+class TestIncremental:
+    """Counters maintained on chat insert and feedback"""
+
+    def test_record_chat_adds_to_hour_user_and_documents(self, db):
+        """Test each chat increments its hour bucket, marks the user active and counts referenced docs"""
+        for chat in (_chat(T0, docs=["d1", "d2"]), _chat(T0 + timedelta(minutes=30), user_id="u2", docs=["d1"],
+                                                         no_answer=True)):
+            db.add(chat)
+            analytics.record_chat(db, chat)
+        db.commit()
+
+        hourly, users, docs = _snapshot(db)
+        assert hourly == [("org", datetime(2026, 4, 1, 9, tzinfo=timezone.utc), 2, 0, 0, 1, 3)]
+        assert users == [("org", date(2026, 4, 1), "u1"), ("org", date(2026, 4, 1), "u2")]
+        assert docs == [("org", date(2026, 4, 1), "d1", 2), ("org", date(2026, 4, 1), "d2", 1)]
+
+    def test_feedback_change_moves_between_good_and_bad(self, db):
+        """Test changing feedback updates good/bad in the chat's hour without touching questions"""
+        chat = _chat(T0)
+        db.add(chat)
+        analytics.record_chat(db, chat)
+
+        chat.feedback = "good"
+        analytics.record_feedback(db, chat, None)
+        chat.feedback = "bad"
+        analytics.record_feedback(db, chat, "good")
+        db.commit()
+
+        row = db.query(ChatStatsHourly).one()
+        assert (row.questions, row.good, row.bad) == (1, 0, 1)
+
+
+class TestRebuild:
+    """Recomputing rollups from chat history"""
+
+    def test_rebuild_matches_incremental(self, db):
+        """Test a rebuild produces the same rows as the incremental counters"""
+        chats = [
+            _chat(T0, docs=["d1"], feedback="good"),
+            _chat(T0 + timedelta(hours=2), user_id="u2", docs=["d1", "d3"], feedback="bad"),
+            _chat(T0 + timedelta(days=1), user_id=None, no_answer=True, org_id="other"),
+        ]
+        for chat in chats:
+            db.add(chat)
+            analytics.record_chat(db, chat)
+        db.commit()
+        incremental = _snapshot(db)
+
+        analytics.rebuild(db, until=date(2026, 4, 3))
+        db.commit()
+        assert _snapshot(db) == incremental
+
+    def test_rebuild_range_leaves_other_days(self, db):
+        """Test a ranged rebuild only replaces rows inside the range"""
+        for chat in (_chat(T0), _chat(T0 + timedelta(days=1))):
+            db.add(chat)
+            analytics.record_chat(db, chat)
+        db.commit()
+        db.query(ChatHistory).delete()
+
+        analytics.rebuild(db, since=date(2026, 4, 2), until=date(2026, 4, 3))
+        db.commit()
+        hourly, users, _ = _snapshot(db)
+        assert [h[1].date() for h in hourly] == [date(2026, 4, 1)]
+        assert [u[1] for u in users] == [date(2026, 4, 1)]
+
+    def test_compact_backfills_history_before_rollups(self, db):
+        """Test chats recorded before the rollups existed are backfilled on the first compaction"""
+        yesterday = datetime.now(timezone.utc) - timedelta(days=1)
+        old = _chat(yesterday - timedelta(days=60))
+        db.add(old)
+        recent = _chat(yesterday)
+        db.add(recent)
+        analytics.record_chat(db, recent)
+        db.commit()
+        assert analytics.orgs_needing_backfill(db) == ["org"]
+
+        assert analytics.compact(db, lookback_days=2, backfill=True)["backfilled"] == 1
+        assert analytics.orgs_needing_backfill(db) == []
+        assert sum(r.questions for r in db.query(ChatStatsHourly)) == 2
+
+    def test_compact_backfills_references_before_rebuilding(self, db):
+        """Test chats saved before chat_references existed keep their document counts after the first compaction"""
+        yesterday = datetime.now(timezone.utc) - timedelta(days=1)
+        old = _chat(yesterday, docs=["d1", "d2"])
+        old.references = []
+        db.add(old)
+        db.commit()
+
+        result = analytics.compact(db, lookback_days=2, backfill=True)
+
+        assert result["references_backfilled"] == 1
+        assert db.query(ChatReference).count() == 2
+        _, _, docs = _snapshot(db)
+        assert [(d[2], d[3]) for d in docs] == [("d1", 1), ("d2", 1)]
+        assert db.query(ChatStatsHourly).one().referenced == 2
+
+
+class TestDashboardReads:
+    """Series, heatmap and top documents served from the rollups"""
+
+    def test_series_heatmap_and_top_documents(self, db):
+        """Test daily sums, Sunday-first heatmap cells and referenced-document ranking"""
+        chats = [
+            _chat(T0, docs=["d1"], feedback="good"),  # 2026-04-01 は水曜
+            _chat(T0 + timedelta(hours=1), docs=["d1", "d2"]),
+            _chat(T0 + timedelta(days=4), docs=["d2", "d1", "d1"], no_answer=True),  # 日曜
+        ]
+        for chat in chats:
+            db.add(chat)
+            analytics.record_chat(db, chat)
+        db.commit()
+
+        rows = analytics.hourly_rows(db, "org", T0 - timedelta(days=1))
+        assert analytics.daily_series(rows, since=T0 + timedelta(days=1)) == [
+            {"date": "2026-04-05", "total": 1, "good": 0, "bad": 0, "noAnswer": 1},
+        ]
+        assert [d["total"] for d in analytics.daily_series(rows, since=T0)] == [2, 1]
+
+        heatmap = analytics.weekday_hour_heatmap(rows)
+        assert heatmap[3][9] == 1 and heatmap[3][10] == 1 and heatmap[0][9] == 1
+
+        assert analytics.top_documents(db, "org", date(2026, 4, 1), limit=5) == [("d1", 4), ("d2", 2)]
+        assert analytics.period_totals(db, "org", T0, T0 + timedelta(days=1))["total"] == 2
+        assert analytics.active_users(db, "org", date(2026, 4, 1), date(2026, 4, 5)) == 1
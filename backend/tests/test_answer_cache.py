@@ -0,0 +1,176 @@
+"""Unit tests for the semantic answer cache"""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.core.database import Base
+from app.models.cache import AnswerCacheEntry, answer_cache_documents
+from app.models.document import Department, Document, document_department
+from app.models.organization import Organization
+from app.services.answer_cache import AnswerCache, visibility_scope
+from app.services.ingestion import content_hash, sync_document_file
+from app.services.principal_cache import Principal
+
+EMBEDDING = [0.1] * 1536
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[
+        Organization.__table__, Department.__table__, Document.__table__, document_department,
+        AnswerCacheEntry.__table__, answer_cache_documents,
+    ])
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def _principal(role="user", department_id=None, organization_id="org") -> Principal:
+    return Principal(id="u1", email="u1@example.jp", name="山田", role=role,
+                     organization_id=organization_id, department_id=department_id, is_active=True)
+
+
+def _store(cache, db, doc_ids, org_id="org", scope="all", question="有給の申請方法は？"):
+    cache.store(db, organization_id=org_id, scope=scope, question=question, question_embedding=EMBEDDING,
+                answer="申請は…", references=[{"id": d, "title": f"{d}.pdf"} for d in doc_ids],
+                followups=[], avg_similarity=0.8)
+    db.commit()
+
+
+def _cached_questions(db):
+    return sorted(q for (q,) in db.query(AnswerCacheEntry.question))
+
+
+class FakeSession:
+    """Returns a fixed nearest entry and records the SQL parameters"""
+
+    def __init__(self, similarity):
+        self.row = SimpleNamespace(
+            id="c1", question="有給の申請方法は？", answer="申請は…", avg_similarity=0.8, similarity=similarity,
+            reference_items=json.dumps([{"id": "d1"}]), followups=json.dumps(["繰越は？"]),
+        )
+        self.calls: list[tuple[str, dict]] = []
+
+    def execute(self, statement, params):
+        self.calls.append((str(statement), params))
+        return SimpleNamespace(first=lambda: self.row)
+
+
+class TestVisibilityScope:
+    """Which users may share cached answers"""
+
+    def test_scopes(self):
+        """Test admins, each department and users without a department get separate scopes"""
+        assert visibility_scope(None) is None
+        assert visibility_scope(_principal(role="admin", department_id="hr")) == "admin"
+        assert visibility_scope(_principal(department_id="hr")) == "dept:hr"
+        assert visibility_scope(_principal(department_id="sales")) == "dept:sales"
+        assert visibility_scope(_principal()) == "all"
+
+
+class TestLookup:
+    """Similarity threshold and scope filtering"""
+
+    def test_hit_above_threshold(self):
+        """Test the nearest entry is returned and its hit counted when similar enough"""
+        cache = AnswerCache()
+        db = FakeSession(similarity=settings.answer_cache_similarity_threshold + 0.01)
+
+        entry = cache.lookup(db, "org", "dept:hr", EMBEDDING)
+
+        assert entry["id"] == "c1" and entry["references"] == [{"id": "d1"}]
+        assert "hit_count = hit_count + 1" in db.calls[1][0]
+        assert cache.stats()["hits"] == 1
+
+    def test_miss_below_threshold(self):
+        """Test a nearest entry under the threshold is not reused"""
+        cache = AnswerCache()
+        db = FakeSession(similarity=settings.answer_cache_similarity_threshold - 0.01)
+
+        assert cache.lookup(db, "org", "dept:hr", EMBEDDING) is None
+        assert len(db.calls) == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_query_is_limited_to_org_and_scope(self):
+        """Test lookups only search entries of the caller's organization and scope"""
+        db = FakeSession(similarity=1.0)
+        AnswerCache().lookup(db, "org", "dept:hr", EMBEDDING)
+
+        sql, params = db.calls[0]
+        assert "organization_id = :organization_id" in sql and "scope = :scope" in sql
+        assert (params["organization_id"], params["scope"]) == ("org", "dept:hr")
+
+
+class TestReplay:
+    """Cached answers stream like a live answer"""
+
+    def test_replay_streams_tokens_then_done(self):
+        """Test the replay reassembles to the stored answer and ends with a cached done event"""
+        entry = {"id": "c1", "answer": "年次有給休暇は入社6か月後に付与されます。" * 3,
+                 "references": [{"id": "d1"}], "followups": ["繰越は？"], "avg_similarity": 0.81234,
+                 "similarity": 0.97}
+
+        async def collect():
+            return [json.loads(e[len("data: "):]) async for e in AnswerCache.replay(entry)]
+
+        events = asyncio.run(collect())
+        assert "".join(e.get("token", "") for e in events) == entry["answer"]
+        done = events[-1]
+        assert done["done"] and done["cached"]
+        assert (done["references"], done["avg_similarity"]) == ([{"id": "d1"}], 0.812)
+
+
+class TestInvalidation:
+    """Entries are dropped when a referenced document changes"""
+
+    def test_delete_or_permission_change_drops_referencing_entries(self, db):
+        """Test invalidating a document removes only the entries that cite it"""
+        cache = AnswerCache()
+        _store(cache, db, ["d1", "d2"], question="d1とd2")
+        _store(cache, db, ["d2"], question="d2のみ")
+        _store(cache, db, ["d3"], question="d3のみ")
+
+        assert cache.invalidate_documents(db, ["d1"]) == 1
+        db.commit()
+        assert _cached_questions(db) == ["d2のみ", "d3のみ"]
+
+    def test_reupload_drops_entries_for_same_filename_in_org(self, db):
+        """Test re-uploading a file invalidates answers citing the old version in that organization only"""
+        db.add_all([
+            Document(id="old", filename="就業規則.pdf", file_type="pdf", organization_id="org"),
+            Document(id="other-org", filename="就業規則.pdf", file_type="pdf", organization_id="other"),
+        ])
+        db.commit()
+        cache = AnswerCache()
+        _store(cache, db, ["old"], question="旧版")
+        _store(cache, db, ["other-org"], org_id="other", question="別組織")
+
+        assert cache.invalidate_filename(db, "org", "就業規則.pdf") == 1
+        db.commit()
+        assert _cached_questions(db) == ["別組織"]
+
+    def test_resync_permission_change_drops_entries(self, db, tmp_path, monkeypatch):
+        """Test a re-sync that changes permissions on unchanged content invalidates cached answers"""
+        from app.services import ingestion
+
+        cache = AnswerCache()
+        monkeypatch.setattr(ingestion, "answer_cache", cache)
+        path = tmp_path / "規程.pdf"
+        path.write_bytes(b"%PDF-1.4 same")
+        db.add(Document(id="d1", filename="規程.pdf", file_type="pdf", organization_id="org", is_public=True,
+                        box_file_id="/docs/規程.pdf", content_hash=content_hash(b"%PDF-1.4 same")))
+        db.commit()
+        _store(cache, db, ["d1"], question="規程")
+
+        sync_document_file(db, "/docs/規程.pdf", "規程.pdf", str(path), is_public=False,
+                           department_ids=[], organization_id="org")
+        db.commit()
+
+        assert _cached_questions(db) == []
+        assert cache.stats()["invalidated"] == 1
@@ -0,0 +1,148 @@
+"""Unit tests for automatic re-ingestion of outdated SFTP documents"""
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base
+from app.models.document import Department, Document, SystemSettings, User, document_department
+from app.models.ingestion import IngestionJob
+from app.models.organization import Organization
+from app.services.ingestion import content_hash, enqueue_outdated_syncs, sync_document_file
+from app.services.poll_scheduler import PollScheduler
+from app.services.resync_window import in_window, parse_window, paused_orgs
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine, tables=[
+        Organization.__table__, Department.__table__, User.__table__, Document.__table__,
+        document_department, SystemSettings.__table__, IngestionJob.__table__,
+    ])
+    return sessionmaker(bind=engine)
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+def _jst(hour: int, minute: int = 0) -> datetime:
+    return datetime(2026, 4, 1, hour, minute, tzinfo=timezone(timedelta(hours=9)))
+
+
+def _outdated(db, path):
+    db.add(Document(filename=path.rsplit("/", 1)[-1], file_type="pdf", organization_id="org",
+                    box_file_id=path, box_sync_status="outdated"))
+    db.commit()
+
+
+def _queued_paths(db):
+    return sorted(json.loads(j.params)["source_file_id"] for j in db.query(IngestionJob).all())
+
+
+class TestResyncWindow:
+    """Off-peak window parsing and matching"""
+
+    def test_parse(self):
+        """Test empty means all day and malformed values are rejected"""
+        assert parse_window("") is None
+        assert parse_window("22:00-06:00") is not None
+        for value in ("22:00", "25:00-06:00", "06:00-06:00"):
+            with pytest.raises(ValueError):
+                parse_window(value)
+
+    def test_same_day_window(self):
+        """Test a daytime window includes its start and excludes its end"""
+        assert in_window("12:00-13:00", _jst(12))
+        assert not in_window("12:00-13:00", _jst(13))
+
+    def test_overnight_window(self):
+        """Test a window across midnight matches both sides of midnight in local time"""
+        assert in_window("22:00-06:00", _jst(23, 30))
+        assert in_window("22:00-06:00", _jst(5, 59))
+        assert not in_window("22:00-06:00", _jst(9))
+
+    def test_paused_orgs(self, db):
+        """Test only orgs outside their window are paused"""
+        db.add_all([
+            SystemSettings(organization_id="night", box_resync_window="22:00-06:00"),
+            SystemSettings(organization_id="always", box_resync_window=""),
+        ])
+        db.commit()
+        assert paused_orgs(db, _jst(9)) == ["night"]
+        assert paused_orgs(db, _jst(23)) == []
+
+
+class TestEnqueueOutdated:
+    """Background sync jobs for outdated documents"""
+
+    def test_outdated_documents_are_queued_once(self, db):
+        """Test each outdated file gets one background job and pending ones are not duplicated"""
+        _outdated(db, "/docs/a.pdf")
+        _outdated(db, "/docs/b.pdf")
+
+        assert enqueue_outdated_syncs(db, "org", limit=10) == 2
+        assert enqueue_outdated_syncs(db, "org", limit=10) == 0
+
+        jobs = db.query(IngestionJob).all()
+        assert _queued_paths(db) == ["/docs/a.pdf", "/docs/b.pdf"]
+        assert {(j.kind, j.priority) for j in jobs} == {("sftp_sync", 1)}
+        assert json.loads(jobs[0].params)["is_public"] is None
+
+    def test_limit_and_recent_failures(self, db):
+        """Test the batch limit applies and recently failed files wait before retrying"""
+        for name in ("a", "b", "c"):
+            _outdated(db, f"/docs/{name}.pdf")
+        db.add(IngestionJob(organization_id="org", kind="sftp_sync", status="failed", filename="a.pdf",
+                            file_type="pdf", params=json.dumps({"source_file_id": "/docs/a.pdf"}),
+                            finished_at=datetime.now(timezone.utc)))
+        db.commit()
+
+        assert enqueue_outdated_syncs(db, "org", limit=1) == 1
+        assert _queued_paths(db) == ["/docs/a.pdf", "/docs/b.pdf"]  # a は失敗ジョブ
+
+    def test_poll_queues_only_when_enabled_and_in_window(self, session_factory, monkeypatch):
+        """Test the scheduler queues resyncs after a poll only for opted-in orgs inside their window"""
+        db = session_factory()
+        _outdated(db, "/docs/a.pdf")
+        db.add(SystemSettings(organization_id="org", box_auto_resync=True, box_resync_window="22:00-06:00"))
+        db.commit()
+        scheduler = PollScheduler(max_workers=1, jitter=0.1, session_factory=session_factory,
+                                  poll=lambda db, org_id: {"outdated": 1})
+
+        monkeypatch.setattr("app.services.poll_scheduler.in_window", lambda window: False)
+        assert scheduler.run_once("org")["queued"] == 0
+
+        monkeypatch.setattr("app.services.poll_scheduler.in_window", lambda window: True)
+        assert scheduler.run_once("org")["queued"] == 1
+        db.close()
+
+
+class TestSyncDocumentFile:
+    """Permission handling on re-sync"""
+
+    def test_none_keeps_existing_permissions(self, db, tmp_path):
+        """Test an automatic re-sync leaves is_public and departments as the admin set them"""
+        path = tmp_path / "規程.pdf"
+        path.write_bytes(b"%PDF-1.4 same")
+        dept = Department(id="hr", organization_id="org", name="人事部")
+        doc = Document(filename="規程.pdf", file_type="pdf", organization_id="org", is_public=False,
+                       box_file_id="/docs/規程.pdf", content_hash=content_hash(b"%PDF-1.4 same"))
+        doc.departments = [dept]
+        db.add_all([dept, doc])
+        db.commit()
+
+        mtime = datetime(2026, 4, 1, tzinfo=timezone.utc)
+        synced = sync_document_file(db, "/docs/規程.pdf", "規程.pdf", str(path), is_public=None,
+                                    department_ids=None, organization_id="org", source_mtime=mtime, source_size=13)
+
+        assert synced.id == doc.id and synced.is_public is False
+        assert [d.id for d in synced.departments] == ["hr"]
+        assert (synced.box_sync_status, synced.source_size) == ("synced", 13)
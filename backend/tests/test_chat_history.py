@@ -0,0 +1,90 @@
+"""Unit tests for the keyset-paginated chat history listing"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.api import stats
+from app.core.database import Base
+from app.models.analytics import ChatDocumentDaily, ChatStatsHourly, ChatUserDaily
+from app.models.document import ChatHistory, ChatReference
+from app.models.organization import Organization
+from app.services.analytics import record_chat
+
+T0 = datetime(2026, 4, 1, 9, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[
+        Organization.__table__, ChatHistory.__table__, ChatReference.__table__, ChatStatsHourly.__table__,
+        ChatUserDaily.__table__, ChatDocumentDaily.__table__,
+    ])
+    session = sessionmaker(bind=engine)()
+    # 7件: 2件ずつ同時刻（id でタイブレーク）。3件目ごとに bad、5件目ごとに回答なし
+    for i in range(7):
+        chat = ChatHistory(
+            id=f"c{i}", organization_id="org", question=f"質問{i}", answer="あ" * (150 + i * 20),
+            created_at=T0 + timedelta(minutes=i // 2), feedback="bad" if i % 3 == 0 else None,
+            is_no_answer="1" if i % 5 == 0 else "0",
+        )
+        session.add(chat)
+        record_chat(session, chat)
+    session.commit()
+    yield session
+    session.close()
+
+
+def _page(db, cursor=None, limit=3, feedback=None, no_answer_only=False, filter_mode=None):
+    return stats._history_page(db, "org", limit, cursor, feedback, no_answer_only, None, filter_mode)
+
+
+class TestKeysetPagination:
+    """Cursor paging over (created_at, id)"""
+
+    def test_pages_walk_all_rows_once_in_order(self, db):
+        """Test following next_cursor visits every chat newest first without gaps or repeats"""
+        seen, cursor = [], None
+        while True:
+            page = _page(db, cursor)
+            seen += [item["id"] for item in page["items"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert seen == ["c6", "c5", "c4", "c3", "c2", "c1", "c0"]
+
+    def test_list_carries_only_answer_preview(self, db):
+        """Test list items truncate the answer and leave full text and references to the detail view"""
+        item = _page(db, limit=1)["items"][0]
+        assert item["answer"] == "あ" * 200 + "..."
+        assert "full_answer" not in item and "references" not in item
+
+    def test_invalid_cursor_is_rejected(self, db):
+        """Test a malformed cursor is a 400 rather than a server error"""
+        with pytest.raises(HTTPException) as exc:
+            _page(db, cursor="not-a-cursor")
+        assert exc.value.status_code == 400
+
+
+class TestTotals:
+    """Rollup-backed and capped totals"""
+
+    def test_rollup_totals_for_simple_filters(self, db):
+        """Test totals come from the hourly rollup and are flagged as estimates"""
+        assert (_page(db)["total"], _page(db)["total_is_estimate"]) == (7, True)
+        assert _page(db, feedback="bad")["total"] == 3
+        assert _page(db, feedback="none")["total"] == 4
+        assert _page(db, no_answer_only=True)["total"] == 2
+
+    def test_capped_count_for_combined_filters(self, db, monkeypatch):
+        """Test filters the rollup cannot express are counted exactly up to the cap"""
+        page = _page(db, filter_mode="evaluated")
+        assert (page["total"], page["total_is_estimate"]) == (4, False)
+        assert {item["id"] for item in page["items"]} <= {"c0", "c3", "c5", "c6"}
+
+        monkeypatch.setattr(stats, "HISTORY_COUNT_CAP", 2)
+        page = _page(db, filter_mode="evaluated")
+        assert (page["total"], page["total_is_estimate"]) == (2, True)
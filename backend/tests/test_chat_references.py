@@ -0,0 +1,98 @@
+"""Unit tests for normalized chat references"""
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base
+from app.models.document import ChatHistory, ChatReference, Document
+from app.models.organization import Organization
+from app.services.chat_references import as_dict, backfill, build_references, document_usage
+
+NOW = datetime.now(timezone.utc)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[
+        Organization.__table__, Document.__table__, ChatHistory.__table__, ChatReference.__table__,
+    ])
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def _chat(references, created_at=NOW, org_id="org", **kwargs):
+    chat = ChatHistory(organization_id=org_id, question="有給は？", answer="…", created_at=created_at,
+                       referenced_doc_ids=json.dumps([r["id"] for r in references]), **kwargs)
+    chat.references = build_references(chat, references)
+    return chat
+
+
+class TestBuildReferences:
+    """Rows written at chat completion"""
+
+    def test_rows_keep_citation_order(self, db):
+        """Test references are stored in answer order with their section and excerpt"""
+        chat = _chat([
+            {"id": "d2", "title": "就業規則.pdf", "section": "第5条", "excerpt": "年次有給休暇は…"},
+            {"id": "", "title": "不明"},
+            {"id": "d1", "title": "出張規程.pdf"},
+        ])
+        db.add(chat)
+        db.commit()
+
+        stored = db.query(ChatHistory).one().references
+        assert [(r.rank, r.document_id) for r in stored] == [(1, "d2"), (2, "d1")]
+        assert as_dict(stored[0]) == {"id": "d2", "title": "就業規則.pdf", "section": "第5条",
+                                      "excerpt": "年次有給休暇は…"}
+
+
+class TestBackfill:
+    """Recovering references for chats saved before the table existed"""
+
+    def test_backfill_from_trace_and_ids(self, db):
+        """Test citations come from the cite_sources trace, falling back to the stored id list"""
+        trace = [{"tool": "search_knowledge"}, {"tool": "cite_sources", "input": {"citations": [
+            {"document_id": "d1", "filename": "就業規則.pdf", "section": "第5条", "excerpt": "…"},
+        ]}}]
+        db.add_all([
+            ChatHistory(id="c1", organization_id="org", question="q", answer="a", created_at=NOW,
+                        referenced_doc_ids=json.dumps(["d1"]), agentic_trace=json.dumps(trace)),
+            ChatHistory(id="c2", organization_id="org", question="q", answer="a", created_at=NOW,
+                        referenced_doc_ids=json.dumps(["d3", "d4"])),
+            ChatHistory(id="c3", organization_id="org", question="q", answer="a", created_at=NOW,
+                        referenced_doc_ids="[]"),
+        ])
+        db.commit()
+
+        assert backfill(db, batch_size=1) == 2
+        assert backfill(db) == 0
+        rows = db.query(ChatReference).order_by(ChatReference.chat_id, ChatReference.rank).all()
+        assert [(r.chat_id, r.document_id, r.title) for r in rows] == [
+            ("c1", "d1", "就業規則.pdf"), ("c2", "d3", ""), ("c2", "d4", ""),
+        ]
+
+
+class TestDocumentUsage:
+    """Per-document usage aggregated in SQL"""
+
+    def test_usage_counts_within_period_and_org(self, db):
+        """Test reference and chat counts are grouped per document for the org and period"""
+        db.add(Document(id="d1", filename="就業規則.pdf", file_type="pdf", organization_id="org"))
+        db.add_all([
+            _chat([{"id": "d1", "section": "第5条"}, {"id": "d1", "section": "第6条"}]),
+            _chat([{"id": "d1"}, {"id": "d2"}]),
+            _chat([{"id": "d2"}], created_at=NOW - timedelta(days=40)),
+            _chat([{"id": "d2"}], org_id="other"),
+        ])
+        db.commit()
+
+        usage = document_usage(db, "org", NOW - timedelta(days=30))
+        assert [(u["id"], u["filename"], u["referenceCount"], u["chatCount"]) for u in usage] == [
+            ("d1", "就業規則.pdf", 3, 2), ("d2", "不明", 1, 1),
+        ]
+        assert [u["id"] for u in document_usage(db, "org", NOW - timedelta(days=30), document_id="d2")] == ["d2"]
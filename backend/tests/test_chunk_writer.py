@@ -0,0 +1,65 @@
+"""Unit tests for bulk chunk writes"""
+import struct
+
+from pgvector.utils import Vector
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base
+from app.models.document import Document, DocumentChunk
+from app.models.organization import Organization
+from app.services.chunk_writer import COPY_COLUMNS, encode_copy_binary, write_chunks
+
+
+def _row(i: int, embedding=None) -> dict:
+    return {
+        "id": f"chunk-{i}",
+        "document_id": "doc",
+        "organization_id": "org",
+        "content": f"第{i}条",
+        "content_hash": None,
+        "chunk_index": i,
+        "embedding": embedding or [float(i), 0.5],
+    }
+
+
+class TestCopyBinary:
+    """COPY binary payload layout"""
+
+    def test_payload_framing(self):
+        """Test header, per-row field count and trailer follow the PGCOPY format"""
+        payload = encode_copy_binary([_row(0), _row(1)])
+        assert payload.startswith(b"PGCOPY\n\xff\r\n\x00\x00\x00\x00\x00\x00\x00\x00\x00")
+        assert payload.endswith(struct.pack("!h", -1))
+        assert payload.count(struct.pack("!h", len(COPY_COLUMNS)) + struct.pack("!i", len(b"chunk-0"))) == 2
+
+    def test_vector_matches_pgvector_binary(self):
+        """Test the embedding field is pgvector's binary representation"""
+        payload = encode_copy_binary([_row(0, [1.0, 2.5, -3.25])])
+        expected = Vector([1.0, 2.5, -3.25]).to_binary()
+        assert struct.pack("!i", len(expected)) + expected + struct.pack("!h", -1) == payload[-(len(expected) + 6):]
+
+    def test_null_content_hash(self):
+        """Test NULL columns are encoded as length -1"""
+        payload = encode_copy_binary([_row(0)])
+        assert "第0条".encode() + struct.pack("!i", -1) in payload
+
+
+class TestWriteChunks:
+    """executemany fallback for non-Postgres sessions"""
+
+    def test_rows_are_inserted_in_the_session_transaction(self):
+        """Test rows land in the table and roll back with the session"""
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine, tables=[
+            Organization.__table__, Document.__table__, DocumentChunk.__table__,
+        ])
+        db = sessionmaker(bind=engine)()
+        db.add(Document(id="doc", filename="規程.pdf", file_type="pdf", organization_id="org"))
+
+        assert write_chunks(db, [_row(i, [float(i)] * 1536) for i in range(3)]) == 3
+        assert db.query(DocumentChunk).count() == 3
+
+        db.rollback()
+        assert db.query(DocumentChunk).count() == 0
+        db.close()
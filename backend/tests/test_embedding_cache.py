@@ -0,0 +1,89 @@
+"""Unit tests for the query embedding cache"""
+import time
+
+from app.services.embedding_cache import (
+    EmbeddingCache,
+    MemoryEmbeddingStore,
+    make_cache_key,
+    normalize_query,
+)
+
+
+class FakeEmbedder:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, text: str) -> list[float]:
+        self.calls += 1
+        return [float(len(text)), 0.5]
+
+
+class TestNormalization:
+    """Key normalization tests"""
+
+    def test_fullwidth_and_whitespace_are_normalized(self):
+        """Test full-width characters and spacing map to the same key"""
+        assert normalize_query("　有給休暇の  申請方法 ") == normalize_query("有給休暇の 申請方法")
+        assert normalize_query("ＰＣ貸与") == normalize_query("pc貸与")
+
+    def test_key_depends_on_model(self):
+        """Test the same text under different models uses different keys"""
+        assert make_cache_key("model-a", "質問") != make_cache_key("model-b", "質問")
+
+
+class TestEmbeddingCache:
+    """Cache hit/miss behaviour tests"""
+
+    def test_repeated_query_skips_compute(self):
+        """Test a repeated query is served from memory"""
+        cache = EmbeddingCache(memory=MemoryEmbeddingStore(max_entries=10, ttl_seconds=60))
+        embedder = FakeEmbedder()
+        first = cache.get_or_compute("m", "有給休暇の申請方法", embedder)
+        second = cache.get_or_compute("m", "有給休暇の申請方法 ", embedder)
+        assert first == second
+        assert embedder.calls == 1
+        stats = cache.stats()
+        assert stats["misses"] == 1
+        assert stats["memory_hits"] == 1
+
+    def test_lru_eviction(self):
+        """Test the least recently used entry is evicted"""
+        store = MemoryEmbeddingStore(max_entries=2, ttl_seconds=60)
+        store.set("a", "m", [1.0])
+        store.set("b", "m", [2.0])
+        store.get("a")
+        store.set("c", "m", [3.0])
+        assert store.get("b") is None
+        assert store.get("a") == [1.0]
+        assert len(store) == 2
+
+    def test_ttl_expiry(self):
+        """Test expired entries are treated as misses"""
+        store = MemoryEmbeddingStore(max_entries=10, ttl_seconds=0)
+        store.set("a", "m", [1.0])
+        time.sleep(0.01)
+        assert store.get("a") is None
+
+    def test_persistent_tier_fills_memory(self):
+        """Test a persistent hit is promoted to the memory tier"""
+
+        class DictStore:
+            def __init__(self):
+                self.data = {}
+
+            def get(self, key):
+                return self.data.get(key)
+
+            def set(self, key, model, embedding):
+                self.data[key] = embedding
+
+        persistent = DictStore()
+        persistent.data[make_cache_key("m", "q")] = [9.0]
+        cache = EmbeddingCache(memory=MemoryEmbeddingStore(10, 60), persistent=persistent)
+        embedder = FakeEmbedder()
+        assert cache.get_or_compute("m", "q", embedder) == [9.0]
+        assert cache.get_or_compute("m", "q", embedder) == [9.0]
+        assert embedder.calls == 0
+        stats = cache.stats()
+        assert stats["persistent_hits"] == 1
+        assert stats["memory_hits"] == 1
@@ -0,0 +1,85 @@
+"""Unit tests for the bulk embedding pipeline"""
+import threading
+
+import httpx
+import openai
+import pytest
+
+from app.services.embedding_pipeline import EmbeddingError, EmbeddingPipeline, token_batches
+
+
+def _status_error(cls, status: int):
+    request = httpx.Request("POST", "https://api.openai.com/v1/embeddings")
+    return cls("error", response=httpx.Response(status, request=request), body=None)
+
+
+class FakeEmbedder:
+    """Returns the text length as a 1-d vector; fails the first call for any text in `flaky`"""
+
+    def __init__(self, flaky=(), too_long=()):
+        self.calls: list[list[str]] = []
+        self.flaky = set(flaky)
+        self.too_long = set(too_long)
+        self._lock = threading.Lock()
+
+    def __call__(self, texts):
+        with self._lock:
+            self.calls.append(list(texts))
+            failing = self.flaky & set(texts)
+            self.flaky -= failing
+        if set(texts) & self.too_long:
+            raise _status_error(openai.BadRequestError, 400)
+        if failing:
+            raise _status_error(openai.RateLimitError, 429)
+        return [[float(len(t))] for t in texts]
+
+
+def _pipeline(embedder, **overrides):
+    params = dict(max_tokens=10, max_items=3, concurrency=2, max_retries=2, backoff_base=0.001)
+    params.update(overrides)
+    return EmbeddingPipeline(embedder, **params)
+
+
+class TestTokenBatches:
+    """Batch boundaries"""
+
+    def test_batches_respect_token_and_item_limits(self):
+        """Test batches close on either the token budget or the item count"""
+        texts = ["a" * 4, "b" * 4, "c" * 4, "d", "e", "f", "g"]
+        batches = token_batches(texts, max_tokens=10, max_items=3)
+        assert [len(b) for b in batches] == [2, 3, 2]
+        assert sorted(i for b in batches for i in b) == list(range(7))
+
+
+class TestEmbeddingPipeline:
+    """Concurrency, retries and ordering"""
+
+    def test_embed_all_keeps_input_order(self):
+        """Test results map back to their input positions across batches"""
+        texts = [str(i) * (i + 1) for i in range(8)]
+        vectors = _pipeline(FakeEmbedder()).embed_all(texts)
+        assert vectors == [[float(len(t))] for t in texts]
+
+    def test_only_the_failed_batch_is_retried(self):
+        """Test a rate-limited batch is resent without re-embedding the others"""
+        embedder = FakeEmbedder(flaky={"ccc"})
+        texts = ["aaa", "bbb", "ccc", "ddd"]
+        _pipeline(embedder, max_items=2).embed_all(texts)
+
+        sent = [t for call in embedder.calls for t in call]
+        assert sent.count("ccc") == 2 and sent.count("aaa") == 1
+
+    def test_bad_request_splits_the_batch(self):
+        """Test a 400 bisects the batch instead of failing every text in it"""
+        embedder = FakeEmbedder(too_long={"bad"})
+        with pytest.raises(openai.BadRequestError):
+            _pipeline(embedder, max_items=4, max_tokens=100).embed_all(["a", "b", "bad", "c"])
+        assert ["a", "b"] in embedder.calls and ["bad"] in embedder.calls
+
+    def test_retries_are_bounded(self):
+        """Test persistent failures surface as EmbeddingError"""
+        def always_fail(texts):
+            raise _status_error(openai.InternalServerError, 500)
+
+        with pytest.raises(EmbeddingError):
+            _pipeline(always_fail).embed_all(["a"])
@@ -0,0 +1,62 @@
+"""Unit tests for the PDF page extraction cache"""
+import fitz
+import pytest
+
+from app.services import document_processor as dp
+from app.services.extraction_cache import page_cache_key
+
+
+class FakePageCache:
+    def __init__(self):
+        self.entries: dict[str, str] = {}
+
+    def get_many(self, keys):
+        return {k: self.entries[k] for k in keys if k in self.entries}
+
+    def put(self, key, prompt_version, markdown):
+        self.entries[key] = markdown
+
+
+def _pdf(labels: list[str]) -> bytes:
+    """One short-text page per label, so every page is routed to Vision"""
+    doc = fitz.open()
+    for label in labels:
+        page = doc.new_page()
+        page.insert_text((72, 72), label)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+@pytest.fixture
+def processor(monkeypatch):
+    cache = FakePageCache()
+    monkeypatch.setattr(dp, "page_extraction_cache", cache)
+    processor = dp.DocumentProcessor()
+    processor.vision_calls = []
+
+    def call_vision(image_data, page_num, media_type="image/png"):
+        processor.vision_calls.append(page_num)
+        return f"page-{page_num}"
+
+    monkeypatch.setattr(processor, "_call_claude_vision", call_vision)
+    return processor
+
+
+class TestPageExtractionCache:
+    """Vision calls are skipped for unchanged pages"""
+
+    def test_key_depends_on_prompt_version(self):
+        """Test the same image under a different prompt version is a miss"""
+        assert page_cache_key(b"png", "v1") != page_cache_key(b"png", "v2")
+
+    def test_reprocessing_only_calls_vision_for_changed_pages(self, processor):
+        """Test a revised PDF re-extracts only the page that changed"""
+        processor.extract_text_from_pdf(_pdf(["A", "B", "C"]))
+        assert sorted(processor.vision_calls) == [1, 2, 3]
+
+        processor.vision_calls.clear()
+        text = processor.extract_text_from_pdf(_pdf(["A", "B2", "C"]))
+
+        assert processor.vision_calls == [2]
+        assert "page-1" in text and "page-3" in text
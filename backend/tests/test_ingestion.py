@@ -0,0 +1,299 @@
+"""Unit tests for incremental chunk indexing and the ingestion job queue"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.config import settings
+from app.core.database import Base
+from app.models.document import (
+    Department, Document, DocumentChunk, SystemSettings, User, document_department,
+)
+from app.models.ingestion import IngestionJob
+from app.models.organization import Organization
+from app.services import ingestion
+from app.services.document_processor import document_processor
+from app.services.ingestion import (
+    IngestionError, JobProgress, claim_next_job, content_hash, file_content_hash, index_chunks,
+    recover_stale_jobs, run_job,
+)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[
+        Organization.__table__, Department.__table__, Document.__table__, DocumentChunk.__table__, document_department,
+    ])
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def embedder(monkeypatch):
+    """Split on blank lines and record which texts get embedded"""
+    calls: list[list[str]] = []
+
+    def embed_batch(texts):
+        calls.append(list(texts))
+        return [[float(len(t))] * 1536 for t in texts]
+
+    monkeypatch.setattr(ingestion.rag_service, "chunk_text", lambda text: text.split("\n\n"))
+    monkeypatch.setattr(ingestion.rag_service, "embed_batch", embed_batch)
+    return calls
+
+
+def _chunks(db, document):
+    return db.query(DocumentChunk).filter(
+        DocumentChunk.document_id == document.id
+    ).order_by(DocumentChunk.chunk_index).all()
+
+
+class TestIndexChunks:
+    """Chunk reuse on re-indexing"""
+
+    def _document(self, db):
+        document = Document(filename="規程.pdf", file_type="pdf", organization_id="org")
+        db.add(document)
+        db.flush()
+        return document
+
+    def test_first_index_embeds_unique_texts_once(self, db, embedder):
+        """Test duplicate chunk texts share one embedding call"""
+        document = self._document(db)
+        result = index_chunks(db, document, "第1条\n\n第2条\n\n第1条")
+        db.commit()
+
+        assert embedder == [["第1条", "第2条"]]
+        assert result.chunk_count == 3 and result.embedded == 2
+        assert [c.content_hash for c in _chunks(db, document)] == [
+            content_hash("第1条"), content_hash("第2条"), content_hash("第1条"),
+        ]
+
+    def test_reindex_only_embeds_changed_chunks(self, db, embedder):
+        """Test unchanged chunks keep their rows and shifted ones are re-numbered"""
+        document = self._document(db)
+        index_chunks(db, document, "第1条\n\n第2条\n\n第3条")
+        db.commit()
+        kept_ids = {c.content: c.id for c in _chunks(db, document)}
+
+        result = index_chunks(db, document, "前文\n\n第1条\n\n第3条")
+        db.commit()
+
+        assert embedder[-1] == ["前文"]
+        assert (result.reused, result.embedded, result.deleted) == (2, 1, 1)
+        chunks = _chunks(db, document)
+        assert [c.content for c in chunks] == ["前文", "第1条", "第3条"]
+        assert chunks[1].id == kept_ids["第1条"] and chunks[2].id == kept_ids["第3条"]
+
+    def test_identical_text_makes_no_embedding_calls(self, db, embedder):
+        """Test re-indexing the same text does not call the embedding API"""
+        document = self._document(db)
+        index_chunks(db, document, "第1条\n\n第2条")
+        db.commit()
+
+        result = index_chunks(db, document, "第1条\n\n第2条")
+
+        assert len(embedder) == 1
+        assert (result.reused, result.embedded, result.deleted) == (2, 0, 0)
+
+
+class TestFileBasedExtraction:
+    """Uploads are read from their staged path"""
+
+    def test_file_hash_matches_bytes_hash(self, tmp_path):
+        """Test the streamed file hash equals the in-memory content hash"""
+        data = "第1条 目的\n".encode() * 200_000
+        path = tmp_path / "規程.txt"
+        path.write_bytes(data)
+        assert file_content_hash(str(path), block_size=4096) == content_hash(data)
+
+    def test_extract_from_path_and_bytes_agree(self, tmp_path):
+        """Test path-based extraction matches the bytes entry point"""
+        data = "\ufeff名前,部署\n山田,総務\n".encode()
+        path = tmp_path / "名簿.csv"
+        path.write_bytes(data)
+        assert document_processor.extract_text_from_file("名簿.csv", str(path)) == \
+            document_processor.extract_text("名簿.csv", data)
+
+
+@pytest.fixture
+def session_factory(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine, tables=[
+        Organization.__table__, Department.__table__, User.__table__, Document.__table__,
+        document_department, SystemSettings.__table__, IngestionJob.__table__,
+    ])
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(ingestion, "SessionLocal", factory)
+    return factory
+
+
+@pytest.fixture
+def queue(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+T0 = datetime(2026, 4, 1, 9, 0, tzinfo=timezone.utc)
+
+
+def _job(db, name, kind="upload", org_id="org", priority=0, status="queued", created_at=T0, **kwargs):
+    job = IngestionJob(organization_id=org_id, kind=kind, priority=priority, status=status,
+                       filename=name, file_type="pdf", created_at=created_at, **kwargs)
+    db.add(job)
+    db.commit()
+    return job
+
+
+class TestClaimNextJob:
+    """Queue ordering and eligibility"""
+
+    def test_claims_by_priority_then_age(self, queue):
+        """Test foreground jobs go first, oldest first, and claiming marks the job running"""
+        _job(queue, "background.pdf", kind="sftp_sync", priority=1, created_at=T0 - timedelta(hours=1))
+        _job(queue, "newer.pdf", created_at=T0 + timedelta(minutes=1))
+        older = _job(queue, "older.pdf")
+
+        assert claim_next_job(queue, "w1") == older.id
+        queue.refresh(older)
+        assert (older.status, older.worker_id, older.attempts) == ("running", "w1", 1)
+        assert [queue.get(IngestionJob, claim_next_job(queue, "w1")).filename for _ in range(2)] == [
+            "newer.pdf", "background.pdf",
+        ]
+        assert claim_next_job(queue, "w1") is None
+
+    def test_skips_backoff_and_busy_sync_orgs(self, queue):
+        """Test jobs waiting to retry and syncs over the org's concurrency stay queued"""
+        _job(queue, "retry.pdf", run_after=datetime.now(timezone.utc) + timedelta(minutes=5))
+        _job(queue, "running.pdf", kind="sftp_sync", status="running")
+        _job(queue, "second-sync.pdf", kind="sftp_sync")
+        other = _job(queue, "other-org.pdf", kind="sftp_sync", org_id="other")
+
+        assert claim_next_job(queue, "w1") == other.id
+        assert claim_next_job(queue, "w1") is None
+
+    def test_paused_orgs_only_hold_background_jobs(self, queue, monkeypatch):
+        """Test the resync window pauses automatic resyncs but not manual work"""
+        monkeypatch.setattr(ingestion, "paused_orgs", lambda db: ["org"])
+        _job(queue, "auto.pdf", kind="sftp_sync", priority=1)
+        manual = _job(queue, "manual.pdf", created_at=T0 + timedelta(minutes=1))
+
+        assert claim_next_job(queue, "w1") == manual.id
+        assert claim_next_job(queue, "w1") is None
+
+
+class TestRecoverStaleJobs:
+    """Jobs whose worker stopped heartbeating"""
+
+    def test_requeues_until_attempts_run_out(self, queue):
+        """Test stale jobs are requeued, or failed once they hit the attempt limit"""
+        stale = datetime.now(timezone.utc) - timedelta(seconds=settings.ingestion_heartbeat_timeout_seconds + 60)
+        retry = _job(queue, "retry.pdf", status="running", attempts=1, heartbeat_at=stale, worker_id="w1")
+        exhausted = _job(queue, "exhausted.pdf", status="running", attempts=settings.ingestion_max_attempts,
+                         heartbeat_at=stale)
+        alive = _job(queue, "alive.pdf", status="running", attempts=1, heartbeat_at=datetime.now(timezone.utc))
+
+        assert recover_stale_jobs(queue) == 2
+        queue.expire_all()
+        assert (retry.status, retry.worker_id) == ("queued", None)
+        assert exhausted.status == "failed" and exhausted.finished_at is not None
+        assert alive.status == "running"
+
+    def test_failed_job_staging_file_is_removed(self, queue, tmp_path):
+        """Test only jobs given up as failed lose their staging file; requeued ones keep it for the retry"""
+        stale = datetime.now(timezone.utc) - timedelta(seconds=settings.ingestion_heartbeat_timeout_seconds + 60)
+        retry_file, exhausted_file = tmp_path / "retry.pdf", tmp_path / "exhausted.pdf"
+        retry_file.write_bytes(b"%PDF")
+        exhausted_file.write_bytes(b"%PDF")
+        _job(queue, "retry.pdf", status="running", attempts=1, heartbeat_at=stale, source_path=str(retry_file))
+        _job(queue, "exhausted.pdf", status="running", attempts=settings.ingestion_max_attempts,
+             heartbeat_at=stale, source_path=str(exhausted_file))
+
+        recover_stale_jobs(queue)
+        assert retry_file.exists() and not exhausted_file.exists()
+
+
+class TestRunJob:
+    """Retry versus permanent failure"""
+
+    def _run(self, queue, monkeypatch, error, attempts=1, handler=None, **kwargs):
+        def raise_error(db, job, progress):
+            raise error
+
+        monkeypatch.setitem(ingestion.JOB_HANDLERS, "upload", handler or raise_error)
+        job = _job(queue, "規程.pdf", status="running", attempts=attempts, **kwargs)
+        run_job(job.id)
+        queue.expire_all()
+        return queue.get(IngestionJob, job.id)
+
+    def test_transient_error_is_requeued_with_backoff(self, queue, monkeypatch):
+        """Test an unexpected error requeues the job behind a backoff"""
+        before = datetime.now(timezone.utc).replace(tzinfo=None)
+        job = self._run(queue, monkeypatch, TimeoutError("embedding API timed out"))
+
+        assert job.status == "queued" and job.finished_at is None
+        assert job.error == "embedding API timed out"
+        assert job.run_after.replace(tzinfo=None) >= before + timedelta(seconds=ingestion.retry_delay(1))
+
+    def test_transient_error_fails_after_last_attempt(self, queue, monkeypatch):
+        """Test the job fails once ingestion_max_attempts is reached"""
+        job = self._run(queue, monkeypatch, TimeoutError("timeout"), attempts=settings.ingestion_max_attempts)
+        assert job.status == "failed" and job.finished_at is not None
+
+    def test_ingestion_error_fails_immediately(self, queue, monkeypatch):
+        """Test errors that cannot succeed on retry fail on the first attempt"""
+        job = self._run(queue, monkeypatch, IngestionError("テキストを抽出できませんでした"))
+        assert (job.status, job.error) == ("failed", "テキストを抽出できませんでした")
+
+    def test_staging_file_is_kept_for_retry_and_removed_on_failure(self, queue, monkeypatch, tmp_path):
+        """Test a requeued job keeps its staging file and a failed job removes it"""
+        retry_file, failed_file = tmp_path / "retry.pdf", tmp_path / "failed.pdf"
+        retry_file.write_bytes(b"%PDF")
+        failed_file.write_bytes(b"%PDF")
+
+        self._run(queue, monkeypatch, TimeoutError("timeout"), source_path=str(retry_file))
+        self._run(queue, monkeypatch, IngestionError("壊れたファイル"), source_path=str(failed_file))
+
+        assert retry_file.exists() and not failed_file.exists()
+
+    def test_files_created_by_rolled_back_job_are_removed(self, queue, monkeypatch, tmp_path):
+        """Test a file saved for a document that was rolled back does not stay on disk"""
+        saved = tmp_path / "saved.pdf"
+
+        def handler(db, job, progress):
+            saved.write_bytes(b"%PDF")
+            progress.created_files.append(str(saved))
+            raise TimeoutError("embedding API timed out")
+
+        job = self._run(queue, monkeypatch, None, handler=handler)
+        assert job.status == "queued" and not saved.exists()
+
+    def test_backoff_doubles_and_is_capped(self):
+        """Test retry delays grow per attempt up to the cap"""
+        base = settings.ingestion_retry_backoff_seconds
+        assert ingestion.retry_delay(1) == base
+        assert ingestion.retry_delay(2) == base * 2
+        assert ingestion.retry_delay(50) == ingestion.RETRY_BACKOFF_MAX_SECONDS
+
+
+class TestJobProgress:
+    """Progress written outside the job's transaction"""
+
+    def test_progress_updates_only_running_jobs(self, queue):
+        """Test stage and progress land on running jobs and leave finished ones alone"""
+        running = _job(queue, "running.pdf", status="running")
+        done = _job(queue, "done.pdf", status="succeeded")
+
+        JobProgress(running.id).stage("embedding", total=10)
+        JobProgress(running.id, min_interval=0).update(4, 10)
+        JobProgress(done.id).stage("embedding", total=10)
+
+        queue.expire_all()
+        assert (running.stage, running.progress_current, running.progress_total) == ("embedding", 4, 10)
+        assert running.heartbeat_at is not None
+        assert done.stage is None
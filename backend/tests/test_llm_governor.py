@@ -0,0 +1,192 @@
+"""Unit tests for the Anthropic call governor"""
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import anthropic
+import httpx
+import pytest
+
+from app.services.llm_governor import (
+    EXPECTED_OUTPUT_TOKENS, LLMGovernor, Priority, TokenBucket, estimate_tokens,
+)
+
+
+def _governor(**overrides) -> LLMGovernor:
+    params = dict(
+        requests_per_minute=6000, tokens_per_minute=10_000_000, max_concurrency=4,
+        max_retries=3, backoff_base=0.01, backoff_max=0.05,
+    )
+    params.update(overrides)
+    return LLMGovernor(**params)
+
+
+def _rate_limit_error(retry_after: str | None = None) -> anthropic.RateLimitError:
+    headers = {"retry-after": retry_after} if retry_after else {}
+    request = httpx.Request("POST", "https://api.anthropic.com/v1/messages")
+    response = httpx.Response(429, headers=headers, request=request)
+    return anthropic.RateLimitError("rate limited", response=response, body=None)
+
+
+class TestTokenBucket:
+    """Budget arithmetic"""
+
+    def test_wait_time_reflects_refill_rate(self):
+        """Test a drained bucket reports the time until enough tokens refill"""
+        bucket = TokenBucket(per_minute=60)
+        now = time.monotonic()
+        bucket.take(60)
+        assert bucket.wait_time(30, now) == pytest.approx(30, abs=0.5)
+
+    def test_estimate_counts_images_and_max_tokens(self):
+        """Test image blocks use a fixed budget instead of their base64 length"""
+        messages = [{"role": "user", "content": [
+            {"type": "image", "source": {"data": "x" * 100_000}},
+            {"type": "text", "text": "あ" * 100},
+        ]}]
+        assert estimate_tokens(messages, max_tokens=1000) == 1600 + 50 + 1000
+
+    def test_estimate_reserves_expected_output_not_max_tokens(self):
+        """Test a large max_tokens only reserves the expected output size"""
+        messages = [{"role": "user", "content": "あ" * 100}]
+        assert estimate_tokens(messages, max_tokens=4096) == 50 + EXPECTED_OUTPUT_TOKENS
+
+    def test_zero_budget_is_unlimited(self):
+        """Test a zero per-minute budget never makes callers wait"""
+        bucket = TokenBucket(per_minute=0)
+        now = time.monotonic()
+        for _ in range(1000):
+            bucket.take(100_000)
+        assert bucket.wait_time(100_000, now) == 0.0
+
+    def test_unlimited_bucket_still_honors_rate_limit_block(self):
+        """Test a 429 block applies even without a configured budget"""
+        bucket = TokenBucket(per_minute=0)
+        now = time.monotonic()
+        bucket.block(now + 5)
+        assert bucket.wait_time(1, now) == pytest.approx(5)
+
+
+class TestLLMGovernor:
+    """Priority ordering and retries"""
+
+    def test_interactive_calls_jump_the_queue(self):
+        """Test queued chat calls are granted before queued ingestion calls"""
+        governor = _governor(max_concurrency=1)
+        order: list[str] = []
+        gate = threading.Event()
+
+        holder = threading.Thread(target=lambda: governor.call(
+            gate.wait, model="m", priority=Priority.ADMIN, estimate=1,
+        ))
+        holder.start()
+        time.sleep(0.05)
+
+        threads = [
+            threading.Thread(target=lambda name=name, p=p: governor.call(
+                lambda: order.append(name), model="m", priority=p, estimate=1,
+            ))
+            for name, p in [("ingestion", Priority.INGESTION), ("chat", Priority.INTERACTIVE)]
+        ]
+        for t in threads:
+            t.start()
+            time.sleep(0.05)
+        gate.set()
+        for t in [holder, *threads]:
+            t.join(timeout=2)
+
+        assert order == ["chat", "ingestion"]
+        assert governor.stats()["classes"]["interactive"]["requests"] == 1
+
+    def test_interactive_slots_are_reserved_from_ingestion(self):
+        """Test ingestion cannot take every slot, so a chat call runs while ingestion saturates its share"""
+        governor = _governor(max_concurrency=4, interactive_reserved=1)
+        gate = threading.Event()
+        ingestion = [
+            threading.Thread(target=lambda: governor.call(
+                gate.wait, model="m", priority=Priority.INGESTION, estimate=1,
+            ))
+            for _ in range(5)
+        ]
+        for t in ingestion:
+            t.start()
+        deadline = time.monotonic() + 2
+        while governor.stats()["queued"] < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert governor.stats()["in_flight_background"] == 3
+
+        chat_done = threading.Event()
+        chat = threading.Thread(target=lambda: governor.call(
+            chat_done.set, model="m", priority=Priority.INTERACTIVE, estimate=1,
+        ))
+        chat.start()
+        assert chat_done.wait(timeout=2)
+
+        gate.set()
+        for t in [chat, *ingestion]:
+            t.join(timeout=2)
+        assert governor.stats()["in_flight"] == 0
+
+    def test_rate_limit_is_retried_after_retry_after(self):
+        """Test a 429 waits for retry-after and then succeeds"""
+        governor = _governor()
+        attempts = []
+
+        def flaky():
+            attempts.append(time.monotonic())
+            if len(attempts) == 1:
+                raise _rate_limit_error(retry_after="0.2")
+            return SimpleNamespace(usage=SimpleNamespace(input_tokens=10, output_tokens=5))
+
+        governor.call(flaky, model="m", priority=Priority.INGESTION, estimate=100)
+
+        assert len(attempts) == 2 and attempts[1] - attempts[0] >= 0.2
+        stats = governor.stats()["classes"]["ingestion"]
+        assert (stats["retries"], stats["rate_limited"]) == (1, 1)
+
+    def test_non_retryable_errors_propagate(self):
+        """Test client errors fail immediately and free the slot"""
+        governor = _governor()
+        request = httpx.Request("POST", "https://api.anthropic.com/v1/messages")
+        error = anthropic.BadRequestError("bad", response=httpx.Response(400, request=request), body=None)
+
+        async def fail():
+            raise error
+
+        with pytest.raises(anthropic.BadRequestError):
+            asyncio.run(governor.acall(fail, model="m", priority=Priority.ADMIN, estimate=1))
+        assert governor.stats()["in_flight"] == 0
+
+    def test_cancel_while_opening_stream_releases_slot(self):
+        """Test a chat cancelled during the stream handshake gives its slot back"""
+        governor = _governor(max_concurrency=2)
+
+        class SlowOpen:
+            async def __aenter__(self):
+                await asyncio.sleep(10)
+
+            async def __aexit__(self, *exc):
+                return False
+
+        async def open_and_read():
+            async with governor.astream(SlowOpen, model="m", priority=Priority.INTERACTIVE, estimate=1):
+                pass
+
+        async def scenario():
+            tasks = [asyncio.create_task(open_and_read()) for _ in range(2)]
+            while governor.stats()["in_flight"] < 2:
+                await asyncio.sleep(0.01)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            assert governor.stats()["in_flight"] == 0
+
+            async def ok():
+                return "ok"
+
+            return await asyncio.wait_for(
+                governor.acall(ok, model="m", priority=Priority.INTERACTIVE, estimate=1), timeout=1,
+            )
+
+        assert asyncio.run(scenario()) == "ok"
@@ -0,0 +1,100 @@
+"""Unit tests for the bounded bcrypt executor"""
+import asyncio
+import threading
+
+import pytest
+
+from app.services.auth import get_password_hash, verify_password
+from app.services.password_hasher import PasswordHasher, PasswordHasherBusy
+
+
+class TestPasswordHasher:
+    """Hashing off the event loop with a bounded queue"""
+
+    def test_hash_and_verify_roundtrip(self):
+        """Test bcrypt results computed in the pool match the synchronous helpers"""
+        hasher = PasswordHasher(workers=2, max_queue=4)
+
+        async def run():
+            hashed = await hasher.run(get_password_hash, "secret-pass")
+            return hashed, await hasher.run(verify_password, "secret-pass", hashed), \
+                await hasher.run(verify_password, "wrong", hashed)
+
+        try:
+            hashed, ok, bad = asyncio.run(run())
+        finally:
+            hasher.shutdown()
+        assert ok and not bad
+        assert verify_password("secret-pass", hashed)
+        stats = hasher.stats()
+        assert stats["completed"] == 3
+        assert stats["in_flight"] == 0 and stats["queued"] == 0
+
+    def test_event_loop_keeps_running_while_hashing(self):
+        """Test other coroutines progress while a hash operation blocks its worker"""
+        hasher = PasswordHasher(workers=1, max_queue=0)
+        release = threading.Event()
+        ticks = []
+
+        async def ticker():
+            for _ in range(5):
+                ticks.append(1)
+                await asyncio.sleep(0.01)
+            release.set()
+
+        async def run():
+            hashing = asyncio.ensure_future(hasher.run(release.wait, 5))
+            await ticker()
+            return await hashing
+
+        try:
+            assert asyncio.run(run()) is True
+        finally:
+            hasher.shutdown()
+        assert len(ticks) == 5
+
+    def test_rejects_when_queue_is_full(self):
+        """Test submissions beyond workers + max_queue fail fast and are counted"""
+        hasher = PasswordHasher(workers=1, max_queue=1)
+        release = threading.Event()
+
+        async def run():
+            first = asyncio.ensure_future(hasher.run(release.wait, 5))
+            second = asyncio.ensure_future(hasher.run(release.wait, 5))
+            await asyncio.sleep(0.05)
+            stats = hasher.stats()
+            with pytest.raises(PasswordHasherBusy):
+                await hasher.run(release.wait, 5)
+            release.set()
+            await asyncio.gather(first, second)
+            return stats
+
+        try:
+            busy = asyncio.run(run())
+        finally:
+            hasher.shutdown()
+        assert busy["in_flight"] == 1 and busy["queued"] == 1
+        stats = hasher.stats()
+        assert stats["rejected"] == 1 and stats["completed"] == 2
+        assert stats["queued"] == 0
+
+    def test_cancelled_waiter_releases_queue_slot(self):
+        """Test a caller cancelled before its turn does not leak a queue slot"""
+        hasher = PasswordHasher(workers=1, max_queue=1)
+        release = threading.Event()
+
+        async def run():
+            running = asyncio.ensure_future(hasher.run(release.wait, 5))
+            waiting = asyncio.ensure_future(hasher.run(release.wait, 5))
+            await asyncio.sleep(0.05)
+            waiting.cancel()
+            await asyncio.sleep(0.01)
+            queued = hasher.stats()["queued"]
+            release.set()
+            await running
+            return queued
+
+        try:
+            assert asyncio.run(run()) == 0
+        finally:
+            hasher.shutdown()
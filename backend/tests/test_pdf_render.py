@@ -0,0 +1,70 @@
+"""Unit tests for parallel PDF page rendering"""
+import os
+
+import fitz
+import pytest
+
+from app.services.pdf_render import (
+    MAX_IMAGE_BYTES,
+    TEXT_RICH_CHAR_THRESHOLD,
+    iter_rendered_pages,
+    render_page_to_image,
+    shutdown_render_pool,
+)
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    doc = fitz.open()
+    for i in range(7):
+        page = doc.new_page()
+        if i % 2 == 0:
+            page.insert_textbox(fitz.Rect(36, 36, 560, 800), "x " * TEXT_RICH_CHAR_THRESHOLD, fontsize=8)
+        else:
+            page.insert_text((72, 72), f"figure {i}")
+    path = tmp_path / "manual.pdf"
+    doc.save(path)
+    doc.close()
+    return str(path)
+
+
+class TestIterRenderedPages:
+    """Batches cover every page once, in-process or in the pool"""
+
+    @pytest.mark.parametrize("workers", [0, 2])
+    def test_pages_are_classified_and_rendered(self, pdf_path, workers):
+        """Test text-rich pages skip rendering and visual pages carry an image"""
+        try:
+            pages = [p for batch in iter_rendered_pages(pdf_path, 7, workers, batch_size=3) for p in batch]
+        finally:
+            shutdown_render_pool()
+
+        assert sorted(p.index for p in pages) == list(range(7))
+        for page in pages:
+            assert page.kind == ("text" if page.index % 2 == 0 else "vision")
+            assert (page.image is not None) == (page.kind == "vision")
+
+
+class TestRenderPageToImage:
+    """Render resolution is predicted instead of retried"""
+
+    def test_sparse_page_renders_png_at_full_resolution(self):
+        """Test a light page is rendered once at 300 DPI after the probe"""
+        doc = fitz.open()
+        doc.new_page().insert_text((72, 72), "figure")
+        image = render_page_to_image(doc[0])
+        doc.close()
+
+        assert (image.media_type, image.dpi, image.encodes) == ("image/png", 300, 2)
+
+    def test_noisy_page_goes_straight_to_jpeg(self):
+        """Test an incompressible page skips the PNG retries"""
+        noise = fitz.Pixmap(fitz.csRGB, 1200, 1700, os.urandom(1200 * 1700 * 3), False)
+        doc = fitz.open()
+        doc.new_page().insert_image(fitz.Rect(0, 0, 595, 842), pixmap=noise)
+        image = render_page_to_image(doc[0])
+        doc.close()
+
+        assert image.media_type == "image/jpeg"
+        assert image.encodes <= 4
+        assert len(image.data) <= MAX_IMAGE_BYTES
@@ -0,0 +1,156 @@
+"""Unit tests for the SFTP poll scheduler"""
+import json
+import threading
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.config import settings
+from app.core.database import Base
+from app.models.document import SystemSettings
+from app.models.organization import Organization
+from app.services.poll_scheduler import PollScheduler, load_poll_targets
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine, tables=[Organization.__table__, SystemSettings.__table__])
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    for org_id, minutes in (("org-a", None), ("org-b", 5)):
+        db.add(SystemSettings(
+            organization_id=org_id, box_poll_enabled=True, box_client_id="faq",
+            box_enterprise_id="sftp.example.jp", box_poll_interval_minutes=minutes,
+        ))
+    db.add(SystemSettings(organization_id="org-off", box_poll_enabled=False, box_client_id="faq",
+                          box_enterprise_id="sftp.example.jp"))
+    db.commit()
+    db.close()
+    return factory
+
+
+def _settings(factory, org_id):
+    db = factory()
+    try:
+        return db.query(SystemSettings).filter(SystemSettings.organization_id == org_id).one()
+    finally:
+        db.close()
+
+
+class TestSchedule:
+    """Target loading, spreading and bounded dispatch"""
+
+    def test_targets_use_per_org_interval(self, session_factory):
+        """Test enabled orgs are loaded with their own interval or the server default"""
+        db = session_factory()
+        assert load_poll_targets(db) == {"org-a": settings.sftp_poll_interval_seconds, "org-b": 300}
+        db.close()
+
+    def test_first_runs_are_spread_across_the_interval(self):
+        """Test new orgs get a first run somewhere inside one interval, not all at once"""
+        scheduler = PollScheduler(max_workers=2, jitter=0.1)
+        scheduler.set_targets({f"org-{i}": 600.0 for i in range(50)}, now=1000.0)
+
+        first_runs = list(scheduler._next_run.values())
+        assert all(1000.0 <= at <= 1600.0 for at in first_runs)
+        assert len({round(at) for at in first_runs}) > 10
+
+    def test_dispatch_is_bounded_and_skips_running_orgs(self):
+        """Test at most max_workers orgs are taken and a running org is not taken again"""
+        scheduler = PollScheduler(max_workers=2, jitter=0.1)
+        scheduler.set_targets({"a": 60.0, "b": 60.0, "c": 60.0}, now=0.0)
+
+        taken = scheduler.take_due(now=100.0)
+        assert len(taken) == 2
+        assert scheduler.take_due(now=100.0) == []
+
+        scheduler._running.discard(taken[0][0])
+        (org_id, interval), = scheduler.take_due(now=100.0)
+        assert org_id not in {t[0] for t in taken} and interval == 60.0
+        assert 100.0 + 54.0 <= scheduler._next_run[org_id] <= 100.0 + 66.0
+
+    def test_removed_orgs_are_unscheduled(self):
+        """Test orgs that disable polling drop out on the next refresh"""
+        scheduler = PollScheduler(max_workers=2, jitter=0.1)
+        scheduler.set_targets({"a": 60.0, "b": 60.0}, now=0.0)
+        scheduler.set_targets({"a": 60.0}, now=10.0)
+        assert scheduler.stats()["scheduled"] == 1 and set(scheduler._next_run) == {"a"}
+
+
+class TestRunOnce:
+    """Per-run recording and cross-process claims"""
+
+    def test_success_records_duration_and_result(self, session_factory):
+        """Test a successful poll stores its outcome and counts on the org"""
+        scheduler = PollScheduler(max_workers=1, jitter=0.1, session_factory=session_factory,
+                                  poll=lambda db, org_id: {"checked": 3, "outdated": 1})
+
+        assert scheduler.run_once("org-a") == {"checked": 3, "outdated": 1, "queued": 0}
+        row = _settings(session_factory, "org-a")
+        assert row.box_last_poll_status == "ok" and row.box_last_polled_at is not None
+        assert json.loads(row.box_last_poll_detail) == {"checked": 3, "outdated": 1, "queued": 0}
+        assert row.box_last_poll_seconds >= 0
+
+    def test_failure_records_error(self, session_factory):
+        """Test a failing poll is recorded and re-raised"""
+        def poll(db, org_id):
+            raise ConnectionError("sftp.example.jp: timed out")
+
+        scheduler = PollScheduler(max_workers=1, jitter=0.1, session_factory=session_factory, poll=poll)
+        with pytest.raises(ConnectionError):
+            scheduler.run_once("org-a")
+
+        row = _settings(session_factory, "org-a")
+        assert row.box_last_poll_status == "error" and "timed out" in row.box_last_poll_detail
+        assert scheduler.stats()["failures"] == 1
+
+    def test_reported_errors_are_not_recorded_as_ok(self, session_factory):
+        """Test listing failures reported in the result mark the run error or partial"""
+        results = {
+            "org-a": {"checked": 0, "directories": 2, "errors": 5},
+            "org-b": {"checked": 4, "directories": 2, "errors": 1},
+        }
+        scheduler = PollScheduler(max_workers=1, jitter=0.1, session_factory=session_factory,
+                                  poll=lambda db, org_id: dict(results[org_id]))
+
+        scheduler.run_once("org-a")
+        scheduler.run_once("org-b")
+
+        assert _settings(session_factory, "org-a").box_last_poll_status == "error"
+        assert _settings(session_factory, "org-b").box_last_poll_status == "partial"
+        stats = scheduler.stats()
+        assert (stats["runs"], stats["failures"], stats["partial"]) == (2, 1, 1)
+
+    def test_recent_run_by_another_process_is_skipped(self, session_factory):
+        """Test a scheduled run is skipped when the org was polled within the interval"""
+        calls = []
+        scheduler = PollScheduler(max_workers=1, jitter=0.1, session_factory=session_factory,
+                                  poll=lambda db, org_id: calls.append(org_id) or {})
+
+        scheduler.run_once("org-a", 1800)
+        assert scheduler.run_once("org-a", 1800) is None
+        scheduler.run_once("org-a")  # 手動実行は常に実行
+        assert calls == ["org-a", "org-a"] and scheduler.stats()["skipped"] == 1
+
+    def test_slow_org_does_not_block_others(self, session_factory):
+        """Test other orgs complete while one poll is stuck"""
+        release = threading.Event()
+        done = []
+
+        def poll(db, org_id):
+            if org_id == "org-a":
+                release.wait(timeout=5)
+            done.append(org_id)
+            return {}
+
+        scheduler = PollScheduler(max_workers=2, jitter=0.1, session_factory=session_factory, poll=poll)
+        slow = threading.Thread(target=scheduler._run_scheduled, args=("org-a", 60.0))
+        slow.start()
+        scheduler._run_scheduled("org-b", 300.0)
+        assert done == ["org-b"]
+        release.set()
+        slow.join(timeout=5)
+        assert done == ["org-b", "org-a"]
@@ -0,0 +1,107 @@
+"""Unit tests for the authenticated-user principal cache"""
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base
+from app.models.document import ChatHistory, ChatReference, Department, User
+from app.models.organization import Organization
+from app.services import principal_cache as module
+from app.services.principal_cache import PrincipalCache, load_principal
+
+
+@pytest.fixture
+def db(monkeypatch):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[
+        Organization.__table__, Department.__table__, User.__table__, ChatHistory.__table__, ChatReference.__table__,
+    ])
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        Organization(id="org", name="ワールドツール", slug="wt", plan="trial"),
+        Department(id="hr", organization_id="org", name="人事部"),
+        User(id="u1", organization_id="org", email="a@example.jp", name="佐藤", department_id="hr", role="user"),
+        User(id="u2", organization_id="org", email="b@example.jp", name="鈴木", role="admin"),
+    ])
+    session.commit()
+    cache = PrincipalCache(ttl_seconds=60, max_entries=10)
+    monkeypatch.setattr(module, "principal_cache", cache)
+    yield session
+    session.close()
+
+
+class TestPrincipal:
+    """Loading and caching user snapshots"""
+
+    def test_load_joins_department_and_organization(self, db):
+        """Test one query returns the user with department name and org plan"""
+        p = load_principal(db, "u1")
+        assert (p.role, p.organization_id, p.department_id, p.is_active) == ("user", "org", "hr", True)
+        assert (p.department_name, p.organization_name, p.plan) == ("人事部", "ワールドツール", "trial")
+        assert load_principal(db, "missing") is None
+
+    def test_resolve_hits_cache_until_ttl(self, db, monkeypatch):
+        """Test the second lookup is served from memory and expires after the TTL"""
+        cache = module.principal_cache
+        clock = [1000.0]
+        monkeypatch.setattr(module.time, "monotonic", lambda: clock[0])
+
+        assert cache.resolve(db, "u1").name == "佐藤"
+        db.execute(User.__table__.update().where(User.__table__.c.id == "u1").values(name="佐藤（旧）"))
+        assert cache.resolve(db, "u1").name == "佐藤"  # SQL直接更新はTTLまで見えない
+        clock[0] += 61
+        assert cache.resolve(db, "u1").name == "佐藤（旧）"
+        assert cache.stats()["hits"] == 1
+
+    def test_lru_bound(self, db):
+        """Test the cache keeps at most max_entries users"""
+        cache = PrincipalCache(ttl_seconds=60, max_entries=1)
+        cache.resolve(db, "u1")
+        cache.resolve(db, "u2")
+        assert cache.stats()["size"] == 1 and cache.get("u1") is None
+
+
+class TestInvalidation:
+    """Entries dropped when users, departments or orgs change"""
+
+    def test_user_update_and_delete_invalidate_on_commit(self, db):
+        """Test ORM changes to a user drop its entry only once committed"""
+        cache = module.principal_cache
+        cache.resolve(db, "u1")
+
+        user = db.get(User, "u1")
+        user.role = "admin"
+        db.flush()
+        assert cache.get("u1") is not None  # コミット前は破棄しない
+        db.commit()
+        assert cache.get("u1") is None
+        assert cache.resolve(db, "u1").role == "admin"
+
+        db.delete(db.get(User, "u1"))
+        db.commit()
+        assert cache.get("u1") is None and cache.resolve(db, "u1") is None
+
+    def test_rollback_keeps_entries(self, db):
+        """Test rolled-back changes leave the cache untouched"""
+        cache = module.principal_cache
+        cache.resolve(db, "u1")
+        db.get(User, "u1").name = "変更"
+        db.flush()
+        db.rollback()
+        db.commit()
+        assert cache.get("u1").name == "佐藤"
+
+    def test_department_and_org_changes_invalidate_members(self, db):
+        """Test renaming a department or updating the org drops affected users"""
+        cache = module.principal_cache
+        cache.resolve(db, "u1")
+        cache.resolve(db, "u2")
+
+        db.get(Department, "hr").name = "人事総務部"
+        db.commit()
+        assert cache.get("u1") is None and cache.get("u2") is not None
+        assert cache.resolve(db, "u1").department_name == "人事総務部"
+
+        db.get(Organization, "org").plan = "standard"
+        db.commit()
+        assert cache.get("u1") is None and cache.get("u2") is None
@@ -0,0 +1,63 @@
+"""Unit tests for retrieval helpers"""
+import pytest
+
+from app.services.rag import build_lexical_sql, extract_lexical_terms
+from app.services.vector_index import tenant_index_ddl, tenant_index_name
+
+
+class TestLexicalTerms:
+    """Lexical term extraction for hybrid search"""
+
+    def test_article_number_is_kept(self):
+        """Test article numbers survive extraction, including spaced/full-width forms"""
+        assert "第20条" in extract_lexical_terms("第２０条の内容")
+        assert "第20条" in extract_lexical_terms("就業規則 第 20 条")
+
+    def test_splits_on_hiragana(self):
+        """Test kanji/katakana runs separated by particles become terms"""
+        terms = extract_lexical_terms("有給休暇の申請方法を教えてください")
+        assert "有給休暇" in terms
+        assert "申請方法" in terms
+        assert all(len(t) >= 2 for t in terms)
+
+    def test_product_code(self):
+        """Test alphanumeric codes are kept as a single term"""
+        assert "WT-2040A" in extract_lexical_terms("WT-2040Aの取扱説明書")
+
+    def test_deduplicated_and_capped(self):
+        """Test terms are unique and capped"""
+        terms = extract_lexical_terms(" ".join(["経費精算"] * 3 + [f"用語{i}" for i in range(20)]))
+        assert terms.count("経費精算") == 1
+        assert len(terms) <= 8
+
+    def test_short_terms_only_score(self):
+        """Test 2-character terms stay out of the match predicate so the trigram index applies"""
+        match_sql, score_sql, params = build_lexical_sql(["有給休暇", "申請"])
+        assert match_sql == "dc.content ILIKE :term_0"
+        assert ":term_1" in score_sql
+        assert params == {"term_0": "%有給休暇%", "term_1": "%申請%"}
+
+    def test_no_indexable_terms(self):
+        """Test queries with only short terms skip the lexical ranking"""
+        assert build_lexical_sql(["申請", "方法"]) is None
+
+
+class TestTenantVectorIndex:
+    """Per-organization partial HNSW index DDL"""
+
+    def test_index_name_fits_identifier_limit(self):
+        """Test index names are derived from the org UUID and fit in 63 chars"""
+        name = tenant_index_name("3f2b8c1e-9a4d-4e6f-8b7a-1c2d3e4f5a6b")
+        assert name == "ix_chunks_hnsw_3f2b8c1e9a4d4e6f8b7a1c2d3e4f5a6b"
+        assert len(name) <= 63
+
+    def test_ddl_is_partial_on_organization(self):
+        """Test DDL restricts the index to one organization"""
+        ddl = tenant_index_ddl("3f2b8c1e-9a4d-4e6f-8b7a-1c2d3e4f5a6b", concurrently=True)
+        assert ddl.startswith("CREATE INDEX CONCURRENTLY IF NOT EXISTS")
+        assert "WHERE organization_id = '3f2b8c1e-9a4d-4e6f-8b7a-1c2d3e4f5a6b'" in ddl
+
+    def test_rejects_non_uuid(self):
+        """Test non-UUID organization ids are rejected before reaching DDL"""
+        with pytest.raises(ValueError):
+            tenant_index_ddl("x'; DROP TABLE documents; --")
@@ -0,0 +1,141 @@
+"""Unit tests for directory-listing based SFTP change detection"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base
+from app.models.document import Document, SystemSettings
+from app.models.organization import Organization
+from app.services import sftp_poller
+from app.services.sftp_service import RemoteFile
+
+MTIME = datetime(2026, 4, 1, 9, 0, tzinfo=timezone.utc)
+
+
+class FakeSFTPService:
+    is_configured = True
+
+    def __init__(self, tree: dict[str, dict[str, tuple[int, datetime]]]):
+        self.tree = tree
+        self.listed: list[list[str]] = []
+
+    def list_directories(self, folder_paths):
+        folder_paths = list(folder_paths)
+        self.listed.append(folder_paths)
+        listings = {}
+        for folder in folder_paths:
+            if folder not in self.tree:
+                listings[folder] = FileNotFoundError(folder)
+                continue
+            listings[folder] = {
+                name: RemoteFile(path=f"{folder}/{name}", size=size, modified_at=mtime)
+                for name, (size, mtime) in self.tree[folder].items()
+            }
+        return listings
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[
+        Organization.__table__, Document.__table__, SystemSettings.__table__,
+    ])
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def _track(db, path, size=100, mtime=MTIME, status="synced"):
+    doc = Document(
+        filename=path.rsplit("/", 1)[-1], file_type="pdf", organization_id="org",
+        box_file_id=path, box_sync_status=status, source_mtime=mtime, source_size=size,
+        box_synced_at=MTIME + timedelta(minutes=5),
+    )
+    db.add(doc)
+    db.commit()
+    return doc
+
+
+def _poll(db, monkeypatch, tree, watched=""):
+    db.add(SystemSettings(organization_id="org", box_watched_folder_id=watched))
+    db.commit()
+    svc = FakeSFTPService(tree)
+    monkeypatch.setattr(sftp_poller, "get_sftp_service_for_org", lambda db, org_id: svc)
+    return svc, sftp_poller.poll_org_changes(db, "org")
+
+
+class TestPollOrgChanges:
+    """Change, deletion and new-file detection"""
+
+    def test_one_listing_per_directory(self, db, monkeypatch):
+        """Test tracked files are grouped so each directory is listed once"""
+        for name in ("a.pdf", "b.pdf", "c.pdf"):
+            _track(db, f"/docs/{name}")
+        _track(db, "/docs/hr/d.pdf")
+        tree = {
+            "/docs": {n: (100, MTIME) for n in ("a.pdf", "b.pdf", "c.pdf")},
+            "/docs/hr": {"d.pdf": (100, MTIME)},
+        }
+
+        svc, result = _poll(db, monkeypatch, tree)
+
+        assert svc.listed == [["/docs", "/docs/hr"]]
+        assert result["checked"] == 4 and result["directories"] == 2
+        assert result["outdated"] == 0 and result["errors"] == 0
+
+    def test_mtime_or_size_change_marks_outdated(self, db, monkeypatch):
+        """Test either a newer mtime or a different size flags the document"""
+        touched = _track(db, "/docs/a.pdf")
+        resized = _track(db, "/docs/b.pdf")
+        same = _track(db, "/docs/c.pdf")
+        tree = {"/docs": {
+            "a.pdf": (100, MTIME + timedelta(hours=1)),
+            "b.pdf": (120, MTIME),
+            "c.pdf": (100, MTIME),
+        }}
+
+        _, result = _poll(db, monkeypatch, tree)
+
+        assert result["outdated"] == 2
+        assert (touched.box_sync_status, resized.box_sync_status, same.box_sync_status) == (
+            "outdated", "outdated", "synced",
+        )
+
+    def test_missing_files_and_directories_are_marked_deleted(self, db, monkeypatch):
+        """Test files absent from their listing or in a removed directory become deleted"""
+        gone = _track(db, "/docs/a.pdf")
+        in_removed_dir = _track(db, "/old/b.pdf")
+
+        _, result = _poll(db, monkeypatch, {"/docs": {}})
+
+        assert result["deleted"] == 2 and result["errors"] == 0
+        assert gone.box_sync_status == in_removed_dir.box_sync_status == "deleted"
+
+    def test_reappearing_file_is_outdated(self, db, monkeypatch):
+        """Test a previously deleted file that comes back needs re-sync"""
+        doc = _track(db, "/docs/a.pdf", status="deleted")
+
+        _poll(db, monkeypatch, {"/docs": {"a.pdf": (100, MTIME)}})
+
+        assert doc.box_sync_status == "outdated"
+
+    def test_new_files_in_watched_folder(self, db, monkeypatch):
+        """Test untracked files in the watched folder are counted as new"""
+        _track(db, "/docs/a.pdf")
+        _track(db, "/docs/b.pdf", status="error")
+        tree = {"/docs": {n: (100, MTIME) for n in ("a.pdf", "b.pdf", "c.pdf", "d.xlsx")}}
+
+        svc, result = _poll(db, monkeypatch, tree, watched="docs/")
+
+        assert svc.listed == [["/docs"]]
+        assert result["new"] == 2 and result["checked"] == 1
+
+    def test_legacy_documents_compare_against_synced_at(self, db, monkeypatch):
+        """Test documents synced before metadata was stored fall back to box_synced_at"""
+        doc = _track(db, "/docs/a.pdf", size=None, mtime=None)
+
+        _, result = _poll(db, monkeypatch, {"/docs": {"a.pdf": (100, MTIME + timedelta(hours=1))}})
+
+        assert result["outdated"] == 1 and doc.box_sync_status == "outdated"
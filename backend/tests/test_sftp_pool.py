@@ -0,0 +1,152 @@
+"""Unit tests for the SFTP connection pool"""
+import threading
+import time
+
+import pytest
+
+from app.services.sftp_pool import SFTPConnectionPool, SFTPPoolTimeout
+from app.services.sftp_service import SFTPCredentials
+
+
+class FakeTransport:
+    def __init__(self):
+        self.active = True
+
+    def is_active(self):
+        return self.active
+
+    def close(self):
+        self.active = False
+
+
+class FakeChannel:
+    closed = False
+
+    def __init__(self, transport):
+        self._transport = transport
+
+    def get_transport(self):
+        return self._transport
+
+
+class FakeSFTP:
+    def __init__(self):
+        self.transport = FakeTransport()
+        self._channel = FakeChannel(self.transport)
+
+    def get_channel(self):
+        return self._channel
+
+    def normalize(self, path):
+        if not self.transport.active:
+            raise EOFError()
+        return "/"
+
+    def close(self):
+        self.transport.close()
+
+
+@pytest.fixture
+def opened():
+    return []
+
+
+@pytest.fixture
+def pool(opened):
+    def connect(creds):
+        sftp = FakeSFTP()
+        opened.append(sftp)
+        return sftp
+
+    pool = SFTPConnectionPool(max_per_key=2, idle_seconds=60, max_lifetime_seconds=3600, connect=connect)
+    yield pool
+    pool.close_all()
+
+
+CREDS = SFTPCredentials(hostname="sftp.example.jp", username="faq", password="secret")
+
+
+class TestSFTPConnectionPool:
+    """Connection reuse, limits and eviction"""
+
+    def test_sequential_operations_reuse_one_connection(self, pool, opened):
+        """Test back-to-back sessions share a single SSH connection"""
+        for _ in range(5):
+            with pool.session(CREDS) as sftp:
+                sftp.normalize(".")
+        assert len(opened) == 1
+        assert pool.stats()["reused"] == 4
+
+    def test_different_credentials_get_separate_connections(self, pool, opened):
+        """Test pools are keyed by credentials, not just host"""
+        other = SFTPCredentials(hostname="sftp.example.jp", username="faq", password="rotated")
+        with pool.session(CREDS):
+            pass
+        with pool.session(other):
+            pass
+        assert len(opened) == 2
+
+    def test_broken_connection_is_replaced(self, pool, opened):
+        """Test a connection error discards the connection instead of returning it"""
+        with pytest.raises(EOFError):
+            with pool.session(CREDS) as sftp:
+                sftp.transport.active = False
+                sftp.normalize(".")
+        with pool.session(CREDS):
+            pass
+        assert len(opened) == 2
+        assert pool.stats()["discarded"] == 1
+
+    def test_file_errors_keep_the_connection(self, pool, opened):
+        """Test SFTP-level errors such as a missing file do not drop the connection"""
+        with pytest.raises(FileNotFoundError):
+            with pool.session(CREDS):
+                raise FileNotFoundError("/docs/missing.pdf")
+        with pool.session(CREDS):
+            pass
+        assert len(opened) == 1
+
+    def test_per_host_limit_blocks_until_checkin(self, pool, opened):
+        """Test a third concurrent session waits for one of the two connections"""
+        ctx = [pool.session(CREDS), pool.session(CREDS)]
+        for c in ctx:
+            c.__enter__()
+        acquired = threading.Event()
+
+        def third():
+            with pool.session(CREDS):
+                acquired.set()
+
+        t = threading.Thread(target=third)
+        t.start()
+        time.sleep(0.1)
+        assert not acquired.is_set()
+
+        ctx[0].__exit__(None, None, None)
+        t.join(timeout=1)
+        ctx[1].__exit__(None, None, None)
+        assert acquired.is_set() and len(opened) == 2
+
+    def test_checkout_times_out_when_all_connections_are_busy(self, pool, opened):
+        """Test waiting for a busy host gives up after the checkout timeout"""
+        pool.checkout_timeout = 0.1
+        ctx = [pool.session(CREDS), pool.session(CREDS)]
+        for c in ctx:
+            c.__enter__()
+        start = time.monotonic()
+        with pytest.raises(SFTPPoolTimeout):
+            with pool.session(CREDS):
+                pass
+        assert time.monotonic() - start >= 0.1
+        for c in ctx:
+            c.__exit__(None, None, None)
+        assert pool.stats()["in_use"] == 0
+
+    def test_idle_connections_are_evicted(self, pool, opened):
+        """Test connections idle past the timeout are closed"""
+        pool.idle_seconds = 0
+        with pool.session(CREDS):
+            pass
+        time.sleep(0.01)
+        assert pool.evict_idle() == 1
+        assert not opened[0].transport.active
@@ -148,8 +148,10 @@ export function ChatPage() {
               if (event.step.status === 'running') {
                 steps.push(event.step);
               } else {
-                const idx = steps.findLastIndex(
-                  (s: AgentStep) => s.tool === event.step.tool && s.status === 'running'
+                // 並列実行のツールは完了順に届くため、idがあればidで対応付ける
+                const idx = steps.findLastIndex((s: AgentStep) =>
+                  s.status === 'running' &&
+                  (event.step.id ? s.id === event.step.id : s.tool === event.step.tool)
                 );
                 if (idx >= 0) {
                   steps[idx] = event.step;
@@ -39,54 +39,45 @@ import remarkGfm from 'remark-gfm';
 import { useQuery } from '@tanstack/react-query';
 import { MainLayout } from '@/layouts/MainLayout';
 import { WT_COLORS } from '@/theme';
-import { apiClient } from '@/services/api/client';
+import {
+  formatHistoryTotal,
+  getChatHistory,
+  getChatHistoryDetail,
+  type ChatHistoryItem,
+} from '@/services/api/stats';
 import { downloadDocument } from '@/services/api/documents';
 
-interface ChatReference {
-  id: string;
-  title: string;
-  section?: string;
-  excerpt?: string;
-}
-
-interface ChatHistoryItem {
-  id: string;
-  question: string;
-  answer: string;
-  full_answer: string;
-  is_no_answer: boolean;
-  feedback: 'good' | 'bad' | null;
-  references: ChatReference[];
-  created_at: string;
-}
-
-interface ChatHistoryResponse {
-  total: number;
-  items: ChatHistoryItem[];
-}
-
 export function HistoryPage() {
   const [page, setPage] = useState(0);
+  // cursors[n] は n ページ目を取得するカーソル（前ページの next_cursor）
+  const [cursors, setCursors] = useState<(string | null)[]>([null]);
   const [rowsPerPage, setRowsPerPage] = useState(10);
   const [searchQuery, setSearchQuery] = useState('');
   const [feedbackFilter, setFeedbackFilter] = useState<string>('all');
   const [selectedChat, setSelectedChat] = useState<ChatHistoryItem | null>(null);
   const [expandedRefs, setExpandedRefs] = useState<Set<string>>(new Set());
 
-  const { data, isLoading } = useQuery<ChatHistoryResponse>({
-    queryKey: ['chat-history', page, rowsPerPage, feedbackFilter],
-    queryFn: async () => {
-      const params = new URLSearchParams({
-        limit: rowsPerPage.toString(),
-        offset: (page * rowsPerPage).toString(),
-      });
-      if (feedbackFilter !== 'all') {
-        params.append('feedback', feedbackFilter);
-      }
-      return apiClient.get<ChatHistoryResponse>(`/api/stats/chat-history?${params}`);
-    },
+  const { data, isLoading } = useQuery({
+    queryKey: ['chat-history', rowsPerPage, feedbackFilter, cursors[page]],
+    queryFn: () =>
+      getChatHistory({
+        limit: rowsPerPage,
+        cursor: cursors[page],
+        feedback: feedbackFilter !== 'all' ? (feedbackFilter as 'good' | 'bad' | 'none') : undefined,
+      }),
+  });
+
+  const { data: detail, isLoading: detailLoading } = useQuery({
+    queryKey: ['chat-history-detail', selectedChat?.id],
+    queryFn: () => getChatHistoryDetail(selectedChat!.id),
+    enabled: !!selectedChat,
   });
 
+  const resetPaging = () => {
+    setCursors([null]);
+    setPage(0);
+  };
+
   const toggleRef = (key: string) => {
     setExpandedRefs((prev) => {
       const next = new Set(prev);
@@ -97,12 +88,17 @@ export function HistoryPage() {
   };
 
   const handleChangePage = (_: unknown, newPage: number) => {
+    if (newPage > page) {
+      if (!data?.next_cursor) return;
+      const nextCursor = data.next_cursor;
+      setCursors((prev) => [...prev.slice(0, newPage), nextCursor]);
+    }
     setPage(newPage);
   };
 
   const handleChangeRowsPerPage = (event: React.ChangeEvent<HTMLInputElement>) => {
     setRowsPerPage(parseInt(event.target.value, 10));
-    setPage(0);
+    resetPaging();
   };
 
   const handleOpenDetail = (item: ChatHistoryItem) => {
@@ -110,7 +106,8 @@ export function HistoryPage() {
     setExpandedRefs(new Set());
   };
 
-  const formatDate = (dateString: string) => {
+  const formatDate = (dateString: string | null) => {
+    if (!dateString) return '-';
     const date = new Date(dateString);
     return date.toLocaleString('ja-JP', {
       year: 'numeric',
@@ -176,7 +173,7 @@ export function HistoryPage() {
                 label="フィードバック"
                 onChange={(e) => {
                   setFeedbackFilter(e.target.value);
-                  setPage(0);
+                  resetPaging();
                 }}
               >
                 <MenuItem value="all">すべて</MenuItem>
@@ -283,15 +280,15 @@ export function HistoryPage() {
               </TableContainer>
               <TablePagination
                 component="div"
-                count={data?.total || 0}
+                count={data?.next_cursor ? -1 : page * rowsPerPage + (data?.items.length ?? 0)}
                 page={page}
                 onPageChange={handleChangePage}
                 rowsPerPage={rowsPerPage}
                 onRowsPerPageChange={handleChangeRowsPerPage}
                 rowsPerPageOptions={[10, 25, 50]}
                 labelRowsPerPage="表示件数:"
-                labelDisplayedRows={({ from, to, count }) =>
-                  `${from}-${to} / ${count}`
+                labelDisplayedRows={({ from, to }) =>
+                  `${from}-${to} / ${data ? formatHistoryTotal(data) : 0}`
                 }
               />
             </>
@@ -372,16 +369,22 @@ export function HistoryPage() {
                       },
                     }}
                   >
-                    <ReactMarkdown remarkPlugins={[remarkGfm]}>
-                      {selectedChat.full_answer}
-                    </ReactMarkdown>
+                    {detailLoading || !detail ? (
+                      <Box sx={{ display: 'flex', justifyContent: 'center', p: 2 }}>
+                        <CircularProgress size={24} />
+                      </Box>
+                    ) : (
+                      <ReactMarkdown remarkPlugins={[remarkGfm]}>
+                        {detail.answer}
+                      </ReactMarkdown>
+                    )}
                   </Box>
                 </Paper>
 
                 {/* 参照元 + メタ情報 */}
                 <Box sx={{ mt: 1.5 }}>
                   {/* 参照元 */}
-                  {selectedChat.references && selectedChat.references.length > 0 && (
+                  {detail && detail.references.length > 0 && (
                     <Box sx={{ mb: 1.5 }}>
                       <Typography
                         variant="caption"
@@ -392,7 +395,7 @@ export function HistoryPage() {
                         参照元:
                       </Typography>
                       <Box sx={{ display: 'flex', flexDirection: 'column', gap: 0.5 }}>
-                        {selectedChat.references.map((ref, refIdx) => {
+                        {detail.references.map((ref, refIdx) => {
                           const refKey = `hist-ref-${refIdx}`;
                           const isExpanded = expandedRefs.has(refKey);
                           const hasExcerpt = !!ref.excerpt;
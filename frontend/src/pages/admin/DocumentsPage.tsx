@@ -52,6 +52,7 @@ import { MainLayout } from '@/layouts/MainLayout';
 import {
   getDocuments,
   uploadDocument,
+  waitForIngestionJob,
   deleteDocument,
   downloadDocument,
   getDocumentDetail,
@@ -118,10 +119,13 @@ export function DocumentsPage() {
   });
 
   const uploadMutation = useMutation({
-    mutationFn: uploadDocument,
+    mutationFn: async (file: File) => {
+      const job = await uploadDocument(file);
+      return waitForIngestionJob(job.id);
+    },
     onSuccess: () => {
       queryClient.invalidateQueries({ queryKey: ['documents'] });
-      setSnackbar({ open: true, message: 'ドキュメントをアップロードしました', severity: 'success' });
+      setSnackbar({ open: true, message: 'ドキュメントを取り込みました', severity: 'success' });
     },
     onError: (error: Error) => {
       setSnackbar({ open: true, message: error.message || 'アップロードに失敗しました', severity: 'error' });
@@ -303,8 +307,9 @@ export function DocumentsPage() {
 
     try {
       const result = await syncBoxFiles(selectedIds, boxSyncPublic, boxSyncDeptIds);
-      const successCount = result.results.filter((r) => r.status === 'synced').length;
-      const errorCount = result.results.filter((r) => r.status === 'error').length;
+      const outcomes = await Promise.allSettled(result.results.map((r) => waitForIngestionJob(r.job_id)));
+      const successCount = outcomes.filter((o) => o.status === 'fulfilled').length;
+      const errorCount = outcomes.length - successCount;
       queryClient.invalidateQueries({ queryKey: ['documents'] });
       setSnackbar({
         open: true,
@@ -486,12 +491,14 @@ export function DocumentsPage() {
                             label={
                               doc.box_sync_status === 'synced' ? '同期済'
                               : doc.box_sync_status === 'outdated' ? '要更新'
+                              : doc.box_sync_status === 'deleted' ? '削除済'
                               : 'エラー'
                             }
                             size="small"
                             color={
                               doc.box_sync_status === 'synced' ? 'success'
                               : doc.box_sync_status === 'outdated' ? 'warning'
+                              : doc.box_sync_status === 'deleted' ? 'default'
                               : 'error'
                             }
                             variant="outlined"
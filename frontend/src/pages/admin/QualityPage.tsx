@@ -37,10 +37,15 @@ import ExpandMoreIcon from '@mui/icons-material/ExpandMore';
 import ExpandLessIcon from '@mui/icons-material/ExpandLess';
 import ReactMarkdown from 'react-markdown';
 import remarkGfm from 'remark-gfm';
-import { useQuery } from '@tanstack/react-query';
+import { useInfiniteQuery, useQuery } from '@tanstack/react-query';
 import { MainLayout } from '@/layouts/MainLayout';
 import { WT_COLORS } from '@/theme';
-import { getChatHistory, type ChatHistoryItem } from '@/services/api/stats';
+import {
+  formatHistoryTotal,
+  getChatHistory,
+  getChatHistoryDetail,
+  type ChatHistoryItem,
+} from '@/services/api/stats';
 
 type FilterType = 'evaluated' | 'all' | 'good' | 'bad' | 'no_answer' | 'none';
 
@@ -52,18 +57,28 @@ export function QualityPage() {
   const [detailOpen, setDetailOpen] = useState(false);
   const [expandedRefs, setExpandedRefs] = useState<Set<string>>(new Set());
 
-  const { data, isLoading, error } = useQuery({
+  const { data, isLoading, error, fetchNextPage, hasNextPage, isFetchingNextPage } = useInfiniteQuery({
     queryKey: ['chat-history', filter, days],
-    queryFn: () => getChatHistory({
+    queryFn: ({ pageParam }) => getChatHistory({
       limit: 100,
+      cursor: pageParam,
       feedback: filter === 'good' || filter === 'bad' || filter === 'none' ? filter : undefined,
       noAnswerOnly: filter === 'no_answer',
       days: days || undefined,
       filterMode: filter === 'evaluated' ? 'evaluated' : undefined,
     }),
+    initialPageParam: null as string | null,
+    getNextPageParam: (lastPage) => lastPage.next_cursor,
+  });
+
+  const { data: detail, isLoading: detailLoading } = useQuery({
+    queryKey: ['chat-history-detail', selectedChat?.id],
+    queryFn: () => getChatHistoryDetail(selectedChat!.id),
+    enabled: !!selectedChat,
   });
 
-  const filteredData = (data?.items || []).filter((item) => {
+  const items = data?.pages.flatMap((page) => page.items) ?? [];
+  const filteredData = items.filter((item) => {
     if (!searchQuery) return true;
     const query = searchQuery.toLowerCase();
     return (
@@ -252,6 +267,18 @@ export function QualityPage() {
             </Table>
           </TableContainer>
         )}
+        {data && data.pages.length > 0 && (
+          <Box sx={{ display: 'flex', justifyContent: 'center', alignItems: 'center', gap: 2, mt: 2 }}>
+            <Typography variant="caption" color="text.secondary">
+              {items.length} / {formatHistoryTotal(data.pages[0])} 件
+            </Typography>
+            {hasNextPage && (
+              <Button size="small" onClick={() => fetchNextPage()} disabled={isFetchingNextPage}>
+                {isFetchingNextPage ? '読み込み中...' : 'さらに読み込む'}
+              </Button>
+            )}
+          </Box>
+        )}
       </Box>
 
       {/* 詳細ダイアログ */}
@@ -333,16 +360,22 @@ export function QualityPage() {
                     },
                   }}
                 >
-                  <ReactMarkdown remarkPlugins={[remarkGfm]}>
-                    {selectedChat.full_answer}
-                  </ReactMarkdown>
+                  {detailLoading || !detail ? (
+                    <Box sx={{ display: 'flex', justifyContent: 'center', p: 2 }}>
+                      <CircularProgress size={24} />
+                    </Box>
+                  ) : (
+                    <ReactMarkdown remarkPlugins={[remarkGfm]}>
+                      {detail.answer}
+                    </ReactMarkdown>
+                  )}
                 </Box>
               </Paper>
 
               {/* 参照元 + メタ情報 */}
               <Box sx={{ mt: 1.5 }}>
                 {/* 参照元 */}
-                {selectedChat.references && selectedChat.references.length > 0 && (
+                {detail && detail.references.length > 0 && (
                   <Box sx={{ mb: 1.5 }}>
                     <Typography
                       variant="caption"
@@ -353,7 +386,7 @@ export function QualityPage() {
                       参照元:
                     </Typography>
                     <Box sx={{ display: 'flex', flexDirection: 'column', gap: 0.5 }}>
-                      {selectedChat.references.map((ref, refIdx) => {
+                      {detail.references.map((ref, refIdx) => {
                         const refKey = `qual-ref-${refIdx}`;
                         const isExpanded = expandedRefs.has(refKey);
                         const hasExcerpt = !!ref.excerpt;
@@ -20,7 +20,7 @@ import SaveIcon from '@mui/icons-material/Save';
 import CheckCircleIcon from '@mui/icons-material/CheckCircle';
 import SyncIcon from '@mui/icons-material/Sync';
 import { MainLayout } from '@/layouts/MainLayout';
-import { adminSettingsService, adminBoxService, type UpdateSettingsRequest } from '@/services/api/admin';
+import { adminSettingsService, adminBoxService, type BoxLastPoll, type UpdateSettingsRequest } from '@/services/api/admin';
 
 interface LocalSettings {
   companyName: string;
@@ -37,6 +37,10 @@ interface LocalSettings {
   boxPrivateKeyPassphrase: string;
   boxWatchedFolderId: string;
   boxPollEnabled: boolean;
+  boxPollIntervalMinutes: string;
+  boxAutoResync: boolean;
+  boxResyncWindow: string;
+  boxResyncConcurrency: string;
 }
 
 const defaultSettings: LocalSettings = {
@@ -52,6 +56,10 @@ const defaultSettings: LocalSettings = {
   boxPrivateKeyPassphrase: '',
   boxWatchedFolderId: '',
   boxPollEnabled: false,
+  boxPollIntervalMinutes: '',
+  boxAutoResync: false,
+  boxResyncWindow: '',
+  boxResyncConcurrency: '',
 };
 
 export function SettingsPage() {
@@ -62,6 +70,7 @@ export function SettingsPage() {
   const [isDirty, setIsDirty] = useState(false);
   const [boxTesting, setBoxTesting] = useState(false);
   const [boxPolling, setBoxPolling] = useState(false);
+  const [lastPoll, setLastPoll] = useState<BoxLastPoll | null>(null);
 
   useEffect(() => {
     const fetchSettings = async () => {
@@ -80,7 +89,12 @@ export function SettingsPage() {
           boxPrivateKeyPassphrase: data.boxPrivateKeyPassphrase || '',
           boxWatchedFolderId: data.boxWatchedFolderId || '',
           boxPollEnabled: data.boxPollEnabled || false,
+          boxPollIntervalMinutes: data.boxPollIntervalMinutes ? String(data.boxPollIntervalMinutes) : '',
+          boxAutoResync: data.boxAutoResync || false,
+          boxResyncWindow: data.boxResyncWindow || '',
+          boxResyncConcurrency: data.boxResyncConcurrency ? String(data.boxResyncConcurrency) : '',
         });
+        setLastPoll(data.boxLastPoll);
       } catch (err) {
         console.error('Failed to fetch settings:', err);
       } finally {
@@ -111,6 +125,10 @@ export function SettingsPage() {
         box_private_key_passphrase: settings.boxPrivateKeyPassphrase,
         box_watched_folder_id: settings.boxWatchedFolderId,
         box_poll_enabled: settings.boxPollEnabled,
+        box_poll_interval_minutes: Number(settings.boxPollIntervalMinutes) || 0,
+        box_auto_resync: settings.boxAutoResync,
+        box_resync_window: settings.boxResyncWindow,
+        box_resync_concurrency: Number(settings.boxResyncConcurrency) || 0,
       };
       await adminSettingsService.update(request);
       setSnackbar({ open: true, message: '設定を保存しました', severity: 'success' });
@@ -139,7 +157,7 @@ export function SettingsPage() {
     try {
       setBoxPolling(true);
       const result = await adminBoxService.pollNow();
-      const msg = `チェック: ${result.checked}件, 要更新: ${result.outdated}件, エラー: ${result.errors}件`;
+      const msg = `チェック: ${result.checked}件, 要更新: ${result.outdated}件, 削除: ${result.deleted}件, 未取込: ${result.new}件, 再同期登録: ${result.queued}件, エラー: ${result.errors}件`;
       setSnackbar({ open: true, message: msg, severity: result.errors > 0 ? 'error' : 'success' });
     } catch (err: unknown) {
       const msg = err instanceof Error ? err.message : 'ポーリングに失敗しました';
@@ -292,7 +310,7 @@ export function SettingsPage() {
                       label="変更検知を有効化"
                     />
                     <Typography variant="caption" color="text.secondary" display="block" sx={{ ml: 6 }}>
-                      30分ごとにサーバーの変更を検知し「要更新」としてマークします
+                      設定した間隔（未入力なら30分）でサーバーの変更を検知し「要更新」としてマークします
                     </Typography>
                   </Grid>
                   <Grid size={{ xs: 12, md: 6 }}>
@@ -306,7 +324,19 @@ export function SettingsPage() {
                     />
                   </Grid>
                   <Grid size={{ xs: 12, md: 6 }}>
-                    <Box sx={{ display: 'flex', alignItems: 'center', height: '100%' }}>
+                    <TextField
+                      fullWidth
+                      type="number"
+                      label="チェック間隔（分）"
+                      value={settings.boxPollIntervalMinutes}
+                      onChange={(e) => handleChange('boxPollIntervalMinutes', e.target.value)}
+                      placeholder="30"
+                      slotProps={{ htmlInput: { min: 0, max: 1440 } }}
+                      helperText="未入力または0でサーバー既定の間隔"
+                    />
+                  </Grid>
+                  <Grid size={{ xs: 12, md: 6 }}>
+                    <Box sx={{ display: 'flex', alignItems: 'center', gap: 2, height: '100%' }}>
                       <Button
                         variant="outlined"
                         startIcon={boxPolling ? <CircularProgress size={20} /> : <SyncIcon />}
@@ -315,8 +345,53 @@ export function SettingsPage() {
                       >
                         今すぐチェック
                       </Button>
+                      {lastPoll?.at && (
+                        <Typography variant="caption" color={lastPoll.status === 'error' ? 'error' : lastPoll.status === 'partial' ? 'warning.main' : 'text.secondary'}>
+                          前回: {new Date(lastPoll.at).toLocaleString('ja-JP')}
+                          {lastPoll.seconds != null && `（${lastPoll.seconds.toFixed(1)}秒）`}
+                          {lastPoll.status === 'error' && ` エラー: ${lastPoll.detail ?? ''}`}
+                          {lastPoll.status === 'partial' && ' 一部のフォルダを確認できませんでした'}
+                        </Typography>
+                      )}
                     </Box>
                   </Grid>
+                  <Grid size={12}>
+                    <FormControlLabel
+                      control={
+                        <Switch
+                          checked={settings.boxAutoResync}
+                          onChange={(e) => handleChange('boxAutoResync', e.target.checked)}
+                        />
+                      }
+                      label="要更新のファイルを自動で再同期"
+                    />
+                    <Typography variant="caption" color="text.secondary" display="block" sx={{ ml: 6 }}>
+                      変更検知で「要更新」になったファイルをバックグラウンドで取り込み直します（アップロード・手動同期が優先されます）
+                    </Typography>
+                  </Grid>
+                  <Grid size={{ xs: 12, md: 6 }}>
+                    <TextField
+                      fullWidth
+                      label="再同期の時間帯"
+                      value={settings.boxResyncWindow}
+                      onChange={(e) => handleChange('boxResyncWindow', e.target.value)}
+                      placeholder="22:00-06:00"
+                      disabled={!settings.boxAutoResync}
+                      helperText="HH:MM-HH:MM（日本時間）。未入力なら終日"
+                    />
+                  </Grid>
+                  <Grid size={{ xs: 12, md: 6 }}>
+                    <TextField
+                      fullWidth
+                      type="number"
+                      label="同時に同期するファイル数"
+                      value={settings.boxResyncConcurrency}
+                      onChange={(e) => handleChange('boxResyncConcurrency', e.target.value)}
+                      placeholder="1"
+                      slotProps={{ htmlInput: { min: 0, max: 10 } }}
+                      helperText="未入力または0でサーバー既定"
+                    />
+                  </Grid>
                 </Grid>
               </CardContent>
             </Card>
@@ -105,6 +105,18 @@ export interface SystemSettings {
   boxPrivateKeyPassphrase: string | null;
   boxWatchedFolderId: string | null;
   boxPollEnabled: boolean | null;
+  boxPollIntervalMinutes: number | null;
+  boxAutoResync: boolean | null;
+  boxResyncWindow: string | null;
+  boxResyncConcurrency: number | null;
+  boxLastPoll: BoxLastPoll;
+}
+
+export interface BoxLastPoll {
+  at: string | null;
+  seconds: number | null;
+  status: 'ok' | 'partial' | 'error' | null;
+  detail: string | null;
 }
 
 export interface UpdateSettingsRequest {
@@ -122,6 +134,10 @@ export interface UpdateSettingsRequest {
   box_private_key_passphrase?: string;
   box_watched_folder_id?: string;
   box_poll_enabled?: boolean;
+  box_poll_interval_minutes?: number;
+  box_auto_resync?: boolean;
+  box_resync_window?: string;
+  box_resync_concurrency?: number;
 }
 
 export const adminSettingsService = {
@@ -136,12 +152,22 @@ export const adminSettingsService = {
 
 // ==================== BOX接続テスト・ポーリング ====================
 
+export interface BoxPollResult {
+  checked: number;
+  outdated: number;
+  deleted: number;
+  new: number;
+  directories: number;
+  errors: number;
+  queued: number;
+}
+
 export const adminBoxService = {
   async testConnection(): Promise<{ success: boolean; message: string }> {
     return apiClient.post<{ success: boolean; message: string }>('/api/admin/settings/box/test', {});
   },
 
-  async pollNow(): Promise<{ checked: number; outdated: number; errors: number }> {
-    return apiClient.post<{ checked: number; outdated: number; errors: number }>('/api/admin/settings/box/poll-now', {});
+  async pollNow(): Promise<BoxPollResult> {
+    return apiClient.post<BoxPollResult>('/api/admin/settings/box/poll-now', {});
   },
 };
@@ -14,6 +14,7 @@ export interface ChatReference {
 }
 
 export interface AgentStep {
+  id?: string;
   tool: string;
   status: 'running' | 'done';
   input?: Record<string, unknown>;
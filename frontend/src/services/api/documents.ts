@@ -13,7 +13,7 @@ export interface Document {
   chunk_count: number;
   has_original_file: boolean;
   box_file_id?: string;
-  box_sync_status?: 'synced' | 'outdated' | 'error';
+  box_sync_status?: 'synced' | 'outdated' | 'deleted' | 'error';
   box_synced_at?: string;
 }
 
@@ -21,14 +21,32 @@ export async function getDocuments(): Promise<Document[]> {
   return apiClient.get<Document[]>('/api/documents');
 }
 
-export async function uploadDocument(file: File): Promise<Document> {
+export interface IngestionJob {
+  id: string;
+  kind: string;
+  status: 'queued' | 'running' | 'succeeded' | 'failed';
+  filename: string;
+  file_type: string;
+  document_id: string | null;
+  stage: 'downloading' | 'extracting' | 'chunking' | 'embedding' | 'saving' | null;
+  progress_current: number;
+  progress_total: number;
+  chunk_count: number;
+  error: string | null;
+  attempts: number;
+  created_at: string | null;
+  started_at: string | null;
+  finished_at: string | null;
+}
+
+export async function uploadDocument(file: File): Promise<IngestionJob> {
   const formData = new FormData();
   formData.append('file', file);
 
   const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:8300';
   const token = localStorage.getItem('tomoe_access_token');
 
-  const response = await axios.post<Document>(`${API_BASE_URL}/api/documents/upload`, formData, {
+  const response = await axios.post<IngestionJob>(`${API_BASE_URL}/api/documents/upload`, formData, {
     headers: {
       'Content-Type': 'multipart/form-data',
       ...(token ? { Authorization: `Bearer ${token}` } : {}),
@@ -37,6 +55,25 @@ export async function uploadDocument(file: File): Promise<Document> {
   return response.data;
 }
 
+export async function getIngestionJob(jobId: string): Promise<IngestionJob> {
+  return apiClient.get<IngestionJob>(`/api/documents/jobs/${jobId}`);
+}
+
+/** 取り込みジョブが完了するまでポーリングする（失敗時はエラーを投げる） */
+export async function waitForIngestionJob(
+  jobId: string,
+  onProgress?: (job: IngestionJob) => void,
+  intervalMs = 2000,
+): Promise<IngestionJob> {
+  for (;;) {
+    const job = await getIngestionJob(jobId);
+    onProgress?.(job);
+    if (job.status === 'succeeded') return job;
+    if (job.status === 'failed') throw new Error(job.error || '取り込みに失敗しました');
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
+}
+
 export async function deleteDocument(documentId: string): Promise<void> {
   await apiClient.delete(`/api/documents/${documentId}`);
 }
@@ -100,7 +137,7 @@ export interface BoxFile {
   size: number;
   modified_at: string;
   file_type: string;
-  sync_status?: 'synced' | 'outdated' | 'error' | null;
+  sync_status?: 'synced' | 'outdated' | 'deleted' | 'error' | null;
 }
 
 export async function getBoxConfigured(): Promise<{ configured: boolean }> {
@@ -117,9 +154,8 @@ export async function getBoxFiles(folderId: string): Promise<BoxFile[]> {
 
 export interface BoxSyncResult {
   file_id: string;
-  document_id: string | null;
-  status: string;
-  detail?: string;
+  job_id: string;
+  status: 'queued';
 }
 
 export async function syncBoxFiles(
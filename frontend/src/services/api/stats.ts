@@ -8,25 +8,30 @@ export interface ChatHistoryReference {
   excerpt?: string;
 }
 
+/** 一覧の行（回答は抜粋のみ。全文と引用は getChatHistoryDetail で取得） */
 export interface ChatHistoryItem {
   id: string;
   question: string;
   answer: string;
-  full_answer: string;
   is_no_answer: boolean;
   feedback: 'good' | 'bad' | null;
-  references: ChatHistoryReference[];
   created_at: string | null;
 }
 
+export interface ChatHistoryDetail extends ChatHistoryItem {
+  references: ChatHistoryReference[];
+}
+
 export interface ChatHistoryResponse {
   total: number;
+  total_is_estimate: boolean;
+  next_cursor: string | null;
   items: ChatHistoryItem[];
 }
 
 export async function getChatHistory(params: {
   limit?: number;
-  offset?: number;
+  cursor?: string | null;
   feedback?: 'good' | 'bad' | 'none';
   noAnswerOnly?: boolean;
   days?: number;
@@ -34,7 +39,7 @@ export async function getChatHistory(params: {
 }): Promise<ChatHistoryResponse> {
   const searchParams = new URLSearchParams();
   if (params.limit) searchParams.append('limit', params.limit.toString());
-  if (params.offset) searchParams.append('offset', params.offset.toString());
+  if (params.cursor) searchParams.append('cursor', params.cursor);
   if (params.feedback) searchParams.append('feedback', params.feedback);
   if (params.noAnswerOnly) searchParams.append('no_answer_only', 'true');
   if (params.days) searchParams.append('days', params.days.toString());
@@ -43,6 +48,14 @@ export async function getChatHistory(params: {
   return apiClient.get<ChatHistoryResponse>(`/api/stats/chat-history?${searchParams}`);
 }
 
+export async function getChatHistoryDetail(chatId: string): Promise<ChatHistoryDetail> {
+  return apiClient.get<ChatHistoryDetail>(`/api/stats/chat-history/${chatId}`);
+}
+
+export function formatHistoryTotal(data: Pick<ChatHistoryResponse, 'total' | 'total_is_estimate'>): string {
+  return data.total_is_estimate ? `約${data.total.toLocaleString()}` : data.total.toLocaleString();
+}
+
 export async function getDashboardData(): Promise<DashboardData> {
   return apiClient.get<DashboardData>('/api/stats/admin/dashboard');
 }
@@ -135,7 +135,7 @@ export interface Document {
   createdAt: string;
   // BOX連携用
   boxFileId?: string;
-  boxSyncStatus?: 'synced' | 'outdated' | 'error';
+  boxSyncStatus?: 'synced' | 'outdated' | 'deleted' | 'error';
   boxSyncedAt?: string;
 }
 